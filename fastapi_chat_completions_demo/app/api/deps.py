@@ -1,24 +1,221 @@
 from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+from uuid import UUID
 
-from fastapi import Depends
+from chat_core import api
+from chat_core.admission import AdmissionController, RateLimitedError, build_admission_controller, estimate_turn_tokens
+from chat_core.api import caller_key, requested_backend, select_backend
+from chat_core.batch import BatchBackend
+from chat_core.batch_service import build_batch_backend
+from chat_core.group_commit import AsyncGroupCommitWriter, GroupCommitWriter
+from chat_core.history_cache import HistoryCache, build_history_cache
+from chat_core.idempotency import IdempotencyStore
+from chat_core.llm import AsyncLLMBackend, BackendSet, LLMBackend, build_async_backends, build_backends
+from chat_core.singleflight import AsyncSingleFlight, SingleFlight
+from fastapi import Depends, HTTPException, Request, status
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db.session import get_db
-from app.services.chat_service import ChatService
-from app.services.openai_service import OpenAIChatClient
+from app.core.config import get_settings
+from app.db.session import SessionLocal, get_async_db, get_async_sessionmaker, get_db
+from app.schemas.chat import ChatMessageRequest
+from app.services.batch import BatchJobService
+from app.services.chat_service import AsyncChatService, ChatService
+from app.services.response_cache import get_response_cache
 
 
 @lru_cache
-def _get_openai_client() -> OpenAIChatClient:
-    return OpenAIChatClient()
+def _get_llm_backends() -> BackendSet[LLMBackend]:
+    return build_backends(get_settings())
 
 
-def get_openai_client() -> OpenAIChatClient:
-    return _get_openai_client()
+@lru_cache
+def _get_async_llm_backends() -> BackendSet[AsyncLLMBackend]:
+    return build_async_backends(get_settings())
+
+
+def get_llm_backends() -> BackendSet[Any]:
+    """This worker's backends for the configured ``EXECUTION_MODE``."""
+    if get_settings().execution_mode == "async":
+        return _get_async_llm_backends()
+    return _get_llm_backends()
+
+
+@lru_cache
+def _get_single_flight() -> SingleFlight:
+    return SingleFlight()
+
+
+@lru_cache
+def _get_async_single_flight() -> AsyncSingleFlight:
+    return AsyncSingleFlight()
+
+
+@lru_cache
+def get_idempotency_store() -> IdempotencyStore:
+    settings = get_settings()
+    return IdempotencyStore(
+        max_entries=settings.idempotency_max_keys,
+        ttl_seconds=settings.idempotency_key_ttl_seconds,
+    )
+
+
+@lru_cache
+def get_history_cache() -> Optional[HistoryCache]:
+    return build_history_cache(get_settings())
+
+
+@lru_cache
+def get_batch_backend() -> BatchBackend:
+    return build_batch_backend(get_settings())
+
+
+@lru_cache
+def get_admission_controller() -> AdmissionController:
+    return build_admission_controller(get_settings())
+
+
+async def admit_turn(
+    request: Request,
+    chat_id: UUID,
+    payload: ChatMessageRequest,
+    admission: AdmissionController = Depends(get_admission_controller),
+) -> AsyncIterator[None]:
+    """Admission control for turns that call the model.
+
+    Rejected turns get a 429 with ``Retry-After`` before any work is done.
+    An admitted turn holds its concurrency slot until its response, streamed
+    or not, has been sent, and its token charge is then settled against the
+    usage the model reported.
+    """
+    settings = get_settings()
+    tokens = 0
+    if settings.rate_limit_tokens_per_minute:
+        history_cache = get_history_cache()
+        cached = history_cache.peek(str(chat_id)) if history_cache is not None else None
+        tokens = estimate_turn_tokens(payload.message, cached, settings)
+    try:
+        ticket = await admission.admit(caller_key(request, settings.rate_limit_api_keys), str(chat_id), tokens)
+    except RateLimitedError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(exc),
+            headers={"Retry-After": exc.retry_after_header},
+        ) from exc
+    try:
+        yield
+    finally:
+        ticket.release()
+
+
+@lru_cache
+def _get_group_commit_writer() -> Optional[GroupCommitWriter]:
+    settings = get_settings()
+    if settings.message_write_mode != "group_commit":
+        return None
+    return GroupCommitWriter(
+        SessionLocal,
+        max_batch=settings.group_commit_max_batch,
+        max_delay_seconds=settings.group_commit_max_delay_ms / 1000,
+    )
+
+
+@lru_cache
+def _get_async_group_commit_writer() -> Optional[AsyncGroupCommitWriter]:
+    settings = get_settings()
+    if settings.message_write_mode != "group_commit":
+        return None
+    return AsyncGroupCommitWriter(
+        get_async_sessionmaker(),
+        max_batch=settings.group_commit_max_batch,
+        max_delay_seconds=settings.group_commit_max_delay_ms / 1000,
+    )
+
+
+def _backend_name(request: Request) -> Optional[str]:
+    return requested_backend(request, get_settings().llm_backend_per_request)
 
 
-def get_chat_service(
+def get_llm_backend(request: Request) -> LLMBackend:
+    return select_backend(_get_llm_backends(), _backend_name(request))
+
+
+def get_async_llm_backend(request: Request) -> AsyncLLMBackend:
+    return select_backend(_get_async_llm_backends(), _backend_name(request))
+
+
+def get_sync_chat_service(
     db: Session = Depends(get_db),
-    client: OpenAIChatClient = Depends(get_openai_client),
+    llm: LLMBackend = Depends(get_llm_backend),
 ) -> ChatService:
-    return ChatService(db=db, openai_client=client)
+    return ChatService(
+        db=db,
+        llm=llm,
+        history_cache=get_history_cache(),
+        single_flight=_get_single_flight(),
+        idempotency_store=get_idempotency_store(),
+        writer=_get_group_commit_writer(),
+        response_cache=get_response_cache(),
+    )
+
+
+def get_async_chat_service(
+    db: AsyncSession = Depends(get_async_db),
+    llm: AsyncLLMBackend = Depends(get_async_llm_backend),
+) -> AsyncChatService:
+    return AsyncChatService(
+        db=db,
+        llm=llm,
+        history_cache=get_history_cache(),
+        single_flight=_get_async_single_flight(),
+        idempotency_store=get_idempotency_store(),
+        writer=_get_async_group_commit_writer(),
+        response_cache=get_response_cache(),
+    )
+
+
+def get_batch_job_service(db: Session = Depends(get_db)) -> BatchJobService:
+    return BatchJobService(db=db, backend=get_batch_backend(), history_cache=get_history_cache())
+
+
+def open_clients() -> None:
+    """Build this worker's shared OpenAI client and backends now rather than on its first request."""
+    get_llm_backends()
+
+
+async def close_clients() -> None:
+    """Close the shared clients and writers this worker built, so a restarted app builds fresh ones."""
+    if _get_llm_backends.cache_info().currsize:
+        for backend in _get_llm_backends():
+            backend.close()
+    if _get_async_llm_backends.cache_info().currsize:
+        for async_backend in _get_async_llm_backends():
+            await async_backend.close()
+    if _get_group_commit_writer.cache_info().currsize:
+        sync_writer = _get_group_commit_writer()
+        if sync_writer is not None:
+            sync_writer.close()
+    if _get_async_group_commit_writer.cache_info().currsize:
+        writer = _get_async_group_commit_writer()
+        if writer is not None:
+            await writer.aclose()
+    _get_llm_backends.cache_clear()
+    _get_async_llm_backends.cache_clear()
+    _get_group_commit_writer.cache_clear()
+    _get_async_group_commit_writer.cache_clear()
+
+
+def _select_chat_service_dependency() -> Callable[..., Any]:
+    if get_settings().execution_mode == "async":
+        return get_async_chat_service
+    return get_sync_chat_service
+
+
+# Resolved once at import so routes and ``dependency_overrides`` share the same key.
+get_chat_service = _select_chat_service_dependency()
+
+
+def json_response(model: type[BaseModel], fields: Dict[str, Any], status_code: int = status.HTTP_200_OK) -> Any:
+    """A route's response built from ``fields``; ``RESPONSE_SERIALIZATION=lean`` skips the model."""
+    return api.json_response(model, fields, status_code, lean=get_settings().response_serialization == "lean")
@@ -1,16 +1,33 @@
 from functools import lru_cache
 from typing import Literal
 
-from pydantic_settings import BaseSettings, SettingsConfigDict
+from chat_core.config import (
+    AdmissionSettings,
+    ArchiveSettings,
+    BatchSettings,
+    ChatSettings,
+    DatabaseSettings,
+    ObservabilitySettings,
+)
+from pydantic_settings import SettingsConfigDict
 
 
-class Settings(BaseSettings):
+class Settings(
+    DatabaseSettings, ObservabilitySettings, ChatSettings, ArchiveSettings, BatchSettings, AdmissionSettings
+):
     openai_api_key: str
     database_url: str = "sqlite:///./chat_app.db"
     openai_model: str = "gpt-5-codex-preview"
-    openai_temperature: float = 0.7
-    openai_max_output_tokens: int = 512
+    openai_temperature: float | None = 0.7
     openai_fallback_model: str | None = "gpt-4o-mini"
+    execution_mode: Literal["sync", "async"] = "async"
+    response_serialization: Literal["validated", "lean"] = "validated"
+    response_cache_mode: Literal["off", "exact", "semantic"] = "off"
+    response_cache_max_entries: int = 1024
+    response_cache_ttl_seconds: float = 3600.0
+    response_cache_similarity_threshold: float = 0.95
+    response_cache_embedding_model: str = "text-embedding-3-small"
+    otel_service_name: str = "fastapi-chat-completions-demo"
     environment: Literal["development",
                          "production", "testing"] = "development"
 
@@ -1,6 +1,8 @@
 import uuid
+from datetime import datetime
 
-from sqlalchemy import Column, DateTime, ForeignKey, String, Text, func
+from chat_core.models import ChatModels
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, LargeBinary, String, Text, func
 from sqlalchemy.orm import declarative_base, relationship
 
 
@@ -11,24 +13,98 @@ class Chat(Base):
     __tablename__ = "chats"
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+    # Client-side default so ``create_chat`` needs no refresh to read it back.
+    created_at = Column(
+        DateTime(timezone=True), default=datetime.utcnow, server_default=func.now(), nullable=False, index=True
+    )
+    summary = Column(Text, nullable=True)
+    summary_until = Column(DateTime(timezone=True), nullable=True)
+    response_cache_enabled = Column(Boolean, default=True, server_default="1", nullable=False)
+    # Maintained by every write of a turn; compaction picks chats by ``last_activity_at``.
+    last_activity_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=True, index=True)
+    message_count = Column(Integer, default=0, server_default="0", nullable=False)
+    # Set while the chat's messages live in ``chat_archives`` instead of ``messages``.
+    archived_at = Column(DateTime(timezone=True), nullable=True)
 
     messages = relationship(
         "Message",
         back_populates="chat",
         cascade="all, delete-orphan",
         passive_deletes=True,
-        order_by="Message.created_at",
+        order_by="(Message.created_at, Message.id)",
     )
 
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Serves keyset pages (``chat_id = ? AND (created_at, id) > (?, ?)``) as an
+        # index seek, and the newest-first ``LIMIT`` history query as a reverse scan.
+        Index("ix_messages_chat_id_created_at_id", "chat_id", "created_at", "id"),
+    )
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     chat_id = Column(String(36), ForeignKey("chats.id", ondelete="CASCADE"), nullable=False, index=True)
     role = Column(String(20), nullable=False)
     content = Column(Text, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+    # Client-side default keeps sub-second ordering; SQLite's CURRENT_TIMESTAMP only has second resolution.
+    created_at = Column(
+        DateTime(timezone=True), default=datetime.utcnow, server_default=func.now(), nullable=False, index=True
+    )
 
     chat = relationship("Chat", back_populates="messages")
+
+
+class ChatArchive(Base):
+    """Messages of an idle chat, packed by ``chat_core.archive.pack_messages``."""
+
+    __tablename__ = "chat_archives"
+
+    chat_id = Column(String(36), ForeignKey("chats.id", ondelete="CASCADE"), primary_key=True)
+    payload = Column(LargeBinary, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    archived_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+
+
+class BatchJob(Base):
+    """A bulk job of chat turns run through the Batch API (see ``chat_core.batch_service``)."""
+
+    __tablename__ = "batch_jobs"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    # The upstream batch; ``None`` until it has been submitted.
+    batch_id = Column(String(64), nullable=True, index=True)
+    status = Column(String(20), nullable=False, default="submitting")
+    request_count = Column(Integer, nullable=False, default=0)
+    succeeded = Column(Integer, nullable=False, default=0, server_default="0")
+    failed = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+    # Set once every result has been written back as messages.
+    ingested_at = Column(DateTime(timezone=True), nullable=True)
+    # When the refresh writing the results back (status ``ingesting``) last made progress.
+    ingest_claimed_at = Column(DateTime(timezone=True), nullable=True)
+
+    items = relationship(
+        "BatchJobItem", back_populates="job", cascade="all, delete-orphan", passive_deletes=True)
+
+
+class BatchJobItem(Base):
+    """One turn of a batch job; its ``id`` is the request's ``custom_id``."""
+
+    __tablename__ = "batch_job_items"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    job_id = Column(String(36), ForeignKey("batch_jobs.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Submission order; replies are written back in this order.
+    position = Column(Integer, nullable=False)
+    chat_id = Column(String(36), ForeignKey("chats.id", ondelete="CASCADE"), nullable=False)
+    content = Column(Text, nullable=False)
+    status = Column(String(16), nullable=False, default="pending")
+    error = Column(Text, nullable=True)
+
+    job = relationship("BatchJob", back_populates="items")
+
+
+# The classes the shared chat, batch and archive services in chat_core work on.
+CHAT_MODELS = ChatModels(
+    chat=Chat, message=Message, archive=ChatArchive, batch_job=BatchJob, batch_job_item=BatchJobItem)
@@ -1,31 +1,93 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
+from functools import lru_cache
 
-from sqlalchemy import create_engine
+import anyio
+from chat_core.db import create_async_db_engine, create_db_engine, schema_lock, warm_async_pool, warm_pool
+from chat_core.metrics import instrument_engine
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.config import get_settings
 from app.db.models import Base
 
+engine = create_db_engine(get_settings())
+instrument_engine(engine)
+SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
 
-def _get_engine():
-    settings = get_settings()
-    connect_args = {}
-    if settings.database_url.startswith("sqlite"):
-        connect_args = {"check_same_thread": False}
 
-    return create_engine(
-        settings.database_url,
-        connect_args=connect_args,
-        future=True,
-    )
+@lru_cache
+def get_async_engine() -> AsyncEngine:
+    async_engine = create_async_db_engine(get_settings())
+    instrument_engine(async_engine.sync_engine)
+    return async_engine
 
 
-engine = _get_engine()
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
+@lru_cache
+def get_async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(bind=get_async_engine(), autoflush=False, expire_on_commit=False)
+
+
+# Statements that fill a column from existing rows when ``_upgrade_schema`` adds it.
+_BACKFILLS = {
+    ("chats", "message_count"): (
+        "UPDATE chats SET message_count = (SELECT COUNT(*) FROM messages WHERE messages.chat_id = chats.id)"
+    ),
+    ("chats", "last_activity_at"): (
+        "UPDATE chats SET last_activity_at = COALESCE("
+        "(SELECT MAX(created_at) FROM messages WHERE messages.chat_id = chats.id), created_at)"
+    ),
+}
+
+
+def _upgrade_schema() -> None:
+    """Add columns and indexes introduced after a table was first created.
+
+    ``create_all`` skips tables that already exist, so databases created by an
+    earlier version would otherwise miss newer columns.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                connection.execute(text(ddl))
+                if (table.name, column.name) in _BACKFILLS:
+                    connection.execute(text(_BACKFILLS[table.name, column.name]))
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
 
 
 def init_db() -> None:
-    Base.metadata.create_all(bind=engine)
+    # Every worker runs this on startup; the lock lets only one migrate at a time.
+    with schema_lock(engine):
+        Base.metadata.create_all(bind=engine)
+        _upgrade_schema()
+
+
+def reset_pools() -> None:
+    """Forget pooled connections inherited from a parent process (``gunicorn --preload``) without closing them."""
+    engine.dispose(close=False)
+
+
+async def warm_pools() -> None:
+    """Open the first connections of the pool this worker's requests will use."""
+    settings = get_settings()
+    if settings.execution_mode == "async":
+        await warm_async_pool(get_async_engine(), settings.db_pool_prewarm)
+    else:
+        await anyio.to_thread.run_sync(warm_pool, engine, settings.db_pool_prewarm)
+
+
+async def close_db() -> None:
+    engine.dispose()
+    if get_async_engine.cache_info().currsize:
+        await get_async_engine().dispose()
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -34,3 +96,8 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with get_async_sessionmaker()() as db:
+        yield db
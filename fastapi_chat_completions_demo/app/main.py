@@ -1,9 +1,57 @@
-from fastapi import FastAPI
+import asyncio
+import contextlib
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import Any, AsyncIterator, Optional
+
+import anyio
+from chat_core import metrics
+from chat_core.archive import compaction_loop
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.api.deps import close_clients, get_history_cache, get_llm_backends, open_clients
+from app.api.routes import batches as batch_routes
 from app.api.routes import chat as chat_routes
 from app.core.config import get_settings
-from app.db.session import init_db
+from app.db.models import CHAT_MODELS
+from app.db.session import SessionLocal, close_db, init_db, reset_pools, warm_pools
+from app.services.response_cache import get_response_cache
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Per-worker startup and shutdown.
+
+    Every worker migrates the schema (serialized across processes by a lock),
+    opens its first database connections and builds its OpenAI client before
+    it accepts requests, and releases them again on shutdown.
+    """
+    settings = get_settings()
+    reset_pools()
+    await anyio.to_thread.run_sync(init_db)
+    await warm_pools()
+    open_clients()
+    compaction_task: Optional["asyncio.Task[None]"] = None
+    if settings.archive_idle_days is not None:
+        compaction_task = asyncio.create_task(compaction_loop(
+            SessionLocal,
+            CHAT_MODELS,
+            timedelta(days=settings.archive_idle_days),
+            settings.archive_interval_seconds,
+            settings.archive_batch_size,
+            get_history_cache(),
+        ))
+    try:
+        yield
+    finally:
+        if compaction_task is not None:
+            compaction_task.cancel()
+            # A pass already running in its thread finishes before the engine is disposed.
+            with contextlib.suppress(asyncio.CancelledError):
+                await compaction_task
+        await close_clients()
+        await close_db()
 
 
 def create_app() -> FastAPI:
@@ -13,6 +61,7 @@ def create_app() -> FastAPI:
         version="0.1.0",
         docs_url="/docs",
         redoc_url="/redoc",
+        lifespan=lifespan,
     )
 
     app.add_middleware(
@@ -23,15 +72,33 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    if settings.metrics_enabled:
+        # Added last so it wraps CORS too and times the whole request.
+        app.add_middleware(metrics.MetricsMiddleware)
+
+        @app.get("/metrics", include_in_schema=False)
+        def prometheus_metrics() -> Response:
+            return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+    if settings.otel_exporter_otlp_endpoint:
+        metrics.configure_tracing(settings.otel_service_name, settings.otel_exporter_otlp_endpoint)
+
     app.include_router(chat_routes.router)
+    app.include_router(batch_routes.router)
 
     @app.get("/", tags=["health"])
-    def healthcheck() -> dict[str, str]:
-        return {"status": "ok", "model": settings.openai_model}
-
-    @app.on_event("startup")
-    def on_startup() -> None:
-        init_db()
+    def healthcheck() -> dict[str, Any]:
+        history_cache = get_history_cache()
+        response_cache = get_response_cache()
+        backends = get_llm_backends()
+        return {
+            "status": "ok",
+            "model": settings.openai_model,
+            "llm_backend": backends.default,
+            "history_cache": history_cache.stats() if history_cache is not None else None,
+            "response_cache": response_cache.stats() if response_cache is not None else None,
+            "models": backends.snapshot(),
+        }
 
     return app
 
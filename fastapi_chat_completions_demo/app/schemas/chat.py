@@ -1,12 +1,19 @@
 from datetime import datetime
+from typing import List, Optional
 from uuid import UUID
 
 from pydantic import BaseModel, Field
 
 
+class ChatCreateRequest(BaseModel):
+    response_cache_enabled: bool = Field(
+        True, description="Allow replies in this chat to be served from the response cache.")
+
+
 class ChatResource(BaseModel):
     id: UUID
     created_at: datetime
+    response_cache_enabled: bool = True
 
     model_config = {"from_attributes": True}
 
@@ -24,3 +31,19 @@ class ChatMessageResponse(BaseModel):
     response: str
     role: str = "assistant"
     sent_at: datetime
+
+
+class MessageResource(BaseModel):
+    id: str
+    role: str
+    content: str
+    created_at: datetime
+
+    model_config = {"from_attributes": True}
+
+
+class MessagePageResponse(BaseModel):
+    chat_id: UUID
+    messages: List[MessageResource]
+    next_cursor: Optional[str] = Field(
+        None, description="Pass as ``cursor`` to fetch the next page; ``null`` on the last page.")
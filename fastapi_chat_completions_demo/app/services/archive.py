@@ -0,0 +1,20 @@
+"""Archival of idle chats out of the hot ``messages`` table; see :mod:`chat_core.archive`.
+
+Run a pass by hand (or from cron) with ``python -m app.services.archive``,
+or set ``ARCHIVE_IDLE_DAYS`` to run it periodically inside the app.
+"""
+
+from chat_core import archive
+
+
+def main() -> None:
+    from app.api.deps import get_history_cache
+    from app.core.config import get_settings
+    from app.db.models import CHAT_MODELS
+    from app.db.session import SessionLocal, engine, init_db
+
+    archive.main(get_settings(), CHAT_MODELS, SessionLocal, engine, init_db, get_history_cache())
+
+
+if __name__ == "__main__":
+    main()
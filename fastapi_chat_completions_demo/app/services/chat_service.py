@@ -1,62 +1,75 @@
-from __future__ import annotations
-
-from typing import List, Sequence
-from uuid import UUID
-
-from sqlalchemy import select
+"""This demo's chat services: ``chat_core``'s, over its models and settings, with the response cache.
+
+Turns of chats with ``response_cache_enabled`` go through the
+:mod:`app.services.response_cache` wrapper when ``RESPONSE_CACHE_MODE`` is
+on; everything else is :mod:`chat_core.chat_service`.
+"""
+
+from typing import Optional
+
+from chat_core import chat_service
+from chat_core.chat_service import AsyncReplyStream, ChatNotFoundError, ReplyStream
+from chat_core.group_commit import AsyncGroupCommitWriter, GroupCommitWriter
+from chat_core.history_cache import HistoryCache
+from chat_core.idempotency import IdempotencyStore
+from chat_core.llm import AsyncLLMBackend, LLMBackend
+from chat_core.singleflight import AsyncSingleFlight, SingleFlight
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.core.config import get_settings
 from app.db import models
-from app.services.openai_service import OpenAIChatClient
-
-
-class ChatNotFoundError(Exception):
-    """Raised when a chat identifier does not exist."""
-
-
-class ChatService:
-    def __init__(self, db: Session, openai_client: OpenAIChatClient) -> None:
-        self._db = db
-        self._openai = openai_client
-
-    def create_chat(self) -> models.Chat:
-        chat = models.Chat()
-        self._db.add(chat)
-        self._db.commit()
-        self._db.refresh(chat)
-        return chat
-
-    def _load_chat(self, chat_id: UUID | str) -> models.Chat:
-        chat = self._db.get(models.Chat, str(chat_id))
-        if chat is None:
-            raise ChatNotFoundError(f"Chat {chat_id} not found.")
-        return chat
-
-    def _chat_history(self, chat_id: str) -> Sequence[models.Message]:
-        stmt = (
-            select(models.Message)
-            .where(models.Message.chat_id == chat_id)
-            .order_by(models.Message.created_at.asc())
-        )
-        return self._db.execute(stmt).scalars().all()
-
-    def send_message(self, chat_id: UUID | str, content: str) -> models.Message:
-        chat = self._load_chat(chat_id)
-        chat_id_str = str(chat.id)
-
-        history_payload: List[dict[str, str]] = [
-            {"role": message.role, "content": message.content}
-            for message in self._chat_history(chat_id_str)
-        ]
-
-        history_payload.append({"role": "user", "content": content})
-
-        completion = self._openai.create_completion(history_payload)
-
-        user_message = models.Message(chat_id=chat_id_str, role="user", content=content)
-        assistant_message = models.Message(chat_id=chat_id_str, role="assistant", content=completion)
-        self._db.add_all([user_message, assistant_message])
-        self._db.commit()
-        self._db.refresh(assistant_message)
-
-        return assistant_message
+from app.services.response_cache import AsyncCachingBackend, CachingBackend, ResponseCache
+
+__all__ = ["AsyncChatService", "AsyncReplyStream", "ChatNotFoundError", "ChatService", "ReplyStream"]
+
+
+class ChatService(chat_service.ChatService):
+    def __init__(
+        self,
+        db: Session,
+        llm: LLMBackend,
+        history_cache: Optional[HistoryCache] = None,
+        single_flight: Optional[SingleFlight] = None,
+        idempotency_store: Optional[IdempotencyStore] = None,
+        writer: Optional[GroupCommitWriter] = None,
+        response_cache: Optional[ResponseCache] = None,
+    ) -> None:
+        super().__init__(
+            db, llm, models.CHAT_MODELS, get_settings(), history_cache, single_flight, idempotency_store, writer)
+        self._response_cache = response_cache
+
+    def create_chat(self, response_cache_enabled: bool = True) -> models.Chat:
+        return super().create_chat(response_cache_enabled=response_cache_enabled)
+
+    def _backend_for(self, chat: models.Chat) -> LLMBackend:
+        """The backend for a turn of ``chat``: cached when the cache is on and the chat allows it."""
+        if self._response_cache is None or not chat.response_cache_enabled:
+            return self._llm
+        return CachingBackend(self._llm, self._response_cache)
+
+
+class AsyncChatService(chat_service.AsyncChatService):
+    """Async variant of :class:`ChatService` used when ``EXECUTION_MODE=async``."""
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        llm: AsyncLLMBackend,
+        history_cache: Optional[HistoryCache] = None,
+        single_flight: Optional[AsyncSingleFlight] = None,
+        idempotency_store: Optional[IdempotencyStore] = None,
+        writer: Optional[AsyncGroupCommitWriter] = None,
+        response_cache: Optional[ResponseCache] = None,
+    ) -> None:
+        super().__init__(
+            db, llm, models.CHAT_MODELS, get_settings(), history_cache, single_flight, idempotency_store, writer)
+        self._response_cache = response_cache
+
+    async def create_chat(self, response_cache_enabled: bool = True) -> models.Chat:
+        return await super().create_chat(response_cache_enabled=response_cache_enabled)
+
+    def _backend_for(self, chat: models.Chat) -> AsyncLLMBackend:
+        if self._response_cache is None or not chat.response_cache_enabled:
+            return self._llm
+        return AsyncCachingBackend(self._llm, self._response_cache)
@@ -0,0 +1,362 @@
+"""Opt-in cache of model replies keyed on the request that produced them."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import aclosing, closing
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Iterator, List, Literal, Optional, Sequence, Tuple
+
+from chat_core.llm import AsyncLLMBackend, Generation, LLMBackend, Messages, ResponseIdCallback
+from openai import OpenAIError
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+CacheMode = Literal["exact", "semantic"]
+
+
+@lru_cache
+def _numpy() -> Optional[Any]:
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _normalize(messages: Sequence[Dict[str, str]]) -> List[List[str]]:
+    # Whitespace-only differences should not defeat the cache.
+    return [[message["role"].lower(), " ".join(message["content"].split())] for message in messages]
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def _unit(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(component * component for component in vector)) or 1.0
+    return [component / norm for component in vector]
+
+
+@dataclass(frozen=True)
+class CacheKey:
+    """Identity of a completion request.
+
+    ``exact`` covers the model parameters and every message. ``context``
+    covers everything except the final user turn (``query``), so semantic
+    matches are only considered between requests with identical history.
+    """
+
+    exact: str
+    context: str
+    query: str
+
+
+@dataclass
+class ResponseCacheStats:
+    hits: int = 0
+    semantic_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+@dataclass
+class _Entry:
+    text: str
+    context: str
+    expires_at: float
+    embedding: Optional[List[float]] = None
+
+
+class ResponseCache:
+    """Size-bounded LRU of replies with a per-entry time-to-live.
+
+    In ``semantic`` mode entries also keep the embedding of their final user
+    turn, and :meth:`get_similar` returns the reply of the most similar prior
+    prompt with the same context when its cosine similarity reaches
+    ``similarity_threshold``. The index is a brute-force scan over the
+    entries of that context, which is fast at the sizes this cache holds.
+    """
+
+    def __init__(
+        self,
+        mode: CacheMode = "exact",
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600.0,
+        similarity_threshold: float = 0.95,
+    ) -> None:
+        self.mode = mode
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._stats = ResponseCacheStats()
+        self._lock = threading.Lock()
+
+    @property
+    def semantic(self) -> bool:
+        return self.mode == "semantic"
+
+    @staticmethod
+    def key_for(
+        model: str,
+        temperature: Optional[float],
+        max_tokens: int,
+        messages: Sequence[Dict[str, str]],
+    ) -> CacheKey:
+        normalized = _normalize(messages)
+        context = _digest([model, temperature, max_tokens, normalized[:-1]])
+        return CacheKey(
+            exact=_digest([context, normalized[-1]]),
+            context=context,
+            query=normalized[-1][1],
+        )
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        """Return the reply cached for exactly this request.
+
+        A miss is only counted here in exact mode; in semantic mode the
+        caller follows up with :meth:`get_similar`, which records the outcome.
+        """
+        with self._lock:
+            entry = self._live_entry(key.exact)
+            if entry is not None:
+                self._entries.move_to_end(key.exact)
+                self._stats.hits += 1
+                return entry.text
+            if not self.semantic:
+                self._stats.misses += 1
+            return None
+
+    def get_similar(self, key: CacheKey, embedding: Sequence[float]) -> Optional[str]:
+        query = _unit(embedding)
+        with self._lock:
+            candidates = [
+                entry_key
+                for entry_key, entry in list(self._entries.items())
+                if entry.context == key.context and entry.embedding is not None
+                and self._live_entry(entry_key) is not None
+            ]
+            scores = self._similarities(query, [self._entries[entry_key].embedding for entry_key in candidates])
+            best_key, best_score = None, self._similarity_threshold
+            for entry_key, score in zip(candidates, scores):
+                if score >= best_score:
+                    best_key, best_score = entry_key, score
+            if best_key is None:
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self._stats.semantic_hits += 1
+            return self._entries[best_key].text
+
+    def put(self, key: CacheKey, text: str, embedding: Optional[Sequence[float]] = None) -> None:
+        entry = _Entry(
+            text=text,
+            context=key.context,
+            expires_at=time.monotonic() + self._ttl_seconds,
+            embedding=_unit(embedding) if embedding is not None else None,
+        )
+        with self._lock:
+            self._entries[key.exact] = entry
+            self._entries.move_to_end(key.exact)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._stats.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._stats.size = len(self._entries)
+            return self._stats.as_dict()
+
+    def _live_entry(self, entry_key: str) -> Optional[_Entry]:
+        entry = self._entries.get(entry_key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            del self._entries[entry_key]
+            self._stats.evictions += 1
+            return None
+        return entry
+
+    @staticmethod
+    def _similarities(query: List[float], embeddings: List[List[float]]) -> List[float]:
+        if not embeddings:
+            return []
+        numpy = _numpy()
+        if numpy is not None:
+            return (numpy.asarray(embeddings) @ numpy.asarray(query)).tolist()
+        return [sum(a * b for a, b in zip(query, embedding)) for embedding in embeddings]
+
+
+@lru_cache
+def get_response_cache() -> Optional[ResponseCache]:
+    settings = get_settings()
+    if settings.response_cache_mode == "off":
+        return None
+    return ResponseCache(
+        mode=settings.response_cache_mode,
+        max_entries=settings.response_cache_max_entries,
+        ttl_seconds=settings.response_cache_ttl_seconds,
+        similarity_threshold=settings.response_cache_similarity_threshold,
+    )
+
+
+class _CachingBackendBase:
+    """Shared key building for the caching backends.
+
+    Replies are keyed on the backend and its preferred model as well as the
+    request, so backends never answer from each other's entries. Chaining is
+    not offered: a cached reply has no upstream response to continue from.
+    The wrapped backend must be one of :mod:`chat_core.llm`'s OpenAI
+    backends, whose client also computes the embeddings for semantic lookups.
+    """
+
+    supports_chaining = False
+
+    def __init__(self, backend: Any, cache: ResponseCache) -> None:
+        settings = get_settings()
+        self.name = backend.name
+        self._backend = backend
+        self._cache = cache
+        self._temperature = settings.openai_temperature
+        self._max_output_tokens = settings.openai_max_output_tokens
+        self._embedding_model = settings.response_cache_embedding_model
+
+    def _key(self, messages: Messages) -> CacheKey:
+        return ResponseCache.key_for(
+            f"{self._backend.name}/{self._backend.model}", self._temperature, self._max_output_tokens, messages)
+
+    @staticmethod
+    def _embedding_of(response: Any) -> List[float]:
+        return list(response.data[0].embedding)
+
+
+class CachingBackend(_CachingBackendBase):
+    """An :class:`~chat_core.llm.LLMBackend` that answers repeated requests from a :class:`ResponseCache`."""
+
+    def __init__(self, backend: LLMBackend, cache: ResponseCache) -> None:
+        super().__init__(backend, cache)
+
+    def generate(self, messages: Messages, previous_response_id: Optional[str] = None) -> Generation:
+        key = self._key(messages)
+        cached, embedding = self._lookup(key)
+        if cached is not None:
+            return Generation(cached)
+        generation = self._backend.generate(messages)
+        self._cache.put(key, generation.text, embedding)
+        return generation
+
+    def stream(
+        self,
+        messages: Messages,
+        previous_response_id: Optional[str] = None,
+        on_response_id: Optional[ResponseIdCallback] = None,
+    ) -> Iterator[str]:
+        """A cached reply is returned as a single delta."""
+        key = self._key(messages)
+        cached, embedding = self._lookup(key)
+        if cached is not None:
+            return iter([cached])
+        return self._caching_deltas(self._backend.stream(messages, on_response_id=on_response_id), key, embedding)
+
+    def close(self) -> None:
+        self._backend.close()
+
+    def _lookup(self, key: CacheKey) -> Tuple[Optional[str], Optional[List[float]]]:
+        """Return a cached reply, plus the query embedding to store on a semantic miss."""
+        cached = self._cache.get(key)
+        if cached is not None or not self._cache.semantic:
+            return cached, None
+        try:
+            embedding = self._embedding_of(
+                self._backend.client.embeddings.create(model=self._embedding_model, input=key.query))
+        except OpenAIError as exc:  # pragma: no cover - depends on external API state
+            logger.warning("Skipping semantic response cache lookup: %s", exc)
+            return None, None
+        return self._cache.get_similar(key, embedding), embedding
+
+    def _caching_deltas(
+        self, deltas: Iterator[str], key: CacheKey, embedding: Optional[List[float]]
+    ) -> Iterator[str]:
+        # Only a reply that streamed to completion is cached.
+        parts: List[str] = []
+        with closing(deltas):
+            for delta in deltas:
+                parts.append(delta)
+                yield delta
+        text = "".join(parts).strip()
+        if text:
+            self._cache.put(key, text, embedding)
+
+
+class AsyncCachingBackend(_CachingBackendBase):
+    """Non-blocking counterpart of :class:`CachingBackend`."""
+
+    def __init__(self, backend: AsyncLLMBackend, cache: ResponseCache) -> None:
+        super().__init__(backend, cache)
+
+    async def generate(self, messages: Messages, previous_response_id: Optional[str] = None) -> Generation:
+        key = self._key(messages)
+        cached, embedding = await self._lookup(key)
+        if cached is not None:
+            return Generation(cached)
+        generation = await self._backend.generate(messages)
+        self._cache.put(key, generation.text, embedding)
+        return generation
+
+    async def stream(
+        self,
+        messages: Messages,
+        previous_response_id: Optional[str] = None,
+        on_response_id: Optional[ResponseIdCallback] = None,
+    ) -> AsyncIterator[str]:
+        key = self._key(messages)
+        cached, embedding = await self._lookup(key)
+        if cached is not None:
+            return self._replay(cached)
+        deltas = await self._backend.stream(messages, on_response_id=on_response_id)
+        return self._caching_deltas(deltas, key, embedding)
+
+    async def close(self) -> None:
+        await self._backend.close()
+
+    async def _lookup(self, key: CacheKey) -> Tuple[Optional[str], Optional[List[float]]]:
+        cached = self._cache.get(key)
+        if cached is not None or not self._cache.semantic:
+            return cached, None
+        try:
+            embedding = self._embedding_of(
+                await self._backend.client.embeddings.create(model=self._embedding_model, input=key.query))
+        except OpenAIError as exc:  # pragma: no cover - depends on external API state
+            logger.warning("Skipping semantic response cache lookup: %s", exc)
+            return None, None
+        return self._cache.get_similar(key, embedding), embedding
+
+    @staticmethod
+    async def _replay(text: str) -> AsyncIterator[str]:
+        yield text
+
+    async def _caching_deltas(
+        self, deltas: AsyncIterator[str], key: CacheKey, embedding: Optional[List[float]]
+    ) -> AsyncIterator[str]:
+        parts: List[str] = []
+        async with aclosing(deltas):
+            async for delta in deltas:
+                parts.append(delta)
+                yield delta
+        text = "".join(parts).strip()
+        if text:
+            self._cache.put(key, text, embedding)
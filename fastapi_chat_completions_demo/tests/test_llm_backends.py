@@ -0,0 +1,62 @@
+from typing import Dict, List, Optional
+
+import pytest
+from chat_core.llm import BackendSet, Generation
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.api import deps
+from app.core.config import get_settings
+from app.services.response_cache import CachingBackend, ResponseCache
+
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+class FakeBackend:
+    supports_chaining = False
+    model = "gpt-test"
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.calls: List[List[Dict[str, str]]] = []
+
+    def generate(self, messages: List[Dict[str, str]], previous_response_id: Optional[str] = None) -> Generation:
+        self.calls.append(messages)
+        return Generation(f"reply from {self.name}")
+
+    def stream(self, messages, previous_response_id=None, on_response_id=None):
+        self.calls.append(messages)
+        return iter(["reply ", "from ", self.name])
+
+    def close(self) -> None:
+        pass
+
+
+def _request(backend: Optional[str] = None) -> Request:
+    headers = [(b"x-llm-backend", backend.encode())] if backend else []
+    return Request({"type": "http", "headers": headers})
+
+
+def test_cached_replies_are_not_shared_between_backends():
+    cache = ResponseCache()
+    chat_completions, responses = FakeBackend("chat_completions"), FakeBackend("responses")
+
+    assert CachingBackend(chat_completions, cache).generate(MESSAGES).text == "reply from chat_completions"
+    assert "".join(CachingBackend(chat_completions, cache).stream(MESSAGES)) == "reply from chat_completions"
+    assert CachingBackend(responses, cache).generate(MESSAGES).text == "reply from responses"
+
+    assert (len(chat_completions.calls), len(responses.calls)) == (1, 1)
+
+
+def test_request_header_selects_the_backend_only_when_allowed(monkeypatch):
+    backends = BackendSet([FakeBackend("chat_completions"), FakeBackend("responses")], default="chat_completions")
+    monkeypatch.setattr(deps, "_get_llm_backends", lambda: backends)
+
+    assert deps.get_llm_backend(_request("responses")).name == "chat_completions"
+
+    monkeypatch.setattr(get_settings(), "llm_backend_per_request", True)
+    assert deps.get_llm_backend(_request("responses")).name == "responses"
+    assert deps.get_llm_backend(_request()).name == "chat_completions"
+    with pytest.raises(HTTPException) as excinfo:
+        deps.get_llm_backend(_request("claude"))
+    assert excinfo.value.status_code == 422
@@ -0,0 +1,165 @@
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Sequence
+
+import pytest
+from chat_core.llm import BackendSet, Generation
+from fastapi.testclient import TestClient
+from sqlalchemy import StaticPool, create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api import deps
+from app.core.config import get_settings
+from app.db.models import Base
+from app.main import create_app
+from app.services import response_cache
+from app.services.chat_service import ChatService
+from app.services.response_cache import CachingBackend, ResponseCache, get_response_cache
+
+
+def _key(content: str, history: Sequence[Dict[str, str]] = ()) -> response_cache.CacheKey:
+    return ResponseCache.key_for("openai/gpt-test", 0.7, 256, [*history, {"role": "user", "content": content}])
+
+
+class FakeEmbeddings:
+    def __init__(self, vectors: Dict[str, List[float]]) -> None:
+        self.vectors = vectors
+
+    def create(self, model: str, input: str) -> SimpleNamespace:
+        return SimpleNamespace(data=[SimpleNamespace(embedding=self.vectors[input])])
+
+
+class FakeBackend:
+    name = "chat_completions"
+    supports_chaining = False
+    model = "gpt-test"
+
+    def __init__(self, vectors: Optional[Dict[str, List[float]]] = None) -> None:
+        self.client = SimpleNamespace(embeddings=FakeEmbeddings(vectors or {}))
+        self.calls: List[List[Dict[str, str]]] = []
+
+    def generate(self, messages: List[Dict[str, str]], previous_response_id: Optional[str] = None) -> Generation:
+        self.calls.append(messages)
+        return Generation(f"reply {len(self.calls)}")
+
+    def stream(self, messages, previous_response_id=None, on_response_id=None):
+        self.calls.append(messages)
+        yield f"reply {len(self.calls)}"
+
+    def close(self) -> None:
+        pass
+
+
+def test_exact_mode_hits_only_the_same_request():
+    cache = ResponseCache()
+    cache.put(_key("Hi"), "Hello!")
+
+    assert cache.get(_key("Hi")) == "Hello!"
+    assert cache.get(_key("Hi there")) is None
+    assert cache.get(_key("Hi", history=[{"role": "user", "content": "Earlier"}])) is None
+    assert cache.stats() == {"hits": 1, "semantic_hits": 0, "misses": 2, "evictions": 0, "size": 1}
+
+
+def test_semantic_mode_answers_prompts_at_or_above_the_threshold():
+    backend = FakeBackend({
+        "What is the capital of France?": [1.0, 0.0],
+        "Which city is France's capital?": [0.8, 0.6],
+        "How tall is the Eiffel Tower?": [0.6, 0.8],
+    })
+    cache = ResponseCache(mode="semantic", similarity_threshold=0.8)
+    caching = CachingBackend(backend, cache)
+
+    assert caching.generate([{"role": "user", "content": "What is the capital of France?"}]).text == "reply 1"
+    # Cosine similarity 0.8 reaches the threshold; 0.6 falls short of it.
+    assert caching.generate([{"role": "user", "content": "Which city is France's capital?"}]).text == "reply 1"
+    assert caching.generate([{"role": "user", "content": "How tall is the Eiffel Tower?"}]).text == "reply 2"
+
+    assert len(backend.calls) == 2
+    assert cache.stats() == {"hits": 0, "semantic_hits": 1, "misses": 2, "evictions": 0, "size": 2}
+
+
+def test_semantic_matches_stay_within_the_same_context():
+    cache = ResponseCache(mode="semantic", similarity_threshold=0.9)
+    cache.put(_key("Hi"), "Hello!", embedding=[1.0, 0.0])
+
+    assert cache.get_similar(_key("Hey"), [1.0, 0.0]) == "Hello!"
+    assert cache.get_similar(_key("Hey", history=[{"role": "user", "content": "Earlier"}]), [1.0, 0.0]) is None
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    cache = ResponseCache(ttl_seconds=60)
+    cache.put(_key("Hi"), "Hello!")
+
+    now[0] += 60
+    assert cache.get(_key("Hi")) == "Hello!"
+    now[0] += 1
+    assert cache.get(_key("Hi")) is None
+    assert cache.stats() == {"hits": 1, "semantic_hits": 0, "misses": 1, "evictions": 1, "size": 0}
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = ResponseCache(max_entries=2)
+    cache.put(_key("one"), "1")
+    cache.put(_key("two"), "2")
+    assert cache.get(_key("one")) == "1"
+
+    cache.put(_key("three"), "3")
+
+    assert cache.get(_key("two")) is None
+    assert cache.get(_key("one")) == "1"
+    assert cache.get(_key("three")) == "3"
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+
+
+@pytest.fixture()
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@pytest.mark.parametrize("enabled, upstream_calls", [(True, 1), (False, 2)])
+def test_chats_can_opt_out_of_the_cache(db, enabled, upstream_calls):
+    backend = FakeBackend()
+    service = ChatService(db=db, llm=backend, response_cache=ResponseCache())
+
+    replies = [
+        service.send_message(service.create_chat(response_cache_enabled=enabled).id, "Hi").content
+        for _ in range(2)
+    ]
+
+    assert len(backend.calls) == upstream_calls
+    assert replies == ["reply 1", "reply 1" if enabled else "reply 2"]
+
+
+@pytest.fixture()
+def exact_cache(monkeypatch):
+    monkeypatch.setattr(get_settings(), "response_cache_mode", "exact")
+    get_response_cache.cache_clear()
+    yield get_response_cache()
+    get_response_cache.cache_clear()
+
+
+def test_healthcheck_reports_the_cache_stats(monkeypatch, exact_cache):
+    monkeypatch.setattr(deps, "_get_llm_backends", lambda: BackendSet([FakeBackend()], default="chat_completions"))
+    exact_cache.put(_key("Hi"), "Hello!")
+    exact_cache.get(_key("Hi"))
+    exact_cache.get(_key("Bye"))
+
+    body = TestClient(create_app()).get("/").json()
+
+    assert body["response_cache"] == {"hits": 1, "semantic_hits": 0, "misses": 1, "evictions": 0, "size": 1}
+
+
+def test_healthcheck_reports_no_cache_when_it_is_off(monkeypatch):
+    monkeypatch.setattr(deps, "_get_llm_backends", lambda: BackendSet([FakeBackend()], default="chat_completions"))
+    get_response_cache.cache_clear()
+
+    assert TestClient(create_app()).get("/").json()["response_cache"] is None
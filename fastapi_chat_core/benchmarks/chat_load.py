@@ -0,0 +1,344 @@
+"""Load-test the chat demos against the local fake LLM server.
+
+Starts ``fake_llm_server.py`` and each selected demo under uvicorn, then
+simulates ``--users`` concurrent users that each create a chat and send
+``--turns`` messages (streamed with ``--stream``). Reports requests per
+second and p50/p95/p99 latency per endpoint, time spent in the database
+stages and SQL statements per turn (scraped from ``/metrics``), and the app's
+peak resident memory. ``--output`` saves the results as JSON and
+``--compare`` prints the change against an earlier run. Run from
+``fastapi_chat_core`` with the ``bench`` extra installed::
+
+    python benchmarks/chat_load.py --app both --users 20 --turns 5 --output bench-main.json
+    python benchmarks/chat_load.py --app both --users 20 --turns 5 --compare bench-main.json
+
+``--backend both`` runs each demo once per LLM backend (``LLM_BACKEND``), so
+Chat Completions and Responses are compared on identical infrastructure; the
+results also show the tokens each backend sent and received per turn. The
+fake server only counts the tokens in each request, so for chained Responses
+turns this is what the app sends, not what the API would bill: the API also
+bills the stored context a turn continues from.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[2]
+DEMOS = {
+    "completions": ROOT / "fastapi_chat_completions_demo",
+    "responses": ROOT / "fastapi_responses_api_demo",
+}
+DB_STAGES = ("load_chat", "build_history", "persist")
+_SAMPLE = re.compile(r"^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(?P<labels>[^}]*)\})? (?P<value>\S+)$")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {process.returncode} before becoming ready.")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not become ready within {timeout:.0f}s.")
+
+
+@contextmanager
+def _serve(command: List[str], url: str, cwd: Optional[Path] = None,
+           env: Optional[Dict[str, str]] = None) -> Iterator[subprocess.Popen]:
+    process = subprocess.Popen(command, cwd=cwd, env={**os.environ, **(env or {})})
+    try:
+        _wait_ready(url, process)
+        yield process
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def _peak_rss_mib(pid: int) -> Optional[float]:
+    """Peak resident set size of ``pid`` (Linux only)."""
+    try:
+        status = Path(f"/proc/{pid}/status").read_text()
+    except OSError:
+        return None
+    match = re.search(r"^VmHWM:\s+(\d+) kB", status, re.MULTILINE)
+    return int(match.group(1)) / 1024 if match else None
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    # Nearest-rank percentile.
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def _summarize(samples: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    ordered = sorted(samples)
+    summary: Dict[str, Any] = {"requests": len(samples) + errors, "errors": errors,
+                               "rps": len(samples) / elapsed if elapsed else 0.0}
+    if ordered:
+        summary.update(
+            mean_ms=1000 * sum(ordered) / len(ordered),
+            p50_ms=1000 * _percentile(ordered, 0.50),
+            p95_ms=1000 * _percentile(ordered, 0.95),
+            p99_ms=1000 * _percentile(ordered, 0.99),
+        )
+    return summary
+
+
+def _scrape(base_url: str) -> Dict[Tuple[str, str], float]:
+    samples: Dict[Tuple[str, str], float] = {}
+    for line in httpx.get(f"{base_url}/metrics", timeout=10.0).text.splitlines():
+        match = _SAMPLE.match(line)
+        if match:
+            samples[(match["name"], match["labels"] or "")] = float(match["value"])
+    return samples
+
+
+def _database_profile(before: Dict[Tuple[str, str], float], after: Dict[Tuple[str, str], float],
+                      turns: int) -> Dict[str, Any]:
+    def delta(name: str, labels: str = "") -> float:
+        return after.get((name, labels), 0.0) - before.get((name, labels), 0.0)
+
+    stages = {}
+    for stage in DB_STAGES:
+        count = delta("chat_stage_duration_seconds_count", f'stage="{stage}"')
+        if count:
+            stages[stage] = 1000 * delta("chat_stage_duration_seconds_sum", f'stage="{stage}"') / count
+    return {
+        "stage_mean_ms": stages,
+        "db_time_per_turn_ms": sum(stages.values()),
+        "statements_per_turn": delta("db_queries_total") / turns if turns else 0.0,
+    }
+
+
+def _token_profile(before: Dict[Tuple[str, str], float], after: Dict[Tuple[str, str], float],
+                   turns: int) -> Dict[str, float]:
+    def total(kind: str) -> float:
+        return sum(value - before.get(key, 0.0) for key, value in after.items()
+                   if key[0] == "llm_tokens_total" and f'kind="{kind}"' in key[1])
+
+    return {
+        "prompt_tokens_per_turn": total("prompt") / turns if turns else 0.0,
+        "completion_tokens_per_turn": total("completion") / turns if turns else 0.0,
+    }
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def timed(self, endpoint: str, request: Any) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError:
+            self.errors[endpoint] += 1
+            return None
+        if response.is_error:
+            self.errors[endpoint] += 1
+        else:
+            self.samples[endpoint].append(time.perf_counter() - started)
+        return response
+
+
+async def _user(client: httpx.AsyncClient, recorder: _Recorder, user: int, args: argparse.Namespace) -> None:
+    created = await recorder.timed("POST /chat", client.post("/chat"))
+    if created is None or created.is_error:
+        return
+    chat_id = created.json()["chat"]["id"]
+    for turn in range(args.turns):
+        message = f"User {user}, turn {turn}: summarise what we discussed so far and add one new idea."
+        if args.stream:
+            await _stream_turn(client, recorder, chat_id, message)
+        else:
+            await recorder.timed("POST /chat/{chat_id}", client.post(f"/chat/{chat_id}", json={"message": message}))
+        if args.think_time:
+            await asyncio.sleep(args.think_time)
+
+
+async def _stream_turn(client: httpx.AsyncClient, recorder: _Recorder, chat_id: str, message: str) -> None:
+    endpoint = "POST /chat/{chat_id}/stream"
+    started = time.perf_counter()
+    first_delta: Optional[float] = None
+    try:
+        async with client.stream("POST", f"/chat/{chat_id}/stream", json={"message": message}) as response:
+            failed = response.is_error
+            async for line in response.aiter_lines():
+                if line == "event: delta" and first_delta is None:
+                    first_delta = time.perf_counter() - started
+                elif line == "event: error":
+                    failed = True
+    except httpx.HTTPError:
+        failed = True
+    if failed:
+        recorder.errors[endpoint] += 1
+        return
+    recorder.samples[endpoint].append(time.perf_counter() - started)
+    if first_delta is not None:
+        recorder.samples["first delta"].append(first_delta)
+
+
+async def _drive(base_url: str, args: argparse.Namespace) -> Tuple[_Recorder, float]:
+    recorder = _Recorder()
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(_user(client, recorder, user, args) for user in range(args.users)))
+        elapsed = time.perf_counter() - started
+    return recorder, elapsed
+
+
+def _run_demo(name: str, llm_url: str, args: argparse.Namespace, backend: Optional[str] = None) -> Dict[str, Any]:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            "OPENAI_API_KEY": "bench",
+            "OPENAI_BASE_URL": f"{llm_url}/v1",
+            "DATABASE_URL": f"sqlite:///{Path(directory) / 'bench.db'}",
+            "EXECUTION_MODE": args.execution_mode,
+            "METRICS_ENABLED": "true",
+            **({"LLM_BACKEND": backend} if backend else {}),
+            **dict(item.split("=", 1) for item in args.env),
+        }
+        command = [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"]
+        with _serve(command, f"{base_url}/", cwd=DEMOS[name], env=env) as process:
+            before = _scrape(base_url)
+            recorder, elapsed = asyncio.run(_drive(base_url, args))
+            after = _scrape(base_url)
+            peak_rss = _peak_rss_mib(process.pid)
+
+    turns = sum(len(recorder.samples[endpoint]) for endpoint in recorder.samples if endpoint.startswith("POST /chat/"))
+    endpoints = sorted(set(recorder.samples) | set(recorder.errors))
+    return {
+        "elapsed_seconds": elapsed,
+        "rps": sum(len(samples) for endpoint, samples in recorder.samples.items() if endpoint != "first delta") / elapsed,
+        "endpoints": {
+            endpoint: _summarize(recorder.samples[endpoint], recorder.errors[endpoint], elapsed)
+            for endpoint in endpoints
+        },
+        "database": _database_profile(before, after, turns),
+        "tokens": _token_profile(before, after, turns),
+        "peak_rss_mib": peak_rss,
+    }
+
+
+def _print_results(results: Dict[str, Any]) -> None:
+    for name, result in results.items():
+        database = result["database"]
+        tokens = result.get("tokens", {})
+        rss = f"{result['peak_rss_mib']:.0f} MiB" if result["peak_rss_mib"] is not None else "n/a"
+        print(f"\n{name}: {result['rps']:.1f} req/s, peak RSS {rss}, "
+              f"DB {database['db_time_per_turn_ms']:.2f} ms and "
+              f"{database['statements_per_turn']:.1f} statements per turn, "
+              f"{tokens.get('prompt_tokens_per_turn', 0):.0f} prompt and "
+              f"{tokens.get('completion_tokens_per_turn', 0):.0f} completion tokens per turn")
+        print(f"  {'endpoint':<28} {'reqs':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for endpoint, summary in result["endpoints"].items():
+            print(f"  {endpoint:<28} {summary['requests']:>6} {summary['errors']:>6} "
+                  f"{summary.get('p50_ms', 0):>8.1f} {summary.get('p95_ms', 0):>8.1f} {summary.get('p99_ms', 0):>8.1f}")
+
+
+def _print_comparison(baseline: Dict[str, Any], results: Dict[str, Any]) -> None:
+    def change(old: Optional[float], new: Optional[float]) -> str:
+        if not old or new is None:
+            return "n/a"
+        return f"{100 * (new - old) / old:+.1f}%"
+
+    print(f"\nChange against {baseline.get('commit') or 'baseline'}:")
+    for name, result in results.items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        print(f"  {name}: rps {change(previous['rps'], result['rps'])}")
+        for endpoint, summary in result["endpoints"].items():
+            old = previous["endpoints"].get(endpoint, {})
+            print(f"    {endpoint:<28} " + "  ".join(
+                f"{metric} {change(old.get(metric), summary.get(metric))}" for metric in ("p50_ms", "p95_ms", "p99_ms")))
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", choices=["completions", "responses", "both"], default="both")
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument("--turns", type=int, default=5, help="messages per user")
+    parser.add_argument("--stream", action="store_true", help="use the SSE endpoint for turns")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds between a user's turns")
+    parser.add_argument("--timeout", type=float, default=60.0, help="client timeout per request")
+    parser.add_argument("--execution-mode", choices=["sync", "async"], default="async")
+    parser.add_argument("--backend", choices=["default", "chat_completions", "responses", "both"], default="default",
+                        help="LLM backend for the apps; default keeps each app's own")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the app, e.g. HISTORY_CACHE_BACKEND=none")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--output", type=Path, help="write results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    llm_port = _free_port()
+    llm_url = f"http://127.0.0.1:{llm_port}"
+    llm_command = [
+        sys.executable, str(Path(__file__).with_name("fake_llm_server.py")), "--port", str(llm_port),
+        "--latency", str(args.latency), "--tokens-per-second", str(args.tokens_per_second),
+        "--reply-tokens", str(args.reply_tokens), "--error-rate", str(args.error_rate),
+    ]
+    names = list(DEMOS) if args.app == "both" else [args.app]
+    backends = {"default": [None], "both": ["chat_completions", "responses"]}.get(args.backend, [args.backend])
+    with _serve(llm_command, llm_url):
+        results = {
+            f"{name}/{backend}" if backend else name: _run_demo(name, llm_url, args, backend)
+            for name in names for backend in backends
+        }
+
+    _print_results(results)
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        "results": results,
+    }
+    if args.compare:
+        _print_comparison(json.loads(args.compare.read_text()), results)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
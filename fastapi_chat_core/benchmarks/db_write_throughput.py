@@ -0,0 +1,140 @@
+"""Compare SQLite write throughput of a plain engine, ``create_db_engine`` and group commit.
+
+Writer threads each commit small message-sized rows, one transaction per
+row like ``ChatService`` does (or through a shared ``GroupCommitWriter`` in
+the ``group-commit`` profile), while reader threads page through recent rows.
+Run from ``fastapi_chat_core``::
+
+    python benchmarks/db_write_throughput.py --writers 8 --readers 4 --writes 250
+    python benchmarks/db_write_throughput.py --writers 16 --synchronous full
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Engine,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    func,
+    insert,
+    select,
+)
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from chat_core.config import DatabaseSettings
+from chat_core.db import create_db_engine
+from chat_core.group_commit import GroupCommitWriter
+
+metadata = MetaData()
+messages = Table(
+    "messages",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("chat_id", String(36), nullable=False, index=True),
+    Column("content", Text, nullable=False),
+    Column("created_at", DateTime, server_default=func.now()),
+)
+
+
+def _baseline_engine(url: str) -> Engine:
+    """The engine the demos created before the shared factory."""
+    return create_engine(url, connect_args={"check_same_thread": False}, future=True)
+
+
+def _tuned_engine(url: str, synchronous: str) -> Engine:
+    return create_db_engine(DatabaseSettings(database_url=url, sqlite_synchronous=synchronous))
+
+
+def _run(engine: Engine, writers: int, readers: int, writes: int,
+         writer: Optional[GroupCommitWriter] = None) -> Dict[str, float]:
+    metadata.create_all(engine)
+    errors: List[Exception] = []
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def write(worker: int) -> None:
+        for index in range(writes):
+            stmt = insert(messages).values(chat_id=f"chat-{worker}", content=f"message {index} " + "x" * 200)
+            try:
+                if writer is not None:
+                    writer.write(lambda session: session.execute(stmt))
+                    continue
+                with engine.begin() as connection:
+                    connection.execute(stmt)
+            except OperationalError as exc:
+                with lock:
+                    errors.append(exc)
+
+    def read(worker: int) -> None:
+        stmt = select(messages).where(messages.c.chat_id == f"chat-{worker}").order_by(messages.c.id.desc()).limit(50)
+        while not done.is_set():
+            try:
+                with engine.connect() as connection:
+                    connection.execute(stmt).all()
+            except OperationalError as exc:
+                with lock:
+                    errors.append(exc)
+
+    reader_threads = [threading.Thread(target=read, args=(worker,)) for worker in range(readers)]
+    writer_threads = [threading.Thread(target=write, args=(worker,)) for worker in range(writers)]
+    for thread in reader_threads:
+        thread.start()
+    started = time.perf_counter()
+    for thread in writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    for thread in reader_threads:
+        thread.join()
+
+    with engine.connect() as connection:
+        rows = connection.execute(select(func.count()).select_from(messages)).scalar_one()
+    engine.dispose()
+    return {"rows": rows, "errors": len(errors), "seconds": elapsed, "writes_per_second": rows / elapsed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=250, help="rows committed per writer")
+    parser.add_argument("--synchronous", choices=["off", "normal", "full"], default="normal",
+                        help="SQLITE_SYNCHRONOUS for the tuned profiles; full syncs every commit")
+    parser.add_argument("--group-commit-delay-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    profiles: Dict[str, Tuple[Callable[[str], Engine], bool]] = {
+        "baseline": (_baseline_engine, False),
+        "tuned": (lambda url: _tuned_engine(url, args.synchronous), False),
+        "group-commit": (lambda url: _tuned_engine(url, args.synchronous), True),
+    }
+    print(f"{'profile':<13} {'rows':>7} {'errors':>7} {'seconds':>8} {'writes/s':>9}")
+    for name, (factory, group_commit) in profiles.items():
+        with tempfile.TemporaryDirectory() as directory:
+            engine = factory(f"sqlite:///{Path(directory) / 'bench.db'}")
+            writer = None
+            if group_commit:
+                writer = GroupCommitWriter(sessionmaker(bind=engine), max_delay_seconds=args.group_commit_delay_ms / 1000)
+            result = _run(engine, args.writers, args.readers, args.writes, writer)
+        print(f"{name:<13} {result['rows']:>7} {result['errors']:>7} "
+              f"{result['seconds']:>8.2f} {result['writes_per_second']:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Local stand-in for the OpenAI Chat Completions and Responses APIs.
+
+Replies are generated word by word at ``--tokens-per-second`` after
+``--latency`` seconds, with optional injected 429/500 errors, so the demos
+can be load-tested without network calls or API costs. Point a demo at it
+with ``OPENAI_BASE_URL=http://127.0.0.1:8100/v1``::
+
+    python benchmarks/fake_llm_server.py --port 8100 --latency 0.2 --tokens-per-second 200 --error-rate 0.01
+
+``--ssl-certfile``/``--ssl-keyfile`` serve HTTPS instead, so connection
+setup includes a TLS handshake as it does against the real API.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+WORDS = (
+    "the model considers your question carefully and replies with a short answer that is long "
+    "enough to exercise streaming persistence and the history window of the chat service"
+).split()
+
+
+@dataclass
+class FakeLLMConfig:
+    latency: float = 0.2
+    tokens_per_second: float = 200.0
+    reply_tokens: int = 40
+    error_rate: float = 0.0
+    # Share of injected errors answered with 429 rather than 500.
+    rate_limit_share: float = 0.5
+    seed: Optional[int] = None
+
+
+def _prompt_tokens(messages: List[Any]) -> int:
+    # A whitespace word count is close enough to drive the usage metrics.
+    return sum(len(json.dumps(message).split()) for message in messages)
+
+
+def _sse(payload: Dict[str, Any]) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def create_app(config: FakeLLMConfig) -> Starlette:
+    rng = random.Random(config.seed)
+    ids = itertools.count(1)
+
+    def reply_words() -> List[str]:
+        return [rng.choice(WORDS) for _ in range(config.reply_tokens)]
+
+    def injected_error() -> Optional[Response]:
+        if rng.random() >= config.error_rate:
+            return None
+        if rng.random() < config.rate_limit_share:
+            body = {"error": {"message": "Rate limit reached (injected).", "type": "rate_limit_error"}}
+            return JSONResponse(body, status_code=429, headers={"retry-after": "0.1"})
+        body = {"error": {"message": "The server had an error (injected).", "type": "server_error"}}
+        return JSONResponse(body, status_code=500)
+
+    async def generate(words: List[str]) -> AsyncIterator[str]:
+        await asyncio.sleep(config.latency)
+        delay = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+        for index, word in enumerate(words):
+            if delay:
+                await asyncio.sleep(delay)
+            yield word if index == 0 else f" {word}"
+
+    async def chat_completions(request: Request) -> Response:
+        body = await request.json()
+        error = injected_error()
+        if error is not None:
+            return error
+        completion_id = f"chatcmpl-{next(ids)}"
+        model = body["model"]
+        created = int(time.time())
+        usage = {"prompt_tokens": _prompt_tokens(body["messages"]), "completion_tokens": config.reply_tokens}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        words = reply_words()
+
+        if not body.get("stream"):
+            text = "".join([delta async for delta in generate(words)])
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+        def chunk(choices: List[Dict[str, Any]], **extra: Any) -> str:
+            return _sse({"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                         "model": model, "choices": choices, **extra})
+
+        async def events() -> AsyncIterator[str]:
+            async for delta in generate(words):
+                yield chunk([{"index": 0, "delta": {"content": delta}, "finish_reason": None}])
+            yield chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk([], usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def responses(request: Request) -> Response:
+        body = await request.json()
+        error = injected_error()
+        if error is not None:
+            return error
+        response_id = f"resp_{next(ids)}"
+        input_tokens = _prompt_tokens(body["input"])
+        words = reply_words()
+
+        def response_object(text: Optional[str]) -> Dict[str, Any]:
+            output = []
+            if text is not None:
+                output.append({
+                    "type": "message",
+                    "id": f"msg_{response_id}",
+                    "status": "completed",
+                    "role": "assistant",
+                    "content": [{"type": "output_text", "text": text, "annotations": []}],
+                })
+            return {
+                "id": response_id,
+                "object": "response",
+                "created_at": time.time(),
+                "model": body["model"],
+                "status": "completed" if text is not None else "in_progress",
+                "output": output,
+                "parallel_tool_calls": True,
+                "tool_choice": "auto",
+                "tools": [],
+                "usage": {
+                    "input_tokens": input_tokens,
+                    "output_tokens": config.reply_tokens,
+                    "total_tokens": input_tokens + config.reply_tokens,
+                    "input_tokens_details": {"cached_tokens": 0},
+                    "output_tokens_details": {"reasoning_tokens": 0},
+                } if text is not None else None,
+            }
+
+        if not body.get("stream"):
+            text = "".join([delta async for delta in generate(words)])
+            return JSONResponse(response_object(text))
+
+        async def events() -> AsyncIterator[str]:
+            sequence = itertools.count()
+            yield _sse({"type": "response.created", "sequence_number": next(sequence),
+                        "response": response_object(None)})
+            parts = []
+            async for delta in generate(words):
+                parts.append(delta)
+                yield _sse({"type": "response.output_text.delta", "sequence_number": next(sequence),
+                            "item_id": f"msg_{response_id}", "output_index": 0, "content_index": 0,
+                            "delta": delta, "logprobs": []})
+            yield _sse({"type": "response.completed", "sequence_number": next(sequence),
+                        "response": response_object("".join(parts))})
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/v1/responses", responses, methods=["POST"]),
+    ])
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429/500")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--ssl-certfile")
+    parser.add_argument("--ssl-keyfile")
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        reply_tokens=args.reply_tokens,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning",
+                ssl_certfile=args.ssl_certfile, ssl_keyfile=args.ssl_keyfile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Compare connection handling strategies for upstream OpenAI calls.
+
+Starts ``fake_llm_server.py`` over HTTPS with a throwaway self-signed
+certificate (plain HTTP with ``--no-tls``) and sends ``--requests`` chat
+completions through ``AsyncOpenAI`` at ``--concurrency``, three ways:
+
+* ``per-request``: a new client, and so a new pool, for every call;
+* ``no-keepalive``: one client whose pool keeps no idle connections;
+* ``shared``: one client from :func:`chat_core.http.build_async_http_client`
+  with the default ``OPENAI_HTTP_*`` settings, as the demos use.
+
+Reports throughput, latency percentiles, connections opened and the time
+spent opening them (TCP connect plus TLS handshake), read from the same
+metrics the demos export. Run from ``fastapi_chat_core`` with the ``bench``
+extra and ``openai`` installed; the certificate needs the ``openssl`` CLI::
+
+    python benchmarks/http_pool.py --requests 500 --concurrency 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import math
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+from chat_core.config import HttpClientSettings
+from chat_core.http import build_async_http_client
+from chat_core.metrics import HTTP_CLIENT_CONNECT_SECONDS, HTTP_CLIENT_CONNECTIONS_OPENED
+
+HERE = Path(__file__).resolve().parent
+MESSAGES = [{"role": "user", "content": "Say something short."}]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _self_signed_cert(directory: Path) -> tuple[str, str]:
+    certfile, keyfile = directory / "cert.pem", directory / "key.pem"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+         "-addext", "subjectAltName=IP:127.0.0.1", "-keyout", str(keyfile), "-out", str(certfile)],
+        check=True, capture_output=True,
+    )
+    return str(certfile), str(keyfile)
+
+
+@contextmanager
+def _fake_llm(args: argparse.Namespace) -> Iterator[tuple[str, Any]]:
+    """Yield the server's base URL and the ``verify`` value clients need for it."""
+    with tempfile.TemporaryDirectory() as tmp:
+        port = _free_port()
+        command = [sys.executable, str(HERE / "fake_llm_server.py"), "--port", str(port),
+                   "--latency", str(args.latency), "--tokens-per-second", "0", "--reply-tokens", "5"]
+        verify: Any = True
+        scheme = "http"
+        if not args.no_tls:
+            certfile, keyfile = _self_signed_cert(Path(tmp))
+            command += ["--ssl-certfile", certfile, "--ssl-keyfile", keyfile]
+            verify, scheme = certfile, "https"
+        process = subprocess.Popen(command)
+        base_url = f"{scheme}://127.0.0.1:{port}/v1"
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Fake LLM server exited with status {process.returncode}.")
+                try:
+                    httpx.get(base_url, verify=verify, timeout=1.0)
+                    break
+                except httpx.TransportError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError("Fake LLM server did not become ready.")
+                    time.sleep(0.1)
+            yield base_url, verify
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    # Nearest-rank percentile.
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+async def _drive(call: Callable[[], Any], requests: int, concurrency: int) -> tuple[List[float], float]:
+    remaining = iter(range(requests))
+    samples: List[float] = []
+
+    async def worker() -> None:
+        for _ in remaining:
+            started = time.perf_counter()
+            await call()
+            samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+async def _run(strategy: str, base_url: str, verify: Any, args: argparse.Namespace) -> Dict[str, Any]:
+    settings = HttpClientSettings()
+    if strategy == "no-keepalive":
+        settings = settings.model_copy(update={"openai_http_max_keepalive_connections": 0})
+
+    def client() -> AsyncOpenAI:
+        http_client = build_async_http_client(settings, name=strategy, verify=verify)
+        return AsyncOpenAI(api_key="bench", base_url=base_url, max_retries=0, http_client=http_client)
+
+    shared: Optional[AsyncOpenAI] = None if strategy == "per-request" else client()
+
+    async def call() -> None:
+        if shared is not None:
+            await shared.chat.completions.create(model="bench", messages=MESSAGES)
+            return
+        async with client() as fresh:
+            await fresh.chat.completions.create(model="bench", messages=MESSAGES)
+
+    try:
+        samples, elapsed = await _drive(call, args.requests, args.concurrency)
+    finally:
+        if shared is not None:
+            await shared.close()
+    ordered = sorted(samples)
+    opened = HTTP_CLIENT_CONNECTIONS_OPENED.value(client=strategy)
+    connect_seconds = HTTP_CLIENT_CONNECT_SECONDS.sum(client=strategy)
+    return {
+        "rps": len(samples) / elapsed,
+        "p50_ms": 1000 * _percentile(ordered, 0.50),
+        "p95_ms": 1000 * _percentile(ordered, 0.95),
+        "connections": int(opened),
+        "connect_ms_mean": 1000 * connect_seconds / opened if opened else 0.0,
+        "connect_s_total": connect_seconds,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.01, help="fake server seconds per reply")
+    parser.add_argument("--no-tls", action="store_true", help="plain HTTP, so no TLS handshakes")
+    args = parser.parse_args()
+    if not args.no_tls and shutil.which("openssl") is None:
+        parser.error("the openssl CLI is needed for the TLS certificate; pass --no-tls to skip TLS")
+    os.environ.pop("OPENAI_BASE_URL", None)
+
+    with _fake_llm(args) as (base_url, verify):
+        print(f"{args.requests} requests at concurrency {args.concurrency} against {base_url}")
+        print(f"{'strategy':<14}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'conns':>8}{'ms/conn':>9}{'connect s':>11}")
+        for strategy in ("per-request", "no-keepalive", "shared"):
+            result = asyncio.run(_run(strategy, base_url, verify, args))
+            print(f"{strategy:<14}{result['rps']:>9.0f}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}"
+                  f"{result['connections']:>8}{result['connect_ms_mean']:>9.2f}{result['connect_s_total']:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Measure the per-request cost of serializing chat responses.
+
+Builds a FastAPI app whose routes turn the same rows into a response three
+ways, and calls it in-process through ASGI, with no server or socket:
+
+* ``validated``: the route builds the response model from the rows' fields
+  and returns it; FastAPI validates it against ``response_model`` and
+  serializes it (the demos' default);
+* ``orjson``: the same, rendered by FastAPI's ``ORJSONResponse`` (skipped
+  when ``orjson`` is not installed);
+* ``lean``: the route passes the fields straight to
+  :class:`chat_core.serialization.ModelResponse`, as the demos do with
+  ``RESPONSE_SERIALIZATION=lean``.
+
+Payloads are a typical reply, a 4096-character reply (the longest message a
+turn accepts) and a page of 50 messages from ``GET /chat/{id}/messages``. A
+route that returns fixed bytes gives the cost of routing alone; it is
+subtracted, so the table shows building and serializing the response only.
+Each route is timed ``--repeat`` times and the fastest run is kept, which
+filters out noise from the rest of the machine. Run from ``fastapi_chat_core``
+with ``fastapi`` installed::
+
+    python benchmarks/serialization.py --requests 20000 --repeat 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+import warnings
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+from uuid import UUID, uuid4
+
+from fastapi import FastAPI, Response
+from pydantic import BaseModel
+
+from chat_core.serialization import ModelResponse
+
+
+class ChatMessageResponse(BaseModel):
+    chat_id: UUID
+    response: str
+    role: str = "assistant"
+    sent_at: datetime
+
+
+class MessageResource(BaseModel):
+    id: str
+    role: str
+    content: str
+    created_at: datetime
+
+
+class MessagePageResponse(BaseModel):
+    chat_id: UUID
+    messages: List[MessageResource]
+    next_cursor: Optional[str] = None
+
+
+Payload = Tuple[Type[BaseModel], Callable[[], Dict[str, Any]]]
+
+
+def _payloads() -> Dict[str, Payload]:
+    """Response model and field builder per payload; the builders read ORM-like rows, as the routes do."""
+    chat_id = uuid4()
+    now = datetime.utcnow()
+    typical = "Sure! Here is a short answer to your question, with a little detail. " * 3
+
+    def reply(content: str) -> Callable[[], Dict[str, Any]]:
+        message = SimpleNamespace(chat_id=str(chat_id), role="assistant", content=content, created_at=now)
+        return lambda: {"chat_id": message.chat_id, "response": message.content, "role": message.role,
+                        "sent_at": message.created_at}
+
+    rows = [
+        SimpleNamespace(id=str(uuid4()), role=("user", "assistant")[i % 2], content=typical, created_at=now)
+        for i in range(50)
+    ]
+
+    def page() -> Dict[str, Any]:
+        return {
+            "chat_id": chat_id,
+            "messages": [{"id": row.id, "role": row.role, "content": row.content, "created_at": row.created_at}
+                         for row in rows],
+            "next_cursor": "b64cursor",
+        }
+
+    return {
+        "typical": (ChatMessageResponse, reply(typical)),
+        "4096-char": (ChatMessageResponse, reply("x" * 4096)),
+        "page-50": (MessagePageResponse, page),
+    }
+
+
+def _orjson_response_class() -> Optional[type]:
+    try:
+        import orjson  # noqa: F401
+    except ImportError:
+        return None
+    # Deprecated in recent FastAPI releases, which serialize with pydantic-core
+    # instead; it warns on every response, so silence it for the whole run.
+    warnings.filterwarnings("ignore", message="ORJSONResponse is deprecated")
+    from fastapi.responses import ORJSONResponse
+
+    return ORJSONResponse
+
+
+def _endpoint(payload: Payload, lean: bool) -> Callable[[], Any]:
+    model, fields = payload
+
+    # Async, so no strategy pays for a threadpool hop.
+    async def route() -> Any:
+        return ModelResponse(fields()) if lean else model(**fields())
+
+    return route
+
+
+def _build_app(payloads: Dict[str, Payload]) -> tuple[FastAPI, List[str]]:
+    app = FastAPI()
+    strategies = ["validated", "lean"]
+    orjson_response = _orjson_response_class()
+    if orjson_response is not None:
+        strategies.insert(1, "orjson")
+
+    @app.get("/baseline")
+    async def baseline() -> Response:
+        return Response(b"{}", media_type="application/json")
+
+    for name, payload in payloads.items():
+        for strategy in strategies:
+            kwargs: Dict[str, Any] = {"response_model": payload[0]}
+            if strategy == "orjson":
+                kwargs["response_class"] = orjson_response
+            app.add_api_route(f"/{strategy}/{name}", _endpoint(payload, lean=strategy == "lean"), methods=["GET"],
+                              **kwargs)
+    return app, strategies
+
+
+async def _time_route(app: FastAPI, path: str, requests: int) -> tuple[float, int]:
+    """Mean seconds per request and the response body size."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"", "headers": [],
+        "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }
+    size = 0
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal size
+        if message["type"] == "http.response.body":
+            size = len(message.get("body", b""))
+
+    for _ in range(min(1000, requests)):
+        await app(scope, receive, send)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(scope, receive, send)
+    return (time.perf_counter() - started) / requests, size
+
+
+async def _run(requests: int, repeat: int) -> None:
+    payloads = _payloads()
+    app, strategies = _build_app(payloads)
+    paths = ["/baseline"] + [f"/{strategy}/{name}" for name in payloads for strategy in strategies]
+    best: Dict[str, float] = {}
+    sizes: Dict[str, int] = {}
+    # Rounds interleave the routes, so a noisy moment does not land on one route's every run.
+    for _ in range(repeat):
+        for path in paths:
+            seconds, sizes[path] = await _time_route(app, path, requests)
+            best[path] = min(seconds, best.get(path, seconds))
+    base = best["/baseline"]
+    print(f"{requests} requests per route, best of {repeat}; "
+          f"routing alone costs {base * 1e6:.1f} us/request (subtracted)")
+    print(f"{'payload':<11}{'bytes':>8}" + "".join(f"{strategy + ' us':>14}" for strategy in strategies))
+    for name in payloads:
+        row = [max(0.0, best[f"/{strategy}/{name}"] - base) * 1e6 for strategy in strategies]
+        print(f"{name:<11}{sizes[f'/validated/{name}']:>8}" + "".join(f"{value:>14.1f}" for value in row))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000, help="timed requests per route and round")
+    parser.add_argument("--repeat", type=int, default=5, help="rounds; each route's fastest round is reported")
+    args = parser.parse_args()
+    asyncio.run(_run(args.requests, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
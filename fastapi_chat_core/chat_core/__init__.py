@@ -0,0 +1 @@
+"""Infrastructure shared by ``fastapi_chat_completions_demo`` and ``fastapi_responses_api_demo``."""
@@ -0,0 +1,393 @@
+"""Admission control in front of the upstream model.
+
+Two independent checks run before a turn reaches the model:
+
+* **Token buckets** cap how fast one caller (verified API key, else client
+  IP) and one chat may send turns, and optionally how many model tokens a
+  caller may spend per minute. A turn is charged an estimate of its tokens
+  up front, corrected to what the model reports once it is done. Bucket
+  state lives in a :class:`RateLimitStore`: in process memory by default,
+  or in Redis so every worker shares it.
+* A **concurrency limiter** caps in-flight turns per worker. Turns beyond the
+  cap wait in a bounded queue for at most ``queue_timeout_seconds``.
+
+A rejected request fails fast with :class:`RateLimitedError`, which carries
+the number of seconds to wait before retrying, instead of piling onto an
+upstream rate limit and failing slowly.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from chat_core.config import AdmissionSettings, ChatSettings
+from chat_core.history import message_tokens, select_window
+from chat_core.history_cache import CachedChat
+from chat_core.metrics import ADMISSION_REJECTIONS, UPSTREAM_TURNS, track_usage
+
+
+class RateLimitedError(Exception):
+    """Raised when a request is not admitted; ``retry_after`` is in seconds."""
+
+    def __init__(self, message: str, retry_after: float, scope: str) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.scope = scope
+
+    @property
+    def retry_after_header(self) -> str:
+        """``Retry-After`` value: whole seconds, at least one."""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+@dataclass(frozen=True)
+class Limit:
+    """A token bucket refilled at ``rate`` tokens per second, holding at most ``burst``."""
+
+    rate: float
+    burst: float
+
+    @classmethod
+    def per_minute(cls, amount: Optional[float], burst: Optional[float] = None) -> Optional["Limit"]:
+        """``amount`` per minute with a ``burst`` (default: a full minute's worth); ``None`` when unset."""
+        if not amount:
+            return None
+        return cls(rate=amount / 60.0, burst=burst or amount)
+
+
+class RateLimitStore(ABC):
+    """Storage for token buckets; implementations must update a bucket atomically."""
+
+    @abstractmethod
+    def take(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        """Take ``cost`` tokens from the bucket at ``key``.
+
+        Returns ``0`` when they were taken, else the seconds until the bucket
+        holds enough; a rejected request takes nothing. A ``cost`` above the
+        burst is charged as the burst, so it waits for a full bucket rather
+        than forever.
+        """
+
+    @abstractmethod
+    def adjust(self, key: str, limit: Limit, cost: float) -> None:
+        """Charge ``cost`` more tokens to the bucket at ``key``, or refund them when negative.
+
+        Never rejects: a charge may leave the bucket in debt, at most one
+        burst deep, which later requests wait out. A refund fills the bucket
+        at most to its burst.
+        """
+
+
+class InMemoryRateLimitStore(RateLimitStore):
+    """Process-local buckets, least recently used dropped beyond ``max_keys``.
+
+    A dropped bucket comes back full, which only ever errs towards admitting.
+    """
+
+    def __init__(self, max_keys: int = 100_000, clock: Callable[[], float] = time.monotonic) -> None:
+        self._max_keys = max_keys
+        self._clock = clock
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        cost = min(cost, limit.burst)
+        now = self._clock()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (limit.burst, now))
+            tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / limit.rate
+            self._put(key, tokens, now)
+        return wait
+
+    def adjust(self, key: str, limit: Limit, cost: float) -> None:
+        now = self._clock()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (limit.burst, now))
+            tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+            self._put(key, max(-limit.burst, min(limit.burst, tokens - cost)), now)
+
+    def _put(self, key: str, tokens: float, now: float) -> None:
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self._max_keys:
+            self._buckets.popitem(last=False)
+
+
+# KEYS[1] = bucket; ARGV = rate, burst, cost, now. Returns the wait in seconds as a string.
+_TAKE_SCRIPT = """
+local rate, burst, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+cost = math.min(cost, burst)
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens, updated = tonumber(bucket[1]) or burst, tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then
+  tokens = tokens - cost
+else
+  wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 1)
+return tostring(wait)
+"""
+
+# KEYS[1] = bucket; ARGV = rate, burst, cost, now.
+_ADJUST_SCRIPT = """
+local rate, burst, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens, updated = tonumber(bucket[1]) or burst, tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+tokens = math.max(-burst, math.min(burst, tokens - cost))
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 1)
+return 0
+"""
+
+
+class RedisRateLimitStore(RateLimitStore):
+    """Buckets shared by every worker and host, updated atomically by a Lua script.
+
+    ``client`` is anything with Redis' ``eval`` method. Buckets expire once
+    they would have refilled, so idle callers cost no memory. Refill uses
+    the workers' wall clocks, so keep them in sync.
+    """
+
+    def __init__(self, client: Any, prefix: str = "rate-limit:", clock: Callable[[], float] = time.time) -> None:
+        self._client = client
+        self._prefix = prefix
+        self._clock = clock
+
+    def take(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        wait = self._client.eval(
+            _TAKE_SCRIPT, 1, f"{self._prefix}{key}", limit.rate, limit.burst, cost, self._clock())
+        return float(wait.decode() if isinstance(wait, bytes) else wait)
+
+    def adjust(self, key: str, limit: Limit, cost: float) -> None:
+        self._client.eval(_ADJUST_SCRIPT, 1, f"{self._prefix}{key}", limit.rate, limit.burst, cost, self._clock())
+
+
+class ConcurrencyLimiter:
+    """Caps in-flight turns, queueing at most ``max_queue`` more for up to ``queue_timeout_seconds``.
+
+    Waiters are served first come, first served. Safe to share across event
+    loops, e.g. between test clients.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int = 100, queue_timeout_seconds: float = 2.0) -> None:
+        self._max_concurrent = max_concurrent
+        self._max_queue = max_queue
+        self._queue_timeout = queue_timeout_seconds
+        self._active = 0
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._active < self._max_concurrent and not self._waiters:
+                self._active += 1
+                return
+            if len(self._waiters) >= self._max_queue:
+                raise RateLimitedError(
+                    "Too many requests are waiting for the model.", self._queue_timeout, "concurrency")
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            # Shielded so a timeout never cancels a slot that was just handed over.
+            await asyncio.wait_for(asyncio.shield(waiter[1]), self._queue_timeout)
+        except BaseException as exc:
+            with self._lock:
+                queued = waiter in self._waiters
+                if queued:
+                    self._waiters.remove(waiter)
+            if not queued:
+                # The slot was handed over as the wait ended; pass it on.
+                self.release()
+            if isinstance(exc, asyncio.TimeoutError):
+                raise RateLimitedError(
+                    "Timed out waiting for a free model slot.", self._queue_timeout, "concurrency") from None
+            raise
+
+    def release(self) -> None:
+        """Free a slot, handing it straight to the oldest waiter if there is one."""
+        with self._lock:
+            while self._waiters:
+                loop, future = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(_resolve, future)
+                    return
+                except RuntimeError:
+                    # That waiter's loop has closed; try the next one.
+                    continue
+            self._active -= 1
+
+
+def _resolve(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class Ticket:
+    """An admitted turn's concurrency slot and token charge; ``release`` may be called more than once.
+
+    Releasing also settles the charge: the estimate taken up front is
+    replaced by the tokens the turn's responses reported, if they reported any.
+    """
+
+    def __init__(self, limiter: Optional[ConcurrencyLimiter], settle: Optional[Callable[[], None]] = None) -> None:
+        self._limiter = limiter
+        self._settle = settle
+
+    def release(self) -> None:
+        limiter, self._limiter = self._limiter, None
+        settle, self._settle = self._settle, None
+        try:
+            if settle is not None:
+                settle()
+        finally:
+            if limiter is not None:
+                limiter.release()
+
+
+class AdmissionController:
+    """Runs the rate limit checks and takes a concurrency slot for each turn."""
+
+    def __init__(
+        self,
+        store: RateLimitStore,
+        caller_limit: Optional[Limit] = None,
+        chat_limit: Optional[Limit] = None,
+        token_limit: Optional[Limit] = None,
+        concurrency: Optional[ConcurrencyLimiter] = None,
+    ) -> None:
+        self._store = store
+        self._caller_limit = caller_limit
+        self._chat_limit = chat_limit
+        self._token_limit = token_limit
+        self._concurrency = concurrency
+
+    def check(self, caller: str, chat_id: str, tokens: int = 0) -> None:
+        """Take from the caller's, the chat's and the caller's token buckets, raising on the first one short.
+
+        A rejected request takes nothing: what the earlier buckets gave is refunded.
+        """
+        checks: Tuple[Tuple[str, str, Optional[Limit], float], ...] = (
+            ("caller", f"caller:{caller}", self._caller_limit, 1.0),
+            ("chat", f"chat:{chat_id}", self._chat_limit, 1.0),
+            ("tokens", f"tokens:{caller}", self._token_limit, float(tokens)),
+        )
+        taken: List[Tuple[str, Limit, float]] = []
+        for scope, key, limit, cost in checks:
+            if limit is None or not cost:
+                continue
+            wait = self._store.take(key, limit, cost)
+            if wait:
+                self._refund(taken)
+                ADMISSION_REJECTIONS.inc(scope=scope)
+                raise RateLimitedError(_MESSAGES[scope], wait, scope)
+            taken.append((key, limit, cost))
+
+    async def admit(self, caller: str, chat_id: str, tokens: int = 0) -> Ticket:
+        """Check the rate limits, then wait for a concurrency slot; release the returned ticket when done.
+
+        Call it from the request's own task: the usage the turn's responses
+        report is tracked from here to settle the ``tokens`` estimate.
+        """
+        self.check(caller, chat_id, tokens)
+        settle = self._settlement(caller, tokens)
+        if self._concurrency is None:
+            return Ticket(None, settle)
+        try:
+            await self._concurrency.acquire()
+        except BaseException as exc:
+            # The turn never reaches the upstream, so its token estimate goes back.
+            if self._token_limit is not None and tokens:
+                self._refund([(f"tokens:{caller}", self._token_limit, float(tokens))])
+            if isinstance(exc, RateLimitedError):
+                ADMISSION_REJECTIONS.inc(scope="concurrency")
+            raise
+        return Ticket(self._concurrency, settle)
+
+    def _refund(self, taken: List[Tuple[str, Limit, float]]) -> None:
+        for key, limit, cost in taken:
+            # ``take`` charges at most one burst.
+            self._store.adjust(key, limit, -min(cost, limit.burst))
+
+    def _settlement(self, caller: str, estimate: int) -> Optional[Callable[[], None]]:
+        limit = self._token_limit
+        if limit is None or not estimate:
+            return None
+        usage = track_usage()
+
+        def settle() -> None:
+            if usage.responses:
+                self._store.adjust(f"tokens:{caller}", limit, usage.tokens - estimate)
+
+        return settle
+
+
+def estimate_turn_tokens(content: str, cached: Optional[CachedChat], settings: ChatSettings) -> int:
+    """Tokens a turn is charged up front: its prompt, replayed history included, plus the longest reply.
+
+    The history window is measured on the chat's entry in the history
+    cache; a chat that is not cached is assumed to fill ``HISTORY_MAX_TOKENS``.
+    """
+    if cached is not None and cached.messages is not None:
+        prompt = select_window(cached.messages, content, cached.columns.get("summary"), settings).tokens
+    else:
+        prompt = max(settings.history_max_tokens, message_tokens(content, settings.openai_model))
+    return prompt + settings.openai_max_output_tokens
+
+
+_MESSAGES: Dict[str, str] = {
+    "caller": "Too many requests from this client.",
+    "chat": "Too many requests for this chat.",
+    "tokens": "Token budget for this client exhausted.",
+}
+
+
+def build_admission_controller(settings: AdmissionSettings) -> AdmissionController:
+    """Controller configured from ``settings``; every limit left unset is off."""
+    store: RateLimitStore
+    if settings.rate_limit_backend == "redis":
+        import redis  # optional dependency, only needed for this backend
+
+        store = RedisRateLimitStore(redis.Redis.from_url(settings.rate_limit_redis_url))
+    else:
+        store = InMemoryRateLimitStore()
+    concurrency = None
+    if settings.upstream_max_concurrency:
+        concurrency = ConcurrencyLimiter(
+            settings.upstream_max_concurrency,
+            max_queue=settings.upstream_max_queue,
+            queue_timeout_seconds=settings.upstream_queue_timeout_seconds,
+        )
+        UPSTREAM_TURNS.set_function(lambda: concurrency.active, state="active")
+        UPSTREAM_TURNS.set_function(lambda: concurrency.waiting, state="waiting")
+    return AdmissionController(
+        store,
+        caller_limit=Limit.per_minute(settings.rate_limit_requests_per_minute, settings.rate_limit_burst),
+        chat_limit=Limit.per_minute(settings.rate_limit_chat_requests_per_minute, settings.rate_limit_chat_burst),
+        token_limit=Limit.per_minute(settings.rate_limit_tokens_per_minute),
+        concurrency=concurrency,
+    )
@@ -0,0 +1,102 @@
+"""FastAPI plumbing shared by the demos' ``app/api/deps.py``.
+
+The demos' routes run against either the sync or the async chat service,
+picked by ``EXECUTION_MODE``. :func:`call_service` and
+:func:`iterate_service` let one route body call both: async methods are
+awaited, and sync ones run on the threadpool. Needs the ``api`` extra.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import inspect
+from typing import Any, AsyncIterator, Callable, Collection, Dict, Optional
+
+import anyio
+from fastapi import HTTPException, Request, status
+from pydantic import BaseModel
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from chat_core.llm import BACKEND_HEADER, BackendSet, UnknownBackendError
+from chat_core.serialization import ModelResponse
+
+
+def caller_key(request: Request, api_keys: Collection[str] = ()) -> str:
+    """The caller's API key if it is one of ``api_keys``, else its IP address.
+
+    Unlisted keys are ignored: any client can send as many made-up keys as
+    it likes, each with a fresh bucket. Keys are hashed so they never reach
+    the rate-limit store.
+    """
+    authorization = request.headers.get("authorization", "")
+    api_key = request.headers.get("x-api-key") or authorization.removeprefix("Bearer ").strip()
+    if api_key and any(hmac.compare_digest(api_key.encode(), known.encode()) for known in api_keys):
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:32]
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+def requested_backend(request: Request, per_request: bool) -> Optional[str]:
+    """The backend a request asks for with ``X-LLM-Backend``, when ``LLM_BACKEND_PER_REQUEST`` allows it."""
+    if not per_request:
+        return None
+    return request.headers.get(BACKEND_HEADER)
+
+
+def select_backend(backends: BackendSet[Any], name: Optional[str]) -> Any:
+    """``backends.select(name)``, with an unknown name rejected as a 422."""
+    try:
+        return backends.select(name)
+    except UnknownBackendError as exc:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc)) from exc
+
+
+def json_response(
+    model: type[BaseModel],
+    fields: Dict[str, Any],
+    status_code: int = status.HTTP_200_OK,
+    lean: bool = False,
+) -> Any:
+    """A route's response built from ``fields``.
+
+    By default this is ``model(**fields)``, which FastAPI checks against the
+    route's ``response_model`` and serializes. With ``lean`` (the demos'
+    ``RESPONSE_SERIALIZATION=lean``) the fields are serialized straight to
+    JSON bytes instead, with no model built or validated; routes pass fields
+    read from their own rows, so the checks have nothing to catch.
+    """
+    if lean:
+        return ModelResponse(fields, status_code=status_code)
+    return model(**fields)
+
+
+async def call_service(method: Callable[..., Any], *args: Any) -> Any:
+    """Await async service methods directly and push sync ones onto the threadpool."""
+    if inspect.iscoroutinefunction(method):
+        return await method(*args)
+    return await run_in_threadpool(method, *args)
+
+
+async def iterate_service(stream: Any) -> AsyncIterator[Any]:
+    """Async-iterate a service stream, draining sync iterators on the threadpool.
+
+    The underlying iterator is always closed, even when the consumer is
+    cancelled by a client disconnect, so its cleanup code gets to run.
+    """
+    if hasattr(stream, "__aiter__"):
+        async_iterator = stream.__aiter__()
+        try:
+            async for item in async_iterator:
+                yield item
+        finally:
+            with anyio.CancelScope(shield=True):
+                await async_iterator.aclose()
+        return
+
+    iterator = iter(stream)
+    try:
+        async for item in iterate_in_threadpool(iterator):
+            yield item
+    finally:
+        with anyio.CancelScope(shield=True):
+            await run_in_threadpool(iterator.close)
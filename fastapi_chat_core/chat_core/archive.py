@@ -0,0 +1,195 @@
+"""Archival of idle chats into compressed blobs.
+
+Idle chats move their rows out of the hot ``messages`` table into one
+gzip-compressed JSON document per chat, which keeps that table and its
+indexes small enough to stay in memory. An archived chat costs one row
+instead of one row and several index entries per message, and its text is
+compressed.
+
+:func:`compact_idle_chats` archives every chat idle for a while, and
+:func:`restore_chat` moves a chat's messages back when it is used again;
+the chat services call it on load. Both work on the ORM classes of a
+:class:`~chat_core.models.ChatModels`. The demos run a pass with
+``python -m app.services.archive``, or periodically inside the app when
+``ARCHIVE_IDLE_DAYS`` is set.
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+
+from sqlalchemy import Engine, delete, select, tuple_, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from chat_core.config import ArchiveSettings
+from chat_core.history_cache import HistoryCache
+from chat_core.models import ChatModels
+
+logger = logging.getLogger(__name__)
+
+# Higher levels cost noticeably more CPU for a few percent smaller blobs.
+COMPRESS_LEVEL = 6
+
+MESSAGE_FIELDS = ("id", "role", "content", "created_at")
+
+
+def pack_messages(messages: Sequence[Mapping[str, Any]]) -> bytes:
+    """Compress ``messages`` (mappings with :data:`MESSAGE_FIELDS`) into an archive blob."""
+    rows = [
+        {**{name: message[name] for name in MESSAGE_FIELDS}, "created_at": message["created_at"].isoformat()}
+        for message in messages
+    ]
+    return gzip.compress(json.dumps(rows, separators=(",", ":")).encode(), compresslevel=COMPRESS_LEVEL)
+
+
+def unpack_messages(blob: bytes) -> List[Dict[str, Any]]:
+    """Inverse of :func:`pack_messages`, in the original order."""
+    rows = json.loads(gzip.decompress(blob))
+    for row in rows:
+        row["created_at"] = datetime.fromisoformat(row["created_at"])
+    return rows
+
+
+def archive_chat(session: Session, models: ChatModels, chat_id: str, idle_before: datetime) -> bool:
+    """Move one chat's messages into the archive table if it is still idle; the caller commits.
+
+    The chat is claimed with a conditional ``UPDATE`` first, so a turn that
+    arrived since the chat was selected keeps it hot, and two compaction
+    runs never archive the same chat.
+    """
+    claimed = session.execute(
+        update(models.chat)
+        .where(
+            models.chat.id == chat_id,
+            models.chat.archived_at.is_(None),
+            models.chat.last_activity_at < idle_before,
+        )
+        .values(archived_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        return False
+    key = (models.message.created_at, models.message.id)
+    messages = session.execute(
+        select(models.message.id, models.message.role, models.message.content, models.message.created_at)
+        .where(models.message.chat_id == chat_id)
+        .order_by(*key)
+    ).mappings().all()
+    if not messages:
+        return True
+    session.add(models.archive(chat_id=chat_id, payload=pack_messages(messages), message_count=len(messages)))
+    last = messages[-1]
+    # Bounded by the last archived key rather than just ``chat_id``, so rows
+    # committed by a racing turn after the SELECT stay in ``messages``.
+    session.execute(
+        delete(models.message)
+        .where(models.message.chat_id == chat_id, tuple_(*key) <= (last["created_at"], last["id"]))
+        .execution_options(synchronize_session=False)
+    )
+    return True
+
+
+def restore_chat(session: Session, models: ChatModels, chat: Any) -> None:
+    """Move an archived chat's messages back into ``messages``; the caller commits.
+
+    Restoring is claimed like archiving, so concurrent requests for the same
+    archived chat insert its messages only once.
+    """
+    claimed = session.execute(
+        update(models.chat)
+        .where(models.chat.id == chat.id, models.chat.archived_at.is_not(None))
+        .values(archived_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    set_committed_value(chat, "archived_at", None)
+    if not claimed:
+        return
+    archive = session.get(models.archive, chat.id)
+    if archive is None:
+        return
+    session.add_all(models.message(chat_id=chat.id, **row) for row in unpack_messages(archive.payload))
+    session.delete(archive)
+
+
+def compact_idle_chats(
+    session_factory: Callable[[], Session],
+    models: ChatModels,
+    idle_for: timedelta,
+    batch_size: int = 100,
+    history_cache: Optional[HistoryCache] = None,
+) -> int:
+    """Archive every chat idle for longer than ``idle_for``, ``batch_size`` chats per transaction.
+
+    Returns the number of chats archived.
+    """
+    idle_before = datetime.utcnow() - idle_for
+    archived = 0
+    while True:
+        with session_factory() as session:
+            chat_ids = session.scalars(
+                select(models.chat.id)
+                .where(
+                    models.chat.archived_at.is_(None),
+                    models.chat.last_activity_at < idle_before,
+                    models.chat.message_count > 0,
+                )
+                .order_by(models.chat.last_activity_at)
+                .limit(batch_size)
+            ).all()
+            done = [chat_id for chat_id in chat_ids if archive_chat(session, models, chat_id, idle_before)]
+            session.commit()
+        if history_cache is not None:
+            for chat_id in done:
+                history_cache.invalidate(chat_id)
+        archived += len(done)
+        if len(chat_ids) < batch_size:
+            return archived
+
+
+async def compaction_loop(
+    session_factory: Callable[[], Session],
+    models: ChatModels,
+    idle_for: timedelta,
+    interval_seconds: float,
+    batch_size: int = 100,
+    history_cache: Optional[HistoryCache] = None,
+) -> None:
+    """Run :func:`compact_idle_chats` every ``interval_seconds`` on a worker thread until cancelled."""
+    while True:
+        try:
+            archived = await asyncio.to_thread(
+                compact_idle_chats, session_factory, models, idle_for, batch_size, history_cache)
+            if archived:
+                logger.info("Archived %d idle chats", archived)
+        except Exception:
+            logger.exception("Chat compaction failed")
+        await asyncio.sleep(interval_seconds)
+
+
+def main(
+    settings: ArchiveSettings,
+    models: ChatModels,
+    session_factory: Callable[[], Session],
+    engine: Engine,
+    init_db: Callable[[], None],
+    history_cache: Optional[HistoryCache] = None,
+) -> None:
+    """Command line for one compaction pass over a demo's database."""
+    parser = argparse.ArgumentParser(description="Archive the messages of idle chats.")
+    parser.add_argument("--idle-days", type=float, default=settings.archive_idle_days or 30.0)
+    parser.add_argument("--batch-size", type=int, default=settings.archive_batch_size)
+    parser.add_argument("--vacuum", action="store_true", help="run VACUUM afterwards to return the freed space")
+    args = parser.parse_args()
+
+    init_db()
+    archived = compact_idle_chats(session_factory, models, timedelta(days=args.idle_days), args.batch_size,
+                                  history_cache)
+    print(f"Archived {archived} chats idle for more than {args.idle_days:g} days.")
+    if args.vacuum:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.exec_driver_sql("VACUUM")
@@ -0,0 +1,298 @@
+"""Bulk requests through the OpenAI Batch API.
+
+A batch is a JSONL file of requests that the API works through within a
+completion window (24 hours) at half the price of live calls, outside the
+live rate limits. That suits evals and backfills, which care about cost
+and total wall-clock time rather than per-request latency.
+
+This module is the transport: encoding requests, submitting and polling
+batches, and parsing their output and error files. :class:`BatchBackend` has
+two implementations, :class:`OpenAIBatchBackend` for the real API and
+:class:`LocalBatchBackend`, a file-based stand-in that answers requests
+locally, for tests and offline runs. :mod:`chat_core.batch_service` builds
+the requests from chat history and writes the replies back as messages.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+CHAT_COMPLETIONS_ENDPOINT = "/v1/chat/completions"
+RESPONSES_ENDPOINT = "/v1/responses"
+
+# Statuses after which a batch never changes again.
+TERMINAL_STATUSES = frozenset({"completed", "failed", "expired", "cancelled"})
+
+Responder = Callable[[str, Dict[str, Any]], Dict[str, Any]]
+
+
+@dataclass
+class BatchRequest:
+    custom_id: str
+    body: Dict[str, Any]
+
+
+@dataclass
+class BatchResult:
+    """One line of a batch's output or error file: a response ``body`` or an ``error``."""
+
+    custom_id: str
+    body: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class BatchStatus:
+    id: str
+    status: str
+    output_file_id: Optional[str] = None
+    error_file_id: Optional[str] = None
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+
+def encode_requests(requests: Iterable[BatchRequest], endpoint: str) -> bytes:
+    """The JSONL input file for ``requests``, all sent to ``endpoint``."""
+    lines = (
+        json.dumps({"custom_id": request.custom_id, "method": "POST", "url": endpoint, "body": request.body},
+                   separators=(",", ":"))
+        for request in requests
+    )
+    return "".join(f"{line}\n" for line in lines).encode()
+
+
+def parse_results(data: bytes) -> Iterator[BatchResult]:
+    """Results from an output or error file; non-2xx responses become errors."""
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        response = row.get("response") or {}
+        body = response.get("body") or {}
+        if row.get("error"):
+            yield BatchResult(row["custom_id"], error=_error_message(row["error"]))
+        elif not 200 <= response.get("status_code", 0) < 300:
+            message = _error_message(body.get("error")) if body.get("error") else "no message"
+            yield BatchResult(row["custom_id"], error=f"HTTP {response.get('status_code')}: {message}")
+        else:
+            yield BatchResult(row["custom_id"], body=body)
+
+
+def reply_text(body: Dict[str, Any]) -> str:
+    """The reply text of a Chat Completions or Responses body; raises ``ValueError`` when there is none."""
+    if "choices" in body:
+        text = body["choices"][0]["message"]["content"] or ""
+    else:
+        text = "".join(
+            item.get("text") or ""
+            for output in body["output"] if output.get("type") == "message"
+            for item in output.get("content") or [] if item.get("type") == "output_text"
+        )
+    text = text.strip()
+    if not text:
+        raise ValueError("no text content")
+    return text
+
+
+def _error_message(error: Any) -> str:
+    if isinstance(error, dict):
+        return str(error.get("message") or error.get("code") or error)
+    return str(error)
+
+
+class BatchBackend(ABC):
+    """Somewhere to run batches: the OpenAI Batch API or a local stand-in."""
+
+    @abstractmethod
+    def submit(self, data: bytes, endpoint: str, metadata: Optional[Dict[str, str]] = None) -> BatchStatus:
+        """Upload the JSONL ``data`` and start a batch over it."""
+
+    @abstractmethod
+    def retrieve(self, batch_id: str) -> BatchStatus:
+        ...
+
+    @abstractmethod
+    def cancel(self, batch_id: str) -> BatchStatus:
+        ...
+
+    @abstractmethod
+    def download(self, file_id: str) -> bytes:
+        ...
+
+    def results(self, status: BatchStatus) -> Iterator[BatchResult]:
+        """Every result of a finished batch, successes first, then errors."""
+        for file_id in (status.output_file_id, status.error_file_id):
+            if file_id:
+                yield from parse_results(self.download(file_id))
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """Batches run by the OpenAI API through a sync ``OpenAI`` client."""
+
+    def __init__(self, client: Any, completion_window: str = "24h") -> None:
+        self._client = client
+        self._completion_window = completion_window
+
+    def submit(self, data: bytes, endpoint: str, metadata: Optional[Dict[str, str]] = None) -> BatchStatus:
+        input_file = self._client.files.create(file=("batch.jsonl", data), purpose="batch")
+        batch = self._client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=endpoint,
+            completion_window=self._completion_window,
+            metadata=metadata,
+        )
+        return self._status(batch)
+
+    def retrieve(self, batch_id: str) -> BatchStatus:
+        return self._status(self._client.batches.retrieve(batch_id))
+
+    def cancel(self, batch_id: str) -> BatchStatus:
+        return self._status(self._client.batches.cancel(batch_id))
+
+    def download(self, file_id: str) -> bytes:
+        return self._client.files.content(file_id).content
+
+    @staticmethod
+    def _status(batch: Any) -> BatchStatus:
+        counts = batch.request_counts
+        return BatchStatus(
+            id=batch.id,
+            status=batch.status,
+            output_file_id=batch.output_file_id,
+            error_file_id=batch.error_file_id,
+            total=counts.total if counts else 0,
+            completed=counts.completed if counts else 0,
+            failed=counts.failed if counts else 0,
+        )
+
+
+def canned_reply(endpoint: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """Default :class:`LocalBatchBackend` responder: a reply that quotes the last input message."""
+    if endpoint == RESPONSES_ENDPOINT:
+        prompt = body["input"][-1]["content"][0]["text"]
+    else:
+        prompt = body["messages"][-1]["content"]
+    text = f"Batch reply to: {prompt}"
+    prompt_tokens, completion_tokens = len(prompt.split()), len(text.split())
+    if endpoint == RESPONSES_ENDPOINT:
+        return {
+            "id": f"resp_local_{uuid.uuid4().hex}",
+            "object": "response",
+            "model": body["model"],
+            "status": "completed",
+            "output": [{"type": "message", "role": "assistant",
+                        "content": [{"type": "output_text", "text": text}]}],
+            "usage": {"input_tokens": prompt_tokens, "output_tokens": completion_tokens},
+        }
+    return {
+        "id": f"chatcmpl-local-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "model": body["model"],
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens},
+    }
+
+
+class LocalBatchBackend(BatchBackend):
+    """File-based stand-in for the Batch API.
+
+    Each batch is a directory under ``directory`` holding its input file and
+    a ``batch.json`` state file. A batch stays ``in_progress`` until
+    ``complete_after`` seconds have passed; the first ``retrieve`` after
+    that answers every request with ``responder(endpoint, body)`` and writes
+    the output and error files. A responder that raises produces an error
+    line for that request. State lives on disk, so a batch submitted by one
+    process can be polled from another.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike[str],
+        responder: Responder = canned_reply,
+        complete_after: float = 0.0,
+    ) -> None:
+        self._directory = Path(directory)
+        self._responder = responder
+        self._complete_after = complete_after
+
+    def submit(self, data: bytes, endpoint: str, metadata: Optional[Dict[str, str]] = None) -> BatchStatus:
+        batch_id = f"batch_local_{uuid.uuid4().hex}"
+        path = self._directory / batch_id
+        path.mkdir(parents=True)
+        (path / "input.jsonl").write_bytes(data)
+        total = sum(1 for line in data.splitlines() if line.strip())
+        status = BatchStatus(id=batch_id, status="in_progress", total=total)
+        self._save(status, endpoint=endpoint, submitted_at=time.time(), metadata=metadata or {})
+        return status
+
+    def retrieve(self, batch_id: str) -> BatchStatus:
+        state = self._load(batch_id)
+        status = BatchStatus(**state["status"])
+        if status.status == "in_progress" and time.time() - state["submitted_at"] >= self._complete_after:
+            status = self._run(status, state["endpoint"])
+            self._save(status, **{key: value for key, value in state.items() if key != "status"})
+        return status
+
+    def cancel(self, batch_id: str) -> BatchStatus:
+        state = self._load(batch_id)
+        status = BatchStatus(**state["status"])
+        if not status.done:
+            status.status = "cancelled"
+            self._save(status, **{key: value for key, value in state.items() if key != "status"})
+        return status
+
+    def download(self, file_id: str) -> bytes:
+        batch_id, name = file_id.split("/", 1)
+        return (self._directory / batch_id / name).read_bytes()
+
+    def _run(self, status: BatchStatus, endpoint: str) -> BatchStatus:
+        path = self._directory / status.id
+        output, errors = [], []
+        for line in (path / "input.jsonl").read_bytes().splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            row: Dict[str, Any] = {"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": request["custom_id"]}
+            try:
+                body = self._responder(endpoint, request["body"])
+            except Exception as exc:
+                errors.append({**row, "response": None, "error": {"code": "server_error", "message": str(exc)}})
+            else:
+                output.append({**row, "response": {"status_code": 200, "body": body}, "error": None})
+        for name, rows in (("output.jsonl", output), ("errors.jsonl", errors)):
+            if rows:
+                (path / name).write_text("".join(json.dumps(row) + "\n" for row in rows))
+        return BatchStatus(
+            id=status.id,
+            status="completed",
+            output_file_id=f"{status.id}/output.jsonl" if output else None,
+            error_file_id=f"{status.id}/errors.jsonl" if errors else None,
+            total=status.total,
+            completed=len(output),
+            failed=len(errors),
+        )
+
+    def _load(self, batch_id: str) -> Dict[str, Any]:
+        path = self._directory / batch_id / "batch.json"
+        if not path.exists():
+            raise KeyError(f"Batch {batch_id} not found.")
+        return json.loads(path.read_text())
+
+    def _save(self, status: BatchStatus, **state: Any) -> None:
+        path = self._directory / status.id / "batch.json"
+        temporary = path.with_suffix(".tmp")
+        temporary.write_text(json.dumps({**state, "status": asdict(status)}))
+        # Atomic, so a concurrent poller never reads a half-written state file.
+        temporary.replace(path)
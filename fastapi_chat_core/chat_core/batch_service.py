@@ -0,0 +1,407 @@
+"""Bulk chat turns through the OpenAI Batch API.
+
+A job takes many ``(chat_id, message)`` turns, builds each request from the
+chat's history the same way ``ChatService.send_message`` does when it does
+not chain on ``previous_response_id``, and submits them all as one batch at
+half the price of live calls. Requests go to the endpoint of ``LLM_BACKEND``.
+Refreshing the job polls the batch and, once it has finished, writes every
+reply back as a user/assistant message pair, in bulk. The demos expose jobs
+through their ``/batches`` routes and a CLI::
+
+    python -m app.services.batch submit turns.jsonl --wait
+    python -m app.services.batch wait <job-id>
+
+``turns.jsonl`` holds one ``{"chat_id": ..., "message": ...}`` object per
+line. Set ``BATCH_BACKEND=local`` to run jobs against the file-based
+stand-in in :mod:`chat_core.batch` instead of the API.
+
+The turns of a job are independent: each sees its chat's history as it was
+at submission, so several turns for one chat do not see each other's
+replies, and batch turns never refresh the history summary. Batch replies
+are not stored server-side, so a chat that received one stops chaining and
+replays its history on its next live turn.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import islice
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, TypeVar
+
+from openai import OpenAI, OpenAIError
+from sqlalchemy import bindparam, func, insert, or_, select, update
+from sqlalchemy.orm import Session, aliased
+
+from chat_core.archive import restore_chat
+from chat_core.batch import (
+    CHAT_COMPLETIONS_ENDPOINT,
+    RESPONSES_ENDPOINT,
+    BatchBackend,
+    BatchRequest,
+    BatchStatus,
+    LocalBatchBackend,
+    OpenAIBatchBackend,
+    encode_requests,
+    reply_text,
+)
+from chat_core.chat_service import ChatNotFoundError
+from chat_core.config import BatchSettings, ChatSettings
+from chat_core.history import build_payload, select_window
+from chat_core.history_cache import HistoryCache
+from chat_core.http import build_http_client
+from chat_core.llm import RESPONSES, Messages, chat_completions_request, responses_request
+from chat_core.metrics import record_usage
+from chat_core.models import ChatModels
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Chats loaded per history query, and results written per transaction.
+CHUNK_SIZE = 500
+# A refresh that has not committed a chunk for this long has died; another refresh may take its ingest over.
+INGEST_CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+class BatchJobNotFoundError(Exception):
+    """Raised when a batch job identifier does not exist."""
+
+
+def _chunks(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _histories(session: Session, models: ChatModels, chat_ids: Sequence[str], limit: int) -> Dict[str, List[Any]]:
+    """The newest ``limit`` messages of each chat, oldest first, in one query for all of ``chat_ids``."""
+    rank = func.row_number().over(
+        partition_by=models.message.chat_id,
+        order_by=(models.message.created_at.desc(), models.message.id.desc()),
+    )
+    ranked = select(models.message, rank.label("rank")).where(models.message.chat_id.in_(chat_ids)).subquery()
+    message = aliased(models.message, ranked)
+    rows = session.scalars(
+        select(message).where(ranked.c.rank <= limit).order_by(message.chat_id, message.created_at, message.id))
+    histories: Dict[str, List[Any]] = defaultdict(list)
+    for row in rows:
+        histories[row.chat_id].append(row)
+    return histories
+
+
+def _outcome(
+    item_id: str, status: str, error: Optional[str], messages: Sequence[Dict[str, Any]] = ()
+) -> Dict[str, Any]:
+    return {"values": {"b_id": item_id, "b_status": status, "b_error": error}, "messages": list(messages)}
+
+
+def _request_body(endpoint: str, settings: ChatSettings, messages: Messages) -> Dict[str, Any]:
+    if endpoint == RESPONSES_ENDPOINT:
+        return responses_request(
+            settings.openai_model, messages, settings.openai_max_output_tokens, settings.openai_temperature)
+    return chat_completions_request(
+        settings.openai_model, messages, settings.openai_temperature, settings.openai_max_output_tokens)
+
+
+class BatchJobService:
+    def __init__(
+        self,
+        db: Session,
+        backend: BatchBackend,
+        models: ChatModels,
+        settings: ChatSettings,
+        history_cache: Optional[HistoryCache] = None,
+    ) -> None:
+        self._db = db
+        self._backend = backend
+        self._models = models
+        self._settings = settings
+        self._history_cache = history_cache
+
+    @property
+    def endpoint(self) -> str:
+        return RESPONSES_ENDPOINT if self._settings.llm_backend == RESPONSES else CHAT_COMPLETIONS_ENDPOINT
+
+    def create_job(self, turns: Sequence[Tuple[str, str]]) -> Any:
+        """Record the turns, build their requests from chat history and submit them as one batch."""
+        models, settings, endpoint = self._models, self._settings, self.endpoint
+        turns_by_chat: Dict[str, List[Tuple[int, str]]] = defaultdict(list)
+        for position, (chat_id, content) in enumerate(turns):
+            turns_by_chat[str(chat_id)].append((position, content))
+
+        job = models.batch_job(request_count=len(turns))
+        self._db.add(job)
+        self._db.flush()
+        requests: List[BatchRequest] = []
+        for chat_ids in _chunks(turns_by_chat, CHUNK_SIZE):
+            chats = {chat.id: chat for chat in self._db.scalars(
+                select(models.chat).where(models.chat.id.in_(chat_ids)))}
+            missing = [chat_id for chat_id in chat_ids if chat_id not in chats]
+            if missing:
+                self._db.rollback()
+                raise ChatNotFoundError(f"Chat {missing[0]} not found.")
+            for chat in chats.values():
+                if chat.archived_at is not None:
+                    restore_chat(self._db, models, chat)
+            self._db.flush()
+            histories = _histories(self._db, models, chat_ids, settings.history_max_messages)
+            items = []
+            for chat_id in chat_ids:
+                chat = chats[chat_id]
+                for position, content in turns_by_chat[chat_id]:
+                    window = select_window(histories.get(chat_id, []), content, chat.summary, settings)
+                    body = _request_body(endpoint, settings, build_payload(window.kept, content, chat.summary))
+                    item_id = str(uuid.uuid4())
+                    requests.append(BatchRequest(item_id, body))
+                    items.append({"id": item_id, "job_id": job.id, "position": position, "chat_id": chat_id,
+                                  "content": content, "status": "pending"})
+            self._db.execute(insert(models.batch_job_item), items)
+        # Committed before submitting, so every result that comes back has an item to land on.
+        self._db.commit()
+        self._invalidate(turns_by_chat)
+
+        try:
+            status = self._backend.submit(encode_requests(requests, endpoint), endpoint, metadata={"job_id": job.id})
+        except OpenAIError as exc:
+            job.status = "failed"
+            self._db.commit()
+            raise RuntimeError(f"Batch API error ({exc.__class__.__name__}): {exc}") from exc
+        job.batch_id = status.id
+        job.status = status.status
+        self._db.commit()
+        return job
+
+    def get_job(self, job_id: str) -> Any:
+        job = self._db.get(self._models.batch_job, str(job_id))
+        if job is None:
+            raise BatchJobNotFoundError(f"Batch job {job_id} not found.")
+        return job
+
+    def refresh(self, job_id: str) -> Any:
+        """Poll the job's batch and, once it has finished, write its replies back."""
+        job = self.get_job(job_id)
+        if job.ingested_at is not None or job.batch_id is None:
+            return job
+        try:
+            status = self._backend.retrieve(job.batch_id)
+            if not status.done:
+                job.status = status.status
+            elif self._claim(job):
+                self._ingest(job, status)
+        except OpenAIError as exc:
+            raise RuntimeError(f"Batch API error ({exc.__class__.__name__}): {exc}") from exc
+        self._db.commit()
+        return job
+
+    def cancel(self, job_id: str) -> Any:
+        """Cancel the job's batch; replies that finished before the cancellation are still written back."""
+        job = self.get_job(job_id)
+        if job.batch_id is None or job.ingested_at is not None or job.status == "ingesting":
+            return job
+        try:
+            job.status = self._backend.cancel(job.batch_id).status
+        except OpenAIError as exc:
+            raise RuntimeError(f"Batch API error ({exc.__class__.__name__}): {exc}") from exc
+        self._db.commit()
+        return job
+
+    def _claim(self, job: Any) -> bool:
+        """Mark a finished job ``ingesting`` with a conditional ``UPDATE``, so only one refresh writes it back.
+
+        A claim whose holder has committed nothing for ``INGEST_CLAIM_TIMEOUT``
+        can be taken over. Returns ``False``, with ``job`` reloaded, when
+        another refresh holds the claim or has already finished.
+        """
+        jobs = self._models.batch_job
+        now = datetime.utcnow()
+        claimed = self._db.execute(
+            update(jobs)
+            .where(
+                jobs.id == job.id,
+                jobs.ingested_at.is_(None),
+                or_(jobs.status != "ingesting", jobs.ingest_claimed_at.is_(None),
+                    jobs.ingest_claimed_at < now - INGEST_CLAIM_TIMEOUT),
+            )
+            .values(status="ingesting", ingest_claimed_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+        self._db.commit()
+        self._db.refresh(job)
+        return claimed
+
+    def _ingest(self, job: Any, status: BatchStatus) -> None:
+        """Write the batch's replies back, ``CHUNK_SIZE`` results per transaction; the caller holds the claim.
+
+        Only items still ``pending`` are written, so an ingest interrupted
+        part-way resumes where it stopped once its claim times out, and an
+        ingest that lost its claim never writes an item twice.
+        """
+        jobs, items = self._models.batch_job, self._models.batch_job_item
+        pending = {
+            row.id: row for row in self._db.execute(
+                select(items.id, items.position, items.chat_id, items.content)
+                .where(items.job_id == job.id, items.status == "pending"))
+        }
+        started = datetime.utcnow()
+        touched = set()
+        for results in _chunks(self._backend.results(status), CHUNK_SIZE):
+            outcomes: List[Dict[str, Any]] = []
+            for result in results:
+                item = pending.pop(result.custom_id, None)
+                if item is None:
+                    continue
+                error = result.error
+                if error is None:
+                    try:
+                        text = reply_text(result.body or {})
+                    except (KeyError, IndexError, TypeError, ValueError) as exc:
+                        error = f"Unreadable response: {exc}"
+                if error is not None:
+                    outcomes.append(_outcome(item.id, "failed", error))
+                    continue
+                usage = (result.body or {}).get("usage")
+                record_usage(result.body.get("model", ""), SimpleNamespace(**usage) if usage else None,
+                             backend="batch")
+                # Spaced by submission order so several turns for one chat stay in order.
+                created_at = started + timedelta(microseconds=2 * item.position)
+                outcomes.append(_outcome(item.id, "succeeded", None, [
+                    {"chat_id": item.chat_id, "role": "user", "content": item.content, "created_at": created_at},
+                    {"chat_id": item.chat_id, "role": "assistant", "content": text,
+                     "created_at": created_at + timedelta(microseconds=1)},
+                ]))
+            touched.update(self._write(outcomes, started))
+            # Renews the claim, so a long ingest is not taken over while it makes progress.
+            self._db.execute(update(jobs).where(jobs.id == job.id).values(ingest_claimed_at=datetime.utcnow())
+                             .execution_options(synchronize_session=False))
+            self._db.commit()
+
+        if pending:
+            # No result at all: the batch expired, failed or was cancelled before reaching these.
+            error = f"No result: batch {status.status}."
+            self._write([_outcome(item_id, "failed", error) for item_id in pending], started)
+        totals = dict(self._db.execute(
+            select(items.status, func.count())
+            .where(items.job_id == job.id)
+            .group_by(items.status)).all())
+        job.status = status.status
+        job.succeeded = totals.get("succeeded", 0)
+        job.failed = totals.get("failed", 0)
+        job.ingested_at = datetime.utcnow()
+        self._invalidate(touched)
+
+    def _write(self, outcomes: List[Dict[str, Any]], now: datetime) -> Set[str]:
+        """Record item outcomes, insert the messages of the items this call settled and bump their chats' counters.
+
+        Each outcome is recorded with ``UPDATE ... WHERE status = 'pending'``,
+        and an item whose update matched no row was settled by another
+        ingest, so its messages are skipped. Messages and counters are then
+        written as one executemany each. Message ids come from the column
+        default. A chat's ``last_response_id`` is cleared: the server-side
+        conversation does not include the batch turns, so the next live turn
+        replays history. Returns the ids of the chats that got messages.
+        """
+        items = self._models.batch_job_item.__table__
+        settle = (
+            items.update()
+            .where(items.c.id == bindparam("b_id"), items.c.status == "pending")
+            .values(status=bindparam("b_status"), error=bindparam("b_error"))
+        )
+        messages: List[Dict[str, Any]] = []
+        counts: Dict[str, int] = defaultdict(int)
+        for outcome in outcomes:
+            if self._db.execute(settle, outcome["values"]).rowcount == 0:
+                continue
+            messages.extend(outcome["messages"])
+            for message in outcome["messages"]:
+                counts[message["chat_id"]] += 1
+        if messages:
+            self._db.execute(insert(self._models.message), messages)
+        if counts:
+            chats = self._models.chat.__table__
+            values: Dict[str, Any] = {"message_count": chats.c.message_count + bindparam("b_count"),
+                                      "last_activity_at": now}
+            if self._models.chains_responses:
+                values["last_response_id"] = None
+            self._db.execute(
+                chats.update().where(chats.c.id == bindparam("b_id")).values(**values),
+                [{"b_id": chat_id, "b_count": count} for chat_id, count in counts.items()],
+            )
+        return set(counts)
+
+    def _invalidate(self, chat_ids: Iterable[str]) -> None:
+        if self._history_cache is None:
+            return
+        for chat_id in chat_ids:
+            self._history_cache.invalidate(chat_id)
+
+
+def build_batch_backend(settings: BatchSettings) -> BatchBackend:
+    """The backend ``BATCH_BACKEND`` selects."""
+    if settings.batch_backend == "local":
+        return LocalBatchBackend(settings.batch_local_dir)
+    client = OpenAI(api_key=settings.openai_api_key, http_client=build_http_client(settings, name="openai_batch"))
+    return OpenAIBatchBackend(client, settings.batch_completion_window)
+
+
+def wait_for_job(
+    session_factory: Callable[[], Session],
+    service_factory: Callable[[Session], BatchJobService],
+    job_id: str,
+    poll_interval_seconds: float,
+) -> Any:
+    """Refresh the job every ``poll_interval_seconds`` until its replies have been written back."""
+    while True:
+        with session_factory() as session:
+            job = service_factory(session).refresh(job_id)
+            if job.ingested_at is not None or job.batch_id is None:
+                return job
+            logger.info("Batch job %s is %s", job_id, job.status)
+        time.sleep(poll_interval_seconds)
+
+
+def _describe(job: Any) -> str:
+    return (f"{job.id}: {job.status}, {job.request_count} turns, "
+            f"{job.succeeded} succeeded, {job.failed} failed")
+
+
+def main(
+    settings: BatchSettings,
+    session_factory: Callable[[], Session],
+    init_db: Callable[[], None],
+    service_factory: Callable[[Session], BatchJobService],
+) -> None:
+    """Command line for a demo's batch jobs; ``service_factory`` builds its service over a session."""
+    parser = argparse.ArgumentParser(description="Run bulk chat turns through the Batch API.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    submit = commands.add_parser("submit", help="submit a JSONL file of {chat_id, message} turns")
+    submit.add_argument("turns", type=argparse.FileType("r"))
+    submit.add_argument("--wait", action="store_true", help="wait for the replies and write them back")
+    for name, text in (("status", "poll a job once"), ("wait", "wait for a job's replies"), ("cancel", "cancel a job")):
+        commands.add_parser(name, help=text).add_argument("job_id")
+    parser.add_argument("--poll-interval", type=float, default=settings.batch_poll_interval_seconds)
+    args = parser.parse_args()
+
+    init_db()
+    try:
+        with session_factory() as session:
+            service = service_factory(session)
+            if args.command == "submit":
+                turns = [(row["chat_id"], row["message"]) for row in map(json.loads, args.turns) if row]
+                job = service.create_job(turns)
+            elif args.command == "cancel":
+                job = service.cancel(args.job_id)
+            else:
+                job = service.refresh(args.job_id)
+            print(_describe(job))
+            job_id = job.id
+        if args.command == "wait" or (args.command == "submit" and args.wait):
+            print(_describe(wait_for_job(session_factory, service_factory, job_id, args.poll_interval)))
+    except (BatchJobNotFoundError, ChatNotFoundError, RuntimeError) as exc:
+        parser.exit(1, f"{exc}\n")
@@ -0,0 +1,820 @@
+"""Chat turns: history replay, caching, deduplication and persistence.
+
+:class:`ChatService` (sync sessions) and :class:`AsyncChatService` (async
+sessions) are shared by both demos. A demo passes in its ORM classes as a
+:class:`~chat_core.models.ChatModels` and its ``Settings``, which extend
+:class:`~chat_core.config.ChatSettings`. Turns are sent to an
+:class:`~chat_core.llm.LLMBackend`; on backends that chain, and with
+``OPENAI_CHAIN_RESPONSES`` on, a turn sends only the new message and
+continues from the chat's ``last_response_id``. Subclasses can route a
+chat's turns through another backend, such as a caching wrapper, by
+overriding ``_backend_for``.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+from uuid import UUID
+
+import anyio
+from sqlalchemy import Select, delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from chat_core.archive import restore_chat
+from chat_core.config import ChatSettings
+from chat_core.group_commit import Apply, AsyncGroupCommitWriter, GroupCommitWriter, pending_updates
+from chat_core.history import build_payload, select_window, summary_request, unsummarized
+from chat_core.history_cache import CachedChat, CachedMessage, HistoryCache
+from chat_core.idempotency import IdempotencyStore, fingerprint
+from chat_core.llm import AsyncLLMBackend, Generation, LLMBackend, PreviousResponseNotFoundError
+from chat_core.metrics import span
+from chat_core.models import ChatModels
+from chat_core.pagination import Cursor, Page, after, paginate
+from chat_core.singleflight import AsyncSingleFlight, SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Rows read per query while exporting a chat.
+EXPORT_BATCH_SIZE = 500
+
+
+class ChatNotFoundError(Exception):
+    """Raised when a chat identifier does not exist."""
+
+
+def _history_statement(models: ChatModels, chat_id: str, limit: int) -> Select:
+    # Newest first so the (chat_id, created_at, id) index is scanned backwards and
+    # the LIMIT stops early; callers restore chronological order. ``id`` breaks
+    # ties the same way pages and exports do.
+    return (
+        select(models.message)
+        .where(models.message.chat_id == chat_id)
+        .order_by(models.message.created_at.desc(), models.message.id.desc())
+        .limit(limit)
+    )
+
+
+def _version_statement(models: ChatModels, chat_id: str) -> Select:
+    # What a turn changes on the chat row, read by primary key: a cheap check
+    # that a cached entry still matches what other workers have written.
+    return select(models.chat.message_count, models.chat.archived_at).where(models.chat.id == chat_id)
+
+
+def _page_statement(
+    models: ChatModels,
+    chat_id: str,
+    limit: int,
+    cursor: Optional[Cursor] = None,
+    descending: bool = False,
+) -> Select:
+    """Up to ``limit`` messages of a chat in ``(created_at, id)`` order, starting after ``cursor``.
+
+    Filters and sorts on exactly the columns of the ``(chat_id, created_at, id)``
+    index, so a page is one index seek plus ``limit`` rows at any depth.
+    """
+    columns = (models.message.created_at, models.message.id)
+    stmt = select(models.message).where(models.message.chat_id == chat_id)
+    if cursor is not None:
+        stmt = stmt.where(after(columns, cursor, descending))
+    order_by = [column.desc() for column in columns] if descending else list(columns)
+    return stmt.order_by(*order_by).limit(limit)
+
+
+def _idempotency_entry(chat: Any, idempotency_key: str, content: str) -> Tuple[Hashable, str]:
+    return ("idempotency", str(chat.id), idempotency_key), fingerprint(content)
+
+
+def _new_turn(content: str) -> List[Dict[str, str]]:
+    return [{"role": "user", "content": content}]
+
+
+def _turn_writes(models: ChatModels, chat: Any, messages: Sequence[Any]) -> Apply:
+    """Write for one turn: insert ``messages`` and update ``chat`` in a single ``UPDATE``.
+
+    Besides any pending changes to ``chat``, the update stamps
+    ``last_activity_at`` and increments ``message_count`` in SQL, so turns
+    racing on one chat never lose a count. ``chat`` is marked clean so its
+    own session does not write the same changes again.
+    """
+    now = datetime.utcnow()
+    changes = pending_updates(chat)
+    for key, value in changes.items():
+        set_committed_value(chat, key, value)
+    set_committed_value(chat, "last_activity_at", now)
+    set_committed_value(chat, "message_count", (chat.message_count or 0) + len(messages))
+    values = {**changes, "last_activity_at": now, "message_count": models.chat.message_count + len(messages)}
+    statement = (
+        update(models.chat)
+        .where(models.chat.id == chat.id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+    def apply(session: Session) -> None:
+        session.add_all(messages)
+        session.execute(statement)
+
+    return apply
+
+
+def _turn_rollback(models: ChatModels, chat: Any, message: Any) -> Apply:
+    """Undo a stored user turn whose reply never started: delete ``message`` and decrement ``message_count``.
+
+    Both are single statements by primary key, so they work wherever the
+    row was written, group-commit writer included. Pending changes to
+    ``chat`` are written with the update, as :func:`_turn_writes` does.
+    """
+    changes = pending_updates(chat)
+    for key, value in changes.items():
+        set_committed_value(chat, key, value)
+    set_committed_value(chat, "message_count", (chat.message_count or 1) - 1)
+    delete_statement = (
+        delete(models.message)
+        .where(models.message.id == message.id)
+        .execution_options(synchronize_session=False)
+    )
+    update_statement = (
+        update(models.chat)
+        .where(models.chat.id == chat.id)
+        .values(**changes, message_count=models.chat.message_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+
+    def apply(session: Session) -> None:
+        session.execute(delete_statement)
+        session.execute(update_statement)
+
+    return apply
+
+
+def _reply_content(parts: Sequence[str], completed: bool, partial_policy: str) -> Optional[str]:
+    """Decide what, if anything, to persist for a streamed reply."""
+    text = "".join(parts).strip()
+    if not text:
+        return None
+    if not completed and partial_policy == "discard":
+        return None
+    return text
+
+
+class ReplyStream:
+    """Iterates assistant text deltas and persists the reply once the stream ends.
+
+    ``message`` holds the stored assistant row after iteration finishes, or
+    ``None`` when nothing was persisted (empty reply, or a partial reply under
+    ``STREAM_PARTIAL_POLICY=discard``).
+    """
+
+    def __init__(
+        self,
+        deltas: Iterator[str],
+        finalize: Callable[[str], Any],
+        partial_policy: str = "save",
+    ) -> None:
+        self._deltas = deltas
+        self._finalize = finalize
+        self._partial_policy = partial_policy
+        self.message: Optional[Any] = None
+
+    def __iter__(self) -> Iterator[str]:
+        parts: List[str] = []
+        completed = False
+        try:
+            for delta in self._deltas:
+                parts.append(delta)
+                yield delta
+            completed = True
+        finally:
+            close = getattr(self._deltas, "close", None)
+            if close is not None:
+                close()
+            content = _reply_content(parts, completed, self._partial_policy)
+            if content is not None:
+                self.message = self._finalize(content)
+
+
+class AsyncReplyStream:
+    """Async counterpart of :class:`ReplyStream`."""
+
+    def __init__(
+        self,
+        deltas: AsyncIterator[str],
+        finalize: Callable[[str], Awaitable[Any]],
+        partial_policy: str = "save",
+    ) -> None:
+        self._deltas = deltas
+        self._finalize = finalize
+        self._partial_policy = partial_policy
+        self.message: Optional[Any] = None
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        parts: List[str] = []
+        completed = False
+        try:
+            async for delta in self._deltas:
+                parts.append(delta)
+                yield delta
+            completed = True
+        finally:
+            content = _reply_content(parts, completed, self._partial_policy)
+            # Shielded so a client disconnect cannot cancel the upstream close or the final write.
+            with anyio.CancelScope(shield=True):
+                aclose = getattr(self._deltas, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+                if content is not None:
+                    self.message = await self._finalize(content)
+
+
+class _ChatServiceBase:
+    """Cache bookkeeping and chaining decisions shared by the sync and async services."""
+
+    _db: Session | AsyncSession
+    _llm: Any
+    _models: ChatModels
+    _settings: ChatSettings
+    _history_cache: Optional[HistoryCache]
+
+    def _backend_for(self, chat: Any) -> Any:
+        """The backend a turn of ``chat`` is sent to; summaries always use the plain backend."""
+        return self._llm
+
+    def _chains(self, backend: Any) -> bool:
+        """Whether turns sent to ``backend`` keep a server-side chain."""
+        return self._settings.openai_chain_responses and self._models.chains_responses and backend.supports_chaining
+
+    def _can_chain(self, chat: Any, backend: Any) -> bool:
+        return self._chains(backend) and bool(chat.last_response_id)
+
+    def _advance_chain(self, chat: Any, response_id: Optional[str]) -> None:
+        if self._models.chains_responses:
+            # A backend that cannot chain returns no id, which ends the chain.
+            chat.last_response_id = response_id if self._settings.openai_chain_responses else None
+
+    def _turn_key(self, chat: Any, backend: Any, content: str) -> Hashable:
+        # ``message_count`` versions the replayed history and the chain head a
+        # chained turn, so only turns that would send the model the same request
+        # share a call, and the history is built once, by the turn that runs.
+        head = chat.last_response_id if self._chains(backend) else None
+        return "turn", str(chat.id), backend.name, fingerprint(content), chat.message_count, head
+
+    def _cached_entry(self, chat_id: str) -> Optional[CachedChat]:
+        if self._history_cache is None:
+            return None
+        return self._history_cache.get(chat_id)
+
+    def _current_chat(self, cached: CachedChat, version: Optional[Any]) -> Optional[Any]:
+        """The chat rebuilt from ``cached``, or ``None`` when the row's ``version`` shows it is stale.
+
+        Another worker, or a concurrent turn, may have written the chat since
+        it was cached; its ``message_count`` then differs and the entry,
+        history included, is not trusted.
+        """
+        if version is None:
+            return None
+        columns = cached.columns
+        if (version.message_count, version.archived_at is None) != (
+                columns.get("message_count"), columns.get("archived_at") is None):
+            return None
+        # Re-attach the cached row as persistent without a full SELECT; later
+        # attribute changes still flush as an UPDATE on commit.
+        chat = self._models.chat(**columns)
+        make_transient_to_detached(chat)
+        self._db.add(chat)
+        return chat
+
+    def _cached_history(self, chat_id: str) -> Optional[List[Any]]:
+        if self._history_cache is None:
+            return None
+        # Peeked: ``_load_chat`` already counted this turn's hit or miss.
+        cached = self._history_cache.peek(chat_id)
+        if cached is None or cached.messages is None:
+            return None
+        return [message.to_model(self._models.message, chat_id) for message in cached.messages]
+
+    def _cache_chat(self, chat: Any, history: Optional[Sequence[Any]] = None) -> None:
+        if self._history_cache is None:
+            return
+        messages = None if history is None else [CachedMessage.from_model(message) for message in history]
+        self._history_cache.put(str(chat.id), CachedChat(columns=CachedChat.columns_of(chat), messages=messages))
+
+    def _remember(self, chat: Any, messages: Sequence[Any]) -> None:
+        if self._history_cache is not None:
+            self._history_cache.append(chat, messages, self._settings.history_max_messages)
+
+    def _forget(self, chat_id: str) -> None:
+        if self._history_cache is not None:
+            self._history_cache.invalidate(chat_id)
+
+    def _window(self, chat: Any, history: Sequence[Any], content: str, pending: Optional[Any]) -> Any:
+        if pending is not None:
+            # Compare by id: cached history holds copies, not the session's instances.
+            history = [message for message in history if message.id != pending.id]
+        return select_window(history, content, chat.summary, self._settings)
+
+
+class ChatService(_ChatServiceBase):
+    def __init__(
+        self,
+        db: Session,
+        llm: LLMBackend,
+        models: ChatModels,
+        settings: ChatSettings,
+        history_cache: Optional[HistoryCache] = None,
+        single_flight: Optional[SingleFlight] = None,
+        idempotency_store: Optional[IdempotencyStore] = None,
+        writer: Optional[GroupCommitWriter] = None,
+    ) -> None:
+        self._db = db
+        self._llm = llm
+        self._models = models
+        self._settings = settings
+        self._history_cache = history_cache
+        self._single_flight = single_flight
+        self._idempotency = idempotency_store
+        self._writer = writer
+
+    def create_chat(self, **columns: Any) -> Any:
+        chat = self._models.chat(**columns)
+        self._db.add(chat)
+        self._db.commit()
+        self._cache_chat(chat, history=[])
+        return chat
+
+    def _cached_chat(self, chat_id: str) -> Optional[Any]:
+        cached = self._cached_entry(chat_id)
+        if cached is None:
+            return None
+        version = self._db.execute(_version_statement(self._models, chat_id)).first()
+        return self._current_chat(cached, version)
+
+    def _load_chat(self, chat_id: UUID | str) -> Any:
+        chat = self._cached_chat(str(chat_id))
+        if chat is None:
+            chat = self._db.get(self._models.chat, str(chat_id))
+            if chat is None:
+                raise ChatNotFoundError(f"Chat {chat_id} not found.")
+            self._cache_chat(chat)
+        if chat.archived_at is not None:
+            self._restore(chat)
+        return chat
+
+    def _restore(self, chat: Any) -> None:
+        """Bring an archived chat's messages back before the chat is used."""
+        with span("restore_archive"):
+            restore_chat(self._db, self._models, chat)
+            self._db.commit()
+        self._cache_chat(chat)
+
+    def _chat_history(self, chat: Any) -> Sequence[Any]:
+        chat_id = str(chat.id)
+        cached = self._cached_history(chat_id)
+        if cached is not None:
+            return cached
+        stmt = _history_statement(self._models, chat_id, self._settings.history_max_messages)
+        history = self._db.execute(stmt).scalars().all()[::-1]
+        self._cache_chat(chat, history)
+        return history
+
+    def _history_payload(self, chat: Any, content: str, pending: Optional[Any] = None) -> List[Dict[str, str]]:
+        """The replayed window plus ``content``; ``pending`` is the already stored row of ``content``."""
+        window = self._window(chat, self._chat_history(chat), content, pending)
+        if self._settings.history_summary_enabled:
+            self._fold_into_summary(chat, unsummarized(window.dropped, chat))
+        return build_payload(window.kept, content, chat.summary)
+
+    def _fold_into_summary(self, chat: Any, messages: Sequence[Any]) -> None:
+        if not messages:
+            return
+        try:
+            chat.summary = self._llm.generate(summary_request(chat.summary, messages)).text
+        except RuntimeError as exc:
+            logger.warning("Keeping previous summary for chat %s: %s", chat.id, exc)
+            return
+        chat.summary_until = messages[-1].created_at
+
+    def send_message(
+        self,
+        chat_id: UUID | str,
+        content: str,
+        idempotency_key: Optional[str] = None,
+    ) -> Any:
+        """Generate and persist one turn.
+
+        Concurrent identical turns share one upstream call and one pair of
+        rows, and a retry with the same ``idempotency_key`` returns the stored
+        reply without calling the model again. The key is claimed with the
+        request's fingerprint before the turn runs, so reusing it for another
+        message fails at once, even while the first request is in flight.
+        """
+        with span("load_chat"):
+            chat = self._load_chat(chat_id)
+        if idempotency_key is None or self._idempotency is None:
+            return self._send_coalesced(chat, content)
+        key, request_fingerprint = _idempotency_entry(chat, idempotency_key, content)
+        replayed = self._idempotency.reserve(key, request_fingerprint)
+        if replayed is not None:
+            return replayed.to_model(self._models.message, str(chat.id))
+        try:
+            return self._coalesce(key, lambda: self._send_and_save(chat, content, key, request_fingerprint))
+        except BaseException:
+            self._idempotency.release(key, request_fingerprint)
+            raise
+
+    def _send_and_save(self, chat: Any, content: str, key: Hashable, request_fingerprint: str) -> Any:
+        message = self._send_coalesced(chat, content)
+        # Saved before single-flight lets go of the key, so a retry arriving
+        # right after the turn finishes replays it instead of running it again.
+        self._idempotency.save(key, request_fingerprint, CachedMessage.from_model(message))
+        return message
+
+    def _coalesce(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        if self._single_flight is None:
+            return fn()
+        message, _ = self._single_flight.do(key, fn)
+        return message
+
+    def _persist(self, chat: Any, messages: Sequence[Any]) -> None:
+        """Commit ``messages`` with any pending changes to ``chat``, through the group-commit writer if set."""
+        self._commit(_turn_writes(self._models, chat, messages))
+
+    def _commit(self, apply: Apply) -> None:
+        if self._writer is not None:
+            self._writer.write(apply)
+            return
+        apply(self._db)
+        self._db.commit()
+
+    def _send_coalesced(self, chat: Any, content: str) -> Any:
+        backend = self._backend_for(chat)
+        return self._coalesce(
+            self._turn_key(chat, backend, content), lambda: self._complete_turn(chat, content, backend))
+
+    def _generate(self, chat: Any, content: str, backend: LLMBackend) -> Generation:
+        """Generate a reply, sending only the new turn when the chat can be chained."""
+        if self._can_chain(chat, backend):
+            try:
+                return backend.generate(_new_turn(content), chat.last_response_id)
+            except PreviousResponseNotFoundError as exc:
+                logger.info("Replaying full history for chat %s: %s", chat.id, exc)
+        with span("build_history"):
+            history_payload = self._history_payload(chat, content)
+        return backend.generate(history_payload)
+
+    def _complete_turn(
+        self,
+        chat: Any,
+        content: str,
+        backend: LLMBackend,
+    ) -> Any:
+        chat_id_str = str(chat.id)
+
+        with span("completion"):
+            generation = self._generate(chat, content, backend)
+        self._advance_chain(chat, generation.response_id)
+
+        user_message = self._models.message(chat_id=chat_id_str, role="user", content=content)
+        assistant_message = self._models.message(chat_id=chat_id_str, role="assistant", content=generation.text)
+        with span("persist"):
+            self._persist(chat, [user_message, assistant_message])
+        self._remember(chat, [user_message, assistant_message])
+
+        return assistant_message
+
+    def _open_stream(self, chat: Any, content: str, user_message: Any, backend: LLMBackend) -> Iterator[str]:
+        if not self._chains(backend):
+            self._advance_chain(chat, None)
+            with span("build_history"):
+                history_payload = self._history_payload(chat, content, user_message)
+            return backend.stream(history_payload)
+
+        def remember(response_id: str) -> None:
+            chat.last_response_id = response_id
+
+        if self._can_chain(chat, backend):
+            try:
+                return backend.stream(_new_turn(content), chat.last_response_id, on_response_id=remember)
+            except PreviousResponseNotFoundError as exc:
+                logger.info("Replaying full history for chat %s: %s", chat.id, exc)
+        with span("build_history"):
+            history_payload = self._history_payload(chat, content, user_message)
+        return backend.stream(history_payload, on_response_id=remember)
+
+    def stream_message(self, chat_id: UUID | str, content: str) -> ReplyStream:
+        """Persist the user turn, open the upstream stream and return its deltas."""
+        with span("load_chat"):
+            chat = self._load_chat(chat_id)
+        chat_id_str = str(chat.id)
+
+        user_message = self._models.message(chat_id=chat_id_str, role="user", content=content)
+        self._persist(chat, [user_message])
+        self._remember(chat, [user_message])
+
+        try:
+            deltas = self._open_stream(chat, content, user_message, self._backend_for(chat))
+        except RuntimeError:
+            self._commit(_turn_rollback(self._models, chat, user_message))
+            self._forget(chat_id_str)
+            raise
+
+        def finalize(completion: str) -> Any:
+            assistant_message = self._models.message(chat_id=chat_id_str, role="assistant", content=completion)
+            self._persist(chat, [assistant_message])
+            self._remember(chat, [assistant_message])
+            return assistant_message
+
+        return ReplyStream(deltas, finalize, self._settings.stream_partial_policy)
+
+    def list_messages(
+        self,
+        chat_id: UUID | str,
+        limit: int,
+        cursor: Optional[str] = None,
+        descending: bool = False,
+    ) -> Page[Any]:
+        """One page of a chat's messages; pass ``next_cursor`` back to get the following page."""
+        position = Cursor.decode(cursor) if cursor else None
+        chat = self._load_chat(chat_id)
+        stmt = _page_statement(self._models, str(chat.id), limit + 1, position, descending)
+        return paginate(self._db.execute(stmt).scalars().all(), limit)
+
+    def export_messages(self, chat_id: UUID | str) -> Iterator[List[Any]]:
+        """Every message of a chat, oldest first, in batches of ``EXPORT_BATCH_SIZE``.
+
+        The chat is looked up before this returns, so a missing chat raises
+        here rather than mid-export. The session is closed after each batch,
+        so a slow client holds neither a pooled connection nor the rows it
+        has already been sent.
+        """
+        chat = self._load_chat(chat_id)
+        return self._export_batches(str(chat.id))
+
+    def _export_batches(self, chat_id: str) -> Iterator[List[Any]]:
+        cursor: Optional[Cursor] = None
+        while True:
+            rows = list(self._db.execute(_page_statement(self._models, chat_id, EXPORT_BATCH_SIZE, cursor)).scalars())
+            self._db.close()
+            if rows:
+                yield rows
+            if len(rows) < EXPORT_BATCH_SIZE:
+                return
+            cursor = Cursor.of(rows[-1])
+
+
+class AsyncChatService(_ChatServiceBase):
+    """Async variant of :class:`ChatService` used when ``EXECUTION_MODE=async``."""
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        llm: AsyncLLMBackend,
+        models: ChatModels,
+        settings: ChatSettings,
+        history_cache: Optional[HistoryCache] = None,
+        single_flight: Optional[AsyncSingleFlight] = None,
+        idempotency_store: Optional[IdempotencyStore] = None,
+        writer: Optional[AsyncGroupCommitWriter] = None,
+    ) -> None:
+        self._db = db
+        self._llm = llm
+        self._models = models
+        self._settings = settings
+        self._history_cache = history_cache
+        self._single_flight = single_flight
+        self._idempotency = idempotency_store
+        self._writer = writer
+
+    async def create_chat(self, **columns: Any) -> Any:
+        chat = self._models.chat(**columns)
+        self._db.add(chat)
+        await self._db.commit()
+        self._cache_chat(chat, history=[])
+        return chat
+
+    async def _cached_chat(self, chat_id: str) -> Optional[Any]:
+        cached = self._cached_entry(chat_id)
+        if cached is None:
+            return None
+        version = (await self._db.execute(_version_statement(self._models, chat_id))).first()
+        return self._current_chat(cached, version)
+
+    async def _load_chat(self, chat_id: UUID | str) -> Any:
+        chat = await self._cached_chat(str(chat_id))
+        if chat is None:
+            chat = await self._db.get(self._models.chat, str(chat_id))
+            if chat is None:
+                raise ChatNotFoundError(f"Chat {chat_id} not found.")
+            self._cache_chat(chat)
+        if chat.archived_at is not None:
+            await self._restore(chat)
+        return chat
+
+    async def _restore(self, chat: Any) -> None:
+        with span("restore_archive"):
+            await self._db.run_sync(restore_chat, self._models, chat)
+            await self._db.commit()
+        self._cache_chat(chat)
+
+    async def _chat_history(self, chat: Any) -> Sequence[Any]:
+        chat_id = str(chat.id)
+        cached = self._cached_history(chat_id)
+        if cached is not None:
+            return cached
+        stmt = _history_statement(self._models, chat_id, self._settings.history_max_messages)
+        result = await self._db.execute(stmt)
+        history = result.scalars().all()[::-1]
+        self._cache_chat(chat, history)
+        return history
+
+    async def _history_payload(self, chat: Any, content: str, pending: Optional[Any] = None) -> List[Dict[str, str]]:
+        window = self._window(chat, await self._chat_history(chat), content, pending)
+        if self._settings.history_summary_enabled:
+            await self._fold_into_summary(chat, unsummarized(window.dropped, chat))
+        return build_payload(window.kept, content, chat.summary)
+
+    async def _fold_into_summary(self, chat: Any, messages: Sequence[Any]) -> None:
+        if not messages:
+            return
+        try:
+            chat.summary = (await self._llm.generate(summary_request(chat.summary, messages))).text
+        except RuntimeError as exc:
+            logger.warning("Keeping previous summary for chat %s: %s", chat.id, exc)
+            return
+        chat.summary_until = messages[-1].created_at
+
+    async def send_message(
+        self,
+        chat_id: UUID | str,
+        content: str,
+        idempotency_key: Optional[str] = None,
+    ) -> Any:
+        """Generate and persist one turn.
+
+        Concurrent identical turns share one upstream call and one pair of
+        rows, and a retry with the same ``idempotency_key`` returns the stored
+        reply without calling the model again. The key is claimed with the
+        request's fingerprint before the turn runs, so reusing it for another
+        message fails at once, even while the first request is in flight.
+        """
+        with span("load_chat"):
+            chat = await self._load_chat(chat_id)
+        if idempotency_key is None or self._idempotency is None:
+            return await self._send_coalesced(chat, content)
+        key, request_fingerprint = _idempotency_entry(chat, idempotency_key, content)
+        replayed = self._idempotency.reserve(key, request_fingerprint)
+        if replayed is not None:
+            return replayed.to_model(self._models.message, str(chat.id))
+        try:
+            return await self._coalesce(key, lambda: self._send_and_save(chat, content, key, request_fingerprint))
+        except BaseException:
+            self._idempotency.release(key, request_fingerprint)
+            raise
+
+    async def _send_and_save(self, chat: Any, content: str, key: Hashable, request_fingerprint: str) -> Any:
+        message = await self._send_coalesced(chat, content)
+        self._idempotency.save(key, request_fingerprint, CachedMessage.from_model(message))
+        return message
+
+    async def _coalesce(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if self._single_flight is None:
+            return await fn()
+        message, _ = await self._single_flight.do(key, fn)
+        return message
+
+    async def _persist(self, chat: Any, messages: Sequence[Any]) -> None:
+        await self._commit(_turn_writes(self._models, chat, messages))
+
+    async def _commit(self, apply: Apply) -> None:
+        if self._writer is not None:
+            await self._writer.write(apply)
+            return
+        await self._db.run_sync(apply)
+        await self._db.commit()
+
+    async def _send_coalesced(self, chat: Any, content: str) -> Any:
+        backend = self._backend_for(chat)
+        return await self._coalesce(
+            self._turn_key(chat, backend, content), lambda: self._complete_turn(chat, content, backend))
+
+    async def _generate(self, chat: Any, content: str, backend: AsyncLLMBackend) -> Generation:
+        if self._can_chain(chat, backend):
+            try:
+                return await backend.generate(_new_turn(content), chat.last_response_id)
+            except PreviousResponseNotFoundError as exc:
+                logger.info("Replaying full history for chat %s: %s", chat.id, exc)
+        with span("build_history"):
+            history_payload = await self._history_payload(chat, content)
+        return await backend.generate(history_payload)
+
+    async def _complete_turn(
+        self,
+        chat: Any,
+        content: str,
+        backend: AsyncLLMBackend,
+    ) -> Any:
+        chat_id_str = str(chat.id)
+
+        with span("completion"):
+            generation = await self._generate(chat, content, backend)
+        self._advance_chain(chat, generation.response_id)
+
+        user_message = self._models.message(chat_id=chat_id_str, role="user", content=content)
+        assistant_message = self._models.message(chat_id=chat_id_str, role="assistant", content=generation.text)
+        with span("persist"):
+            await self._persist(chat, [user_message, assistant_message])
+        self._remember(chat, [user_message, assistant_message])
+
+        return assistant_message
+
+    async def _open_stream(
+        self, chat: Any, content: str, user_message: Any, backend: AsyncLLMBackend
+    ) -> AsyncIterator[str]:
+        if not self._chains(backend):
+            self._advance_chain(chat, None)
+            with span("build_history"):
+                history_payload = await self._history_payload(chat, content, user_message)
+            return await backend.stream(history_payload)
+
+        def remember(response_id: str) -> None:
+            chat.last_response_id = response_id
+
+        if self._can_chain(chat, backend):
+            try:
+                return await backend.stream(_new_turn(content), chat.last_response_id, on_response_id=remember)
+            except PreviousResponseNotFoundError as exc:
+                logger.info("Replaying full history for chat %s: %s", chat.id, exc)
+        with span("build_history"):
+            history_payload = await self._history_payload(chat, content, user_message)
+        return await backend.stream(history_payload, on_response_id=remember)
+
+    async def stream_message(self, chat_id: UUID | str, content: str) -> AsyncReplyStream:
+        """Persist the user turn, open the upstream stream and return its deltas."""
+        with span("load_chat"):
+            chat = await self._load_chat(chat_id)
+        chat_id_str = str(chat.id)
+
+        user_message = self._models.message(chat_id=chat_id_str, role="user", content=content)
+        await self._persist(chat, [user_message])
+        self._remember(chat, [user_message])
+
+        try:
+            deltas = await self._open_stream(chat, content, user_message, self._backend_for(chat))
+        except RuntimeError:
+            await self._commit(_turn_rollback(self._models, chat, user_message))
+            self._forget(chat_id_str)
+            raise
+
+        async def finalize(completion: str) -> Any:
+            assistant_message = self._models.message(chat_id=chat_id_str, role="assistant", content=completion)
+            await self._persist(chat, [assistant_message])
+            self._remember(chat, [assistant_message])
+            return assistant_message
+
+        return AsyncReplyStream(deltas, finalize, self._settings.stream_partial_policy)
+
+    async def list_messages(
+        self,
+        chat_id: UUID | str,
+        limit: int,
+        cursor: Optional[str] = None,
+        descending: bool = False,
+    ) -> Page[Any]:
+        """One page of a chat's messages; pass ``next_cursor`` back to get the following page."""
+        position = Cursor.decode(cursor) if cursor else None
+        chat = await self._load_chat(chat_id)
+        stmt = _page_statement(self._models, str(chat.id), limit + 1, position, descending)
+        result = await self._db.execute(stmt)
+        return paginate(result.scalars().all(), limit)
+
+    async def export_messages(self, chat_id: UUID | str) -> AsyncIterator[List[Any]]:
+        """Every message of a chat, oldest first, in batches of ``EXPORT_BATCH_SIZE``."""
+        chat = await self._load_chat(chat_id)
+        return self._export_batches(str(chat.id))
+
+    async def _export_batches(self, chat_id: str) -> AsyncIterator[List[Any]]:
+        cursor: Optional[Cursor] = None
+        while True:
+            result = await self._db.execute(_page_statement(self._models, chat_id, EXPORT_BATCH_SIZE, cursor))
+            rows = list(result.scalars())
+            await self._db.close()
+            if rows:
+                yield rows
+            if len(rows) < EXPORT_BATCH_SIZE:
+                return
+            cursor = Cursor.of(rows[-1])
@@ -0,0 +1,141 @@
+from typing import List, Literal, Optional
+
+from pydantic_settings import BaseSettings
+
+
+class DatabaseSettings(BaseSettings):
+    """Connection and pool settings read by :func:`chat_core.db.create_db_engine`.
+
+    Each demo's ``Settings`` subclasses this and overrides ``database_url``.
+    """
+
+    database_url: str = "sqlite:///./chat.db"
+    async_database_url: Optional[str] = None
+
+    # Pool settings apply to server databases and file-backed SQLite.
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_statement_timeout_ms: Optional[int] = None
+    # Connections each worker opens at startup, so the first requests skip connect and auth.
+    db_pool_prewarm: int = 2
+
+    # Applied with PRAGMA statements on every new SQLite connection.
+    sqlite_journal_mode: Literal["wal", "delete", "truncate", "persist", "memory", "off"] = "wal"
+    sqlite_synchronous: Literal["off", "normal", "full", "extra"] = "normal"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size_kib: int = 64 * 1024
+
+
+class ObservabilitySettings(BaseSettings):
+    """Settings for :mod:`chat_core.metrics`, mixed into each demo's ``Settings``."""
+
+    metrics_enabled: bool = True
+    # OTLP/HTTP traces endpoint, e.g. ``http://localhost:4318/v1/traces``; tracing is off when unset.
+    otel_exporter_otlp_endpoint: Optional[str] = None
+    otel_service_name: str = "fastapi-chat"
+
+
+class HttpClientSettings(BaseSettings):
+    """Pool, keep-alive and timeout settings for the upstream client built by :mod:`chat_core.http`."""
+
+    # Needs the ``h2`` package (the ``http2`` extra).
+    openai_http2: bool = False
+    openai_http_max_connections: int = 100
+    openai_http_max_keepalive_connections: int = 20
+    openai_http_keepalive_expiry_seconds: float = 30.0
+    openai_http_connect_timeout_seconds: float = 5.0
+    openai_http_read_timeout_seconds: float = 60.0
+    openai_http_write_timeout_seconds: float = 10.0
+    # How long a request waits for a free connection when all ``max_connections`` are busy.
+    openai_http_pool_timeout_seconds: float = 10.0
+
+
+class AdmissionSettings(BaseSettings):
+    """Rate limits and upstream concurrency for :mod:`chat_core.admission`; each limit is off while unset."""
+
+    rate_limit_backend: Literal["memory", "redis"] = "memory"
+    rate_limit_redis_url: Optional[str] = None
+    # API keys callers are identified by; any other key is ignored and the caller keyed on its IP.
+    rate_limit_api_keys: List[str] = []
+    # Per caller: a listed API key when one is sent, else the client IP.
+    rate_limit_requests_per_minute: Optional[float] = None
+    # Requests allowed back to back; defaults to the per-minute limit.
+    rate_limit_burst: Optional[float] = None
+    rate_limit_chat_requests_per_minute: Optional[float] = None
+    rate_limit_chat_burst: Optional[float] = None
+    # Per caller; a turn is charged its estimated prompt plus maximum reply, then what it actually used.
+    rate_limit_tokens_per_minute: Optional[float] = None
+    # In-flight turns per worker; 0 means unlimited.
+    upstream_max_concurrency: int = 0
+    upstream_max_queue: int = 100
+    upstream_queue_timeout_seconds: float = 2.0
+
+
+class LLMSettings(HttpClientSettings):
+    """Models, retries and backend selection for :mod:`chat_core.llm`; replaces ``HttpClientSettings`` in a demo's bases."""
+
+    openai_api_key: Optional[str] = None
+    openai_model: str = "gpt-4o-mini"
+    openai_fallback_model: Optional[str] = None
+    # Left out of requests while unset; reasoning models reject it.
+    openai_temperature: Optional[float] = None
+    openai_max_output_tokens: int = 512
+    openai_timeout_seconds: float = 30.0
+    openai_max_retries: int = 2
+    openai_retry_base_delay_seconds: float = 0.5
+    openai_retry_max_delay_seconds: float = 8.0
+    openai_hedge_after_seconds: Optional[float] = None
+    # Worker threads for the backup requests of sync hedged calls; a hedge is skipped while all are busy.
+    openai_hedge_max_concurrency: int = 16
+    circuit_breaker_error_rate: float = 0.5
+    circuit_breaker_min_requests: int = 10
+    circuit_breaker_cooldown_seconds: float = 30.0
+    router_window: int = 100
+    router_latency_slo_seconds: Optional[float] = None
+    # The API turns are sent to unless a request picks another with ``X-LLM-Backend``.
+    llm_backend: Literal["chat_completions", "responses"] = "chat_completions"
+    llm_backend_per_request: bool = False
+
+
+class ChatSettings(LLMSettings):
+    """History, caching and write settings for :mod:`chat_core.chat_service`; includes ``LLMSettings``."""
+
+    # Send only the new turn with ``previous_response_id`` on backends that can chain (Responses API).
+    openai_chain_responses: bool = False
+    # What to keep of a streamed reply the client disconnected from.
+    stream_partial_policy: Literal["save", "discard"] = "save"
+    history_max_tokens: int = 8000
+    history_min_messages: int = 4
+    history_max_messages: int = 200
+    history_summary_enabled: bool = False
+    # Per-process ``memory`` caches are turned off by ``chat_core.serve`` when it runs several workers.
+    history_cache_backend: Literal["none", "memory", "redis"] = "memory"
+    history_cache_max_chats: int = 1024
+    history_cache_ttl_seconds: float = 300.0
+    history_cache_redis_url: Optional[str] = None
+    idempotency_key_ttl_seconds: float = 86400.0
+    idempotency_max_keys: int = 10000
+    message_write_mode: Literal["immediate", "group_commit"] = "immediate"
+    group_commit_max_batch: int = 256
+    group_commit_max_delay_ms: float = 0.0
+
+
+class ArchiveSettings(BaseSettings):
+    """Idle-chat compaction for :mod:`chat_core.archive`; off in the app while ``ARCHIVE_IDLE_DAYS`` is unset."""
+
+    archive_idle_days: Optional[float] = None
+    archive_interval_seconds: float = 3600.0
+    archive_batch_size: int = 100
+
+
+class BatchSettings(LLMSettings):
+    """Batch jobs for :mod:`chat_core.batch_service`."""
+
+    batch_backend: Literal["openai", "local"] = "openai"
+    batch_local_dir: str = "./batches"
+    batch_completion_window: str = "24h"
+    batch_poll_interval_seconds: float = 60.0
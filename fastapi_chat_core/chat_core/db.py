@@ -0,0 +1,182 @@
+"""Engine factory shared by the chat demos.
+
+SQLite connections get WAL journaling and a busy timeout so readers do not
+block the writer and concurrent writers wait instead of failing with
+"database is locked". Server databases get a bounded, pre-pinged pool.
+"""
+
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import Engine, create_engine, event, text
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from chat_core.config import DatabaseSettings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def async_database_url(settings: DatabaseSettings) -> str:
+    """Return ``ASYNC_DATABASE_URL`` or derive it from ``DATABASE_URL``."""
+    if settings.async_database_url:
+        return settings.async_database_url
+    scheme, sep, rest = settings.database_url.partition("://")
+    if "+" in scheme:
+        return settings.database_url
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+def _is_memory_sqlite(url: URL) -> bool:
+    return url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+
+
+def sqlite_pragmas(settings: DatabaseSettings, url: URL) -> Dict[str, Any]:
+    """PRAGMA values applied to every new SQLite connection, in order."""
+    pragmas: Dict[str, Any] = {}
+    if not _is_memory_sqlite(url):
+        pragmas["journal_mode"] = settings.sqlite_journal_mode
+        pragmas["mmap_size"] = settings.sqlite_mmap_size
+    pragmas["synchronous"] = settings.sqlite_synchronous
+    pragmas["busy_timeout"] = settings.sqlite_busy_timeout_ms
+    # A negative cache_size is a size in KiB rather than a page count.
+    pragmas["cache_size"] = -settings.sqlite_cache_size_kib
+    return pragmas
+
+
+def _install_sqlite_pragmas(engine: Engine, pragmas: Dict[str, Any]) -> None:
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def _postgres_connect_args(url: URL, settings: DatabaseSettings) -> Dict[str, Any]:
+    if settings.db_statement_timeout_ms is None:
+        return {}
+    if url.get_driver_name() == "asyncpg":
+        return {"server_settings": {"statement_timeout": str(settings.db_statement_timeout_ms)}}
+    return {"options": f"-c statement_timeout={settings.db_statement_timeout_ms}"}
+
+
+def _engine_kwargs(url: URL, settings: DatabaseSettings, is_async: bool) -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {"pool_pre_ping": settings.db_pool_pre_ping}
+    connect_args: Dict[str, Any] = {}
+    backend = url.get_backend_name()
+
+    if backend == "sqlite":
+        if not is_async:
+            connect_args["check_same_thread"] = False
+        if _is_memory_sqlite(url):
+            # Leave SQLAlchemy's single-connection pools in place: every new
+            # connection to ``:memory:`` would otherwise be a fresh, empty database.
+            kwargs["connect_args"] = connect_args
+            return kwargs
+        kwargs["poolclass"] = AsyncAdaptedQueuePool if is_async else QueuePool
+    elif backend == "postgresql":
+        # LIFO reuse keeps a small hot set of connections and lets the rest
+        # idle out server-side instead of cycling through the whole pool.
+        kwargs["pool_use_lifo"] = True
+        connect_args.update(_postgres_connect_args(url, settings))
+
+    kwargs.update(
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        connect_args=connect_args,
+    )
+    return kwargs
+
+
+def create_db_engine(settings: DatabaseSettings, url: Optional[str] = None) -> Engine:
+    """Create the sync engine for ``url`` (default ``DATABASE_URL``)."""
+    parsed = make_url(url or settings.database_url)
+    engine = create_engine(parsed, future=True, **_engine_kwargs(parsed, settings, is_async=False))
+    if parsed.get_backend_name() == "sqlite":
+        _install_sqlite_pragmas(engine, sqlite_pragmas(settings, parsed))
+    return engine
+
+
+def create_async_db_engine(settings: DatabaseSettings, url: Optional[str] = None) -> AsyncEngine:
+    """Create the async engine for ``url`` (default derived by :func:`async_database_url`)."""
+    parsed = make_url(url or async_database_url(settings))
+    engine = create_async_engine(parsed, future=True, **_engine_kwargs(parsed, settings, is_async=True))
+    if parsed.get_backend_name() == "sqlite":
+        _install_sqlite_pragmas(engine.sync_engine, sqlite_pragmas(settings, parsed))
+    return engine
+
+
+# Identifies the schema lock among the database's advisory locks ("chat" in ASCII).
+SCHEMA_LOCK_KEY = 0x63686174
+
+
+@contextmanager
+def schema_lock(engine: Engine) -> Iterator[None]:
+    """Hold a cross-process lock while creating or upgrading the schema.
+
+    Every worker of a multi-process server migrates on startup, so without
+    it concurrent ``CREATE TABLE``/``ALTER TABLE`` statements race. PostgreSQL
+    uses a session-level advisory lock; file-backed SQLite an exclusive
+    ``flock`` on ``<database>.lock``. In-memory SQLite is private to one
+    process and needs no lock.
+    """
+    url = engine.url
+    backend = url.get_backend_name()
+    if backend == "postgresql":
+        with engine.connect() as connection:
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+            try:
+                yield
+            finally:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        return
+    if backend != "sqlite" or _is_memory_sqlite(url) or fcntl is None:
+        yield
+        return
+    with open(f"{url.database}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def warm_pool(engine: Engine, connections: int) -> None:
+    """Open ``connections`` pooled connections now so early requests skip connection setup."""
+    opened: List[Any] = []
+    try:
+        for _ in range(connections):
+            connection = engine.connect()
+            opened.append(connection)
+            connection.execute(text("SELECT 1"))
+    finally:
+        for connection in opened:
+            connection.close()
+
+
+async def warm_async_pool(engine: AsyncEngine, connections: int) -> None:
+    """Async counterpart of :func:`warm_pool`."""
+    opened: List[Any] = []
+    try:
+        for _ in range(connections):
+            connection = await engine.connect()
+            opened.append(connection)
+            await connection.execute(text("SELECT 1"))
+    finally:
+        for connection in opened:
+            await connection.close()
@@ -0,0 +1,235 @@
+"""Group commit: one transaction for the writes of many concurrent requests.
+
+Each request hands the writer a function that adds its rows to (or issues
+its updates through) a session, and waits on a future for the commit. A
+background writer applies queued functions in submission order. Every
+write queued while the previous batch was committing joins the next one, up
+to ``max_batch``; ``max_delay_seconds`` optionally waits that long after the
+first write for more. Under load one commit, and one fsync, then covers many
+requests. Because callers wait for the acknowledgement, a reply is never
+returned before its rows are durable, and nothing is pending at shutdown
+once in-flight requests have finished.
+
+If a batch fails, its writes are retried one transaction each, so a single
+bad write fails only its own request.
+"""
+
+import asyncio
+import contextlib
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from chat_core.metrics import WRITE_BATCH_SIZE
+
+Apply = Callable[[Session], None]
+
+# Queued by ``GroupCommitWriter.close`` behind the writes still to commit.
+_STOP: Any = object()
+
+
+def pending_updates(instance: Any) -> Dict[str, Any]:
+    """Column values changed on ``instance`` since it was loaded.
+
+    Lets a request replay changes made to a row in its own session as an
+    ``UPDATE`` inside the writer's batch instead of committing them itself.
+    """
+    state = inspect(instance)
+    columns = {prop.key for prop in state.mapper.column_attrs}
+    return {attr.key: attr.value for attr in state.attrs if attr.key in columns and attr.history.has_changes()}
+
+
+def _apply_all(session: Session, applies: List[Apply]) -> None:
+    for apply in applies:
+        apply(session)
+
+
+class GroupCommitWriter:
+    """Thread-based group commit for sync sessions.
+
+    ``session_factory`` should create sessions with ``expire_on_commit=False``
+    so rows passed in keep their loaded attributes (ids, defaults) afterwards.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        max_batch: int = 256,
+        max_delay_seconds: float = 0.0,
+    ) -> None:
+        self._session_factory = session_factory
+        self._max_batch = max_batch
+        self._max_delay = max_delay_seconds
+        self._queue: "queue.Queue[Tuple[Apply, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, apply: Apply) -> "Future[None]":
+        """Queue ``apply`` and return a future that resolves once it has been committed."""
+        self._ensure_started()
+        future: "Future[None]" = Future()
+        self._queue.put((apply, future))
+        return future
+
+    def write(self, apply: Apply) -> None:
+        """Queue ``apply`` and block until it has been committed."""
+        self.submit(apply).result()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Commit the writes already queued, then stop the writer thread; a later write starts a new one."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self._max_delay
+            while len(batch) < self._max_batch:
+                try:
+                    # Everything already queued joins the batch without waiting.
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                if item is _STOP:
+                    # Commit this batch first; the next loop sees the stop again.
+                    self._queue.put(_STOP)
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch: List[Tuple[Apply, Future]]) -> None:
+        try:
+            self._transaction([apply for apply, _ in batch])
+        except Exception as exc:
+            if len(batch) == 1:
+                batch[0][1].set_exception(exc)
+                return
+            for item in batch:
+                self._commit([item])
+            return
+        WRITE_BATCH_SIZE.observe(len(batch))
+        for _, future in batch:
+            future.set_result(None)
+
+    def _transaction(self, applies: List[Apply]) -> None:
+        with self._session_factory() as session:
+            _apply_all(session, applies)
+            session.commit()
+
+
+class AsyncGroupCommitWriter:
+    """Group commit on the event loop for :class:`AsyncSession` factories.
+
+    ``apply`` functions receive the sync :class:`Session` behind the async
+    one (via ``run_sync``), so the same functions work with both writers.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        max_batch: int = 256,
+        max_delay_seconds: float = 0.0,
+    ) -> None:
+        self._session_factory = session_factory
+        self._max_batch = max_batch
+        self._max_delay = max_delay_seconds
+        self._queue: Optional["asyncio.Queue[Tuple[Apply, asyncio.Future]]"] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def write(self, apply: Apply) -> None:
+        """Queue ``apply`` and wait until it has been committed."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            # Bound to the loop that first writes; a new loop (e.g. a new test client) gets a new writer task.
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run(self._queue))
+        future: asyncio.Future = loop.create_future()
+        assert self._queue is not None
+        self._queue.put_nowait((apply, future))
+        # Shielded so a cancelled request still lets its queued write complete with the batch.
+        await asyncio.shield(future)
+
+    async def aclose(self) -> None:
+        """Stop the writer task; call once in-flight requests have finished, e.g. at shutdown."""
+        task, self._task = self._task, None
+        if task is None or task.done() or self._loop is not asyncio.get_running_loop():
+            return
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    async def _run(self, pending: "asyncio.Queue[Tuple[Apply, asyncio.Future]]") -> None:
+        while True:
+            batch = [await pending.get()]
+            deadline = time.monotonic() + self._max_delay
+            while len(batch) < self._max_batch:
+                try:
+                    batch.append(pending.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(pending.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._commit(batch)
+
+    async def _commit(self, batch: List[Tuple[Apply, asyncio.Future]]) -> None:
+        try:
+            await self._transaction([apply for apply, _ in batch])
+        except Exception as exc:
+            if len(batch) == 1:
+                _set(batch[0][1], exc)
+                return
+            for item in batch:
+                await self._commit([item])
+            return
+        WRITE_BATCH_SIZE.observe(len(batch))
+        for _, future in batch:
+            _set(future, None)
+
+    async def _transaction(self, applies: List[Apply]) -> None:
+        async with self._session_factory() as session:
+            await session.run_sync(_apply_all, applies)
+            await session.commit()
+
+
+def _set(future: "asyncio.Future[Any]", result: Any) -> None:
+    if future.done():
+        return
+    if isinstance(result, BaseException):
+        future.set_exception(result)
+    else:
+        future.set_result(result)
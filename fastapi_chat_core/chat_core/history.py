@@ -0,0 +1,126 @@
+"""Token-aware selection of the conversation history that is replayed to the model.
+
+Messages and chats are the demos' ORM rows (see :mod:`chat_core.models`);
+only their ``role``, ``content`` and ``created_at`` attributes, and the
+chat's ``summary_until``, are read.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+
+from chat_core.config import ChatSettings
+
+# Framing overhead OpenAI charges per chat message on top of its content tokens.
+_MESSAGE_OVERHEAD_TOKENS = 4
+# Rough characters-per-token ratio used when tiktoken is unavailable.
+_CHARS_PER_TOKEN = 4
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation below in a few sentences. Keep facts, decisions, names "
+    "and open questions the assistant needs to continue the chat. Reply with the summary only."
+)
+
+
+@lru_cache
+def _encoding_for(model: str) -> Optional[Any]:
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:  # pragma: no cover - encoding files could not be fetched
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    encoding = _encoding_for(model)
+    if encoding is None:
+        return max(1, len(text) // _CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+
+def message_tokens(content: str, model: str) -> int:
+    return count_tokens(content, model) + _MESSAGE_OVERHEAD_TOKENS
+
+
+@dataclass
+class HistoryWindow:
+    """Chronological split of the loaded history into replayed and dropped messages.
+
+    ``tokens`` is the estimated prompt size: the kept messages plus the new
+    turn and the summary.
+    """
+
+    kept: List[Any]
+    dropped: List[Any]
+    tokens: int = 0
+
+
+def select_window(
+    history: Sequence[Any],
+    content: str,
+    summary: Optional[str],
+    settings: ChatSettings,
+) -> HistoryWindow:
+    """Keep the newest messages that fit the token budget.
+
+    The new user ``content`` and the rolling ``summary`` are charged against
+    ``HISTORY_MAX_TOKENS`` first. The last ``HISTORY_MIN_MESSAGES`` messages
+    are always kept, even when they alone exceed the budget.
+    """
+    model = settings.openai_model
+    used = message_tokens(content, model)
+    if summary:
+        used += message_tokens(summary, model)
+
+    start = len(history)
+    for index in range(len(history) - 1, -1, -1):
+        cost = message_tokens(history[index].content, model)
+        kept_count = len(history) - start
+        if kept_count >= settings.history_min_messages and used + cost > settings.history_max_tokens:
+            break
+        used += cost
+        start = index
+
+    return HistoryWindow(kept=list(history[start:]), dropped=list(history[:start]), tokens=used)
+
+
+def unsummarized(messages: Sequence[Any], chat: Any) -> List[Any]:
+    """Return the dropped messages that are not yet folded into the chat summary."""
+    if chat.summary_until is None:
+        return list(messages)
+    return [message for message in messages if message.created_at > chat.summary_until]
+
+
+def summary_request(previous_summary: Optional[str], messages: Sequence[Any]) -> List[Dict[str, str]]:
+    transcript = "\n".join(f"{message.role}: {message.content}" for message in messages)
+    if previous_summary:
+        transcript = f"Existing summary:\n{previous_summary}\n\nNew messages:\n{transcript}"
+    return [
+        {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+        {"role": "user", "content": transcript},
+    ]
+
+
+def build_payload(
+    history: Sequence[Any],
+    content: str,
+    summary: Optional[str] = None,
+) -> List[Dict[str, str]]:
+    history_payload: List[Dict[str, str]] = []
+    if summary:
+        history_payload.append(
+            {"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+    history_payload.extend(
+        {"role": message.role, "content": message.content}
+        for message in history
+    )
+    history_payload.append({"role": "user", "content": content})
+    return history_payload
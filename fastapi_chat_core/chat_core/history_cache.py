@@ -0,0 +1,240 @@
+"""Per-chat cache of chat rows and recent messages, consulted before the database.
+
+Entries hold plain column values, so they work for any of the demos' ORM
+classes (see :mod:`chat_core.models`).
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from chat_core.config import ChatSettings
+
+
+@dataclass
+class CachedMessage:
+    id: Any
+    role: str
+    content: str
+    created_at: datetime
+
+    @classmethod
+    def from_model(cls, message: Any) -> "CachedMessage":
+        return cls(id=message.id, role=message.role, content=message.content, created_at=message.created_at)
+
+    def to_model(self, message_class: Any, chat_id: str) -> Any:
+        """Build a detached, read-only ``message_class`` row for payload construction."""
+        return message_class(
+            id=self.id, chat_id=chat_id, role=self.role, content=self.content, created_at=self.created_at)
+
+
+@dataclass
+class CachedChat:
+    """Column values of a ``Chat`` row plus its newest messages.
+
+    ``messages`` is ``None`` when the history has not been loaded yet, which
+    is different from a chat that is known to be empty.
+    """
+
+    columns: Dict[str, Any]
+    messages: Optional[List[CachedMessage]] = None
+
+    @staticmethod
+    def columns_of(chat: Any) -> Dict[str, Any]:
+        return {column.key: getattr(chat, column.key) for column in type(chat).__table__.columns}
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    size: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+class HistoryCache(ABC):
+    """Backend-agnostic history cache.
+
+    Backends only implement ``_load``/``_store``/``_delete``; hit and miss
+    accounting and the append-through logic live here so every backend
+    behaves the same.
+    """
+
+    def __init__(self) -> None:
+        self._stats = CacheStats()
+        self._stats_lock = threading.Lock()
+
+    @abstractmethod
+    def _load(self, chat_id: str) -> Optional[CachedChat]:
+        ...
+
+    @abstractmethod
+    def _store(self, chat_id: str, entry: CachedChat) -> None:
+        ...
+
+    @abstractmethod
+    def _delete(self, chat_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def _size(self) -> int:
+        ...
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            setattr(self._stats, name, getattr(self._stats, name) + amount)
+
+    def get(self, chat_id: str) -> Optional[CachedChat]:
+        entry = self._load(chat_id)
+        self._count("hits" if entry is not None else "misses")
+        return entry
+
+    def peek(self, chat_id: str) -> Optional[CachedChat]:
+        """Like :meth:`get`, but left out of the hit and miss counts; for estimates made before a turn."""
+        return self._load(chat_id)
+
+    def put(self, chat_id: str, entry: CachedChat) -> None:
+        self._store(chat_id, entry)
+
+    def append(
+        self,
+        chat: Any,
+        messages: Sequence[Any],
+        max_messages: int,
+    ) -> None:
+        """Write-through after a commit: refresh the chat columns and append ``messages``."""
+        chat_id = str(chat.id)
+        entry = self._load(chat_id)
+        if entry is None:
+            return
+        cached_messages = entry.messages
+        if cached_messages is not None:
+            # Build a new list so readers holding the previous entry never see it change.
+            cached_messages = [*cached_messages, *(CachedMessage.from_model(message) for message in messages)]
+            cached_messages = cached_messages[-max_messages:]
+        self._store(chat_id, CachedChat(columns=CachedChat.columns_of(chat), messages=cached_messages))
+
+    def invalidate(self, chat_id: str) -> None:
+        if self._delete(chat_id):
+            self._count("invalidations")
+
+    def stats(self) -> Dict[str, int]:
+        size = self._size()
+        with self._stats_lock:
+            self._stats.size = size
+            return self._stats.as_dict()
+
+
+class InMemoryHistoryCache(HistoryCache):
+    """Process-local LRU cache with a per-entry time-to-live."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0) -> None:
+        super().__init__()
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, CachedChat]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, chat_id: str) -> Optional[CachedChat]:
+        with self._lock:
+            item = self._entries.get(chat_id)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at < time.monotonic():
+                del self._entries[chat_id]
+                self._count("evictions")
+                return None
+            self._entries.move_to_end(chat_id)
+            return entry
+
+    def _store(self, chat_id: str, entry: CachedChat) -> None:
+        with self._lock:
+            self._entries[chat_id] = (time.monotonic() + self._ttl_seconds, entry)
+            self._entries.move_to_end(chat_id)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._count("evictions")
+
+    def _delete(self, chat_id: str) -> bool:
+        with self._lock:
+            return self._entries.pop(chat_id, None) is not None
+
+    def _size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _decode(value: Dict[str, Any]) -> Any:
+    if "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    return value
+
+
+class RedisHistoryCache(HistoryCache):
+    """Shared cache for multi-process deployments.
+
+    ``client`` is anything with Redis' ``get``/``set(ex=...)``/``delete``/
+    ``scan_iter`` methods; TTL expiry and eviction are left to the server.
+    """
+
+    def __init__(self, client: Any, ttl_seconds: float = 300.0, prefix: str = "chat-history:") -> None:
+        super().__init__()
+        self._client = client
+        self._ttl_seconds = max(1, int(ttl_seconds))
+        self._prefix = prefix
+
+    def _key(self, chat_id: str) -> str:
+        return f"{self._prefix}{chat_id}"
+
+    def _load(self, chat_id: str) -> Optional[CachedChat]:
+        raw = self._client.get(self._key(chat_id))
+        if raw is None:
+            return None
+        data = json.loads(raw, object_hook=_decode)
+        messages = data["messages"]
+        return CachedChat(
+            columns=data["columns"],
+            messages=None if messages is None else [CachedMessage(**message) for message in messages],
+        )
+
+    def _store(self, chat_id: str, entry: CachedChat) -> None:
+        self._client.set(self._key(chat_id), json.dumps(asdict(entry), default=_encode), ex=self._ttl_seconds)
+
+    def _delete(self, chat_id: str) -> bool:
+        return bool(self._client.delete(self._key(chat_id)))
+
+    def _size(self) -> int:
+        return sum(1 for _ in self._client.scan_iter(match=f"{self._prefix}*"))
+
+
+def build_history_cache(settings: ChatSettings) -> Optional[HistoryCache]:
+    """The cache ``HISTORY_CACHE_BACKEND`` selects, or ``None`` when it is ``none``."""
+    if settings.history_cache_backend == "memory":
+        return InMemoryHistoryCache(
+            max_entries=settings.history_cache_max_chats,
+            ttl_seconds=settings.history_cache_ttl_seconds,
+        )
+    if settings.history_cache_backend == "redis":
+        import redis  # optional dependency, only needed for this backend
+
+        client = redis.Redis.from_url(settings.history_cache_redis_url)
+        return RedisHistoryCache(client, ttl_seconds=settings.history_cache_ttl_seconds)
+    return None
@@ -0,0 +1,132 @@
+"""Shared, tuned ``httpx`` clients for upstream API calls.
+
+Left alone, each OpenAI SDK client builds its own ``httpx`` client with
+generic limits, and a client built per request pays a fresh TCP and TLS
+handshake every time. One client per process, with explicit pool limits,
+keep-alive expiry and timeouts, lets requests reuse warm connections, caps
+how many connections a burst can open, and fails a request that waited
+``pool`` seconds for a free connection instead of queueing it indefinitely.
+
+The transport is instrumented: requests, connections opened, connection
+setup time and the pool's active/idle connections are exported through
+:mod:`chat_core.metrics`, so ``connections_opened / requests`` shows how
+well connections are being reused.
+"""
+
+import time
+from typing import Any, Callable, Optional
+
+import httpx
+
+from chat_core.config import HttpClientSettings
+from chat_core.metrics import (
+    HTTP_CLIENT_CONNECT_SECONDS,
+    HTTP_CLIENT_CONNECTIONS_OPENED,
+    HTTP_CLIENT_POOL_CONNECTIONS,
+    HTTP_CLIENT_REQUESTS,
+)
+
+
+def client_limits(settings: HttpClientSettings) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.openai_http_max_connections,
+        max_keepalive_connections=settings.openai_http_max_keepalive_connections,
+        keepalive_expiry=settings.openai_http_keepalive_expiry_seconds,
+    )
+
+
+def client_timeout(settings: HttpClientSettings, read: Optional[float] = None) -> httpx.Timeout:
+    """Timeouts from ``settings``; ``read`` overrides the read timeout, e.g. for a per-call deadline."""
+    return httpx.Timeout(
+        connect=settings.openai_http_connect_timeout_seconds,
+        read=settings.openai_http_read_timeout_seconds if read is None else read,
+        write=settings.openai_http_write_timeout_seconds,
+        pool=settings.openai_http_pool_timeout_seconds,
+    )
+
+
+class _ConnectTrace:
+    """``httpcore`` trace callback that times the connection a request had to open, if any."""
+
+    def __init__(self, client: str) -> None:
+        self._client = client
+        self._started: Optional[float] = None
+
+    def __call__(self, event: str, info: Any) -> None:
+        if event == "connection.connect_tcp.started":
+            self._started = time.perf_counter()
+        elif self._started is not None and event.startswith(("http11.", "http2.")):
+            # The first protocol event follows the TCP connect and TLS handshake.
+            HTTP_CLIENT_CONNECT_SECONDS.observe(time.perf_counter() - self._started, client=self._client)
+            HTTP_CLIENT_CONNECTIONS_OPENED.inc(client=self._client)
+            self._started = None
+
+    async def atrace(self, event: str, info: Any) -> None:
+        self(event, info)
+
+
+def _pool_counter(transport: Any, active: bool) -> Callable[[], float]:
+    def count() -> float:
+        pool = getattr(transport, "_pool", None)
+        if pool is None:
+            return 0.0
+        return float(sum(1 for connection in pool.connections if connection.is_idle() != active))
+
+    return count
+
+
+def _register_pool(name: str, transport: Any) -> None:
+    HTTP_CLIENT_POOL_CONNECTIONS.set_function(_pool_counter(transport, active=True), client=name, state="active")
+    HTTP_CLIENT_POOL_CONNECTIONS.set_function(_pool_counter(transport, active=False), client=name, state="idle")
+
+
+class InstrumentedTransport(httpx.BaseTransport):
+    def __init__(self, transport: httpx.HTTPTransport, name: str) -> None:
+        self._transport = transport
+        self._name = name
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        HTTP_CLIENT_REQUESTS.inc(client=self._name)
+        request.extensions["trace"] = _ConnectTrace(self._name)
+        return self._transport.handle_request(request)
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncInstrumentedTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncHTTPTransport, name: str) -> None:
+        self._transport = transport
+        self._name = name
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        HTTP_CLIENT_REQUESTS.inc(client=self._name)
+        request.extensions["trace"] = _ConnectTrace(self._name).atrace
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def build_http_client(settings: HttpClientSettings, name: str = "openai", verify: Any = True) -> httpx.Client:
+    """A pooled client for the sync OpenAI SDK (``OpenAI(http_client=...)``); closing the SDK client closes it."""
+    transport = httpx.HTTPTransport(limits=client_limits(settings), http2=settings.openai_http2, verify=verify)
+    _register_pool(name, transport)
+    return httpx.Client(
+        transport=InstrumentedTransport(transport, name),
+        timeout=client_timeout(settings),
+        follow_redirects=True,
+    )
+
+
+def build_async_http_client(
+    settings: HttpClientSettings, name: str = "openai_async", verify: Any = True
+) -> httpx.AsyncClient:
+    """Async counterpart of :func:`build_http_client`, for ``AsyncOpenAI(http_client=...)``."""
+    transport = httpx.AsyncHTTPTransport(limits=client_limits(settings), http2=settings.openai_http2, verify=verify)
+    _register_pool(name, transport)
+    return httpx.AsyncClient(
+        transport=AsyncInstrumentedTransport(transport, name),
+        timeout=client_timeout(settings),
+        follow_redirects=True,
+    )
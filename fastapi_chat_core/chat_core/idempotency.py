@@ -0,0 +1,84 @@
+"""Replay the stored result of a request retried with the same ``Idempotency-Key``."""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class IdempotencyKeyMismatchError(Exception):
+    """Raised when an idempotency key is reused for a different request."""
+
+
+def fingerprint(value: Any) -> str:
+    """Stable digest of a JSON-serializable request body."""
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """Process-local LRU of ``key -> (request fingerprint, result)`` with a time-to-live."""
+
+    def __init__(self, max_entries: int = 10_000, ttl_seconds: float = 86_400.0) -> None:
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key: Hashable, request_fingerprint: str) -> Optional[Any]:
+        """Return the stored result for ``key``, or ``None`` if the key is new, expired or still pending."""
+        with self._lock:
+            item = self._live_entry(key)
+        return self._checked(item, request_fingerprint)
+
+    def reserve(self, key: Hashable, request_fingerprint: str) -> Optional[Any]:
+        """Like :meth:`lookup`, but claim a new ``key`` for this request before it runs.
+
+        The claim records the request fingerprint with no result yet, so a
+        concurrent request reusing the key with a different body is rejected
+        up front rather than joining this one. Follow up with :meth:`save`, or
+        :meth:`release` if the request fails.
+        """
+        with self._lock:
+            item = self._live_entry(key)
+            if item is None:
+                self._store(key, request_fingerprint, None)
+        return self._checked(item, request_fingerprint)
+
+    def release(self, key: Hashable, request_fingerprint: str) -> None:
+        """Drop this request's pending claim on ``key`` so the key can be used again."""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[1] == request_fingerprint and item[2] is None:
+                del self._entries[key]
+
+    def save(self, key: Hashable, request_fingerprint: str, result: Any) -> None:
+        """Store ``result``; an existing, live entry for ``key`` is kept and checked instead."""
+        if self.lookup(key, request_fingerprint) is not None:
+            return
+        with self._lock:
+            self._store(key, request_fingerprint, result)
+
+    def _live_entry(self, key: Hashable) -> Optional[Tuple[float, str, Any]]:
+        item = self._entries.get(key)
+        if item is not None and item[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        return item
+
+    def _store(self, key: Hashable, request_fingerprint: str, result: Any) -> None:
+        self._entries[key] = (time.monotonic() + self._ttl_seconds, request_fingerprint, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _checked(item: Optional[Tuple[float, str, Any]], request_fingerprint: str) -> Optional[Any]:
+        if item is None:
+            return None
+        _, stored_fingerprint, result = item
+        if stored_fingerprint != request_fingerprint:
+            raise IdempotencyKeyMismatchError(
+                "This Idempotency-Key was already used with a different request body.")
+        return result
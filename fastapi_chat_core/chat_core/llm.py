@@ -0,0 +1,824 @@
+"""Pluggable LLM backends for chat turns.
+
+A chat turn needs two things from a model API: a whole reply, or a stream
+of reply text. :class:`LLMBackend` (and :class:`AsyncLLMBackend`) is that
+contract, and the demos' chat services are written against it alone. Two
+OpenAI APIs implement it:
+
+* :class:`ChatCompletionsBackend`, ``/v1/chat/completions``: stateless, the
+  whole history is sent every turn;
+* :class:`ResponsesBackend`, ``/v1/responses``: can continue server-side
+  state from ``previous_response_id``, so a turn sends only the new message.
+
+Both run the same client-side machinery around the API call: per-call
+deadlines, retries of transient errors with jittered backoff, failover to
+``OPENAI_FALLBACK_MODEL`` behind a circuit breaker, and optional hedging
+(see :mod:`chat_core.resilience`). Latency and token counts are labelled with
+the backend's name, so a deployment serving both backends from one process
+and one connection pool can compare them like for like.
+:func:`build_backends` builds that set from :class:`~chat_core.config.LLMSettings`;
+``LLM_BACKEND`` picks the default and, with ``LLM_BACKEND_PER_REQUEST``, a
+request can pick another with the ``X-LLM-Backend`` header.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import Context, copy_context
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+import httpx
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    AsyncOpenAI,
+    BadRequestError,
+    InternalServerError,
+    NotFoundError,
+    OpenAI,
+    OpenAIError,
+    RateLimitError,
+)
+
+from chat_core.config import LLMSettings
+from chat_core.http import build_async_http_client, build_http_client, client_timeout
+from chat_core.metrics import LLM_FIRST_TOKEN_SECONDS, LLM_REQUEST_SECONDS, record_usage, span
+from chat_core.resilience import ModelRouter, RouterConfig, backoff_delay
+
+logger = logging.getLogger(__name__)
+
+CHAT_COMPLETIONS = "chat_completions"
+RESPONSES = "responses"
+BACKEND_HEADER = "X-LLM-Backend"
+
+Messages = List[Dict[str, str]]
+ResponseIdCallback = Callable[[str], None]
+T = TypeVar("T")
+B = TypeVar("B")
+
+# Failures of one model call: recorded against the model, then retried or failed over. Transport
+# errors are normally wrapped as ``APIConnectionError``, but custom clients can let httpx's through.
+_UPSTREAM_ERRORS = (OpenAIError, httpx.TransportError)
+# Transient failures that are retried against the same model before failing over.
+_RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, InternalServerError, RateLimitError, httpx.TransportError)
+
+
+class PreviousResponseNotFoundError(RuntimeError):
+    """Raised when the API rejects a ``previous_response_id`` (expired, deleted or unknown)."""
+
+
+class UnknownBackendError(ValueError):
+    """Raised when a request or setting names a backend that is not configured."""
+
+
+@dataclass(frozen=True)
+class Generation:
+    """A whole reply; ``response_id`` is set by backends that can continue from it."""
+
+    text: str
+    response_id: Optional[str] = None
+
+
+class LLMBackend(Protocol):
+    """A blocking model API that chat turns are sent to."""
+
+    name: str
+    # Whether ``previous_response_id`` is honoured; other backends ignore it.
+    supports_chaining: bool
+
+    def generate(self, messages: Messages, previous_response_id: Optional[str] = None) -> Generation:
+        ...
+
+    def stream(
+        self,
+        messages: Messages,
+        previous_response_id: Optional[str] = None,
+        on_response_id: Optional[ResponseIdCallback] = None,
+    ) -> Iterator[str]:
+        """Open a streamed reply and return an iterator over its text deltas.
+
+        The upstream request is issued eagerly so model and API errors
+        surface here, before the caller has started its own response.
+        ``on_response_id`` is called with the reply's id once it is known.
+        """
+
+    def close(self) -> None:
+        ...
+
+
+class AsyncLLMBackend(Protocol):
+    """Non-blocking counterpart of :class:`LLMBackend`."""
+
+    name: str
+    supports_chaining: bool
+
+    async def generate(self, messages: Messages, previous_response_id: Optional[str] = None) -> Generation:
+        ...
+
+    async def stream(
+        self,
+        messages: Messages,
+        previous_response_id: Optional[str] = None,
+        on_response_id: Optional[ResponseIdCallback] = None,
+    ) -> AsyncIterator[str]:
+        ...
+
+    async def close(self) -> None:
+        ...
+
+
+def chat_completions_request(
+    model_name: str, messages: Messages, temperature: Optional[float], max_tokens: int
+) -> Dict[str, Any]:
+    """Chat Completions request body, shared by live calls and batch jobs."""
+    body: Dict[str, Any] = {"model": model_name, "messages": messages, "max_tokens": max_tokens}
+    if temperature is not None:
+        body["temperature"] = temperature
+    return body
+
+
+def responses_request(
+    model_name: str,
+    messages: Messages,
+    max_output_tokens: int,
+    temperature: Optional[float] = None,
+    previous_response_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Responses request body, shared by live calls and batch jobs."""
+    body: Dict[str, Any] = {
+        "model": model_name,
+        "input": [_response_input(message) for message in messages],
+        "max_output_tokens": max_output_tokens,
+    }
+    if temperature is not None:
+        body["temperature"] = temperature
+    if previous_response_id:
+        body["previous_response_id"] = previous_response_id
+        # Server-side state grows every turn; let the API drop the oldest items.
+        body["truncation"] = "auto"
+    return body
+
+
+def _response_input(message: Dict[str, str]) -> Dict[str, Any]:
+    role = message.get("role", "user")
+    content_type = "output_text" if role == "assistant" else "input_text"
+    return {"role": role, "content": [{"type": content_type, "text": message.get("content", "")}]}
+
+
+@dataclass(frozen=True)
+class BackendOptions:
+    """Request parameters and retry policy shared by every backend of a deployment."""
+
+    temperature: Optional[float] = None
+    max_output_tokens: int = 512
+    # Per-call timeout passed to the SDK: seconds or an ``httpx.Timeout``.
+    timeout: Any = None
+    max_retries: int = 2
+    retry_base_delay: float = 0.5
+    retry_max_delay: float = 8.0
+    hedge_after: Optional[float] = None
+    hedge_max_concurrency: int = 16
+
+    @classmethod
+    def from_settings(cls, settings: LLMSettings) -> "BackendOptions":
+        return cls(
+            temperature=settings.openai_temperature,
+            max_output_tokens=settings.openai_max_output_tokens,
+            # Per-call read deadline; connect and pool waits come from the shared client's settings.
+            timeout=client_timeout(settings, read=settings.openai_timeout_seconds),
+            max_retries=settings.openai_max_retries,
+            retry_base_delay=settings.openai_retry_base_delay_seconds,
+            retry_max_delay=settings.openai_retry_max_delay_seconds,
+            hedge_after=settings.openai_hedge_after_seconds,
+            hedge_max_concurrency=settings.openai_hedge_max_concurrency,
+        )
+
+
+def build_router(settings: LLMSettings) -> ModelRouter:
+    """Health and latency tracking for ``OPENAI_MODEL`` and ``OPENAI_FALLBACK_MODEL``."""
+    models = [settings.openai_model]
+    if settings.openai_fallback_model:
+        models.append(settings.openai_fallback_model)
+    return ModelRouter(models, RouterConfig(
+        window=settings.router_window,
+        error_rate_threshold=settings.circuit_breaker_error_rate,
+        min_requests=settings.circuit_breaker_min_requests,
+        cooldown_seconds=settings.circuit_breaker_cooldown_seconds,
+        latency_slo_seconds=settings.router_latency_slo_seconds,
+    ))
+
+
+class _OpenAIBackend:
+    """Configuration, error mapping and metrics shared by every OpenAI backend.
+
+    Subclasses combine one API mixin (what to send and how to read the
+    reply) with one execution mixin (sync or async retries, failover and
+    hedging).
+    """
+
+    name = ""
+    supports_chaining = False
+    _stream_kwargs: Dict[str, Any] = {}
+
+    def __init__(self, client: Any, router: ModelRouter, options: Optional[BackendOptions] = None) -> None:
+        self._client = client
+        self._router = router
+        self._options = options or BackendOptions()
+
+    @property
+    def client(self) -> Any:
+        """The SDK client, shared with the deployment's other backends."""
+        return self._client
+
+    @property
+    def model(self) -> str:
+        """The preferred model; failover may answer with another."""
+        return self._router.models[0]
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        return self._router.snapshot()
+
+    # API-specific parts, supplied by the API mixins.
+
+    def _request(
+        self, model_name: str, messages: Messages, previous_response_id: Optional[str]
+    ) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def _create(self, **kwargs: Any) -> Any:
+        """The SDK call; its result is awaited by the async backends."""
+        raise NotImplementedError
+
+    def _extract_text(self, response: Any) -> str:
+        raise NotImplementedError
+
+    def _response_id(self, response: Any) -> Optional[str]:
+        return None
+
+    def _extract_delta(self, event: Any, model_name: str, on_response_id: Optional[ResponseIdCallback]) -> str:
+        raise NotImplementedError
+
+    def _chain_error(self, exc: Exception, previous_response_id: Optional[str]) -> bool:
+        """Whether ``exc`` rejects ``previous_response_id`` rather than the request or the model."""
+        return False
+
+    # Shared.
+
+    def _chain_from(self, previous_response_id: Optional[str]) -> Optional[str]:
+        return previous_response_id if self.supports_chaining else None
+
+    def _call_kwargs(
+        self, model_name: str, messages: Messages, previous_response_id: Optional[str], stream: bool
+    ) -> Dict[str, Any]:
+        kwargs = self._request(model_name, messages, previous_response_id)
+        if self._options.timeout is not None:
+            kwargs["timeout"] = self._options.timeout
+        if stream:
+            kwargs.update(stream=True, **self._stream_kwargs)
+        return kwargs
+
+    def _retry_delay(self, attempt: int) -> float:
+        return backoff_delay(attempt, self._options.retry_base_delay, self._options.retry_max_delay)
+
+    def _record(self, model_name: str, started: float, ok: bool, stream: bool) -> None:
+        elapsed = time.monotonic() - started
+        # Time to open a stream is not comparable with a full reply.
+        self._router.record(model_name, None if stream and ok else elapsed, ok=ok)
+        if not stream:
+            LLM_REQUEST_SECONDS.observe(elapsed, backend=self.name, model=model_name, outcome="ok" if ok else "error")
+
+    def _record_first_token(self, model_name: str, started: float) -> None:
+        LLM_FIRST_TOKEN_SECONDS.observe(time.monotonic() - started, backend=self.name, model=model_name)
+
+    @staticmethod
+    def _api_error(exc: OpenAIError) -> RuntimeError:
+        return RuntimeError(f"OpenAI API error ({exc.__class__.__name__}): {exc}")
+
+    @staticmethod
+    def _model_not_found_error(model_name: str) -> RuntimeError:
+        return RuntimeError(
+            "The configured OpenAI model \"{}\" could not be found or is inaccessible. "
+            "Update `OPENAI_MODEL` or set `OPENAI_FALLBACK_MODEL` to a model your API key can use."
+            .format(model_name)
+        )
+
+    def _failed(self, model_name: str, exc: Exception) -> RuntimeError:
+        """The error to report for ``model_name`` after ``exc``; a missing model leaves rotation."""
+        if isinstance(exc, NotFoundError):  # pragma: no cover - depends on external API state
+            self._router.disable(model_name)
+            return self._model_not_found_error(model_name)
+        if isinstance(exc, OpenAIError):
+            logger.warning("OpenAI model %s failed on %s: %s", model_name, self.name, exc)
+            return self._api_error(exc)
+        if isinstance(exc, httpx.TransportError):
+            logger.warning("OpenAI model %s could not be reached on %s: %s", model_name, self.name, exc)
+            return RuntimeError(f"OpenAI API connection error ({exc.__class__.__name__}): {exc}")
+        raise RuntimeError(f"Unexpected error while requesting an OpenAI reply: {exc}") from exc
+
+
+class _ChatCompletionsAPI(_OpenAIBackend):
+    name = CHAT_COMPLETIONS
+    _stream_kwargs = {"stream_options": {"include_usage": True}}
+
+    def _request(
+        self, model_name: str, messages: Messages, previous_response_id: Optional[str]
+    ) -> Dict[str, Any]:
+        return chat_completions_request(
+            model_name, messages, self._options.temperature, self._options.max_output_tokens)
+
+    def _create(self, **kwargs: Any) -> Any:
+        return self._client.chat.completions.create(**kwargs)
+
+    def _extract_text(self, response: Any) -> str:
+        message = response.choices[0].message
+        if message is None or message.content is None:
+            raise RuntimeError("Empty response from OpenAI chat completion.")
+        content: Union[str, List[Any]] = message.content
+        if isinstance(content, list):
+            text = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+        else:
+            text = content
+        text = text.strip()
+        if not text:
+            raise RuntimeError("OpenAI response did not contain text content.")
+        return text
+
+    def _extract_delta(self, event: Any, model_name: str, on_response_id: Optional[ResponseIdCallback]) -> str:
+        if not event.choices:
+            # With ``include_usage`` the final chunk carries the token counts and no choices.
+            record_usage(getattr(event, "model", None) or model_name, getattr(event, "usage", None), self.name)
+            return ""
+        delta = event.choices[0].delta
+        return (delta.content or "") if delta is not None else ""
+
+
+class _ResponsesAPI(_OpenAIBackend):
+    name = RESPONSES
+    supports_chaining = True
+
+    def _request(
+        self, model_name: str, messages: Messages, previous_response_id: Optional[str]
+    ) -> Dict[str, Any]:
+        return responses_request(model_name, messages, self._options.max_output_tokens,
+                                 self._options.temperature, previous_response_id)
+
+    def _create(self, **kwargs: Any) -> Any:
+        return self._client.responses.create(**kwargs)
+
+    def _response_id(self, response: Any) -> Optional[str]:
+        return response.id
+
+    def _chain_error(self, exc: Exception, previous_response_id: Optional[str]) -> bool:
+        return bool(previous_response_id) and (
+            isinstance(exc, NotFoundError)
+            or (isinstance(exc, BadRequestError) and getattr(exc, "param", None) == "previous_response_id")
+        )
+
+    def _extract_text(self, response: Any) -> str:
+        output_text = getattr(response, "output_text", None)
+        if isinstance(output_text, str) and output_text.strip():
+            return output_text.strip()
+
+        text_fragments: List[str] = []
+        for output in getattr(response, "output", []) or []:
+            for item in getattr(output, "content", []) or []:
+                text = getattr(item, "text", None)
+                if text:
+                    text_fragments.append(text)
+                elif isinstance(item, dict) and item.get("text"):
+                    text_fragments.append(item["text"])
+        text = "".join(text_fragments).strip()
+        if not text:
+            raise RuntimeError("OpenAI response did not include text content.")
+        return text
+
+    def _extract_delta(self, event: Any, model_name: str, on_response_id: Optional[ResponseIdCallback]) -> str:
+        event_type = getattr(event, "type", "")
+        if event_type == "response.created" and on_response_id is not None:
+            on_response_id(event.response.id)
+            return ""
+        if event_type == "response.completed":
+            record_usage(model_name, getattr(event.response, "usage", None), self.name)
+            return ""
+        if event_type == "response.output_text.delta":
+            return getattr(event, "delta", "") or ""
+        if event_type in ("error", "response.failed"):
+            raise RuntimeError(f"OpenAI stream error ({event_type}): {getattr(event, 'message', event)}")
+        return ""
+
+
+class _SyncBackend(_OpenAIBackend):
+    """Blocking execution: retries, failover and hedging around an ``OpenAI`` client."""
+
+    def close(self) -> None:
+        self._client.close()
+
+    def generate(self, messages: Messages, previous_response_id: Optional[str] = None) -> Generation:
+        previous_response_id = self._chain_from(previous_response_id)
+        plan = self._router.plan()
+
+        def call(models: List[str]) -> Tuple[str, Any]:
+            return self._with_failover(models, lambda model_name: self._call(model_name, messages, previous_response_id))
+
+        if self._options.hedge_after is not None and len(plan) > 1:
+            _, response = self._hedged(plan, call)
+        else:
+            _, response = call(plan)
+        return Generation(self._extract_text(response), self._response_id(response))
+
+    def stream(
+        self,
+        messages: Messages,
+        previous_response_id: Optional[str] = None,
+        on_response_id: Optional[ResponseIdCallback] = None,
+    ) -> Iterator[str]:
+        previous_response_id = self._chain_from(previous_response_id)
+        started = time.monotonic()
+        model_name, stream = self._with_failover(
+            self._router.plan(),
+            lambda model_name: self._call(model_name, messages, previous_response_id, stream=True))
+        return self._iter_deltas(stream, model_name, started, on_response_id)
+
+    def _with_failover(self, plan: List[str], attempt: Callable[[str], Any]) -> Tuple[str, Any]:
+        """Try ``attempt`` on each model in ``plan`` until one succeeds; return the model and its result.
+
+        A missing model is taken out of rotation; any other API error moves on
+        to the next model. The last error is raised when every model failed.
+        A rejected ``previous_response_id`` is raised at once: no model can
+        continue from it.
+        """
+        last_error: Optional[RuntimeError] = None
+        last_cause: Optional[Exception] = None
+        for model_name in plan:
+            try:
+                return model_name, attempt(model_name)
+            except PreviousResponseNotFoundError:
+                raise
+            except Exception as exc:
+                last_error, last_cause = self._failed(model_name, exc), exc
+
+        if last_error:
+            raise last_error from last_cause
+
+        raise RuntimeError("Failed to obtain a reply from OpenAI without a specific error.")
+
+    def _call(
+        self, model_name: str, messages: Messages, previous_response_id: Optional[str], stream: bool = False
+    ) -> Any:
+        """Call one model with the per-call timeout, retrying transient errors with jittered backoff."""
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                with span("openai_request"):
+                    response = self._create(**self._call_kwargs(model_name, messages, previous_response_id, stream))
+            except _UPSTREAM_ERRORS as exc:
+                if self._chain_error(exc, previous_response_id):
+                    raise PreviousResponseNotFoundError(
+                        f"Previous response {previous_response_id} was rejected: {exc}") from exc
+                if isinstance(exc, NotFoundError):
+                    raise
+                self._record(model_name, started, ok=False, stream=stream)
+                if not isinstance(exc, _RETRYABLE_ERRORS) or attempt >= self._options.max_retries:
+                    raise
+                time.sleep(self._retry_delay(attempt))
+                attempt += 1
+                continue
+            self._record(model_name, started, ok=True, stream=stream)
+            if not stream:
+                record_usage(model_name, getattr(response, "usage", None), self.name)
+            return response
+
+    def _hedged(self, plan: List[str], call: Callable[[List[str]], T]) -> T:
+        """Send to ``plan[0]`` on this thread; once it is ``OPENAI_HEDGE_AFTER_SECONDS`` overdue,
+        also send to the remaining models on the hedge pool.
+
+        A blocking call cannot be abandoned, so the primary's reply is
+        returned when it succeeds, and a backup that has not started yet is
+        cancelled. When the primary fails, the backup already in flight
+        answers instead of a fresh call. No backup is sent while every
+        worker of the pool (``OPENAI_HEDGE_MAX_CONCURRENCY``) is busy.
+        """
+        pool = _hedge_pool(self._options.hedge_max_concurrency)
+        lock = threading.Lock()
+        backup: List["Future[T]"] = []
+        settled = False
+
+        def send_backup() -> None:
+            with lock:
+                if settled:
+                    return
+                future = pool.try_submit(call, plan[1:])
+                if future is not None:
+                    backup.append(future)
+
+        pool.call_later(self._options.hedge_after, send_backup)
+        try:
+            return call(plan[:1])
+        except PreviousResponseNotFoundError:
+            raise
+        except RuntimeError:
+            with lock:
+                settled = True
+            if backup:
+                return backup[0].result()
+            return call(plan[1:])
+        finally:
+            with lock:
+                settled = True
+                for future in backup:
+                    future.cancel()
+
+    def _iter_deltas(
+        self, stream: Any, model_name: str, started: float, on_response_id: Optional[ResponseIdCallback]
+    ) -> Iterator[str]:
+        first = True
+        try:
+            for event in stream:
+                delta = self._extract_delta(event, model_name, on_response_id)
+                if delta:
+                    if first:
+                        self._record_first_token(model_name, started)
+                        first = False
+                    yield delta
+        except OpenAIError as exc:  # pragma: no cover - depends on external API state
+            raise self._api_error(exc) from exc
+        finally:
+            stream.close()
+
+
+class _AsyncBackend(_OpenAIBackend):
+    """Non-blocking execution: retries, failover and hedging around an ``AsyncOpenAI`` client."""
+
+    async def close(self) -> None:
+        await self._client.close()
+
+    async def generate(self, messages: Messages, previous_response_id: Optional[str] = None) -> Generation:
+        previous_response_id = self._chain_from(previous_response_id)
+        plan = self._router.plan()
+
+        def call(models: List[str]) -> Awaitable[Tuple[str, Any]]:
+            return self._with_failover(models, lambda model_name: self._call(model_name, messages, previous_response_id))
+
+        if self._options.hedge_after is not None and len(plan) > 1:
+            _, response = await self._hedged(plan, call)
+        else:
+            _, response = await call(plan)
+        return Generation(self._extract_text(response), self._response_id(response))
+
+    async def stream(
+        self,
+        messages: Messages,
+        previous_response_id: Optional[str] = None,
+        on_response_id: Optional[ResponseIdCallback] = None,
+    ) -> AsyncIterator[str]:
+        previous_response_id = self._chain_from(previous_response_id)
+        started = time.monotonic()
+        model_name, stream = await self._with_failover(
+            self._router.plan(),
+            lambda model_name: self._call(model_name, messages, previous_response_id, stream=True))
+        return self._iter_deltas(stream, model_name, started, on_response_id)
+
+    async def _with_failover(self, plan: List[str], attempt: Callable[[str], Awaitable[Any]]) -> Tuple[str, Any]:
+        last_error: Optional[RuntimeError] = None
+        last_cause: Optional[Exception] = None
+        for model_name in plan:
+            try:
+                return model_name, await attempt(model_name)
+            except PreviousResponseNotFoundError:
+                raise
+            except Exception as exc:
+                last_error, last_cause = self._failed(model_name, exc), exc
+
+        if last_error:
+            raise last_error from last_cause
+
+        raise RuntimeError("Failed to obtain a reply from OpenAI without a specific error.")
+
+    async def _call(
+        self, model_name: str, messages: Messages, previous_response_id: Optional[str], stream: bool = False
+    ) -> Any:
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                with span("openai_request"):
+                    response = await self._create(
+                        **self._call_kwargs(model_name, messages, previous_response_id, stream))
+            except _UPSTREAM_ERRORS as exc:
+                if self._chain_error(exc, previous_response_id):
+                    raise PreviousResponseNotFoundError(
+                        f"Previous response {previous_response_id} was rejected: {exc}") from exc
+                if isinstance(exc, NotFoundError):
+                    raise
+                self._record(model_name, started, ok=False, stream=stream)
+                if not isinstance(exc, _RETRYABLE_ERRORS) or attempt >= self._options.max_retries:
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt))
+                attempt += 1
+                continue
+            self._record(model_name, started, ok=True, stream=stream)
+            if not stream:
+                record_usage(model_name, getattr(response, "usage", None), self.name)
+            return response
+
+    async def _hedged(self, plan: List[str], call: Callable[[List[str]], Awaitable[T]]) -> T:
+        primary = asyncio.ensure_future(call(plan[:1]))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self._options.hedge_after)
+            if primary in done:
+                try:
+                    return primary.result()
+                except PreviousResponseNotFoundError:
+                    raise
+                except RuntimeError:
+                    return await call(plan[1:])
+
+            tasks.add(asyncio.ensure_future(call(plan[1:])))
+            error: Optional[RuntimeError] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        return task.result()
+                    except RuntimeError as exc:
+                        error = exc
+            assert error is not None
+            raise error
+        finally:
+            # The slower request is abandoned once a winner is known.
+            for task in tasks:
+                task.cancel()
+
+    async def _iter_deltas(
+        self, stream: Any, model_name: str, started: float, on_response_id: Optional[ResponseIdCallback]
+    ) -> AsyncIterator[str]:
+        first = True
+        try:
+            async for event in stream:
+                delta = self._extract_delta(event, model_name, on_response_id)
+                if delta:
+                    if first:
+                        self._record_first_token(model_name, started)
+                        first = False
+                    yield delta
+        except OpenAIError as exc:  # pragma: no cover - depends on external API state
+            raise self._api_error(exc) from exc
+        finally:
+            await stream.close()
+
+
+class _HedgePool:
+    """Worker threads for the backup requests of sync hedged calls.
+
+    One timer thread runs each scheduled callback once its delay has
+    passed, so a waiting hedge holds no worker. ``try_submit`` runs work
+    only on a free worker and returns ``None`` otherwise. Both run their
+    work in a copy of the caller's context, as ``run_in_threadpool`` does,
+    so a backup's usage is recorded against the request that hedged.
+    """
+
+    def __init__(self, max_workers: int) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="openai-hedge")
+        self._free = threading.BoundedSemaphore(max_workers)
+        self._condition = threading.Condition()
+        self._due: List[Tuple[float, int, Context, Callable[[], None]]] = []
+        self._order = itertools.count()
+        self._timer: Optional[threading.Thread] = None
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> None:
+        with self._condition:
+            heapq.heappush(self._due, (time.monotonic() + delay, next(self._order), copy_context(), callback))
+            if self._timer is None:
+                self._timer = threading.Thread(target=self._run, name="openai-hedge-timer", daemon=True)
+                self._timer.start()
+            self._condition.notify()
+
+    def try_submit(self, fn: Callable[..., T], *args: Any) -> Optional["Future[T]"]:
+        if not self._free.acquire(blocking=False):
+            return None
+        future = self._executor.submit(copy_context().run, fn, *args)
+        future.add_done_callback(lambda _: self._free.release())
+        return future
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._due or self._due[0][0] > time.monotonic():
+                    self._condition.wait(self._due[0][0] - time.monotonic() if self._due else None)
+                _, _, context, callback = heapq.heappop(self._due)
+            try:
+                context.run(callback)
+            except Exception:  # pragma: no cover - callbacks only submit work
+                logger.exception("Hedge callback failed")
+
+
+@lru_cache
+def _hedge_pool(max_workers: int) -> _HedgePool:
+    return _HedgePool(max_workers)
+
+
+class ChatCompletionsBackend(_ChatCompletionsAPI, _SyncBackend):
+    """Chat turns through ``/v1/chat/completions`` with a sync ``OpenAI`` client."""
+
+
+class ResponsesBackend(_ResponsesAPI, _SyncBackend):
+    """Chat turns through ``/v1/responses`` with a sync ``OpenAI`` client."""
+
+
+class AsyncChatCompletionsBackend(_ChatCompletionsAPI, _AsyncBackend):
+    """Chat turns through ``/v1/chat/completions`` with an ``AsyncOpenAI`` client."""
+
+
+class AsyncResponsesBackend(_ResponsesAPI, _AsyncBackend):
+    """Chat turns through ``/v1/responses`` with an ``AsyncOpenAI`` client."""
+
+
+class BackendSet(Generic[B]):
+    """The backends a deployment serves, by name, and the one a turn gets when it names none."""
+
+    def __init__(self, backends: Iterable[B], default: str) -> None:
+        self._backends: Dict[str, B] = {backend.name: backend for backend in backends}  # type: ignore[attr-defined]
+        if default not in self._backends:
+            raise UnknownBackendError(f"Default LLM backend {default!r} is not one of {self.names}.")
+        self.default = default
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._backends)
+
+    def select(self, name: Optional[str] = None) -> B:
+        """The backend called ``name``, or the default when ``name`` is empty."""
+        if not name:
+            return self._backends[self.default]
+        try:
+            return self._backends[name]
+        except KeyError:
+            raise UnknownBackendError(
+                f"Unknown LLM backend {name!r}; expected one of: {', '.join(self.names)}.") from None
+
+    def __iter__(self) -> Iterator[B]:
+        return iter(self._backends.values())
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, object]]]:
+        """Model health per backend, for health checks."""
+        return {name: backend.snapshot() for name, backend in self._backends.items()  # type: ignore[attr-defined]
+                if hasattr(backend, "snapshot")}
+
+
+def _require_api_key(settings: LLMSettings) -> None:
+    if not settings.openai_api_key:
+        raise RuntimeError(
+            "Missing OpenAI API key. Set the OPENAI_API_KEY environment variable or configure it in .env.")
+
+
+def build_backends(settings: LLMSettings) -> BackendSet[LLMBackend]:
+    """Both sync backends over one ``OpenAI`` client, so they share its connection pool.
+
+    Each backend tracks model health separately: one API can be failing
+    while the other is fine.
+    """
+    _require_api_key(settings)
+    # Retries are handled by the backends so they can be recorded per model.
+    client = OpenAI(api_key=settings.openai_api_key, max_retries=0, http_client=build_http_client(settings))
+    options = BackendOptions.from_settings(settings)
+    return BackendSet([
+        ChatCompletionsBackend(client, build_router(settings), options),
+        ResponsesBackend(client, build_router(settings), options),
+    ], default=settings.llm_backend)
+
+
+def build_async_backends(settings: LLMSettings) -> BackendSet[AsyncLLMBackend]:
+    """Async counterpart of :func:`build_backends`."""
+    _require_api_key(settings)
+    client = AsyncOpenAI(
+        api_key=settings.openai_api_key, max_retries=0, http_client=build_async_http_client(settings))
+    options = BackendOptions.from_settings(settings)
+    return BackendSet([
+        AsyncChatCompletionsBackend(client, build_router(settings), options),
+        AsyncResponsesBackend(client, build_router(settings), options),
+    ], default=settings.llm_backend)
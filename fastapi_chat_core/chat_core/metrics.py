@@ -0,0 +1,365 @@
+"""Request metrics exported in the Prometheus text format, with optional tracing.
+
+Counters and fixed-bucket histograms live in process memory behind one lock
+per metric, so recording a sample costs a dictionary lookup and a bisect and
+the metrics can stay on in production. OpenTelemetry spans are only created
+after :func:`configure_tracing` has installed an exporter.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, MutableMapping, Optional, Sequence, Tuple
+
+from sqlalchemy import Engine, event
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._bounds = tuple(sorted(buckets))
+        # Per label set: one count per bucket (not cumulative), then sum and total count.
+        self._series: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self._bounds) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels: str) -> int:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return int(series[-1]) if series else 0
+
+    def sum(self, **labels: str) -> float:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return series[-2] if series else 0.0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in series_items:
+            cumulative = 0.0
+            for bound, bucket_count in zip(self._bounds + (float("inf"),), series):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(series[-1])}")
+        return lines
+
+
+class Gauge:
+    """A current value, either ``set`` directly or read from a function each time metrics are rendered."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function: Callable[[], float], **labels: str) -> None:
+        """Sample ``function`` at render time; replaces any earlier value or function for these labels."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._functions[key] = function
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            function = self._functions.get(key)
+            if function is None:
+                return self._values.get(key, 0.0)
+        return function()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        values.update((key, function()) for key, function in functions.items())
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Any] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: Any) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        self._metrics[metric.name] = metric
+        return metric
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status"))
+HTTP_REQUEST_DB_QUERIES = REGISTRY.histogram(
+    "http_request_db_queries", "SQL statements executed per HTTP request.", ("method", "route"), COUNT_BUCKETS)
+STAGE_SECONDS = REGISTRY.histogram(
+    "chat_stage_duration_seconds", "Time spent in each stage of a chat turn.", ("stage",))
+DB_QUERIES = REGISTRY.counter("db_queries_total", "SQL statements executed.")
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Tokens reported by upstream model responses.", ("backend", "model", "kind"))
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "llm_request_duration_seconds", "Upstream model calls, attempt by attempt, by backend and outcome.",
+    ("backend", "model", "outcome"))
+LLM_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "llm_time_to_first_token_seconds", "Time from opening a streamed reply to its first text.", ("backend", "model"))
+WRITE_BATCH_SIZE = REGISTRY.histogram(
+    "db_write_batch_size", "Writes committed per group-commit transaction.", (), (1, 2, 5, 10, 25, 50, 100, 250, 500))
+HTTP_CLIENT_REQUESTS = REGISTRY.counter(
+    "http_client_requests_total", "Requests sent by shared outbound HTTP clients.", ("client",))
+HTTP_CLIENT_CONNECTIONS_OPENED = REGISTRY.counter(
+    "http_client_connections_opened_total",
+    "Connections opened by shared outbound HTTP clients; every other request reused one.", ("client",))
+HTTP_CLIENT_CONNECT_SECONDS = REGISTRY.histogram(
+    "http_client_connect_duration_seconds", "Time to open an outbound connection, TLS handshake included.",
+    ("client",), (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+ADMISSION_REJECTIONS = REGISTRY.counter(
+    "admission_rejections_total", "Turns answered with 429 before reaching the model, by limit.", ("scope",))
+UPSTREAM_TURNS = REGISTRY.gauge(
+    "upstream_turns", "Turns holding or waiting for an upstream concurrency slot.", ("state",))
+HTTP_CLIENT_POOL_CONNECTIONS = REGISTRY.gauge(
+    "http_client_pool_connections", "Connections held by an outbound HTTP pool, by state.", ("client", "state"))
+
+# A one-element list rather than an int so threadpool workers, which run in a
+# copy of the request's context, add to the same per-request total.
+_request_queries: ContextVar[Optional[List[int]]] = ContextVar("chat_core_request_queries", default=None)
+_tracer: Optional[Any] = None
+
+
+@dataclass
+class TokenUsage:
+    """Tokens reported by the model responses of one request; see :func:`track_usage`."""
+
+    tokens: int = 0
+    responses: int = 0
+
+
+# Shared the same way as ``_request_queries``: workers mutate the one object.
+_request_usage: ContextVar[Optional[TokenUsage]] = ContextVar("chat_core_request_usage", default=None)
+
+
+def track_usage() -> TokenUsage:
+    """Add the ``usage`` of every response recorded from here on in this request's context to the returned total.
+
+    Call it from the request's own task, before the work starts; threads and
+    tasks started afterwards report into the same total.
+    """
+    usage = TokenUsage()
+    _request_usage.set(usage)
+    return usage
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a block as ``stage`` in ``chat_stage_duration_seconds`` (and as a trace span when tracing is on)."""
+    trace_span = _tracer.start_as_current_span(stage) if _tracer is not None else nullcontext()
+    started = time.perf_counter()
+    try:
+        with trace_span:
+            yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+def record_usage(model: str, usage: Any, backend: str = "") -> None:
+    """Count the tokens in a response's ``usage`` (Chat Completions or Responses API shape)."""
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", None)
+    if prompt is None:
+        prompt = getattr(usage, "input_tokens", None)
+    completion = getattr(usage, "completion_tokens", None)
+    if completion is None:
+        completion = getattr(usage, "output_tokens", None)
+    if prompt:
+        LLM_TOKENS.inc(prompt, backend=backend, model=model, kind="prompt")
+    if completion:
+        LLM_TOKENS.inc(completion, backend=backend, model=model, kind="completion")
+    request_usage = _request_usage.get()
+    if request_usage is not None:
+        request_usage.tokens += (prompt or 0) + (completion or 0)
+        request_usage.responses += 1
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Count every statement ``engine`` executes; pass ``AsyncEngine.sync_engine`` for async engines."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_query(*args: Any) -> None:
+        DB_QUERIES.inc()
+        queries = _request_queries.get()
+        if queries is not None:
+            queries[0] += 1
+
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and SQL statement count per request.
+
+    Requests are labelled with their route template (``/chat/{chat_id}``)
+    rather than the raw path, which keeps the number of series bounded.
+    Latency is measured until the response body has been sent, so streamed
+    replies are counted in full.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        queries = [0]
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_queries.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(elapsed, method=scope["method"], route=route, status=status)
+            HTTP_REQUEST_DB_QUERIES.observe(queries[0], method=scope["method"], route=route)
+
+
+def configure_tracing(service_name: str, endpoint: str) -> None:
+    """Export :func:`span` stages as OpenTelemetry spans to an OTLP/HTTP ``endpoint``.
+
+    Needs the ``opentelemetry-sdk`` and ``opentelemetry-exporter-otlp-proto-http``
+    packages (the ``tracing`` extra).
+    """
+    global _tracer
+    from opentelemetry import trace
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint)))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("chat_core")
@@ -0,0 +1,36 @@
+"""The ORM classes the shared chat services are built over.
+
+Each demo maps its own tables, so message ids can differ (UUID strings in
+one demo, integers in the other) and existing databases keep working. The
+services in :mod:`chat_core.chat_service`, :mod:`chat_core.batch_service`
+and :mod:`chat_core.archive` only rely on the columns listed below, and get
+the classes from a :class:`ChatModels` passed to them.
+
+* ``chat``: ``id``, ``created_at``, ``summary``, ``summary_until``,
+  ``last_activity_at``, ``message_count``, ``archived_at``, and optionally
+  ``last_response_id`` for chats that chain on the Responses API.
+* ``message``: ``id``, ``chat_id``, ``role``, ``content``, ``created_at``,
+  indexed on ``(chat_id, created_at, id)``.
+* ``archive``: ``chat_id``, ``payload``, ``message_count``.
+* ``batch_job``: ``id``, ``batch_id``, ``status``, ``request_count``,
+  ``succeeded``, ``failed``, ``ingested_at``, ``ingest_claimed_at``.
+* ``batch_job_item``: ``id``, ``job_id``, ``position``, ``chat_id``,
+  ``content``, ``status``, ``error``.
+"""
+
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass(frozen=True)
+class ChatModels:
+    chat: Any
+    message: Any
+    archive: Any
+    batch_job: Any
+    batch_job_item: Any
+
+    @property
+    def chains_responses(self) -> bool:
+        """Whether chats can store the head of a server-side Responses chain."""
+        return hasattr(self.chat, "last_response_id")
@@ -0,0 +1,77 @@
+"""Opaque cursors for keyset pagination.
+
+A cursor carries the sort key of the last row of a page, and the next page
+is the rows strictly after that key. With an index that ends in the sort
+columns, the database seeks straight to the cursor instead of counting past
+an ``OFFSET``, so every page costs the same however deep into a long chat it
+is, and rows inserted meanwhile never shift a page boundary.
+"""
+
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Generic, List, Optional, Sequence, TypeVar, Union
+
+from sqlalchemy import ColumnElement, tuple_
+
+T = TypeVar("T")
+
+RowId = Union[int, str]
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a client sends a cursor this service did not issue."""
+
+
+@dataclass(frozen=True)
+class Cursor:
+    created_at: datetime
+    id: RowId
+
+    def encode(self) -> str:
+        raw = json.dumps([self.created_at.isoformat(), self.id], separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).rstrip(b"=").decode()
+
+    @classmethod
+    def decode(cls, token: str) -> "Cursor":
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            created_at, row_id = json.loads(raw)
+            if not isinstance(row_id, (int, str)) or isinstance(row_id, bool):
+                raise TypeError(row_id)
+            return cls(datetime.fromisoformat(created_at), row_id)
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as exc:
+            raise InvalidCursorError("Invalid pagination cursor.") from exc
+
+    @classmethod
+    def of(cls, row: Any) -> "Cursor":
+        """Cursor pointing just past ``row``, which needs ``created_at`` and ``id`` attributes."""
+        return cls(row.created_at, row.id)
+
+
+@dataclass
+class Page(Generic[T]):
+    items: List[T]
+    # ``None`` on the last page.
+    next_cursor: Optional[str] = None
+
+
+def after(columns: Sequence[ColumnElement], cursor: Cursor, descending: bool = False) -> ColumnElement:
+    """Row-value filter for the rows following ``cursor`` in ``(created_at, id)`` order.
+
+    Written as ``(created_at, id) > (:created_at, :id)`` so PostgreSQL and
+    SQLite both turn it into an index range scan.
+    """
+    key = tuple_(*columns)
+    values = tuple_(cursor.created_at, cursor.id)
+    return key < values if descending else key > values
+
+
+def paginate(rows: Sequence[T], limit: int) -> Page[T]:
+    """Build a page from up to ``limit + 1`` rows; the extra row only signals that more follow."""
+    items = list(rows[:limit])
+    if len(rows) <= limit or not items:
+        return Page(items)
+    return Page(items, Cursor.of(items[-1]).encode())
@@ -0,0 +1,153 @@
+"""Per-model health tracking used to route, retry and hedge upstream model calls."""
+
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+@dataclass(frozen=True)
+class RouterConfig:
+    window: int = 100
+    error_rate_threshold: float = 0.5
+    min_requests: int = 10
+    cooldown_seconds: float = 30.0
+    # Prefer a later model while the first one's p95 exceeds this many seconds.
+    latency_slo_seconds: Optional[float] = None
+
+
+def backoff_delay(attempt: int, base_seconds: float, max_seconds: float) -> float:
+    """Full-jitter exponential backoff for retry number ``attempt`` (0-based)."""
+    return random.uniform(0, min(max_seconds, base_seconds * (2 ** attempt)))
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class ModelHealth:
+    """Rolling latency/error window and circuit breaker for one model."""
+
+    def __init__(self, config: RouterConfig) -> None:
+        self._config = config
+        self._samples: Deque[Tuple[Optional[float], bool]] = deque(maxlen=config.window)
+        self.state = CLOSED
+        self._opened_at = 0.0
+        # When the half-open breaker admitted its trial request; ``None`` while none is in flight.
+        self._trial_started_at: Optional[float] = None
+        self.disabled = False
+
+    def record(self, latency: Optional[float], ok: bool) -> None:
+        self._samples.append((latency, ok))
+        if self.state == HALF_OPEN:
+            self._trial_started_at = None
+            if ok:
+                self.state = CLOSED
+                self._samples.clear()
+            else:
+                self._open()
+            return
+        if (
+            self.state == CLOSED
+            and len(self._samples) >= self._config.min_requests
+            and self.error_rate() >= self._config.error_rate_threshold
+        ):
+            self._open()
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now.
+
+        After the cooldown an open breaker goes half-open and admits a single
+        trial request, whose outcome closes or re-opens it. Other requests
+        are turned away meanwhile, unless the trial goes unanswered for a
+        whole cooldown, e.g. because an earlier model in its plan answered.
+        """
+        if self.disabled:
+            return False
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self._opened_at < self._config.cooldown_seconds:
+                return False
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            if self._trial_started_at is not None and now - self._trial_started_at < self._config.cooldown_seconds:
+                return False
+            self._trial_started_at = now
+        return True
+
+    def error_rate(self) -> float:
+        if not self._samples:
+            return 0.0
+        return sum(1 for _, ok in self._samples if not ok) / len(self._samples)
+
+    def latency(self, fraction: float) -> Optional[float]:
+        latencies = sorted(latency for latency, ok in self._samples if ok and latency is not None)
+        return _percentile(latencies, fraction) if latencies else None
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "state": "disabled" if self.disabled else self.state,
+            "requests": len(self._samples),
+            "error_rate": round(self.error_rate(), 3),
+            "p50_seconds": self.latency(0.5),
+            "p95_seconds": self.latency(0.95),
+        }
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._trial_started_at = None
+
+
+class ModelRouter:
+    """Orders candidate models by health for each request.
+
+    Models keep their configured preference order, except that models whose
+    breaker is open are skipped, and with ``latency_slo_seconds`` a model
+    whose p95 is over the SLO moves behind models that are within it. When
+    every model is unavailable the configured order is returned unchanged so
+    requests still fail with a real upstream error rather than a local one.
+    """
+
+    def __init__(self, models: List[str], config: Optional[RouterConfig] = None) -> None:
+        self._config = config or RouterConfig()
+        self._models = list(dict.fromkeys(models))
+        self._health = {model: ModelHealth(self._config) for model in self._models}
+        self._lock = threading.Lock()
+
+    @property
+    def models(self) -> List[str]:
+        """Every model, in configured preference order."""
+        return list(self._models)
+
+    def plan(self) -> List[str]:
+        with self._lock:
+            allowed = [model for model in self._models if self._health[model].allow()]
+            if not allowed:
+                return [model for model in self._models if not self._health[model].disabled] or list(self._models)
+            slo = self._config.latency_slo_seconds
+            if slo is None:
+                return allowed
+            within = [model for model in allowed if (self._health[model].latency(0.95) or 0.0) <= slo]
+            return within + [model for model in allowed if model not in within]
+
+    def record(self, model: str, latency: Optional[float], ok: bool) -> None:
+        """Record one outcome; pass ``latency=None`` for calls whose duration is not comparable (stream opens)."""
+        with self._lock:
+            self._health[model].record(latency, ok)
+
+    def disable(self, model: str) -> None:
+        """Take a model out of rotation for good, e.g. when the API reports it does not exist."""
+        with self._lock:
+            self._health[model].disabled = True
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            return {model: health.snapshot() for model, health in self._health.items()}
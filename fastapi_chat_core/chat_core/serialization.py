@@ -0,0 +1,30 @@
+"""Lean JSON responses for hot routes.
+
+FastAPI validates whatever a route returns against the route's
+``response_model`` and then serializes the validated value. For a model the
+route has just built from its own database rows, that validation repeats
+work already done. :class:`ModelResponse` skips it: the model is written
+straight to JSON bytes by pydantic-core, the same serializer FastAPI uses,
+and FastAPI passes a returned ``Response`` through untouched. The route
+keeps its ``response_model``, so the OpenAPI schema does not change.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import pydantic_core
+from starlette.responses import Response
+
+
+class ModelResponse(Response):
+    """JSON response rendered by pydantic-core from a model, or anything pydantic can serialize.
+
+    Output matches FastAPI's default response for the same model: fields by
+    alias, UUIDs and datetimes as strings, non-ASCII text unescaped.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return pydantic_core.to_json(content, by_alias=True)
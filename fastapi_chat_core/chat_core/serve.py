@@ -0,0 +1,87 @@
+"""Multi-process launcher for the chat demos.
+
+Runs the app in several uvicorn worker processes that share one listening
+socket, so a single host serves requests on all of its cores. From a demo
+directory::
+
+    python -m chat_core.serve app.main:app --workers 4 --port 8000
+
+Each worker imports the app on its own and runs its lifespan: the schema is
+migrated under :func:`chat_core.db.schema_lock`, so only the first worker
+does the work, and each worker then opens its own connection pool and HTTP
+clients. The supervisor restarts workers that exit unexpectedly and stops
+them gracefully on SIGINT/SIGTERM.
+
+Per-process state is not shared between workers: in-memory history caches,
+in-flight request coalescing, idempotency keys and ``/metrics`` are all per
+worker. A per-process ``memory`` history cache is switched off when more than
+one worker runs; use ``HISTORY_CACHE_BACKEND=redis`` to share the cache.
+"""
+
+import argparse
+import os
+from typing import List, Optional
+
+from pydantic_settings import SettingsConfigDict
+
+from chat_core.config import ChatSettings
+
+
+class _AppSettings(ChatSettings):
+    # Read what the app will read, ignoring the settings that are not ours.
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
+
+
+def worker_count(value: Optional[str] = None) -> int:
+    """Workers to run: ``value``, else ``WEB_CONCURRENCY``, else one per CPU."""
+    value = value or os.environ.get("WEB_CONCURRENCY")
+    if value and value != "auto":
+        count = int(value)
+        if count < 1:
+            raise ValueError(f"Worker count must be at least 1, got {count}.")
+        return count
+    return os.cpu_count() or 1
+
+
+def history_cache_backend(workers: int) -> str:
+    """The history cache the workers will use: a ``memory`` cache is turned off when ``workers > 1``.
+
+    The choice is written to ``HISTORY_CACHE_BACKEND``, which the workers
+    inherit and which takes precedence over an ``.env`` file.
+    """
+    backend = _AppSettings().history_cache_backend
+    if workers > 1 and backend == "memory":
+        backend = "none"
+    os.environ["HISTORY_CACHE_BACKEND"] = backend
+    return backend
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("app", help="import string of the ASGI app, e.g. app.main:app")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", help="number of worker processes, or 'auto' for one per CPU (default)")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0,
+                        help="seconds to let in-flight requests finish on shutdown")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    workers = worker_count(args.workers)
+    if history_cache_backend(workers) == "none" and workers > 1:
+        print(f"Running {workers} workers without a history cache; set HISTORY_CACHE_BACKEND=redis to share one.")
+    uvicorn.run(
+        args.app,
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        lifespan="on",
+        timeout_graceful_shutdown=args.graceful_timeout,
+        log_level=args.log_level,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import asyncio
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from chat_core.admission import (
+    AdmissionController,
+    ConcurrencyLimiter,
+    InMemoryRateLimitStore,
+    Limit,
+    RateLimitedError,
+    estimate_turn_tokens,
+)
+from chat_core.config import ChatSettings
+from chat_core.history import message_tokens
+from chat_core.history_cache import CachedChat, CachedMessage
+from chat_core.metrics import record_usage
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_bucket_allows_burst_then_refills_at_rate():
+    clock = FakeClock()
+    store = InMemoryRateLimitStore(clock=clock)
+    limit = Limit.per_minute(60, burst=3)
+
+    assert [store.take("k", limit) for _ in range(3)] == [0, 0, 0]
+    assert store.take("k", limit) == pytest.approx(1.0)
+
+    clock.now = 1.0
+    assert store.take("k", limit) == 0
+    assert store.take("k", limit) == pytest.approx(1.0)
+
+
+def test_rejected_take_costs_nothing_and_oversized_cost_waits_for_full_bucket():
+    clock = FakeClock()
+    store = InMemoryRateLimitStore(clock=clock)
+    limit = Limit(rate=10.0, burst=100.0)
+
+    assert store.take("tokens", limit, cost=80) == 0
+    assert store.take("tokens", limit, cost=50) == pytest.approx(3.0)
+    assert store.take("tokens", limit, cost=20) == 0
+    assert store.take("tokens", limit, cost=500) == pytest.approx(10.0)
+
+
+def test_adjust_refunds_up_to_the_burst_and_charges_into_debt():
+    clock = FakeClock()
+    store = InMemoryRateLimitStore(clock=clock)
+    limit = Limit(rate=10.0, burst=100.0)
+
+    store.take("tokens", limit, cost=80)
+    store.adjust("tokens", limit, -500)
+    assert store.take("tokens", limit, cost=100) == 0
+
+    store.adjust("tokens", limit, 500)
+    # One burst of debt at most: back to empty after 10s, full after 20s.
+    assert store.take("tokens", limit, cost=100) == pytest.approx(20.0)
+
+
+def test_released_ticket_settles_the_token_estimate_to_reported_usage():
+    clock = FakeClock()
+    store = InMemoryRateLimitStore(clock=clock)
+    limit = Limit(rate=1.0, burst=1000.0)
+    controller = AdmissionController(store, token_limit=limit)
+
+    async def turn(estimate: int, used: int) -> None:
+        ticket = await controller.admit("alice", "chat-1", tokens=estimate)
+        if used:
+            record_usage("gpt-test", SimpleNamespace(prompt_tokens=used - 10, completion_tokens=10))
+        ticket.release()
+        ticket.release()
+
+    asyncio.run(turn(estimate=900, used=300))
+    # 700 left; a rejected take costs nothing.
+    assert store.take("tokens:alice", limit, cost=701) == pytest.approx(1.0)
+    # Nothing reported: the estimate stands.
+    asyncio.run(turn(estimate=300, used=0))
+    assert store.take("tokens:alice", limit, cost=401) == pytest.approx(1.0)
+
+
+def test_turn_estimate_measures_the_cached_history_window():
+    settings = ChatSettings(openai_model="gpt-4o-mini", openai_max_output_tokens=100, history_max_tokens=2000)
+    messages = [CachedMessage(id=index, role="user", content="hello " * 20, created_at=datetime(2025, 1, 1))
+                for index in range(3)]
+    cached = CachedChat(columns={"summary": "earlier"}, messages=messages)
+
+    expected = (message_tokens("Hi", settings.openai_model) + message_tokens("earlier", settings.openai_model)
+                + 3 * message_tokens("hello " * 20, settings.openai_model) + 100)
+    assert estimate_turn_tokens("Hi", cached, settings) == expected
+    assert estimate_turn_tokens("Hi", None, settings) == 2100
+    assert estimate_turn_tokens("Hi", CachedChat(columns={}), settings) == 2100
+
+
+def test_controller_reports_which_limit_rejected():
+    controller = AdmissionController(
+        InMemoryRateLimitStore(clock=FakeClock()),
+        caller_limit=Limit(rate=1.0, burst=10),
+        chat_limit=Limit(rate=0.5, burst=1),
+    )
+    controller.check("alice", "chat-1")
+
+    with pytest.raises(RateLimitedError) as excinfo:
+        controller.check("alice", "chat-1")
+
+    assert excinfo.value.scope == "chat"
+    assert excinfo.value.retry_after_header == "2"
+    controller.check("alice", "chat-2")
+
+
+def test_rejected_check_refunds_the_buckets_it_took_from():
+    store = InMemoryRateLimitStore(clock=FakeClock())
+    caller_limit = Limit(rate=1.0, burst=2)
+    token_limit = Limit(rate=1.0, burst=100.0)
+    controller = AdmissionController(
+        store, caller_limit=caller_limit, chat_limit=Limit(rate=0.5, burst=1), token_limit=token_limit)
+    controller.check("alice", "chat-1", tokens=10)
+
+    for _ in range(3):
+        with pytest.raises(RateLimitedError):
+            controller.check("alice", "chat-1", tokens=10)
+
+    # Only the admitted request was charged to the caller's buckets.
+    assert store.take("caller:alice", caller_limit) == 0
+    assert store.take("tokens:alice", token_limit, cost=90) == 0
+
+
+def test_turn_rejected_for_concurrency_gets_its_token_estimate_back():
+    store = InMemoryRateLimitStore(clock=FakeClock())
+    limit = Limit(rate=1.0, burst=1000.0)
+    controller = AdmissionController(
+        store, token_limit=limit, concurrency=ConcurrencyLimiter(max_concurrent=1, max_queue=0))
+
+    async def run() -> None:
+        ticket = await controller.admit("alice", "chat-1", tokens=400)
+        with pytest.raises(RateLimitedError) as excinfo:
+            await controller.admit("alice", "chat-2", tokens=400)
+        assert excinfo.value.scope == "concurrency"
+        ticket.release()
+
+    asyncio.run(run())
+
+    assert store.take("tokens:alice", limit, cost=600) == 0
+
+
+def test_concurrency_limiter_caps_in_flight_turns_under_load():
+    limiter = ConcurrencyLimiter(max_concurrent=4, max_queue=100, queue_timeout_seconds=5.0)
+    peak = 0
+
+    async def turn() -> None:
+        nonlocal peak
+        await limiter.acquire()
+        try:
+            peak = max(peak, limiter.active)
+            await asyncio.sleep(0.005)
+        finally:
+            limiter.release()
+
+    async def run() -> None:
+        await asyncio.gather(*(turn() for _ in range(50)))
+
+    asyncio.run(run())
+
+    assert peak == 4
+    assert (limiter.active, limiter.waiting) == (0, 0)
+
+
+def test_overload_is_rejected_fast_once_queue_is_full_or_deadline_passes():
+    limiter = ConcurrencyLimiter(max_concurrent=2, max_queue=3, queue_timeout_seconds=0.05)
+    outcomes = []
+
+    async def turn() -> None:
+        started = time.perf_counter()
+        try:
+            await limiter.acquire()
+        except RateLimitedError:
+            outcomes.append(("rejected", time.perf_counter() - started))
+            return
+        outcomes.append(("admitted", time.perf_counter() - started))
+        await asyncio.sleep(0.3)
+        limiter.release()
+
+    async def run() -> None:
+        await asyncio.gather(*(turn() for _ in range(10)))
+
+    asyncio.run(run())
+
+    admitted = [elapsed for outcome, elapsed in outcomes if outcome == "admitted"]
+    rejected = [elapsed for outcome, elapsed in outcomes if outcome == "rejected"]
+    assert len(admitted) == 2
+    assert len(rejected) == 8
+    # Nobody waits for a slot longer than the queue deadline.
+    assert max(rejected) < 0.25
+    assert (limiter.active, limiter.waiting) == (0, 0)
+
+
+def test_released_slot_goes_to_the_oldest_waiter():
+    limiter = ConcurrencyLimiter(max_concurrent=1, queue_timeout_seconds=1.0)
+    order = []
+
+    async def waiter(name: str) -> None:
+        await limiter.acquire()
+        order.append(name)
+        limiter.release()
+
+    async def run() -> None:
+        await limiter.acquire()
+        tasks = [asyncio.create_task(waiter(name)) for name in ("first", "second", "third")]
+        await asyncio.sleep(0.01)
+        limiter.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+    assert order == ["first", "second", "third"]
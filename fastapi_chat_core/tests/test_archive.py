@@ -0,0 +1,18 @@
+from datetime import datetime
+
+from chat_core.archive import pack_messages, unpack_messages
+
+
+def test_pack_round_trips_messages_in_order():
+    messages = [
+        {"id": index, "role": "user" if index % 2 else "assistant", "content": f"message {index} " * 20,
+         "created_at": datetime(2024, 1, 1, 12, 0, index), "chat_id": "ignored"}
+        for index in range(10)
+    ]
+
+    blob = pack_messages(messages)
+
+    assert len(blob) < len(str(messages)) / 4
+    assert unpack_messages(blob) == [
+        {key: message[key] for key in ("id", "role", "content", "created_at")} for message in messages
+    ]
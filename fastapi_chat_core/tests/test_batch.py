@@ -0,0 +1,71 @@
+import json
+
+from chat_core.batch import (
+    CHAT_COMPLETIONS_ENDPOINT,
+    BatchRequest,
+    LocalBatchBackend,
+    encode_requests,
+    parse_results,
+)
+
+
+def _body(prompt: str) -> dict:
+    return {"model": "test-model", "messages": [{"role": "user", "content": prompt}]}
+
+
+def test_encode_requests_writes_one_post_per_line():
+    data = encode_requests([BatchRequest("a", _body("Hi")), BatchRequest("b", _body("Yo"))], CHAT_COMPLETIONS_ENDPOINT)
+
+    rows = [json.loads(line) for line in data.decode().splitlines()]
+    assert [row["custom_id"] for row in rows] == ["a", "b"]
+    assert rows[0] == {"custom_id": "a", "method": "POST", "url": CHAT_COMPLETIONS_ENDPOINT, "body": _body("Hi")}
+
+
+def test_parse_results_turns_failed_lines_into_errors():
+    lines = [
+        {"custom_id": "ok", "response": {"status_code": 200, "body": {"id": "r1"}}, "error": None},
+        {"custom_id": "http", "response": {"status_code": 429, "body": {"error": {"message": "slow down"}}}},
+        {"custom_id": "err", "response": None, "error": {"code": "server_error", "message": "boom"}},
+    ]
+    data = "\n".join(json.dumps(line) for line in lines).encode()
+
+    results = {result.custom_id: result for result in parse_results(data)}
+
+    assert results["ok"].body == {"id": "r1"} and results["ok"].error is None
+    assert results["http"].error == "HTTP 429: slow down"
+    assert results["err"].error == "boom"
+
+
+def test_local_backend_answers_batch_once_complete_after_passes(tmp_path):
+    def responder(endpoint: str, body: dict) -> dict:
+        prompt = body["messages"][-1]["content"]
+        if prompt == "fail":
+            raise ValueError("no reply")
+        return {"reply": prompt.upper()}
+
+    backend = LocalBatchBackend(tmp_path, responder=responder)
+    requests = [BatchRequest("1", _body("one")), BatchRequest("2", _body("fail")), BatchRequest("3", _body("three"))]
+    submitted = backend.submit(encode_requests(requests, CHAT_COMPLETIONS_ENDPOINT), CHAT_COMPLETIONS_ENDPOINT)
+    assert (submitted.status, submitted.total) == ("in_progress", 3)
+
+    # Another process polling the same directory sees the same batch.
+    status = LocalBatchBackend(tmp_path, responder=responder).retrieve(submitted.id)
+
+    assert status.done
+    assert (status.completed, status.failed) == (2, 1)
+    results = {result.custom_id: result for result in backend.results(status)}
+    assert results["1"].body == {"reply": "ONE"}
+    assert results["3"].body == {"reply": "THREE"}
+    assert results["2"].error == "no reply"
+
+
+def test_local_backend_batch_stays_in_progress_until_cancelled(tmp_path):
+    backend = LocalBatchBackend(tmp_path, complete_after=3600)
+    submitted = backend.submit(encode_requests([BatchRequest("1", _body("Hi"))], CHAT_COMPLETIONS_ENDPOINT),
+                               CHAT_COMPLETIONS_ENDPOINT)
+
+    assert backend.retrieve(submitted.id).status == "in_progress"
+    cancelled = backend.cancel(submitted.id)
+    assert cancelled.status == "cancelled"
+    assert list(backend.results(cancelled)) == []
+    assert backend.retrieve(submitted.id).status == "cancelled"
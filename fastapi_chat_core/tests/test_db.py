@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from chat_core.config import DatabaseSettings
+from chat_core.db import (
+    _engine_kwargs,
+    async_database_url,
+    create_async_db_engine,
+    create_db_engine,
+    schema_lock,
+    warm_async_pool,
+    warm_pool,
+)
+
+
+def _pragma(connection, name: str):
+    return connection.execute(text(f"PRAGMA {name}")).scalar_one()
+
+
+def test_file_sqlite_engine_applies_pragmas_and_pool(tmp_path):
+    settings = DatabaseSettings(database_url=f"sqlite:///{tmp_path / 'chat.db'}", db_pool_size=3)
+    engine = create_db_engine(settings)
+
+    with engine.connect() as connection:
+        assert _pragma(connection, "journal_mode") == "wal"
+        assert _pragma(connection, "synchronous") == 1  # NORMAL
+        assert _pragma(connection, "busy_timeout") == settings.sqlite_busy_timeout_ms
+        assert _pragma(connection, "cache_size") == -settings.sqlite_cache_size_kib
+    assert isinstance(engine.pool, QueuePool)
+    assert engine.pool.size() == 3
+
+
+def test_memory_sqlite_engine_keeps_single_connection_pool():
+    engine = create_db_engine(DatabaseSettings(database_url="sqlite://"))
+
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE t (x INTEGER)"))
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM t")).scalar_one() == 0
+
+
+def test_async_sqlite_engine_applies_pragmas(tmp_path):
+    settings = DatabaseSettings(database_url=f"sqlite:///{tmp_path / 'chat.db'}")
+
+    async def journal_mode() -> str:
+        engine = create_async_db_engine(settings)
+        async with engine.connect() as connection:
+            mode = (await connection.execute(text("PRAGMA journal_mode"))).scalar_one()
+        await engine.dispose()
+        return mode
+
+    assert asyncio.run(journal_mode()) == "wal"
+
+
+def test_async_database_url_derives_driver():
+    assert async_database_url(DatabaseSettings(database_url="sqlite:///./x.db")) == "sqlite+aiosqlite:///./x.db"
+    assert async_database_url(DatabaseSettings(database_url="postgresql://u@h/db")) == "postgresql+asyncpg://u@h/db"
+    assert async_database_url(DatabaseSettings(database_url="postgresql+psycopg://u@h/db")) == "postgresql+psycopg://u@h/db"
+
+
+def test_postgres_profile_uses_lifo_pool_and_statement_timeout():
+    settings = DatabaseSettings(db_statement_timeout_ms=5000, db_pool_size=20)
+
+    sync_kwargs = _engine_kwargs(make_url("postgresql+psycopg://u@h/db"), settings, is_async=False)
+    async_kwargs = _engine_kwargs(make_url("postgresql+asyncpg://u@h/db"), settings, is_async=True)
+
+    assert sync_kwargs["pool_use_lifo"] is True
+    assert sync_kwargs["pool_size"] == 20
+    assert sync_kwargs["connect_args"] == {"options": "-c statement_timeout=5000"}
+    assert async_kwargs["connect_args"] == {"server_settings": {"statement_timeout": "5000"}}
+
+
+def test_schema_lock_serializes_holders_of_the_same_sqlite_file(tmp_path):
+    settings = DatabaseSettings(database_url=f"sqlite:///{tmp_path / 'chat.db'}")
+    engines = [create_db_engine(settings), create_db_engine(settings)]
+    events = []
+
+    def migrate(name: str, engine) -> None:
+        with schema_lock(engine):
+            events.append(f"{name} start")
+            time.sleep(0.05)
+            events.append(f"{name} end")
+
+    threads = [threading.Thread(target=migrate, args=(name, engine)) for name, engine in zip("ab", engines)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [event.split()[1] for event in events] == ["start", "end", "start", "end"]
+    assert (tmp_path / "chat.db.lock").exists()
+
+
+def test_warm_pool_leaves_connections_checked_in(tmp_path):
+    settings = DatabaseSettings(database_url=f"sqlite:///{tmp_path / 'chat.db'}", db_pool_size=5)
+    engine = create_db_engine(settings)
+    async_engine = create_async_db_engine(settings)
+
+    warm_pool(engine, 3)
+    asyncio.run(warm_async_pool(async_engine, 2))
+
+    assert engine.pool.checkedin() == 3
+    assert async_engine.pool.checkedin() == 2
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import Column, Integer, String, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from chat_core.config import DatabaseSettings
+from chat_core.db import create_async_db_engine, create_db_engine
+from chat_core.group_commit import AsyncGroupCommitWriter, GroupCommitWriter
+
+Base = declarative_base()
+
+
+class Row(Base):
+    __tablename__ = "rows"
+
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(String(8), nullable=False)
+    content = Column(String(32), nullable=False, unique=True)
+
+
+class CountingWriter(GroupCommitWriter):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.transactions = 0
+
+    def _transaction(self, applies):
+        self.transactions += 1
+        super()._transaction(applies)
+
+
+def _settings(tmp_path) -> DatabaseSettings:
+    return DatabaseSettings(database_url=f"sqlite:///{tmp_path / 'chat.db'}")
+
+
+def test_concurrent_writes_share_transactions_and_keep_order(tmp_path):
+    engine = create_db_engine(_settings(tmp_path))
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, expire_on_commit=False)
+    writer = CountingWriter(factory, max_batch=64, max_delay_seconds=0.02)
+
+    def user(chat: int) -> None:
+        for turn in range(10):
+            row = Row(chat_id=str(chat), content=f"{chat}-{turn}")
+            writer.write(lambda session: session.add(row))
+            assert row.id is not None
+
+    threads = [threading.Thread(target=user, args=(chat,)) for chat in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with factory() as session:
+        rows = session.scalars(select(Row).order_by(Row.id)).all()
+    assert len(rows) == 80
+    assert writer.transactions < 80
+    for chat in range(8):
+        assert [row.content for row in rows if row.chat_id == str(chat)] == [f"{chat}-{turn}" for turn in range(10)]
+
+
+def test_failing_write_only_fails_its_own_request(tmp_path):
+    engine = create_db_engine(_settings(tmp_path))
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, expire_on_commit=False)
+    writer = GroupCommitWriter(factory, max_delay_seconds=0.05)
+
+    futures = [
+        writer.submit(lambda session, content=content: session.add(Row(chat_id="a", content=content)))
+        for content in ("one", "one", "two")
+    ]
+
+    assert futures[0].result() is None
+    with pytest.raises(IntegrityError):
+        futures[1].result()
+    assert futures[2].result() is None
+    with factory() as session:
+        assert sorted(session.scalars(select(Row.content))) == ["one", "two"]
+
+
+def test_close_commits_queued_writes_then_stops_the_thread(tmp_path):
+    engine = create_db_engine(_settings(tmp_path))
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, expire_on_commit=False)
+    writer = GroupCommitWriter(factory, max_delay_seconds=0.5)
+    futures = [writer.submit(lambda session, index=index: session.add(Row(chat_id="a", content=str(index))))
+               for index in range(3)]
+    thread = writer._thread
+
+    writer.close()
+
+    assert all(future.done() for future in futures)
+    assert not thread.is_alive()
+    # A write after close starts a fresh thread.
+    writer.write(lambda session: session.add(Row(chat_id="a", content="after")))
+    writer.close()
+    with factory() as session:
+        assert len(session.scalars(select(Row)).all()) == 4
+
+
+def test_async_writer_batches_concurrent_writes(tmp_path):
+    async def scenario():
+        engine = create_async_db_engine(_settings(tmp_path))
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+        writer = AsyncGroupCommitWriter(factory, max_delay_seconds=0.02)
+        rows = [Row(chat_id="a", content=str(index)) for index in range(20)]
+
+        await asyncio.gather(*(writer.write(lambda session, row=row: session.add(row)) for row in rows))
+
+        async with factory() as session:
+            stored = (await session.scalars(select(Row.content).order_by(Row.id))).all()
+        await engine.dispose()
+        return rows, stored
+
+    rows, stored = asyncio.run(scenario())
+    assert stored == [str(index) for index in range(20)]
+    assert all(row.id is not None for row in rows)
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from chat_core.config import ChatSettings
+from chat_core.history import (
+    build_payload,
+    message_tokens,
+    select_window,
+    unsummarized,
+)
+
+MODEL = "gpt-4o-mini"
+
+
+def _messages(count: int, size: int = 40):
+    start = datetime(2025, 1, 1)
+    return [
+        SimpleNamespace(
+            chat_id="chat",
+            role="user" if index % 2 == 0 else "assistant",
+            content=f"{index:02d}" + "x" * (size - 2),
+            created_at=start + timedelta(seconds=index),
+        )
+        for index in range(count)
+    ]
+
+
+def _settings(**overrides) -> ChatSettings:
+    values = {"openai_model": MODEL, "history_min_messages": 2}
+    values.update(overrides)
+    return ChatSettings(**values)
+
+
+def test_select_window_keeps_newest_messages_within_budget():
+    history = _messages(10)
+    per_message = message_tokens(history[0].content, MODEL)
+    budget = message_tokens("hi", MODEL) + 3 * per_message
+
+    window = select_window(history, "hi", None, _settings(history_max_tokens=budget))
+
+    assert window.kept == history[-3:]
+    assert window.dropped == history[:-3]
+
+
+def test_select_window_respects_min_messages_floor():
+    history = _messages(6, size=400)
+
+    window = select_window(history, "hi", None, _settings(history_max_tokens=1, history_min_messages=4))
+
+    assert window.kept == history[-4:]
+
+
+def test_unsummarized_skips_messages_already_in_summary():
+    history = _messages(4)
+    chat = SimpleNamespace(summary="earlier", summary_until=history[1].created_at)
+
+    assert unsummarized(history, chat) == history[2:]
+
+
+def test_build_payload_prepends_summary():
+    payload = build_payload(_messages(1), "next", summary="earlier")
+
+    assert payload[0]["role"] == "system"
+    assert "earlier" in payload[0]["content"]
+    assert payload[-1] == {"role": "user", "content": "next"}
@@ -0,0 +1,129 @@
+from datetime import datetime, timezone
+from typing import Dict, Iterator
+
+from sqlalchemy import Column, DateTime, Integer, String, Text
+from sqlalchemy.orm import declarative_base
+
+from chat_core import history_cache
+from chat_core.history_cache import (
+    CachedChat,
+    CachedMessage,
+    InMemoryHistoryCache,
+    RedisHistoryCache,
+)
+
+Base = declarative_base()
+
+
+class Chat(Base):
+    __tablename__ = "chats"
+
+    id = Column(String(36), primary_key=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    summary = Column(Text, nullable=True)
+
+
+class Message(Base):
+    __tablename__ = "messages"
+
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(String(36), nullable=False)
+    role = Column(String(20), nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+
+def _chat(chat_id: str = "chat") -> Chat:
+    return Chat(id=chat_id, created_at=datetime(2025, 1, 1, tzinfo=timezone.utc))
+
+
+def _entry(chat_id: str = "chat") -> CachedChat:
+    return CachedChat(columns=CachedChat.columns_of(_chat(chat_id)), messages=[])
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.values: Dict[str, str] = {}
+        self.expiries: Dict[str, int] = {}
+
+    def get(self, key: str):
+        return self.values.get(key)
+
+    def set(self, key: str, value: str, ex: int) -> None:
+        self.values[key] = value
+        self.expiries[key] = ex
+
+    def delete(self, key: str) -> int:
+        return 1 if self.values.pop(key, None) is not None else 0
+
+    def scan_iter(self, match: str) -> Iterator[str]:
+        prefix = match.rstrip("*")
+        return iter([key for key in self.values if key.startswith(prefix)])
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = InMemoryHistoryCache(max_entries=2)
+    cache.put("a", _entry("a"))
+    cache.put("b", _entry("b"))
+    cache.get("a")
+    cache.put("c", _entry("c"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats() == {"hits": 2, "misses": 1, "evictions": 1, "invalidations": 0, "size": 2}
+
+
+def test_memory_cache_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(history_cache.time, "monotonic", lambda: now[0])
+    cache = InMemoryHistoryCache(ttl_seconds=10)
+    cache.put("chat", _entry())
+
+    now[0] += 11
+
+    assert cache.get("chat") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_append_trims_to_max_messages_and_skips_unknown_chats():
+    cache = InMemoryHistoryCache()
+    chat = _chat()
+    messages = [
+        Message(id=index, chat_id="chat", role="user", content=str(index), created_at=datetime(2025, 1, 1))
+        for index in range(3)
+    ]
+
+    cache.append(chat, messages, max_messages=10)
+    assert cache.get("chat") is None
+
+    cache.put("chat", _entry())
+    cache.append(chat, messages, max_messages=2)
+
+    assert [message.content for message in cache.get("chat").messages] == ["1", "2"]
+
+
+def test_cached_messages_rebuild_rows_of_the_given_class():
+    created_at = datetime(2025, 1, 1)
+    cached = CachedMessage.from_model(Message(id=7, chat_id="chat", role="user", content="Hi", created_at=created_at))
+
+    message = cached.to_model(Message, "chat")
+
+    assert isinstance(message, Message)
+    assert (message.id, message.chat_id, message.content, message.created_at) == (7, "chat", "Hi", created_at)
+
+
+def test_redis_cache_round_trips_entries():
+    client = FakeRedis()
+    cache = RedisHistoryCache(client, ttl_seconds=30)
+    created_at = datetime(2025, 1, 1, 12, 30)
+    entry = _entry()
+    entry.messages = [CachedMessage(id=1, role="user", content="Hi", created_at=created_at)]
+
+    cache.put("chat", entry)
+    loaded = cache.get("chat")
+
+    assert loaded == entry
+    assert client.expiries["chat-history:chat"] == 30
+    cache.invalidate("chat")
+    assert cache.get("chat") is None
+    assert cache.stats()["invalidations"] == 1
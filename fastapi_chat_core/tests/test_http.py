@@ -0,0 +1,74 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from chat_core.config import HttpClientSettings
+from chat_core.http import build_async_http_client, build_http_client, client_timeout
+from chat_core.metrics import HTTP_CLIENT_CONNECTIONS_OPENED, HTTP_CLIENT_POOL_CONNECTIONS, HTTP_CLIENT_REQUESTS
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_timeout_and_limits_follow_settings():
+    settings = HttpClientSettings(openai_http_connect_timeout_seconds=1.5, openai_http_pool_timeout_seconds=2)
+
+    timeout = client_timeout(settings, read=30)
+
+    assert (timeout.connect, timeout.read, timeout.pool) == (1.5, 30, 2)
+    assert client_timeout(settings).read == settings.openai_http_read_timeout_seconds
+
+
+def test_shared_client_reuses_connections(server_url):
+    with build_http_client(HttpClientSettings(), name="test-sync") as client:
+        for _ in range(5):
+            assert client.get(server_url).text == "ok"
+
+        assert HTTP_CLIENT_REQUESTS.value(client="test-sync") == 5
+        assert HTTP_CLIENT_CONNECTIONS_OPENED.value(client="test-sync") == 1
+        assert HTTP_CLIENT_POOL_CONNECTIONS.value(client="test-sync", state="idle") == 1
+        assert HTTP_CLIENT_POOL_CONNECTIONS.value(client="test-sync", state="active") == 0
+
+
+def test_pool_without_keepalive_opens_a_connection_per_request(server_url):
+    settings = HttpClientSettings(openai_http_max_keepalive_connections=0)
+    with build_http_client(settings, name="test-no-keepalive") as client:
+        for _ in range(3):
+            client.get(server_url)
+
+    assert HTTP_CLIENT_CONNECTIONS_OPENED.value(client="test-no-keepalive") == 3
+
+
+def test_async_client_is_instrumented(server_url):
+    async def run() -> None:
+        async with build_async_http_client(HttpClientSettings(), name="test-async") as client:
+            responses = await asyncio.gather(*(client.get(server_url) for _ in range(4)))
+            assert all(response.status_code == 200 for response in responses)
+            await client.get(server_url)
+
+    asyncio.run(run())
+
+    assert HTTP_CLIENT_REQUESTS.value(client="test-async") == 5
+    assert 1 <= HTTP_CLIENT_CONNECTIONS_OPENED.value(client="test-async") <= 4
@@ -0,0 +1,275 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import pytest
+from openai import APITimeoutError, BadRequestError, NotFoundError
+
+from chat_core import llm
+from chat_core.llm import (
+    AsyncChatCompletionsBackend,
+    BackendOptions,
+    BackendSet,
+    ChatCompletionsBackend,
+    PreviousResponseNotFoundError,
+    ResponsesBackend,
+    UnknownBackendError,
+)
+from chat_core.resilience import ModelRouter, RouterConfig
+
+MESSAGES = [{"role": "user", "content": "Hi"}]
+_REQUEST = httpx.Request("POST", "https://api.openai.test/v1/chat/completions")
+
+
+def _timeout() -> APITimeoutError:
+    return APITimeoutError(request=_REQUEST)
+
+
+def _bad_request() -> BadRequestError:
+    return BadRequestError("bad request", response=httpx.Response(400, request=_REQUEST), body=None)
+
+
+def _completion(text: str) -> SimpleNamespace:
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+class FaultyCompletions:
+    """Stands in for ``client.chat.completions`` with scripted per-model latency and failures."""
+
+    def __init__(self, latency: Optional[Dict[str, float]] = None, failures: Optional[Dict[str, list]] = None):
+        self.latency = latency or {}
+        self.failures = {model: list(errors) for model, errors in (failures or {}).items()}
+        self.calls: List[Tuple[str, Optional[float]]] = []
+        self.kwargs: List[Dict] = []
+        self.threads: Dict[str, threading.Thread] = {}
+
+    def _outcome(self, model: str):
+        errors = self.failures.get(model)
+        if errors:
+            raise errors.pop(0)
+        return _completion(f"reply from {model}")
+
+    def create(self, model: str, timeout: Optional[float] = None, **kwargs):
+        self.calls.append((model, timeout))
+        self.kwargs.append(kwargs)
+        self.threads[model] = threading.current_thread()
+        time.sleep(self.latency.get(model, 0.0))
+        return self._outcome(model)
+
+
+class AsyncFaultyCompletions(FaultyCompletions):
+    async def create(self, model: str, timeout: Optional[float] = None, **kwargs):
+        self.calls.append((model, timeout))
+        self.kwargs.append(kwargs)
+        await asyncio.sleep(self.latency.get(model, 0.0))
+        return self._outcome(model)
+
+
+def _router(**config) -> ModelRouter:
+    return ModelRouter(["primary", "fallback"], RouterConfig(**config))
+
+
+def _client(backend_class, completions, router: ModelRouter, **options):
+    return backend_class(SimpleNamespace(chat=SimpleNamespace(completions=completions)), router,
+                         BackendOptions(**options))
+
+
+@pytest.fixture(autouse=True)
+def _no_backoff(monkeypatch):
+    monkeypatch.setattr(llm, "backoff_delay", lambda attempt, base, maximum: 0.0)
+
+
+def test_transient_errors_are_retried_on_the_same_model():
+    completions = FaultyCompletions(failures={"primary": [_timeout(), _timeout()]})
+    client = _client(ChatCompletionsBackend, completions, _router(), max_retries=2, timeout=1.5)
+
+    assert client.generate(MESSAGES).text == "reply from primary"
+    assert completions.calls == [("primary", 1.5)] * 3
+
+
+def test_exhausted_retries_fail_over_to_the_next_model():
+    completions = FaultyCompletions(failures={"primary": [_timeout()] * 2})
+    client = _client(ChatCompletionsBackend, completions, _router(), max_retries=1)
+
+    assert client.generate(MESSAGES).text == "reply from fallback"
+    assert [model for model, _ in completions.calls] == ["primary", "primary", "fallback"]
+
+
+@pytest.mark.parametrize("backend_class", [ChatCompletionsBackend, AsyncChatCompletionsBackend])
+def test_transport_errors_count_against_the_model_and_fail_over(backend_class):
+    failures = {"primary": [httpx.ConnectError("refused", request=_REQUEST), httpx.ReadTimeout("slow")]}
+    sync = backend_class is ChatCompletionsBackend
+    completions = FaultyCompletions(failures=failures) if sync else AsyncFaultyCompletions(failures=failures)
+    router = _router()
+    client = _client(backend_class, completions, router, max_retries=1)
+
+    generation = client.generate(MESSAGES) if sync else asyncio.run(client.generate(MESSAGES))
+
+    assert generation.text == "reply from fallback"
+    assert [model for model, _ in completions.calls] == ["primary", "primary", "fallback"]
+    assert router.snapshot()["primary"]["error_rate"] == 1.0
+
+
+def test_non_retryable_errors_are_not_retried():
+    completions = FaultyCompletions(failures={"primary": [_bad_request()], "fallback": [_bad_request()]})
+    client = _client(ChatCompletionsBackend, completions, _router(), max_retries=3)
+
+    with pytest.raises(RuntimeError, match="BadRequestError"):
+        client.generate(MESSAGES).text
+    assert [model for model, _ in completions.calls] == ["primary", "fallback"]
+
+
+def test_open_breaker_skips_the_failing_model():
+    router = _router(min_requests=2, error_rate_threshold=0.5, cooldown_seconds=60)
+    completions = FaultyCompletions(failures={"primary": [_bad_request()] * 2})
+    client = _client(ChatCompletionsBackend, completions, router)
+
+    client.generate(MESSAGES).text
+    client.generate(MESSAGES).text
+    completions.calls.clear()
+
+    assert client.generate(MESSAGES).text == "reply from fallback"
+    assert [model for model, _ in completions.calls] == ["fallback"]
+    assert router.snapshot()["primary"]["state"] == "open"
+
+
+def test_hedged_backup_answers_when_the_slow_primary_fails():
+    completions = FaultyCompletions(latency={"primary": 0.3, "fallback": 0.3}, failures={"primary": [_bad_request()]})
+    client = _client(ChatCompletionsBackend, completions, _router(), hedge_after=0.05)
+
+    started = time.monotonic()
+    assert client.generate(MESSAGES).text == "reply from fallback"
+    # The backup was already in flight when the primary failed.
+    assert time.monotonic() - started < 0.5
+    assert completions.threads["primary"] is threading.current_thread()
+    assert completions.threads["fallback"] is not threading.current_thread()
+
+
+def test_hedge_is_skipped_while_the_pool_is_busy():
+    release = threading.Event()
+    busy = llm._hedge_pool(1).try_submit(release.wait)
+    completions = FaultyCompletions(latency={"primary": 0.2})
+    client = _client(ChatCompletionsBackend, completions, _router(), hedge_after=0.01, hedge_max_concurrency=1)
+
+    try:
+        assert client.generate(MESSAGES).text == "reply from primary"
+        assert [model for model, _ in completions.calls] == ["primary"]
+    finally:
+        release.set()
+        busy.result()
+
+
+def test_hedge_is_not_sent_when_the_primary_is_fast():
+    completions = FaultyCompletions()
+    client = _client(ChatCompletionsBackend, completions, _router(), hedge_after=0.5)
+
+    assert client.generate(MESSAGES).text == "reply from primary"
+    assert [model for model, _ in completions.calls] == ["primary"]
+
+
+def test_async_hedged_request_returns_the_faster_model():
+    completions = AsyncFaultyCompletions(latency={"primary": 0.5})
+    client = _client(AsyncChatCompletionsBackend, completions, _router(), hedge_after=0.05)
+
+    started = time.monotonic()
+    assert asyncio.run(client.generate(MESSAGES)).text == "reply from fallback"
+    assert time.monotonic() - started < 0.4
+
+
+def test_async_retries_then_fails_over():
+    completions = AsyncFaultyCompletions(failures={"primary": [_timeout()] * 3})
+    client = _client(AsyncChatCompletionsBackend, completions, _router(), max_retries=2)
+
+    assert asyncio.run(client.generate(MESSAGES)).text == "reply from fallback"
+    assert [model for model, _ in completions.calls] == ["primary"] * 3 + ["fallback"]
+
+
+def test_chat_completions_ignore_previous_response_id():
+    completions = FaultyCompletions()
+    client = _client(ChatCompletionsBackend, completions, _router())
+
+    generation = client.generate(MESSAGES, previous_response_id="resp_1")
+
+    assert generation.response_id is None
+    assert "previous_response_id" not in completions.kwargs[-1]
+
+
+class FakeResponses:
+    """Stands in for ``client.responses``: knows the ids in ``issued`` and streams two deltas."""
+
+    def __init__(self, issued: Tuple[str, ...] = ()) -> None:
+        self.issued = set(issued)
+        self.calls: List[Dict] = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        previous = kwargs.get("previous_response_id")
+        if previous and previous not in self.issued:
+            raise NotFoundError("no such response", response=httpx.Response(404, request=_REQUEST), body=None)
+        response = SimpleNamespace(id=f"resp_{len(self.calls)}", model=kwargs["model"], usage=None,
+                                   output_text=f"reply from {kwargs['model']}")
+        if not kwargs.get("stream"):
+            return response
+        return FakeStream([
+            SimpleNamespace(type="response.created", response=response),
+            SimpleNamespace(type="response.output_text.delta", delta="Hello "),
+            SimpleNamespace(type="response.output_text.delta", delta="there"),
+            SimpleNamespace(type="response.completed", response=response),
+        ])
+
+
+class FakeStream(list):
+    def close(self) -> None:
+        pass
+
+
+def _responses_backend(responses: FakeResponses, router: ModelRouter) -> ResponsesBackend:
+    return ResponsesBackend(SimpleNamespace(responses=responses), router)
+
+
+def test_responses_chain_and_report_the_response_id():
+    responses = FakeResponses(issued=("resp_0",))
+    backend = _responses_backend(responses, _router())
+
+    generation = backend.generate(MESSAGES, previous_response_id="resp_0")
+
+    assert generation == llm.Generation("reply from primary", "resp_1")
+    assert responses.calls[0]["previous_response_id"] == "resp_0"
+    assert responses.calls[0]["truncation"] == "auto"
+
+
+def test_rejected_previous_response_is_not_failed_over_or_counted_against_the_model():
+    responses = FakeResponses()
+    router = _router(min_requests=1)
+    backend = _responses_backend(responses, router)
+
+    with pytest.raises(PreviousResponseNotFoundError):
+        backend.generate(MESSAGES, previous_response_id="resp_gone")
+
+    assert [call["model"] for call in responses.calls] == ["primary"]
+    assert router.snapshot()["primary"]["requests"] == 0
+
+
+def test_responses_stream_reports_its_id_before_the_text():
+    backend = _responses_backend(FakeResponses(), _router())
+    seen: List[str] = []
+
+    deltas = backend.stream(MESSAGES, on_response_id=seen.append)
+
+    assert "".join(deltas) == "Hello there"
+    assert seen == ["resp_1"]
+
+
+def test_backend_set_selects_by_name_and_falls_back_to_the_default():
+    chat_completions = _client(ChatCompletionsBackend, FaultyCompletions(), _router())
+    responses = _responses_backend(FakeResponses(), _router())
+    backends = BackendSet([chat_completions, responses], default="responses")
+
+    assert backends.select() is responses
+    assert backends.select("chat_completions") is chat_completions
+    with pytest.raises(UnknownBackendError, match="chat_completions, responses"):
+        backends.select("gemini")
+    assert set(backends.snapshot()) == {"chat_completions", "responses"}
@@ -0,0 +1,85 @@
+import asyncio
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, text
+
+from chat_core import metrics
+from chat_core.metrics import Counter, Gauge, Histogram, MetricsMiddleware, instrument_engine, record_usage, span
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, route="/a")
+
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a",le="1"} 2',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 3',
+        'latency_seconds_sum{route="/a"} 5.55',
+        'latency_seconds_count{route="/a"} 3',
+    ]
+
+
+def test_counter_escapes_label_values():
+    counter = Counter("events_total", "Events.", ("name",))
+    counter.inc(name='say "hi"')
+
+    assert counter.render()[-1] == 'events_total{name="say \\"hi\\""} 1'
+
+
+def test_gauge_samples_functions_at_render_time():
+    gauge = Gauge("pool_connections", "Connections.", ("state",))
+    connections = ["a"]
+    gauge.set(3, state="idle")
+    gauge.set_function(lambda: len(connections), state="active")
+    connections.append("b")
+
+    assert gauge.value(state="active") == 2
+    assert gauge.render()[2:] == ['pool_connections{state="active"} 2', 'pool_connections{state="idle"} 3']
+
+
+def test_record_usage_accepts_both_api_shapes():
+    before = metrics.LLM_TOKENS.value(backend="b", model="m", kind="prompt")
+    record_usage("m", SimpleNamespace(prompt_tokens=3, completion_tokens=4), backend="b")
+    record_usage("m", SimpleNamespace(input_tokens=5, output_tokens=6), backend="b")
+    record_usage("m", None, backend="b")
+
+    assert metrics.LLM_TOKENS.value(backend="b", model="m", kind="prompt") - before == 8
+
+
+def test_span_records_stage_even_when_the_block_raises():
+    before = metrics.STAGE_SECONDS.count(stage="failing")
+    try:
+        with span("failing"):
+            raise ValueError
+    except ValueError:
+        pass
+
+    assert metrics.STAGE_SECONDS.count(stage="failing") == before + 1
+
+
+def test_middleware_counts_queries_per_route():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    route = SimpleNamespace(path="/items/{item_id}")
+
+    async def app(scope, receive, send):
+        scope["route"] = route
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("SELECT 2"))
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "GET", "path": "/items/1"}
+    asyncio.run(MetricsMiddleware(app)(scope, None, send))
+
+    rendered = metrics.REGISTRY.render()
+    assert 'http_request_duration_seconds_count{method="GET",route="/items/{item_id}",status="204"} 1' in rendered
+    assert 'http_request_db_queries_sum{method="GET",route="/items/{item_id}"} 2' in rendered
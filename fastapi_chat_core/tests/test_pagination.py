@@ -0,0 +1,33 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from chat_core.pagination import Cursor, InvalidCursorError, paginate
+
+
+@pytest.mark.parametrize("row_id", [42, "3f1c0d2e-6a7b-4c8d-9e0f-112233445566"])
+def test_cursor_round_trips_through_opaque_token(row_id):
+    cursor = Cursor(datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc), row_id)
+
+    token = cursor.encode()
+
+    assert "=" not in token
+    assert Cursor.decode(token) == cursor
+
+
+@pytest.mark.parametrize("token", ["", "not-a-cursor", Cursor(datetime(2024, 1, 1), 1).encode()[:-3], "WzEsMl0"])
+def test_decode_rejects_tokens_it_did_not_issue(token):
+    with pytest.raises(InvalidCursorError):
+        Cursor.decode(token)
+
+
+def test_paginate_sets_next_cursor_only_when_more_rows_follow():
+    rows = [SimpleNamespace(created_at=datetime(2024, 1, 1), id=index) for index in range(4)]
+
+    full = paginate(rows, 3)
+    last = paginate(rows[:3], 3)
+
+    assert full.items == rows[:3]
+    assert Cursor.decode(full.next_cursor) == Cursor(datetime(2024, 1, 1), 2)
+    assert last.next_cursor is None
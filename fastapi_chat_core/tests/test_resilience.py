@@ -0,0 +1,80 @@
+from chat_core import resilience
+from chat_core.resilience import ModelRouter, RouterConfig, backoff_delay
+
+
+def _fail(router: ModelRouter, model: str, times: int) -> None:
+    for _ in range(times):
+        router.record(model, 0.1, ok=False)
+
+
+def test_breaker_opens_on_error_rate_and_half_opens_after_cooldown(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    router = ModelRouter(["a", "b"], RouterConfig(min_requests=4, error_rate_threshold=0.5, cooldown_seconds=10))
+
+    router.record("a", 0.1, ok=True)
+    _fail(router, "a", 2)
+    assert router.plan() == ["a", "b"]
+    _fail(router, "a", 1)
+    assert router.plan() == ["b"]
+
+    now[0] += 10
+    assert router.plan() == ["a", "b"]
+    assert router.snapshot()["a"]["state"] == "half_open"
+    router.record("a", 0.1, ok=True)
+    assert router.snapshot()["a"]["state"] == "closed"
+
+
+def test_failed_trial_request_reopens_the_breaker(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    router = ModelRouter(["a", "b"], RouterConfig(min_requests=1, cooldown_seconds=5))
+    _fail(router, "a", 1)
+
+    now[0] += 5
+    router.plan()
+    _fail(router, "a", 1)
+
+    assert router.plan() == ["b"]
+
+
+def test_half_open_breaker_admits_a_single_trial_request(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    router = ModelRouter(["a", "b"], RouterConfig(min_requests=1, cooldown_seconds=5))
+    _fail(router, "a", 1)
+
+    now[0] += 5
+    assert router.plan() == ["a", "b"]
+    assert [router.plan() for _ in range(3)] == [["b"]] * 3
+
+    # A trial that never reports back stops blocking after another cooldown.
+    now[0] += 5
+    assert router.plan() == ["a", "b"]
+    router.record("a", 0.1, ok=True)
+    assert [router.plan() for _ in range(3)] == [["a", "b"]] * 3
+
+
+def test_every_model_open_falls_back_to_configured_order():
+    router = ModelRouter(["a", "b"], RouterConfig(min_requests=1))
+    _fail(router, "a", 1)
+    _fail(router, "b", 1)
+    router.disable("b")
+
+    assert router.plan() == ["a"]
+
+
+def test_slow_models_move_behind_models_within_the_slo():
+    router = ModelRouter(["a", "b"], RouterConfig(latency_slo_seconds=1.0))
+    for _ in range(5):
+        router.record("a", 2.0, ok=True)
+        router.record("b", 0.5, ok=True)
+    # Stream opens carry no latency and must not skew the percentiles.
+    router.record("b", None, ok=True)
+
+    assert router.plan() == ["b", "a"]
+    assert router.snapshot()["b"]["p95_seconds"] == 0.5
+
+
+def test_backoff_delay_is_capped():
+    assert all(0 <= backoff_delay(attempt, 0.5, 2.0) <= 2.0 for attempt in range(10))
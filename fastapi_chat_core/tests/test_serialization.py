@@ -0,0 +1,42 @@
+from datetime import datetime
+from typing import List
+from uuid import UUID, uuid4
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, Field
+
+from chat_core.serialization import ModelResponse
+
+
+class Item(BaseModel):
+    id: UUID
+    text: str = Field(serialization_alias="content")
+    created_at: datetime
+
+
+class Page(BaseModel):
+    items: List[Item]
+    next_cursor: str | None = None
+
+
+def test_model_response_matches_fastapi_serialization():
+    page = Page(items=[Item(id=uuid4(), text='Ünïcode "quoted"\n' * 3, created_at=datetime(2024, 5, 1, 12, 0, 0, 5))])
+    app = FastAPI()
+
+    @app.get("/validated", response_model=Page)
+    def validated() -> Page:
+        return page
+
+    @app.get("/lean", response_model=Page, status_code=201)
+    def lean() -> ModelResponse:
+        return ModelResponse(page, status_code=201)
+
+    client = TestClient(app)
+    expected = client.get("/validated")
+    response = client.get("/lean")
+
+    assert response.status_code == 201
+    assert response.headers["content-type"] == "application/json"
+    assert response.content == expected.content
+    assert response.json()["items"][0]["content"].startswith("Ünïcode")
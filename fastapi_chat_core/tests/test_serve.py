@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from chat_core.serve import history_cache_backend, worker_count
+
+
+def test_worker_count_prefers_argument_then_environment(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+
+    assert worker_count("2") == 2
+    assert worker_count() == 3
+    assert worker_count("auto") == (os.cpu_count() or 1)
+
+
+def test_worker_count_rejects_zero():
+    with pytest.raises(ValueError):
+        worker_count("0")
+
+
+@pytest.mark.parametrize("configured, workers, expected", [
+    (None, 1, "memory"),
+    (None, 4, "none"),
+    ("memory", 4, "none"),
+    ("redis", 4, "redis"),
+])
+def test_memory_history_cache_is_off_with_several_workers(monkeypatch, tmp_path, configured, workers, expected):
+    monkeypatch.chdir(tmp_path)
+    if configured is None:
+        monkeypatch.delenv("HISTORY_CACHE_BACKEND", raising=False)
+    else:
+        monkeypatch.setenv("HISTORY_CACHE_BACKEND", configured)
+
+    assert history_cache_backend(workers) == expected
+    assert os.environ["HISTORY_CACHE_BACKEND"] == expected
+
+
+def test_history_cache_backend_reads_the_env_file(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("HISTORY_CACHE_BACKEND", raising=False)
+    (tmp_path / ".env").write_text("DATABASE_URL=sqlite://\nHISTORY_CACHE_BACKEND=redis\n")
+
+    assert history_cache_backend(4) == "redis"
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from chat_core.idempotency import IdempotencyKeyMismatchError, IdempotencyStore, fingerprint
+from chat_core.singleflight import AsyncSingleFlight, SingleFlight
+
+
+def test_single_flight_shares_result_between_threads():
+    group = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def work():
+        calls.append(1)
+        started.set()
+        time.sleep(0.05)
+        return object()
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(group.do("key", work)))
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=lambda: results.append(group.do("key", work)))
+    follower.start()
+    leader.join()
+    follower.join()
+
+    assert len(calls) == 1
+    assert results[0][0] is results[1][0]
+    assert sorted(shared for _, shared in results) == [False, True]
+
+
+def test_async_single_flight_shares_errors_and_forgets_finished_calls():
+    group = AsyncSingleFlight()
+    calls = []
+
+    async def fail():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream failed")
+
+    async def scenario():
+        outcomes = await asyncio.gather(group.do("key", fail), group.do("key", fail), return_exceptions=True)
+        assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+        assert len(calls) == 1
+        with pytest.raises(RuntimeError):
+            await group.do("key", fail)
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_idempotency_store_rejects_reuse_with_other_request():
+    store = IdempotencyStore()
+    store.save("key", fingerprint("hello"), "reply")
+
+    assert store.lookup("key", fingerprint("hello")) == "reply"
+    assert store.lookup("other", fingerprint("hello")) is None
+    with pytest.raises(IdempotencyKeyMismatchError):
+        store.lookup("key", fingerprint("goodbye"))
+
+
+def test_idempotency_store_rejects_other_request_while_key_is_reserved():
+    store = IdempotencyStore()
+
+    assert store.reserve("key", fingerprint("hello")) is None
+    # A concurrent retry of the same request waits on the first; another body is turned away.
+    assert store.reserve("key", fingerprint("hello")) is None
+    with pytest.raises(IdempotencyKeyMismatchError):
+        store.reserve("key", fingerprint("goodbye"))
+
+    store.save("key", fingerprint("hello"), "reply")
+    assert store.reserve("key", fingerprint("hello")) == "reply"
+
+
+def test_idempotency_store_release_frees_a_failed_reservation():
+    store = IdempotencyStore()
+    store.reserve("key", fingerprint("hello"))
+
+    store.release("key", fingerprint("goodbye"))
+    with pytest.raises(IdempotencyKeyMismatchError):
+        store.reserve("key", fingerprint("goodbye"))
+
+    store.release("key", fingerprint("hello"))
+    assert store.reserve("key", fingerprint("goodbye")) is None
@@ -0,0 +1,77 @@
+from uuid import UUID
+
+from chat_core.api import call_service
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.api.deps import get_batch_job_service
+from app.schemas.batch import BatchJobCreateRequest, BatchJobResource
+from app.services.batch import BatchJobNotFoundError, BatchJobService
+from app.services.chat_service import ChatNotFoundError
+
+router = APIRouter(prefix="/batches", tags=["batches"])
+
+
+def _batch_api_error(exc: RuntimeError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_502_BAD_GATEWAY,
+        detail={"message": "Batch API request failed.", "reason": str(exc)},
+    )
+
+
+@router.post(
+    "",
+    response_model=BatchJobResource,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def create_batch_job(
+    payload: BatchJobCreateRequest,
+    service: BatchJobService = Depends(get_batch_job_service),
+) -> BatchJobResource:
+    turns = [(str(turn.chat_id), turn.message) for turn in payload.turns]
+    try:
+        job = await call_service(service.create_job, turns)
+    except ChatNotFoundError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=str(exc)) from exc
+    except RuntimeError as exc:
+        raise _batch_api_error(exc) from exc
+    return BatchJobResource.model_validate(job)
+
+
+@router.get(
+    "/{job_id}",
+    response_model=BatchJobResource,
+    status_code=status.HTTP_200_OK,
+)
+async def get_batch_job(
+    job_id: UUID,
+    service: BatchJobService = Depends(get_batch_job_service),
+) -> BatchJobResource:
+    """Poll the job's batch, writing its replies back to their chats once it has finished."""
+    try:
+        job = await call_service(service.refresh, str(job_id))
+    except BatchJobNotFoundError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=str(exc)) from exc
+    except RuntimeError as exc:
+        raise _batch_api_error(exc) from exc
+    return BatchJobResource.model_validate(job)
+
+
+@router.post(
+    "/{job_id}/cancel",
+    response_model=BatchJobResource,
+    status_code=status.HTTP_200_OK,
+)
+async def cancel_batch_job(
+    job_id: UUID,
+    service: BatchJobService = Depends(get_batch_job_service),
+) -> BatchJobResource:
+    try:
+        job = await call_service(service.cancel, str(job_id))
+    except BatchJobNotFoundError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=str(exc)) from exc
+    except RuntimeError as exc:
+        raise _batch_api_error(exc) from exc
+    return BatchJobResource.model_validate(job)
@@ -1,32 +1,51 @@
+import json
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from chat_core.api import call_service, iterate_service
+from chat_core.idempotency import IdempotencyKeyMismatchError
+from chat_core.pagination import InvalidCursorError
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 
-from app.api.deps import get_chat_service
-from app.schemas.chat import ChatCreateResponse, ChatMessageRequest, ChatMessageResponse, ChatResource
-from app.services.chat_service import ChatNotFoundError, ChatService
+from app.api.deps import admit_turn, get_chat_service, json_response
+from app.schemas.chat import (
+    ChatCreateResponse,
+    ChatMessageRequest,
+    ChatMessageResponse,
+    MessagePageResponse,
+    MessageResource,
+)
+from app.services.chat_service import AsyncChatService, ChatNotFoundError, ChatService
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 
 @router.post("", response_model=ChatCreateResponse, status_code=status.HTTP_201_CREATED)
-def create_chat(chat_service: ChatService = Depends(get_chat_service)) -> ChatCreateResponse:
-    chat = chat_service.create_chat()
-    resource = ChatResource.model_validate(chat, from_attributes=True)
-    return ChatCreateResponse(chat=resource)
+async def create_chat(
+    chat_service: ChatService | AsyncChatService = Depends(get_chat_service),
+) -> ChatCreateResponse:
+    chat = await call_service(chat_service.create_chat)
+    resource = {"id": chat.id, "created_at": chat.created_at}
+    return json_response(ChatCreateResponse, {"chat": resource}, status.HTTP_201_CREATED)
 
 
-@router.post("/{chat_id}", response_model=ChatMessageResponse)
-def send_message(
+@router.post("/{chat_id}", response_model=ChatMessageResponse, dependencies=[Depends(admit_turn)])
+async def send_message(
     chat_id: UUID,
     payload: ChatMessageRequest,
-    chat_service: ChatService = Depends(get_chat_service),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    chat_service: ChatService | AsyncChatService = Depends(get_chat_service),
 ) -> ChatMessageResponse:
     try:
-        message = chat_service.send_message(chat_id, payload.message)
+        message = await call_service(chat_service.send_message, chat_id, payload.message, idempotency_key)
     except ChatNotFoundError as exc:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=str(exc)) from exc
+    except IdempotencyKeyMismatchError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc)) from exc
     except RuntimeError as exc:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
@@ -36,9 +55,142 @@ def send_message(
             },
         ) from exc
 
-    return ChatMessageResponse(
-        chat_id=UUID(message.chat_id),
+    return json_response(ChatMessageResponse, {
+        "chat_id": message.chat_id,
+        "response": message.content,
+        "role": message.role,
+        "sent_at": message.created_at,
+    })
+
+
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def _reply_events(chat_id: UUID, reply_stream: Any) -> AsyncIterator[str]:
+    try:
+        async for delta in iterate_service(reply_stream):
+            yield _sse("delta", json.dumps({"delta": delta}))
+    except RuntimeError as exc:
+        yield _sse("error", json.dumps({
+            "message": "Failed to generate response from language model.",
+            "reason": str(exc),
+        }))
+        return
+
+    message = reply_stream.message
+    if message is None:
+        yield _sse("error", json.dumps({
+            "message": "Failed to generate response from language model.",
+            "reason": "OpenAI response did not contain text content.",
+        }))
+        return
+
+    done = ChatMessageResponse(
+        chat_id=chat_id,
         response=message.content,
         role=message.role,
         sent_at=message.created_at,
     )
+    yield _sse("done", done.model_dump_json())
+
+
+@router.post(
+    "/{chat_id}/stream",
+    response_class=StreamingResponse,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(admit_turn)],
+)
+async def stream_message(
+    chat_id: UUID,
+    payload: ChatMessageRequest,
+    chat_service: ChatService | AsyncChatService = Depends(get_chat_service),
+) -> StreamingResponse:
+    """Stream the assistant reply as Server-Sent Events.
+
+    Emits ``delta`` events while the model generates, then a single ``done``
+    event carrying the persisted message, or an ``error`` event.
+    """
+    try:
+        reply_stream = await call_service(chat_service.stream_message, chat_id, payload.message)
+    except ChatNotFoundError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=str(exc)) from exc
+    except RuntimeError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail={
+                "message": "Failed to generate response from language model.",
+                "reason": str(exc),
+            },
+        ) from exc
+
+    return StreamingResponse(
+        _reply_events(chat_id, reply_stream),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/{chat_id}/messages", response_model=MessagePageResponse)
+async def list_messages(
+    chat_id: UUID,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, max_length=512),
+    order: Literal["asc", "desc"] = "asc",
+    chat_service: ChatService | AsyncChatService = Depends(get_chat_service),
+) -> MessagePageResponse:
+    """Page through a chat's messages; follow ``next_cursor`` until it is ``null``."""
+    try:
+        page = await call_service(chat_service.list_messages, chat_id, limit, cursor, order == "desc")
+    except ChatNotFoundError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=str(exc)) from exc
+    except InvalidCursorError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc)) from exc
+    return json_response(MessagePageResponse, {
+        "chat_id": chat_id,
+        "messages": [_message_fields(message) for message in page.items],
+        "next_cursor": page.next_cursor,
+    })
+
+
+def _message_fields(message: Any) -> Dict[str, Any]:
+    return {"id": message.id, "role": message.role, "content": message.content, "created_at": message.created_at}
+
+
+_message_list = TypeAdapter(List[MessageResource])
+
+
+async def _export_json(chat_id: UUID, batches: Any) -> AsyncIterator[bytes]:
+    yield b'{"chat_id":"' + str(chat_id).encode() + b'","messages":['
+    separator = b""
+    async for batch in iterate_service(batches):
+        items = _message_list.validate_python(batch, from_attributes=True)
+        # Drop the list's brackets so consecutive batches join into one array.
+        yield separator + _message_list.dump_json(items)[1:-1]
+        separator = b","
+    yield b"]}"
+
+
+@router.get("/{chat_id}/messages/export", response_class=StreamingResponse)
+async def export_messages(
+    chat_id: UUID,
+    chat_service: ChatService | AsyncChatService = Depends(get_chat_service),
+) -> StreamingResponse:
+    """Stream every message of a chat, oldest first, as one JSON document.
+
+    Messages are read in keyset batches and sent as they are read, so memory
+    use stays flat however long the chat is.
+    """
+    try:
+        batches = await call_service(chat_service.export_messages, chat_id)
+    except ChatNotFoundError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=str(exc)) from exc
+    return StreamingResponse(
+        _export_json(chat_id, batches),
+        media_type="application/json",
+        headers={"Content-Disposition": f'attachment; filename="chat-{chat_id}.json"'},
+    )
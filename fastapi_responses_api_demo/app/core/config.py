@@ -1,14 +1,27 @@
 from functools import lru_cache
-from typing import Literal, Optional
+from typing import Literal
 
-from pydantic_settings import BaseSettings, SettingsConfigDict
+from chat_core.config import (
+    AdmissionSettings,
+    ArchiveSettings,
+    BatchSettings,
+    ChatSettings,
+    DatabaseSettings,
+    ObservabilitySettings,
+)
+from pydantic_settings import SettingsConfigDict
 
 
-class Settings(BaseSettings):
-    openai_api_key: Optional[str] = None
+class Settings(
+    DatabaseSettings, ObservabilitySettings, ChatSettings, ArchiveSettings, BatchSettings, AdmissionSettings
+):
     openai_model: str = "gpt-5-nano-2025-08-07"
-    openai_max_output_tokens: int = 512
+    openai_chain_responses: bool = True
+    llm_backend: Literal["chat_completions", "responses"] = "responses"
     database_url: str = "sqlite:///./responses_chat.db"
+    execution_mode: Literal["sync", "async"] = "async"
+    response_serialization: Literal["validated", "lean"] = "validated"
+    otel_service_name: str = "fastapi-responses-api-demo"
     environment: Literal["development",
                          "production", "testing"] = "development"
 
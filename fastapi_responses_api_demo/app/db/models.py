@@ -1,10 +1,11 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 from uuid import uuid4
 
-from sqlalchemy import Column, DateTime, ForeignKey, String, Text
+from chat_core.models import ChatModels
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, LargeBinary, String, Text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -19,12 +20,30 @@ class Chat(Base):
         String(36), primary_key=True, default=lambda: str(uuid4()))
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=datetime.utcnow)
+    summary: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    summary_until: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True)
+    last_response_id: Mapped[Optional[str]] = mapped_column(
+        String(64), nullable=True)
+    # Maintained by every write of a turn; compaction picks chats by ``last_activity_at``.
+    last_activity_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), default=datetime.utcnow, nullable=True, index=True)
+    message_count: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False)
+    # Set while the chat's messages live in ``chat_archives`` instead of ``messages``.
+    archived_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True)
     messages: Mapped[List["Message"]] = relationship(
         "Message", back_populates="chat", cascade="all, delete-orphan")
 
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Serves keyset pages (``chat_id = ? AND (created_at, id) > (?, ?)``) as an
+        # index seek, and the newest-first ``LIMIT`` history query as a reverse scan.
+        Index("ix_messages_chat_id_created_at_id", "chat_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     chat_id: Mapped[str] = mapped_column(String(36), ForeignKey(
@@ -35,3 +54,71 @@ class Message(Base):
         DateTime(timezone=True), default=datetime.utcnow)
 
     chat: Mapped[Chat] = relationship("Chat", back_populates="messages")
+
+
+class ChatArchive(Base):
+    """Messages of an idle chat, packed by ``chat_core.archive.pack_messages``."""
+
+    __tablename__ = "chat_archives"
+
+    chat_id: Mapped[str] = mapped_column(String(36), ForeignKey(
+        "chats.id", ondelete="CASCADE"), primary_key=True)
+    payload: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    message_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=datetime.utcnow)
+
+
+class BatchJob(Base):
+    """A bulk job of chat turns run through the Batch API (see ``chat_core.batch_service``)."""
+
+    __tablename__ = "batch_jobs"
+
+    id: Mapped[str] = mapped_column(
+        String(36), primary_key=True, default=lambda: str(uuid4()))
+    # The upstream batch; ``None`` until it has been submitted.
+    batch_id: Mapped[Optional[str]] = mapped_column(
+        String(64), nullable=True, index=True)
+    status: Mapped[str] = mapped_column(
+        String(20), nullable=False, default="submitting")
+    request_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    succeeded: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False)
+    failed: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=datetime.utcnow)
+    # Set once every result has been written back as messages.
+    ingested_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True)
+    # When the refresh writing the results back (status ``ingesting``) last made progress.
+    ingest_claimed_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True)
+    items: Mapped[List["BatchJobItem"]] = relationship(
+        "BatchJobItem", back_populates="job", cascade="all, delete-orphan")
+
+
+class BatchJobItem(Base):
+    """One turn of a batch job; its ``id`` is the request's ``custom_id``."""
+
+    __tablename__ = "batch_job_items"
+
+    id: Mapped[str] = mapped_column(
+        String(36), primary_key=True, default=lambda: str(uuid4()))
+    job_id: Mapped[str] = mapped_column(String(36), ForeignKey(
+        "batch_jobs.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Submission order; replies are written back in this order.
+    position: Mapped[int] = mapped_column(Integer, nullable=False)
+    chat_id: Mapped[str] = mapped_column(String(36), ForeignKey(
+        "chats.id", ondelete="CASCADE"), nullable=False)
+    content: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[str] = mapped_column(
+        String(16), nullable=False, default="pending")
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    job: Mapped[BatchJob] = relationship("BatchJob", back_populates="items")
+
+
+# The classes the shared chat, batch and archive services in chat_core work on.
+CHAT_MODELS = ChatModels(
+    chat=Chat, message=Message, archive=ChatArchive, batch_job=BatchJob, batch_job_item=BatchJobItem)
@@ -0,0 +1,27 @@
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+
+
+class BatchTurn(BaseModel):
+    chat_id: UUID
+    message: str = Field(..., min_length=1, max_length=4096)
+
+
+class BatchJobCreateRequest(BaseModel):
+    turns: List[BatchTurn] = Field(..., min_length=1, max_length=50000)
+
+
+class BatchJobResource(BaseModel):
+    id: UUID
+    status: str
+    request_count: int
+    succeeded: int
+    failed: int
+    created_at: datetime
+    ingested_at: Optional[datetime] = Field(
+        None, description="When the replies were written back to their chats; ``null`` until then.")
+
+    model_config = {"from_attributes": True}
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import List, Optional
 from uuid import UUID
 
 from pydantic import BaseModel, Field
@@ -24,3 +25,19 @@ class ChatMessageResponse(BaseModel):
     response: str
     role: str = "assistant"
     sent_at: datetime
+
+
+class MessageResource(BaseModel):
+    id: int
+    role: str
+    content: str
+    created_at: datetime
+
+    model_config = {"from_attributes": True}
+
+
+class MessagePageResponse(BaseModel):
+    chat_id: UUID
+    messages: List[MessageResource]
+    next_cursor: Optional[str] = Field(
+        None, description="Pass as ``cursor`` to fetch the next page; ``null`` on the last page.")
@@ -0,0 +1,39 @@
+"""Bulk chat turns through the OpenAI Batch API; see :mod:`chat_core.batch_service`.
+
+Use the ``/batches`` routes or the CLI::
+
+    python -m app.services.batch submit turns.jsonl --wait
+    python -m app.services.batch wait <job-id>
+"""
+
+from typing import Optional
+
+from chat_core import batch_service
+from chat_core.batch import BatchBackend
+from chat_core.batch_service import BatchJobNotFoundError
+from chat_core.history_cache import HistoryCache
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.db.models import CHAT_MODELS
+
+__all__ = ["BatchJobNotFoundError", "BatchJobService", "main"]
+
+
+class BatchJobService(batch_service.BatchJobService):
+    def __init__(self, db: Session, backend: BatchBackend, history_cache: Optional[HistoryCache] = None) -> None:
+        super().__init__(db, backend, CHAT_MODELS, get_settings(), history_cache)
+
+
+def main() -> None:
+    from app.api.deps import get_batch_backend, get_history_cache
+    from app.db.session import SessionLocal, init_db
+
+    backend = get_batch_backend()
+    history_cache = get_history_cache()
+    batch_service.main(
+        get_settings(), SessionLocal, init_db, lambda session: BatchJobService(session, backend, history_cache))
+
+
+if __name__ == "__main__":
+    main()
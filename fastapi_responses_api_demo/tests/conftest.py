@@ -0,0 +1,5 @@
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test-api-key")
+# Keep app startup in tests from creating or migrating the bundled responses_chat.db.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
@@ -1,30 +1,112 @@
-from app.services.chat_service import ChatService
+from chat_core import batch_service, chat_service
+from chat_core.admission import AdmissionController, ConcurrencyLimiter, InMemoryRateLimitStore, Limit
+from chat_core.archive import compact_idle_chats
+from chat_core.batch import LocalBatchBackend, canned_reply
+from chat_core.llm import BackendSet, Generation, PreviousResponseNotFoundError
+from chat_core.metrics import record_usage
+from chat_core.group_commit import AsyncGroupCommitWriter, GroupCommitWriter
+from chat_core.history_cache import InMemoryHistoryCache
+from chat_core.idempotency import IdempotencyKeyMismatchError, IdempotencyStore
+from chat_core.singleflight import AsyncSingleFlight, SingleFlight
+from app.services.batch import BatchJobService
+from app.services.chat_service import AsyncChatService, ChatService, ReplyStream
 from app.main import create_app
+from app.core.config import get_settings
 from app.db.session import get_db
-from app.db.models import Base
-from app.api.deps import get_chat_service
+from app.db.models import CHAT_MODELS, Base, Chat, ChatArchive, Message
+from app.api import deps
+from app.api.deps import get_admission_controller, get_batch_job_service, get_chat_service, get_llm_backend
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
-from sqlalchemy import StaticPool, create_engine
+from sqlalchemy import StaticPool, create_engine, select
 from fastapi.testclient import TestClient
 from fastapi import Depends
 import pytest
+from datetime import datetime, timedelta
 from uuid import UUID
-from typing import Dict, List
-from collections.abc import Generator
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from collections.abc import AsyncGenerator, Generator
+import asyncio
+import json
 import os
+import re
 os.environ.setdefault("OPENAI_API_KEY", "test-api-key")
 
 os.environ.setdefault("OPENAI_API_KEY", "test-api-key")
 
 
-class FakeOpenAIResponsesClient:
+class FakeResponsesBackend:
+    name = "responses"
+    supports_chaining = True
+
     def __init__(self, response_text: str = "Hello from test bot!") -> None:
         self._response_text = response_text
         self.last_messages: List[Dict[str, str]] = []
+        self.last_previous_response_id: Optional[str] = None
+        self.issued_response_ids: List[str] = []
+
+    def generate(self, messages: List[Dict[str, str]], previous_response_id: Optional[str] = None) -> Generation:
+        self.last_messages = messages
+        return Generation(self._response_text, self._chain(previous_response_id))
+
+    def stream(
+        self,
+        messages: List[Dict[str, str]],
+        previous_response_id: Optional[str] = None,
+        on_response_id: Optional[Callable[[str], None]] = None,
+    ) -> Iterator[str]:
+        response_id = self._chain(previous_response_id)
+        self.last_messages = messages
+        if on_response_id is not None:
+            on_response_id(response_id)
+        return iter(re.findall(r"\S+\s*", self._response_text))
+
+    def close(self) -> None:
+        pass
+
+    def _chain(self, previous_response_id: Optional[str]) -> str:
+        if previous_response_id and previous_response_id not in self.issued_response_ids:
+            raise PreviousResponseNotFoundError(f"Unknown response {previous_response_id}")
+        self.last_previous_response_id = previous_response_id
+        response_id = f"resp_{len(self.issued_response_ids) + 1}"
+        self.issued_response_ids.append(response_id)
+        return response_id
+
+
+class FakeChatCompletionsBackend(FakeResponsesBackend):
+    """Stateless: no response ids and nothing to chain from."""
 
-    def create_response(self, messages: List[Dict[str, str]]) -> str:
+    name = "chat_completions"
+    supports_chaining = False
+
+    def generate(self, messages: List[Dict[str, str]], previous_response_id: Optional[str] = None) -> Generation:
+        assert previous_response_id is None
         self.last_messages = messages
-        return self._response_text
+        return Generation(f"{self._response_text} (chat completions)")
+
+
+class FakeAsyncResponsesBackend(FakeResponsesBackend):
+    async def generate(  # type: ignore[override]
+        self, messages: List[Dict[str, str]], previous_response_id: Optional[str] = None
+    ) -> Generation:
+        return super().generate(messages, previous_response_id)
+
+    async def stream(  # type: ignore[override]
+        self,
+        messages: List[Dict[str, str]],
+        previous_response_id: Optional[str] = None,
+        on_response_id: Optional[Callable[[str], None]] = None,
+    ) -> AsyncIterator[str]:
+        deltas = super().stream(messages, previous_response_id, on_response_id)
+
+        async def generate() -> AsyncIterator[str]:
+            for delta in deltas:
+                yield delta
+
+        return generate()
+
+    async def close(self) -> None:  # type: ignore[override]
+        pass
 
 
 @pytest.fixture()
@@ -48,11 +130,18 @@ def test_app():
         finally:
             db.close()
 
-    fake_client = FakeOpenAIResponsesClient()
+    fake_client = FakeResponsesBackend()
+    single_flight = SingleFlight()
+    idempotency_store = IdempotencyStore()
 
     # type: ignore[arg-type]
     def override_get_chat_service(db: Session = Depends(override_get_db)) -> ChatService:
-        return ChatService(db=db, openai_client=fake_client)
+        return ChatService(
+            db=db,
+            llm=fake_client,
+            single_flight=single_flight,
+            idempotency_store=idempotency_store,
+        )
 
     app.dependency_overrides[get_db] = override_get_db
     app.dependency_overrides[get_chat_service] = override_get_chat_service
@@ -62,6 +151,32 @@ def test_app():
     app.dependency_overrides.clear()
 
 
+@pytest.fixture()
+def async_test_app(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'async_chat.db'}"
+    Base.metadata.create_all(bind=create_engine(database_url))
+    async_engine = create_async_engine(
+        database_url.replace("sqlite://", "sqlite+aiosqlite://", 1))
+    TestingAsyncSessionLocal = async_sessionmaker(
+        bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    app = create_app()
+    fake_client = FakeAsyncResponsesBackend()
+
+    async def override_get_async_db() -> AsyncGenerator[AsyncSession, None]:
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
+    def override_get_chat_service(db: AsyncSession = Depends(override_get_async_db)) -> AsyncChatService:
+        return AsyncChatService(db=db, llm=fake_client)  # type: ignore[arg-type]
+
+    app.dependency_overrides[get_chat_service] = override_get_chat_service
+
+    yield app, fake_client
+
+    app.dependency_overrides.clear()
+
+
 @pytest.fixture()
 def client(test_app):
     app, _ = test_app
@@ -94,3 +209,880 @@ def test_send_message_unknown_chat_returns_404(client):
         "/chat/00000000-0000-0000-0000-000000000000", json={"message": "Hello"})
     assert response.status_code == 404
     assert "not found" in response.json()["detail"].lower()
+
+
+def test_async_service_sends_full_history(async_test_app, monkeypatch):
+    monkeypatch.setattr(get_settings(), "openai_chain_responses", False)
+    app, fake_client = async_test_app
+    with TestClient(app) as async_client:
+        chat_id = async_client.post("/chat").json()["chat"]["id"]
+
+        first = async_client.post(f"/chat/{chat_id}", json={"message": "First"})
+        second = async_client.post(f"/chat/{chat_id}", json={"message": "Second"})
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert second.json()["response"] == fake_client._response_text
+    assert [message["content"] for message in fake_client.last_messages] == [
+        "First",
+        fake_client._response_text,
+        "Second",
+    ]
+
+
+def test_async_service_unknown_chat_returns_404(async_test_app):
+    app, _ = async_test_app
+    with TestClient(app) as async_client:
+        response = async_client.post(
+            "/chat/00000000-0000-0000-0000-000000000000", json={"message": "Hello"})
+    assert response.status_code == 404
+
+
+def _parse_sse(body: str) -> List[tuple]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_message_emits_deltas_and_persists_reply(client, test_app, monkeypatch):
+    monkeypatch.setattr(get_settings(), "openai_chain_responses", False)
+    _, fake_client = test_app
+    chat_id = client.post("/chat").json()["chat"]["id"]
+
+    response = client.post(f"/chat/{chat_id}/stream", json={"message": "Stream it"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = _parse_sse(response.text)
+    deltas = [data["delta"] for event, data in events if event == "delta"]
+    assert len(deltas) > 1
+    assert "".join(deltas) == fake_client._response_text
+    assert events[-1][0] == "done"
+    assert events[-1][1]["response"] == fake_client._response_text
+
+    client.post(f"/chat/{chat_id}", json={"message": "Follow up"})
+    assert [message["role"] for message in fake_client.last_messages] == [
+        "user", "assistant", "user"]
+
+
+def test_stream_message_unknown_chat_returns_404(client):
+    response = client.post(
+        "/chat/00000000-0000-0000-0000-000000000000/stream", json={"message": "Hello"})
+    assert response.status_code == 404
+
+
+def test_async_stream_message_emits_done_event(async_test_app):
+    app, fake_client = async_test_app
+    with TestClient(app) as async_client:
+        chat_id = async_client.post("/chat").json()["chat"]["id"]
+        response = async_client.post(f"/chat/{chat_id}/stream", json={"message": "Stream it"})
+
+    events = _parse_sse(response.text)
+    assert events[-1] == ("done", {
+        "chat_id": chat_id,
+        "response": fake_client._response_text,
+        "role": "assistant",
+        "sent_at": events[-1][1]["sent_at"],
+    })
+
+
+@pytest.mark.parametrize(("policy", "expected"), [("save", ["Hello"]), ("discard", [])])
+def test_reply_stream_partial_policy_on_early_close(policy, expected):
+    saved: List[str] = []
+    stream = ReplyStream(iter(["Hello ", "world"]), saved.append, policy)  # type: ignore[arg-type]
+
+    iterator = iter(stream)
+    assert next(iterator) == "Hello "
+    iterator.close()
+
+    assert saved == expected
+
+
+def test_long_chat_replays_bounded_window_with_summary(client, test_app, monkeypatch):
+    _, fake_client = test_app
+    settings = get_settings()
+    monkeypatch.setattr(settings, "openai_chain_responses", False)
+    monkeypatch.setattr(settings, "history_max_tokens", 1)
+    monkeypatch.setattr(settings, "history_min_messages", 2)
+    monkeypatch.setattr(settings, "history_summary_enabled", True)
+    chat_id = client.post("/chat").json()["chat"]["id"]
+
+    for turn in range(3):
+        client.post(f"/chat/{chat_id}", json={"message": f"Turn {turn}"})
+
+    assert fake_client.last_messages[0] == {
+        "role": "system",
+        "content": f"Summary of the earlier conversation:\n{fake_client._response_text}",
+    }
+    assert [message["content"] for message in fake_client.last_messages[1:]] == [
+        "Turn 1",
+        fake_client._response_text,
+        "Turn 2",
+    ]
+
+
+def test_history_breaks_created_at_ties_by_id(client, test_app, monkeypatch):
+    app, fake_client = test_app
+    monkeypatch.setattr(get_settings(), "openai_chain_responses", False)
+    monkeypatch.setattr(get_settings(), "history_max_messages", 2)
+    chat_id = client.post("/chat").json()["chat"]["id"]
+    db = next(app.dependency_overrides[get_db]())
+    same_time = datetime(2025, 1, 1)
+    db.add_all([Message(chat_id=chat_id, role=role, content=content, created_at=same_time)
+                for role, content in [("user", "A"), ("assistant", "B"), ("user", "C")]])
+    db.commit()
+
+    client.post(f"/chat/{chat_id}", json={"message": "D"})
+
+    assert [message["content"] for message in fake_client.last_messages] == ["B", "C", "D"]
+
+
+def test_follow_up_turn_chains_previous_response_id(client, test_app):
+    _, fake_client = test_app
+    chat_id = client.post("/chat").json()["chat"]["id"]
+
+    client.post(f"/chat/{chat_id}", json={"message": "First"})
+    assert fake_client.last_previous_response_id is None
+
+    reply = client.post(f"/chat/{chat_id}", json={"message": "Second"})
+    assert reply.status_code == 200
+    assert fake_client.last_previous_response_id == "resp_1"
+    assert fake_client.last_messages == [{"role": "user", "content": "Second"}]
+
+
+def test_rejected_previous_response_id_replays_full_history(client, test_app):
+    _, fake_client = test_app
+    chat_id = client.post("/chat").json()["chat"]["id"]
+    client.post(f"/chat/{chat_id}", json={"message": "First"})
+    fake_client.issued_response_ids.clear()  # simulate an expired response
+
+    reply = client.post(f"/chat/{chat_id}", json={"message": "Second"})
+
+    assert reply.status_code == 200
+    assert fake_client.last_previous_response_id is None
+    assert [message["content"] for message in fake_client.last_messages] == [
+        "First",
+        fake_client._response_text,
+        "Second",
+    ]
+
+
+def test_streamed_turn_advances_response_chain(async_test_app):
+    app, fake_client = async_test_app
+    with TestClient(app) as async_client:
+        chat_id = async_client.post("/chat").json()["chat"]["id"]
+        async_client.post(f"/chat/{chat_id}/stream", json={"message": "First"})
+        async_client.post(f"/chat/{chat_id}", json={"message": "Second"})
+
+    assert fake_client.last_previous_response_id == "resp_1"
+    assert fake_client.last_messages == [{"role": "user", "content": "Second"}]
+
+
+@pytest.fixture()
+def cached_test_app():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    TestingSessionLocal = sessionmaker(
+        bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
+    Base.metadata.create_all(bind=engine)
+
+    app = create_app()
+    fake_client = FakeResponsesBackend()
+    cache = InMemoryHistoryCache()
+
+    def override_get_chat_service() -> Generator[ChatService, None, None]:
+        db = TestingSessionLocal()
+        try:
+            yield ChatService(db=db, llm=fake_client, history_cache=cache)
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_service] = override_get_chat_service
+
+    yield app, fake_client, cache, TestingSessionLocal
+
+    app.dependency_overrides.clear()
+
+
+def test_cached_history_matches_database_history(cached_test_app, monkeypatch):
+    monkeypatch.setattr(get_settings(), "openai_chain_responses", False)
+    app, fake_client, cache, _ = cached_test_app
+    with TestClient(app) as cached_client:
+        chat_id = cached_client.post("/chat").json()["chat"]["id"]
+        cached_client.post(f"/chat/{chat_id}/stream", json={"message": "First"})
+        cached_client.post(f"/chat/{chat_id}", json={"message": "Second"})
+
+    assert [message["content"] for message in fake_client.last_messages] == [
+        "First",
+        fake_client._response_text,
+        "Second",
+    ]
+    # One lookup per turn.
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (2, 0)
+
+
+def test_cached_chat_persists_response_chain(cached_test_app):
+    app, fake_client, cache, session_factory = cached_test_app
+    with TestClient(app) as cached_client:
+        chat_id = cached_client.post("/chat").json()["chat"]["id"]
+        cached_client.post(f"/chat/{chat_id}", json={"message": "First"})
+        cache.invalidate(chat_id)
+        cached_client.post(f"/chat/{chat_id}", json={"message": "Second"})
+        cached_client.post(f"/chat/{chat_id}", json={"message": "Third"})
+
+    assert fake_client.last_previous_response_id == "resp_2"
+    with session_factory() as db:
+        assert db.get(Chat, chat_id).last_response_id == "resp_3"
+
+
+@pytest.mark.parametrize("chain", [False, True])
+def test_workers_with_their_own_caches_never_replay_stale_history(cached_test_app, monkeypatch, chain):
+    monkeypatch.setattr(get_settings(), "openai_chain_responses", chain)
+    _, fake_client, _, session_factory = cached_test_app
+    # Two workers, each with its own in-process cache, over one database.
+    workers = [InMemoryHistoryCache(), InMemoryHistoryCache()]
+
+    def send(worker: int, chat_id: str, content: str) -> None:
+        with session_factory() as db:
+            ChatService(db=db, llm=fake_client, history_cache=workers[worker]).send_message(chat_id, content)
+
+    with session_factory() as db:
+        chat_id = ChatService(db=db, llm=fake_client, history_cache=workers[0]).create_chat().id
+    send(0, chat_id, "First")
+    send(1, chat_id, "Second")
+    send(0, chat_id, "Third")
+
+    if chain:
+        assert fake_client.last_previous_response_id == "resp_2"
+    else:
+        assert [message["content"] for message in fake_client.last_messages] == [
+            "First", fake_client._response_text, "Second", fake_client._response_text, "Third"]
+    with session_factory() as db:
+        assert db.get(Chat, chat_id).message_count == 6
+
+
+def test_idempotency_key_replays_stored_reply(client, test_app):
+    _, fake_client = test_app
+    chat_id = client.post("/chat").json()["chat"]["id"]
+    headers = {"Idempotency-Key": "retry-1"}
+
+    first = client.post(f"/chat/{chat_id}", json={"message": "Hello"}, headers=headers)
+    retry = client.post(f"/chat/{chat_id}", json={"message": "Hello"}, headers=headers)
+    client.post(f"/chat/{chat_id}", json={"message": "Next"})
+
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+    assert fake_client.issued_response_ids == ["resp_1", "resp_2"]
+
+
+def test_idempotency_key_reused_with_other_message_returns_422(client):
+    chat_id = client.post("/chat").json()["chat"]["id"]
+    headers = {"Idempotency-Key": "retry-1"}
+    client.post(f"/chat/{chat_id}", json={"message": "Hello"}, headers=headers)
+
+    response = client.post(f"/chat/{chat_id}", json={"message": "Goodbye"}, headers=headers)
+
+    assert response.status_code == 422
+
+
+def test_retry_arriving_as_the_turn_finishes_replays_it(test_app):
+    app, fake_client = test_app
+    retries = []
+
+    class RetryOnRelease(SingleFlight):
+        def do(self, key, fn):
+            result = super().do(key, fn)
+            if key[0] == "idempotency" and not retries:
+                # The retry lands after single-flight let go of the key.
+                retries.append(None)
+                retries[0] = service.send_message(chat.id, "Hello", idempotency_key="retry-1")
+            return result
+
+    service = ChatService(db=next(app.dependency_overrides[get_db]()), llm=fake_client,
+                          single_flight=RetryOnRelease(), idempotency_store=IdempotencyStore())
+    chat = service.create_chat()
+
+    first = service.send_message(chat.id, "Hello", idempotency_key="retry-1")
+
+    assert retries[0].id == first.id
+    assert fake_client.issued_response_ids == ["resp_1"]
+
+
+class SlowFakeAsyncResponsesBackend(FakeAsyncResponsesBackend):
+    async def generate(  # type: ignore[override]
+        self, messages: List[Dict[str, str]], previous_response_id: Optional[str] = None
+    ) -> Generation:
+        await asyncio.sleep(0.05)
+        return await super().generate(messages, previous_response_id)
+
+
+def test_concurrent_duplicate_turns_share_one_upstream_call(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'coalesce.db'}"
+    Base.metadata.create_all(bind=create_engine(database_url))
+    async_engine = create_async_engine(database_url.replace("sqlite://", "sqlite+aiosqlite://", 1))
+    session_factory = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+    fake_client = SlowFakeAsyncResponsesBackend()
+    single_flight = AsyncSingleFlight()
+
+    async def send(chat_id: str, content: str):
+        async with session_factory() as db:
+            service = AsyncChatService(db=db, llm=fake_client, single_flight=single_flight)  # type: ignore[arg-type]
+            return await service.send_message(chat_id, content)
+
+    async def scenario():
+        async with session_factory() as db:
+            chat = await AsyncChatService(db=db, llm=fake_client).create_chat()  # type: ignore[arg-type]
+        replies = await asyncio.gather(
+            send(chat.id, "Hello"), send(chat.id, "Hello"), send(chat.id, "Something else"))
+        async with session_factory() as db:
+            rows = (await db.execute(select(Message).where(Message.chat_id == chat.id))).scalars().all()
+        await async_engine.dispose()
+        return replies, rows
+
+    replies, rows = asyncio.run(scenario())
+
+    assert replies[0] is replies[1]
+    assert len(fake_client.issued_response_ids) == 2
+    assert len(rows) == 4
+
+
+
+def test_concurrent_duplicate_turns_build_the_history_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "openai_chain_responses", False)
+    database_url = f"sqlite:///{tmp_path / 'coalesce.db'}"
+    Base.metadata.create_all(bind=create_engine(database_url))
+    async_engine = create_async_engine(database_url.replace("sqlite://", "sqlite+aiosqlite://", 1))
+    session_factory = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+    fake_client = SlowFakeAsyncResponsesBackend()
+    single_flight = AsyncSingleFlight()
+    builds = []
+    history_payload = AsyncChatService._history_payload
+
+    async def counted_history_payload(self, chat, content, pending=None):
+        builds.append(content)
+        return await history_payload(self, chat, content, pending)
+
+    monkeypatch.setattr(AsyncChatService, "_history_payload", counted_history_payload)
+
+    async def send(chat_id: str, content: str):
+        async with session_factory() as db:
+            service = AsyncChatService(db=db, llm=fake_client, single_flight=single_flight)  # type: ignore[arg-type]
+            return await service.send_message(chat_id, content)
+
+    async def scenario():
+        async with session_factory() as db:
+            chat = await AsyncChatService(db=db, llm=fake_client).create_chat()  # type: ignore[arg-type]
+        replies = await asyncio.gather(send(chat.id, "Hello"), send(chat.id, "Hello"))
+        await async_engine.dispose()
+        return replies
+
+    replies = asyncio.run(scenario())
+
+    assert replies[0] is replies[1]
+    assert builds == ["Hello"]
+    assert len(fake_client.issued_response_ids) == 1
+
+
+def test_idempotency_key_reused_while_in_flight_is_rejected_up_front(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'idempotency.db'}"
+    Base.metadata.create_all(bind=create_engine(database_url))
+    async_engine = create_async_engine(database_url.replace("sqlite://", "sqlite+aiosqlite://", 1))
+    session_factory = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+    fake_client = SlowFakeAsyncResponsesBackend()
+    single_flight = AsyncSingleFlight()
+    idempotency_store = IdempotencyStore()
+
+    async def send(chat_id: str, content: str):
+        async with session_factory() as db:
+            service = AsyncChatService(
+                db=db, llm=fake_client, single_flight=single_flight,  # type: ignore[arg-type]
+                idempotency_store=idempotency_store)
+            return await service.send_message(chat_id, content, idempotency_key="retry-1")
+
+    async def reuse(chat_id: str):
+        try:
+            await send(chat_id, "Goodbye")
+        except IdempotencyKeyMismatchError:
+            # Upstream calls finished by the time the reused key was turned away.
+            return len(fake_client.issued_response_ids)
+
+    async def scenario():
+        async with session_factory() as db:
+            chat = await AsyncChatService(db=db, llm=fake_client).create_chat()  # type: ignore[arg-type]
+        replies = await asyncio.gather(send(chat.id, "Hello"), reuse(chat.id))
+        await async_engine.dispose()
+        return replies
+
+    first, finished_before_rejection = asyncio.run(scenario())
+
+    assert first.content == "Hello from test bot!"
+    assert finished_before_rejection == 0
+    assert len(fake_client.issued_response_ids) == 1
+
+def test_rate_limited_turns_get_429_with_retry_after(client, test_app):
+    app, _ = test_app
+    controller = AdmissionController(InMemoryRateLimitStore(), chat_limit=Limit.per_minute(6, burst=2))
+    app.dependency_overrides[get_admission_controller] = lambda: controller
+    chat_id = client.post("/chat").json()["chat"]["id"]
+
+    assert [client.post(f"/chat/{chat_id}", json={"message": "Hi"}).status_code for _ in range(2)] == [200, 200]
+    rejected = client.post(f"/chat/{chat_id}", json={"message": "Hi"})
+    streamed = client.post(f"/chat/{chat_id}/stream", json={"message": "Hi"})
+
+    assert rejected.status_code == 429
+    assert rejected.headers["Retry-After"] == "10"
+    assert streamed.status_code == 429
+    other_chat = client.post("/chat").json()["chat"]["id"]
+    assert client.post(f"/chat/{other_chat}", json={"message": "Hi"}).status_code == 200
+
+
+def test_made_up_api_keys_do_not_get_their_own_rate_limit(client, test_app, monkeypatch):
+    app, _ = test_app
+    monkeypatch.setattr(get_settings(), "rate_limit_api_keys", ["issued-key"])
+    controller = AdmissionController(InMemoryRateLimitStore(), caller_limit=Limit.per_minute(1))
+    app.dependency_overrides[get_admission_controller] = lambda: controller
+    chat_id = client.post("/chat").json()["chat"]["id"]
+
+    def send(api_key: str) -> int:
+        return client.post(f"/chat/{chat_id}", json={"message": "Hi"}, headers={"X-API-Key": api_key}).status_code
+
+    assert [send("made-up-1"), send("made-up-2"), send("issued-key")] == [200, 429, 200]
+
+
+def test_token_budget_is_settled_against_reported_usage(client, test_app, monkeypatch):
+    app, fake_client = test_app
+    monkeypatch.setattr(get_settings(), "rate_limit_tokens_per_minute", 1.0)
+    generate = fake_client.generate
+
+    def generate_with_usage(messages, previous_response_id=None):
+        record_usage("gpt-test", type("Usage", (), {"input_tokens": 40, "output_tokens": 10})())
+        return generate(messages, previous_response_id)
+
+    monkeypatch.setattr(fake_client, "generate", generate_with_usage)
+    # Room for one up-front estimate of an uncached chat (a full history window plus the reply), not two.
+    controller = AdmissionController(InMemoryRateLimitStore(), token_limit=Limit(rate=0.001, burst=10_000))
+    app.dependency_overrides[get_admission_controller] = lambda: controller
+    chat_id = client.post("/chat").json()["chat"]["id"]
+
+    assert [client.post(f"/chat/{chat_id}", json={"message": "Hi"}).status_code for _ in range(3)] == [200, 200, 200]
+
+
+def test_turns_beyond_upstream_concurrency_fail_fast_with_429(client, test_app):
+    app, _ = test_app
+    limiter = ConcurrencyLimiter(max_concurrent=1, max_queue=1, queue_timeout_seconds=0.05)
+    app.dependency_overrides[get_admission_controller] = lambda: AdmissionController(
+        InMemoryRateLimitStore(), concurrency=limiter)
+    chat_id = client.post("/chat").json()["chat"]["id"]
+    # Another turn holds the only slot.
+    asyncio.run(limiter.acquire())
+
+    rejected = client.post(f"/chat/{chat_id}", json={"message": "Hi"})
+    limiter.release()
+    admitted = client.post(f"/chat/{chat_id}/stream", json={"message": "Hi"})
+
+    assert rejected.status_code == 429
+    assert rejected.headers["Retry-After"] == "1"
+    assert admitted.status_code == 200
+    assert _parse_sse(admitted.text)[-1][0] == "done"
+    assert limiter.active == 0
+
+
+def test_metrics_endpoint_reports_route_and_stage_timings(client):
+    chat_id = client.post("/chat").json()["chat"]["id"]
+    client.post(f"/chat/{chat_id}", json={"message": "Hello"})
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'http_request_duration_seconds_count{method="POST",route="/chat/{chat_id}",status="200"}' in body
+    assert 'chat_stage_duration_seconds_count{stage="completion"}' in body
+    assert chat_id not in body
+
+
+def test_group_commit_writer_persists_turns_and_response_chain(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'group_commit.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    writer = GroupCommitWriter(session_factory)
+    fake_client = FakeResponsesBackend()
+    app = create_app()
+
+    def override_get_chat_service() -> Generator[ChatService, None, None]:
+        db = session_factory()
+        try:
+            yield ChatService(db=db, llm=fake_client, writer=writer)
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_service] = override_get_chat_service
+    with TestClient(app) as writer_client:
+        chat_id = writer_client.post("/chat").json()["chat"]["id"]
+        first = writer_client.post(f"/chat/{chat_id}", json={"message": "First"})
+        writer_client.post(f"/chat/{chat_id}", json={"message": "Second"})
+
+    assert first.json()["response"] == fake_client._response_text
+    assert fake_client.last_previous_response_id == "resp_1"
+    with session_factory() as db:
+        assert db.get(Chat, chat_id).last_response_id == "resp_2"
+        messages = db.scalars(select(Message).where(Message.chat_id == chat_id).order_by(Message.id)).all()
+    assert [(message.role, message.content) for message in messages] == [
+        ("user", "First"),
+        ("assistant", fake_client._response_text),
+        ("user", "Second"),
+        ("assistant", fake_client._response_text),
+    ]
+
+
+class UnavailableResponsesBackend(FakeResponsesBackend):
+    def stream(self, messages, previous_response_id=None, on_response_id=None):
+        raise RuntimeError("The model is unavailable.")
+
+
+@pytest.mark.parametrize("group_commit", [False, True])
+def test_stream_that_fails_to_open_removes_the_user_turn(tmp_path, group_commit):
+    engine = create_engine(f"sqlite:///{tmp_path / 'stream_failure.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    writer = GroupCommitWriter(session_factory) if group_commit else None
+    app = create_app()
+
+    def override_get_chat_service() -> Generator[ChatService, None, None]:
+        db = session_factory()
+        try:
+            yield ChatService(db=db, llm=UnavailableResponsesBackend(), writer=writer)
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_service] = override_get_chat_service
+    with TestClient(app) as writer_client:
+        chat_id = writer_client.post("/chat").json()["chat"]["id"]
+        response = writer_client.post(f"/chat/{chat_id}/stream", json={"message": "Hi"})
+
+    assert response.status_code == 502
+    with session_factory() as db:
+        assert db.get(Chat, chat_id).message_count == 0
+        assert db.scalars(select(Message).where(Message.chat_id == chat_id)).all() == []
+
+
+class UnavailableAsyncResponsesBackend(FakeAsyncResponsesBackend):
+    async def stream(self, messages, previous_response_id=None, on_response_id=None):  # type: ignore[override]
+        raise RuntimeError("The model is unavailable.")
+
+
+@pytest.mark.parametrize("group_commit", [False, True])
+def test_async_stream_that_fails_to_open_removes_the_user_turn(tmp_path, group_commit):
+    database_url = f"sqlite:///{tmp_path / 'async_stream_failure.db'}"
+    Base.metadata.create_all(bind=create_engine(database_url))
+    async_engine = create_async_engine(database_url.replace("sqlite://", "sqlite+aiosqlite://", 1))
+    session_factory = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+    writer = AsyncGroupCommitWriter(session_factory) if group_commit else None
+
+    async def scenario():
+        async with session_factory() as db:
+            service = AsyncChatService(
+                db=db, llm=UnavailableAsyncResponsesBackend(), writer=writer)  # type: ignore[arg-type]
+            chat = await service.create_chat()
+            with pytest.raises(RuntimeError):
+                await service.stream_message(chat.id, "Hi")
+        if writer is not None:
+            await writer.aclose()
+        async with session_factory() as db:
+            message_count = (await db.get(Chat, chat.id)).message_count
+            rows = (await db.execute(select(Message).where(Message.chat_id == chat.id))).scalars().all()
+        await async_engine.dispose()
+        return message_count, rows
+
+    assert asyncio.run(scenario()) == (0, [])
+
+
+def _seed_messages(app, chat_id: str, count: int) -> None:
+    # Identical timestamps, so page boundaries depend on the ``id`` tiebreaker.
+    created_at = datetime(2024, 1, 1)
+    db = next(app.dependency_overrides[get_db]())
+    db.add_all([
+        Message(chat_id=chat_id, role="user", content=f"m{index}", created_at=created_at)
+        for index in range(count)
+    ])
+    db.commit()
+    db.close()
+
+
+def _all_pages(client, chat_id: str, **params) -> List[dict]:
+    pages = []
+    cursor = None
+    while True:
+        query = {**params, **({"cursor": cursor} if cursor else {})}
+        response = client.get(f"/chat/{chat_id}/messages", params=query)
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = pages[-1]["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_list_messages_pages_through_chat_by_cursor(client, test_app):
+    app, _ = test_app
+    chat_id = client.post("/chat").json()["chat"]["id"]
+    _seed_messages(app, chat_id, 7)
+
+    pages = _all_pages(client, chat_id, limit=3)
+    newest_first = _all_pages(client, chat_id, limit=3, order="desc")
+
+    contents = [message["content"] for page in pages for message in page["messages"]]
+    assert [len(page["messages"]) for page in pages] == [3, 3, 1]
+    assert contents == [f"m{index}" for index in range(7)]
+    assert [message["content"] for page in newest_first for message in page["messages"]] == contents[::-1]
+
+
+def test_list_messages_rejects_unknown_chat_and_bad_cursor(client):
+    unknown = client.get("/chat/00000000-0000-0000-0000-000000000000/messages")
+    chat_id = client.post("/chat").json()["chat"]["id"]
+    bad_cursor = client.get(f"/chat/{chat_id}/messages", params={"cursor": "not-a-cursor"})
+
+    assert unknown.status_code == 404
+    assert bad_cursor.status_code == 422
+
+
+def test_export_messages_streams_every_batch(client, test_app, monkeypatch):
+    monkeypatch.setattr(chat_service, "EXPORT_BATCH_SIZE", 3)
+    app, _ = test_app
+    chat_id = client.post("/chat").json()["chat"]["id"]
+    _seed_messages(app, chat_id, 7)
+
+    response = client.get(f"/chat/{chat_id}/messages/export")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    body = response.json()
+    assert body["chat_id"] == chat_id
+    assert [message["content"] for message in body["messages"]] == [f"m{index}" for index in range(7)]
+    assert client.get("/chat/00000000-0000-0000-0000-000000000000/messages/export").status_code == 404
+
+
+def test_async_export_and_pagination_return_turns_in_order(async_test_app, monkeypatch):
+    monkeypatch.setattr(chat_service, "EXPORT_BATCH_SIZE", 2)
+    app, fake_client = async_test_app
+    with TestClient(app) as async_client:
+        chat_id = async_client.post("/chat").json()["chat"]["id"]
+        async_client.post(f"/chat/{chat_id}", json={"message": "First"})
+        async_client.post(f"/chat/{chat_id}", json={"message": "Second"})
+        exported = async_client.get(f"/chat/{chat_id}/messages/export").json()
+        pages = _all_pages(async_client, chat_id, limit=3)
+
+    expected = ["First", fake_client._response_text, "Second", fake_client._response_text]
+    assert [message["content"] for message in exported["messages"]] == expected
+    assert [message["content"] for page in pages for message in page["messages"]] == expected
+
+
+def test_turns_maintain_chat_activity_and_message_count(client, test_app):
+    app, _ = test_app
+    chat_id = client.post("/chat").json()["chat"]["id"]
+    client.post(f"/chat/{chat_id}", json={"message": "First"})
+    client.post(f"/chat/{chat_id}/stream", json={"message": "Second"})
+
+    db = next(app.dependency_overrides[get_db]())
+    chat = db.get(Chat, chat_id)
+    first_turn = db.scalars(select(Message.created_at).where(Message.chat_id == chat_id).order_by(Message.id)).first()
+    db.close()
+
+    assert chat.message_count == 4
+    assert chat.last_activity_at > first_turn
+
+
+def test_idle_chat_is_archived_and_restored_when_resumed(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "openai_chain_responses", False)
+    engine = create_engine(f"sqlite:///{tmp_path / 'archive.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    cache = InMemoryHistoryCache()
+    fake_client = FakeResponsesBackend()
+    app = create_app()
+
+    def override_get_chat_service() -> Generator[ChatService, None, None]:
+        db = session_factory()
+        try:
+            yield ChatService(db=db, llm=fake_client, history_cache=cache)
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_chat_service] = override_get_chat_service
+    with TestClient(app) as archive_client:
+        chat_id = archive_client.post("/chat").json()["chat"]["id"]
+        archive_client.post(f"/chat/{chat_id}", json={"message": "First"})
+
+        assert compact_idle_chats(session_factory, CHAT_MODELS, timedelta(0), history_cache=cache) == 1
+        with session_factory() as db:
+            assert db.scalars(select(Message).where(Message.chat_id == chat_id)).all() == []
+            assert db.get(ChatArchive, chat_id).message_count == 2
+            assert db.get(Chat, chat_id).archived_at is not None
+
+        archive_client.post(f"/chat/{chat_id}", json={"message": "Second"})
+
+    assert [message["content"] for message in fake_client.last_messages] == [
+        "First", fake_client._response_text, "Second"]
+    with session_factory() as db:
+        chat = db.get(Chat, chat_id)
+        assert chat.archived_at is None
+        assert chat.message_count == 4
+        assert db.get(ChatArchive, chat_id) is None
+        assert len(db.scalars(select(Message).where(Message.chat_id == chat_id)).all()) == 4
+
+
+def test_batch_job_writes_replies_back_and_stops_chaining(client, test_app, tmp_path):
+    app, fake_client = test_app
+    bodies = {}
+
+    def responder(endpoint: str, body: dict) -> dict:
+        prompt = body["input"][-1]["content"][0]["text"]
+        if prompt == "Bad":
+            raise ValueError("model overloaded")
+        bodies[prompt] = body
+        return canned_reply(endpoint, body)
+
+    backend = LocalBatchBackend(tmp_path, responder=responder)
+    app.dependency_overrides[get_batch_job_service] = lambda db=Depends(get_db): BatchJobService(db, backend)
+    first, second = (client.post("/chat").json()["chat"]["id"] for _ in range(2))
+    client.post(f"/chat/{first}", json={"message": "Live"})
+
+    created = client.post("/batches", json={"turns": [
+        {"chat_id": first, "message": "Batch 1"},
+        {"chat_id": second, "message": "Bad"},
+        {"chat_id": first, "message": "Batch 2"},
+    ]})
+    assert created.status_code == 202
+    assert created.json()["status"] == "in_progress"
+    job = client.get(f"/batches/{created.json()['id']}").json()
+
+    assert (job["status"], job["succeeded"], job["failed"]) == ("completed", 2, 1)
+    assert job["ingested_at"] is not None
+    # Requests are built from history as it was at submission.
+    assert [item["content"][0]["text"] for item in bodies["Batch 2"]["input"]] == [
+        "Live", fake_client._response_text, "Batch 2"]
+    db = next(app.dependency_overrides[get_db]())
+    chat = db.get(Chat, first)
+    contents = db.scalars(select(Message.content).where(Message.chat_id == first).order_by(Message.created_at)).all()
+    assert (chat.message_count, chat.last_response_id) == (6, None)
+    assert db.get(Chat, second).message_count == 0
+    db.close()
+    assert contents == [
+        "Live", fake_client._response_text, "Batch 1", "Batch reply to: Batch 1", "Batch 2", "Batch reply to: Batch 2"]
+
+    client.post(f"/chat/{first}", json={"message": "Live again"})
+    assert fake_client.last_previous_response_id is None
+    assert len(fake_client.last_messages) == 7
+    assert client.post("/batches", json={"turns": [
+        {"chat_id": "00000000-0000-0000-0000-000000000000", "message": "Hi"}]}).status_code == 404
+
+
+class InterleavingBatchBackend(LocalBatchBackend):
+    """Runs ``interleave`` (another refresh) the first time results are read, mid-ingest."""
+
+    def __init__(self, directory, interleave: Callable[[], None]) -> None:
+        super().__init__(directory)
+        self._interleave: Optional[Callable[[], None]] = interleave
+
+    def results(self, status):
+        interleave, self._interleave = self._interleave, None
+        if interleave is not None:
+            interleave()
+        return super().results(status)
+
+
+@pytest.mark.parametrize("claim_expired", [False, True])
+def test_concurrent_batch_refreshes_write_each_reply_once(test_app, tmp_path, monkeypatch, claim_expired):
+    app, _ = test_app
+    if claim_expired:
+        # The second refresh takes the first one's claim over; only the item updates keep them apart.
+        monkeypatch.setattr(batch_service, "INGEST_CLAIM_TIMEOUT", timedelta(seconds=-1))
+    session_factory = app.dependency_overrides[get_db]
+    db = next(session_factory())
+    chat = Chat()
+    db.add(chat)
+    db.commit()
+    inner_jobs = []
+
+    def refresh_again() -> None:
+        inner_db = next(session_factory())
+        inner_jobs.append(BatchJobService(inner_db, LocalBatchBackend(tmp_path)).refresh(job.id).status)
+        inner_db.close()
+
+    service = BatchJobService(db, InterleavingBatchBackend(tmp_path, refresh_again))
+    job = service.create_job([(chat.id, "Batch 1"), (chat.id, "Batch 2")])
+    job = service.refresh(job.id)
+
+    assert inner_jobs == (["completed"] if claim_expired else ["ingesting"])
+    assert (job.status, job.succeeded, job.failed) == ("completed", 2, 0)
+    db.expire_all()
+    assert db.get(Chat, chat.id).message_count == 4
+    assert len(db.scalars(select(Message).where(Message.chat_id == chat.id)).all()) == 4
+    db.close()
+
+
+def test_lean_serialization_returns_the_same_json(client, test_app, monkeypatch):
+    chat_id = client.post("/chat").json()["chat"]["id"]
+    for turn in ("First", "Second"):
+        client.post(f"/chat/{chat_id}", json={"message": turn})
+    validated = client.get(f"/chat/{chat_id}/messages", params={"limit": 3})
+
+    monkeypatch.setattr(get_settings(), "response_serialization", "lean")
+    lean = client.get(f"/chat/{chat_id}/messages", params={"limit": 3})
+    created = client.post("/chat")
+    reply = client.post(f"/chat/{chat_id}", json={"message": "Third"})
+
+    assert lean.status_code == 200
+    assert lean.content == validated.content
+    assert created.status_code == 201
+    assert set(created.json()["chat"]) == {"id", "created_at"}
+    assert reply.status_code == 200
+    assert reply.json()["chat_id"] == chat_id
+    assert reply.json()["response"] == "Hello from test bot!"
+
+
+def test_backend_is_chosen_per_request_and_switching_ends_the_chain(test_app, monkeypatch):
+    app, _ = test_app
+    responses, chat_completions = FakeResponsesBackend(), FakeChatCompletionsBackend()
+    monkeypatch.setattr(deps, "build_backends", lambda settings: BackendSet([responses, chat_completions], "responses"))
+    deps._get_llm_backends.cache_clear()
+    monkeypatch.setattr(get_settings(), "llm_backend_per_request", True)
+    get_db_override = app.dependency_overrides[get_db]
+
+    def override_get_chat_service(db: Session = Depends(get_db_override), llm=Depends(get_llm_backend)):
+        return ChatService(db=db, llm=llm)
+
+    app.dependency_overrides[get_chat_service] = override_get_chat_service
+    with TestClient(app) as test_client:
+        chat_id = test_client.post("/chat").json()["chat"]["id"]
+        test_client.post(f"/chat/{chat_id}", json={"message": "First"})
+        second = test_client.post(f"/chat/{chat_id}", json={"message": "Second"},
+                                  headers={"X-LLM-Backend": "chat_completions"})
+        test_client.post(f"/chat/{chat_id}", json={"message": "Third"})
+        unknown = test_client.post(f"/chat/{chat_id}", json={"message": "Fourth"},
+                                   headers={"X-LLM-Backend": "davinci"})
+
+    assert second.json()["response"] == "Hello from test bot! (chat completions)"
+    assert [message["content"] for message in chat_completions.last_messages] == [
+        "First", "Hello from test bot!", "Second"]
+    # The stateless turn left no chain to continue, so the next one replays history.
+    assert responses.last_previous_response_id is None
+    assert len(responses.last_messages) == 5
+    assert unknown.status_code == 422
+
+
+def test_close_clients_stops_the_sync_group_commit_writer(monkeypatch):
+    monkeypatch.setattr(get_settings(), "message_write_mode", "group_commit")
+    deps._get_group_commit_writer.cache_clear()
+    writer = deps._get_group_commit_writer()
+    writer._ensure_started()
+    thread = writer._thread
+
+    asyncio.run(deps.close_clients())
+
+    assert not thread.is_alive()
+    assert deps._get_group_commit_writer.cache_info().currsize == 0
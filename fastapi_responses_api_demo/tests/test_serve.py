@@ -0,0 +1,65 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+from sqlalchemy import create_engine, inspect
+
+DEMO_ROOT = Path(__file__).resolve().parents[1]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        assert process.poll() is None, process.stdout.read()
+        try:
+            if httpx.get(base_url + "/", timeout=1.0).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise AssertionError("server did not become ready")
+
+
+def test_multi_worker_launcher_migrates_once_and_serves_requests(tmp_path):
+    database = tmp_path / "workers.db"
+    port = _free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{database}",
+        "OPENAI_API_KEY": "test-api-key",
+        "EXECUTION_MODE": "async",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "chat_core.serve", "app.main:app", "--workers", "2", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=DEMO_ROOT,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_until_ready(base_url, process)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            statuses = list(pool.map(lambda _: httpx.post(base_url + "/chat", timeout=10.0).status_code, range(24)))
+    finally:
+        process.send_signal(signal.SIGINT)
+        output, _ = process.communicate(timeout=30)
+
+    assert statuses == [201] * 24
+    assert process.returncode == 0, output
+    assert "Traceback" not in output
+    assert {"chats", "messages", "chat_archives"} <= set(inspect(create_engine(f"sqlite:///{database}")).get_table_names())
@@ -0,0 +1,133 @@
+"""Compare the FAISS index types on recall, query speed and memory.
+
+Generates ``--vectors`` synthetic embeddings: L2-normalized points around
+random cluster centres, which are closer to real text embeddings than
+uniform noise. Queries are drawn the same way. Each ``--types`` index is
+built the way ``build-index`` builds it: the same factory string, training
+sample and ids. The exact ``flat`` index gives the true ``k`` nearest
+neighbours. For every ``nprobe`` (IVF) or ``efSearch`` (HNSW) value, the
+table shows:
+
+* recall@k against those neighbours;
+* queries per second, searching one query at a time as the server does;
+* build time;
+* memory, measured as the serialized index size.
+
+The last lines give the smallest setting that reaches ``--target-recall``
+for each type: a value for ``INDEX_NPROBE`` or ``INDEX_EF_SEARCH``.
+``auto`` in ``--types`` shows what ``INDEX_TYPE=auto`` would build for
+this corpus and ``--memory-budget-mb``. Run from
+``semantic_search_faiss_openai`` with the ``faiss`` extra installed::
+
+    python benchmarks/ann_recall.py --vectors 200000 --dim 384
+    python benchmarks/ann_recall.py --vectors 200000 --dim 384 --types auto --memory-budget-mb 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from semantic_search.ann import (
+    choose_index_type,
+    index_factory,
+    recall_at_k,
+    set_search_params,
+    training_points,
+)
+from semantic_search.embeddings import l2_normalize
+from semantic_search.index import create_index
+
+NPROBES = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+EF_SEARCHES = (16, 32, 64, 128, 256, 512)
+
+
+def _synthetic(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = np.random.default_rng(0).normal(size=(clusters, dim)).astype(np.float32)
+    noise = rng.normal(scale=0.6, size=(count, dim)).astype(np.float32)
+    return l2_normalize(centers[rng.integers(0, clusters, count)] + noise)
+
+
+def _build(factory: str, vectors: np.ndarray, train_size: int) -> Tuple[faiss.Index, float]:
+    started = time.perf_counter()
+    index = create_index(vectors.shape[1], "faiss", factory)
+    if not index.is_trained:
+        picked = np.random.default_rng(0).choice(len(vectors), training_points(factory, len(vectors), train_size),
+                                                 replace=False)
+        index.train(vectors[np.sort(picked)])
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+    return index, time.perf_counter() - started
+
+
+def _search(index: faiss.Index, queries: np.ndarray, k: int) -> Tuple[np.ndarray, float]:
+    found = np.empty((len(queries), k), dtype=np.int64)
+    started = time.perf_counter()
+    for row in range(len(queries)):
+        found[row] = index.search(queries[row:row + 1], k)[1][0]
+    return found, len(queries) / (time.perf_counter() - started)
+
+
+def _sweep(factory: str) -> List[Tuple[str, Optional[int]]]:
+    if "IVF" in factory:
+        nlist = int(factory.split("IVF", 1)[1].split(",", 1)[0])
+        return [("nprobe", value) for value in NPROBES if value <= nlist]
+    if factory.startswith("HNSW"):
+        return [("efSearch", value) for value in EF_SEARCHES]
+    return [("", None)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=100_000, help="indexed vectors")
+    parser.add_argument("--dim", type=int, default=384, help="embedding dimensions")
+    parser.add_argument("--clusters", type=int, default=200, help="cluster centres of the synthetic data")
+    parser.add_argument("--queries", type=int, default=500, help="timed queries per setting")
+    parser.add_argument("-k", type=int, default=10, help="neighbours per query, for recall@k")
+    parser.add_argument("--types", default="flat,ivf_flat,ivf_pq,opq,hnsw", help="comma-separated index types")
+    parser.add_argument("--memory-budget-mb", type=float, help="(INDEX_MEMORY_BUDGET_MB)")
+    parser.add_argument("--pq-m", type=int, help="PQ code bytes per vector (INDEX_PQ_M)")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="(INDEX_HNSW_M)")
+    parser.add_argument("--train-size", type=int, default=50_000, help="(INDEX_TRAIN_SIZE)")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    args = parser.parse_args()
+
+    vectors = _synthetic(args.vectors, args.dim, args.clusters, seed=1)
+    queries = _synthetic(args.queries, args.dim, args.clusters, seed=2)
+    exact, _ = _build("Flat", vectors, args.train_size)
+    _, truth = exact.search(queries, args.k)
+    del exact
+    print(f"{args.vectors} vectors of {args.dim} dims, {args.queries} queries, recall@{args.k}, "
+          f"{faiss.omp_get_max_threads()} FAISS threads")
+    print(f"{'type':<9}{'factory':<24}{'param':>14}{'recall':>8}{'QPS':>10}{'build s':>9}{'MB':>9}")
+
+    tuned: Dict[str, str] = {}
+    for index_type in args.types.split(","):
+        if index_type == "auto":
+            index_type = choose_index_type(args.vectors, args.dim, args.memory_budget_mb)
+        factory = index_factory(index_type, args.vectors, args.dim, args.memory_budget_mb, args.pq_m, args.hnsw_m)
+        index, build_seconds = _build(factory, vectors, args.train_size)
+        megabytes = faiss.serialize_index(index).nbytes / 2 ** 20
+        for name, value in _sweep(factory):
+            if value is not None:
+                set_search_params(index, factory, nprobe=value, ef_search=value)
+            found, qps = _search(index, queries, args.k)
+            recall = recall_at_k(found, truth)
+            param = f"{name}={value}" if name else "exact"
+            print(f"{index_type:<9}{factory:<24}{param:>14}{recall:>8.3f}{qps:>10.0f}{build_seconds:>9.1f}"
+                  f"{megabytes:>9.1f}")
+            if recall >= args.target_recall and index_type not in tuned:
+                tuned[index_type] = f"{param} ({qps:.0f} QPS)"
+        tuned.setdefault(index_type, f"not reached (best setting tried: {param})")
+
+    print(f"\nSmallest setting reaching recall@{args.k} >= {args.target_recall}:")
+    for index_type, setting in tuned.items():
+        print(f"  {index_type:<9}{setting}")
+
+
+if __name__ == "__main__":
+    main()
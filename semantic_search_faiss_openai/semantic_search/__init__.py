@@ -0,0 +1,5 @@
+"""Semantic search over a folder of text documents with OpenAI embeddings and FAISS.
+
+Importing the package is cheap: ``faiss``, ``openai`` and ``pandas`` are
+imported only by the code paths that use them.
+"""
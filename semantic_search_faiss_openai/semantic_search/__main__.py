@@ -0,0 +1,5 @@
+import sys
+
+from semantic_search.cli import main
+
+sys.exit(main())
@@ -0,0 +1,150 @@
+"""Index structures for the FAISS backend, and how to choose between them.
+
+``flat`` compares a query with every vector. It is exact, and fast enough
+up to tens of thousands of vectors. The approximate types trade a little
+recall for speed or memory:
+
+* ``ivf_flat`` clusters the vectors into cells with k-means. A query scans
+  only the ``nprobe`` cells nearest to it. It stores full vectors, so it
+  uses as much memory as ``flat``.
+* ``ivf_pq`` uses the same cells, but stores each vector as a product-
+  quantized code of ``pq_m`` bytes instead of ``4 * dim``.
+* ``opq`` is ``ivf_pq`` behind a learned rotation (OPQ). The rotation
+  spreads variance evenly over the PQ sub-vectors, which gives better
+  recall for the same code size.
+* ``hnsw`` is a proximity graph. A query walks the graph with a beam of
+  ``ef_search`` candidates. It has the best recall per query time, but it
+  uses more memory than ``flat``. FAISS cannot remove vectors from it, so
+  an update that changes or removes documents rebuilds the index.
+
+IVF centroids and PQ codebooks are trained on a sample of the vectors
+before the first vector is added. A type is built from a FAISS factory
+string, and the manifest records that string.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Any, Literal, Optional
+
+import numpy as np
+
+IndexType = Literal["flat", "ivf_flat", "ivf_pq", "opq", "hnsw"]
+
+# Up to this many vectors, exact search takes a few milliseconds, so ``auto`` keeps it.
+FLAT_MAX_VECTORS = 50_000
+# k-means wants this many training points per centroid; FAISS warns below it.
+POINTS_PER_CENTROID = 39
+# PQ codes are 8 bits, so each sub-quantizer trains 256 centroids.
+PQ_CENTROIDS = 256
+# Graph quality during construction. Unlike ``efSearch``, it cannot be changed after the build.
+HNSW_EF_CONSTRUCTION = 200
+# Bytes per vector beside the code: its int64 id in the IVF lists or the id map.
+_ID_BYTES = 8
+
+
+def ivf_cells(vectors: int) -> int:
+    """IVF cell count: about ``4 * sqrt(n)``, with at least ``POINTS_PER_CENTROID`` vectors per cell."""
+    return max(1, min(int(4 * math.sqrt(vectors)), vectors // POINTS_PER_CENTROID))
+
+
+def estimate_memory(index_type: IndexType, vectors: int, dim: int, pq_m: int = 0, hnsw_m: int = 32) -> int:
+    """Approximate bytes an index of ``vectors`` vectors takes in memory and on disk."""
+    if index_type == "flat":
+        return vectors * (4 * dim + _ID_BYTES)
+    if index_type == "hnsw":
+        # Level-0 links take 2 * M int32s per vector; the upper levels add little.
+        return vectors * (4 * dim + 2 * hnsw_m * 4 + _ID_BYTES)
+    centroids = ivf_cells(vectors) * 4 * dim
+    if index_type == "ivf_flat":
+        return centroids + vectors * (4 * dim + _ID_BYTES)
+    codebooks = PQ_CENTROIDS * 4 * dim + (4 * dim * dim if index_type == "opq" else 0)
+    return centroids + codebooks + vectors * (pq_m + _ID_BYTES)
+
+
+def _pq_bytes(dim: int, vectors: int, memory_budget_mb: Optional[float]) -> int:
+    """The largest code size that divides ``dim``, is at most ``dim / 8``, and fits the budget."""
+    limit = dim // 8
+    if memory_budget_mb is not None:
+        fixed = estimate_memory("opq", vectors, dim, pq_m=0)
+        limit = min(limit, int((memory_budget_mb * 2 ** 20 - fixed) / vectors) - _ID_BYTES)
+    for pq_m in range(max(limit, 0), 0, -1):
+        if dim % pq_m == 0:
+            return pq_m
+    raise ValueError(f"{vectors} vectors of {dim} dims do not fit in {memory_budget_mb} MB, even compressed.")
+
+
+def choose_index_type(vectors: int, dim: int, memory_budget_mb: Optional[float] = None) -> IndexType:
+    """The index ``auto`` builds for ``vectors`` vectors of ``dim`` dims.
+
+    ``flat`` while exact search is cheap, then ``ivf_flat`` while full
+    vectors fit the memory budget, and ``opq`` once they must be compressed.
+    ``hnsw`` is never chosen: every update would rebuild it.
+    """
+    budget = math.inf if memory_budget_mb is None else memory_budget_mb * 2 ** 20
+    if vectors <= FLAT_MAX_VECTORS and estimate_memory("flat", vectors, dim) <= budget:
+        return "flat"
+    if estimate_memory("ivf_flat", vectors, dim) <= budget:
+        return "ivf_flat"
+    return "opq"
+
+
+def index_factory(
+    index_type: IndexType,
+    vectors: int,
+    dim: int,
+    memory_budget_mb: Optional[float] = None,
+    pq_m: Optional[int] = None,
+    hnsw_m: int = 32,
+) -> str:
+    """The FAISS factory string for an index of ``index_type`` sized for ``vectors`` vectors."""
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m}"
+    nlist = ivf_cells(vectors)
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type not in ("ivf_pq", "opq"):
+        raise ValueError(f"Unknown index type {index_type!r}.")
+    if vectors < PQ_CENTROIDS:
+        raise ValueError(f"A {index_type} index needs at least {PQ_CENTROIDS} vectors to train; "
+                         f"there are {vectors}. Use INDEX_TYPE=flat.")
+    pq_m = pq_m or _pq_bytes(dim, vectors, memory_budget_mb)
+    if dim % pq_m:
+        raise ValueError(f"INDEX_PQ_M={pq_m} must divide the embedding dimension {dim}.")
+    return f"{'OPQ%d,' % pq_m if index_type == 'opq' else ''}IVF{nlist},PQ{pq_m}"
+
+
+def training_points(factory: str, vectors: int, limit: int) -> int:
+    """Vectors to sample for training: ``limit``, raised to what the centroids and codebooks need."""
+    needed = 0
+    if "IVF" in factory:
+        nlist = int(factory.split("IVF", 1)[1].split(",", 1)[0])
+        needed = POINTS_PER_CENTROID * nlist
+    if "PQ" in factory:
+        needed = max(needed, POINTS_PER_CENTROID * PQ_CENTROIDS)
+    return min(vectors, max(limit, needed))
+
+
+def supports_removal(factory: str) -> bool:
+    return not factory.startswith("HNSW")
+
+
+def set_search_params(index: Any, factory: str, nprobe: int, ef_search: int) -> None:
+    """Apply the query-time recall/speed trade-off: IVF cells scanned, or the HNSW search beam."""
+    if "IVF" not in factory and not factory.startswith("HNSW"):
+        return
+    import faiss
+
+    space = faiss.ParameterSpace()
+    if "IVF" in factory:
+        space.set_index_parameter(index, "nprobe", min(nprobe, faiss.extract_index_ivf(index).nlist))
+    else:
+        space.set_index_parameter(index, "efSearch", ef_search)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    """Fraction of the exact ``k`` nearest neighbours in ``truth`` that ``found`` returned, over all queries."""
+    hits = sum(len(np.intersect1d(row[row >= 0], expected)) for row, expected in zip(found, truth))
+    return hits / truth.size
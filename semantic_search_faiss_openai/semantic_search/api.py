@@ -0,0 +1,75 @@
+"""HTTP search server.
+
+The index, documents and embedder are loaded once in the lifespan, before
+the first request is accepted::
+
+    uvicorn semantic_search.api:app --port 8001
+"""
+
+from __future__ import annotations
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+import anyio
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from pydantic import BaseModel
+
+from semantic_search.config import Settings, get_settings
+from semantic_search.engine import SearchEngine
+
+
+class SearchHitResponse(BaseModel):
+    rank: int
+    score: float
+    doc_id: int
+    title: str
+    category: str
+    path: str
+    preview: str
+    passage: Optional[str] = None
+
+
+class SearchResponse(BaseModel):
+    query: str
+    k: int
+    hits: List[SearchHitResponse]
+
+
+def get_engine(request: Request) -> SearchEngine:
+    return request.app.state.engine
+
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    settings = settings or get_settings()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        engine = await anyio.to_thread.run_sync(SearchEngine.load, settings)
+        await anyio.to_thread.run_sync(engine.warm_up)
+        app.state.engine = engine
+        yield
+
+    app = FastAPI(title="Semantic Search", version="0.1.0", lifespan=lifespan)
+
+    @app.get("/healthz")
+    def healthcheck(engine: SearchEngine = Depends(get_engine)) -> dict:
+        return {"status": "ok", **engine.manifest.as_dict()}
+
+    # A plain ``def``: query embedding may block on the network, so it runs in the threadpool.
+    @app.get("/search", response_model=SearchResponse)
+    def search(
+        q: str = Query(..., min_length=1, max_length=2000),
+        k: int = Query(settings.search_default_k, ge=1, le=settings.search_max_k),
+        engine: SearchEngine = Depends(get_engine),
+    ) -> SearchResponse:
+        try:
+            hits = engine.search(q, k)
+        except RuntimeError as exc:
+            raise HTTPException(status_code=502, detail=str(exc)) from exc
+        return SearchResponse(query=q, k=k, hits=[SearchHitResponse(**hit.as_dict()) for hit in hits])
+
+    return app
+
+
+app = create_app()
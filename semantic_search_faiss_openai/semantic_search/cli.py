@@ -0,0 +1,107 @@
+"""Command line for the semantic search engine.
+
+From ``semantic_search_faiss_openai``::
+
+    semantic-search ingest sample_corpus.zip
+    semantic-search build-index
+    semantic-search query "How do I build a FAISS index?" -k 5
+
+Settings come from the environment and ``.env`` (see
+:class:`semantic_search.config.Settings`); the flags override them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from semantic_search.config import Settings, get_settings
+
+
+def _overrides(args: argparse.Namespace) -> Dict[str, Any]:
+    fields = ("index_dir", "embedding_backend", "index_backend", "index_type", "index_granularity")
+    return {field: getattr(args, field) for field in fields if getattr(args, field, None) is not None}
+
+
+def _ingest(settings: Settings, args: argparse.Namespace) -> None:
+    from semantic_search.pipeline import ingest
+
+    count = ingest(settings, args.source)
+    print(f"Ingested {count} documents into {settings.index_dir}")
+
+
+def _build_index(settings: Settings, args: argparse.Namespace) -> None:
+    from semantic_search.pipeline import build_index
+
+    report = build_index(settings, full=args.full)
+    manifest = report.manifest
+    print(f"{'Rebuilt' if report.rebuilt else 'Updated'} the {manifest.index_backend} {manifest.index_factory} index "
+          f"in {settings.index_dir}: "
+          f"{manifest.documents} documents ({manifest.embedder.name} {manifest.embedder.model}, "
+          f"{manifest.embedder.dim} dims)")
+    print(f"{report.added} added, {report.updated} updated, {report.removed} removed; "
+          f"{report.embedded_chunks} chunks embedded, {report.reused_chunks} reused from the store")
+
+
+def _query(settings: Settings, args: argparse.Namespace) -> None:
+    from semantic_search.engine import SearchEngine
+
+    engine = SearchEngine.load(settings)
+    for text in args.text:
+        hits = engine.search(text, args.k or settings.search_default_k)
+        if args.json:
+            print(json.dumps({"query": text, "hits": [hit.as_dict() for hit in hits]}, ensure_ascii=False))
+            continue
+        print(f"\n=== {text}")
+        for hit in hits:
+            print(f"{hit.rank:>2}. {hit.score:.3f}  {hit.title}  [{hit.category}]  {hit.path}")
+            if hit.passage is not None:
+                print(f"    {hit.preview}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="semantic-search", description=__doc__.splitlines()[0])
+    parser.add_argument("--index-dir", type=Path, help="artifact folder (INDEX_DIR)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log progress")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="read a corpus into the index folder")
+    ingest.add_argument("source", nargs="?", type=Path, help="folder or .zip of .txt files (DATA_DIR)")
+    ingest.set_defaults(handler=_ingest)
+
+    build = commands.add_parser("build-index", help="embed the ingested documents and write the index")
+    build.add_argument("--embedding-backend", choices=["auto", "openai", "hashing"], help="(EMBEDDING_BACKEND)")
+    build.add_argument("--index-backend", choices=["auto", "faiss", "numpy"], help="(INDEX_BACKEND)")
+    build.add_argument("--index-type", choices=["auto", "flat", "ivf_flat", "ivf_pq", "opq", "hnsw"],
+                       help="(INDEX_TYPE)")
+    build.add_argument("--granularity", dest="index_granularity", choices=["document", "chunk"],
+                       help="index documents or their chunks (INDEX_GRANULARITY)")
+    build.add_argument("--full", action="store_true", help="rebuild the index instead of updating it")
+    build.set_defaults(handler=_build_index)
+
+    query = commands.add_parser("query", help="search the index")
+    query.add_argument("text", nargs="+", help="one or more queries")
+    query.add_argument("-k", type=int, help="results per query (SEARCH_DEFAULT_K)")
+    query.add_argument("--json", action="store_true", help="print one JSON object per query")
+    query.set_defaults(handler=_query)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(message)s")
+    settings = get_settings().model_copy(update=_overrides(args))
+    try:
+        args.handler(settings, args)
+    except (FileNotFoundError, ValueError, RuntimeError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
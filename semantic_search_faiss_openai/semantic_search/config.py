@@ -0,0 +1,66 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import Literal, Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """Paths, embedding and index settings shared by the CLI and the search server."""
+
+    # Folder of ``.txt`` files (each file is one document), or a ``.zip`` of one.
+    data_dir: Path = Path("./sample_corpus")
+    # Where ``ingest`` and ``build-index`` write their artifacts and the server reads them.
+    index_dir: Path = Path("./index")
+
+    openai_api_key: Optional[str] = None
+    embedding_model: str = "text-embedding-3-small"
+    # ``auto`` uses OpenAI when a key is set and the local hashing embedding otherwise.
+    embedding_backend: Literal["auto", "openai", "hashing"] = "auto"
+    # Requests are packed up to both caps; the API accepts at most 2048 inputs per request.
+    embedding_batch_size: int = 2048
+    embedding_batch_tokens: int = 100_000
+    embedding_concurrency: int = 4
+    # Learned from the API's rate-limit headers while unset.
+    embedding_requests_per_minute: Optional[int] = None
+    embedding_tokens_per_minute: Optional[int] = None
+    embedding_max_retries: int = 5
+    embedding_timeout_seconds: float = 60.0
+    hashing_dim: int = 1024
+
+    # ``auto`` uses FAISS when it is installed and the NumPy index otherwise.
+    index_backend: Literal["auto", "faiss", "numpy"] = "auto"
+    # FAISS structure (see :mod:`semantic_search.ann`). ``auto`` stays exact for small corpora, then picks
+    # IVF, or OPQ-compressed IVF when full vectors would not fit the memory budget.
+    index_type: Literal["auto", "flat", "ivf_flat", "ivf_pq", "opq", "hnsw"] = "auto"
+    index_memory_budget_mb: Optional[float] = None
+    # Bytes per vector in ``ivf_pq``/``opq`` codes; unset uses ``dim / 8``, or less to fit the budget.
+    index_pq_m: Optional[int] = None
+    index_hnsw_m: int = 32
+    # Vectors sampled to train IVF centroids and PQ codebooks, raised to what their sizes need.
+    index_train_size: int = 50_000
+    # Applied when the index is loaded: IVF cells scanned per query, and the HNSW search beam.
+    index_nprobe: int = 16
+    index_ef_search: int = 128
+    # ``document`` indexes each document's averaged chunk vectors; ``chunk`` indexes every chunk and
+    # returns the best passage per document.
+    index_granularity: Literal["document", "chunk"] = "document"
+    # How a document's retrieved chunk scores rank it: its best one, or the mean of its best ``m``.
+    chunk_pooling: Literal["max", "top_m"] = "max"
+    chunk_pooling_m: int = 3
+    # Chunk-level searches retrieve ``k`` times this many chunks before grouping them by document.
+    chunk_oversample: int = 4
+
+    chunk_max_chars: int = 2000
+    chunk_overlap_chars: int = 200
+    preview_chars: int = 280
+
+    search_default_k: int = 5
+    search_max_k: int = 50
+
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
+
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
@@ -0,0 +1,109 @@
+"""Loading documents from a folder or zip of ``.txt`` files, and the ``docs.jsonl`` they are stored in."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import zipfile
+from dataclasses import asdict, dataclass
+from pathlib import Path, PurePosixPath
+from typing import Iterable, Iterator, List, Tuple
+
+DOCUMENTS_FILE = "docs.jsonl"
+
+_TITLE = re.compile(r"^Title:\s*(.*?)$", re.IGNORECASE | re.MULTILINE)
+_CATEGORY = re.compile(r"^Category:\s*(.*?)$", re.IGNORECASE | re.MULTILINE)
+_WORD = re.compile(r"\w+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass(frozen=True)
+class Document:
+    doc_id: int
+    path: str
+    title: str
+    category: str
+    text: str
+    n_chars: int
+    n_words: int
+    preview: str
+    # SHA-256 of ``text``; ``build-index`` re-embeds a document only when it changes.
+    content_hash: str
+
+
+def preview(text: str, max_chars: int = 280) -> str:
+    collapsed = _WHITESPACE.sub(" ", text.strip())
+    return collapsed[:max_chars] + "…" if len(collapsed) > max_chars else collapsed
+
+
+def chunk_spans(text: str, max_chars: int = 2000, overlap: int = 200) -> List[Tuple[int, int]]:
+    """``[start, end)`` offsets into ``text`` of chunks of its stripped content.
+
+    Chunks are at most ``max_chars`` long and overlap by ``overlap`` characters.
+    """
+    first = len(text) - len(text.lstrip())
+    last = len(text.rstrip())
+    if last - first <= max_chars:
+        return [(first, max(first, last))]
+    step = max(1, max_chars - overlap)
+    spans = []
+    for start in range(first, last, step):
+        spans.append((start, min(start + max_chars, last)))
+        if start + max_chars >= last:
+            break
+    return spans
+
+
+def chunk_text(text: str, max_chars: int = 2000, overlap: int = 200) -> List[str]:
+    """Split ``text`` into chunks of at most ``max_chars`` that overlap by ``overlap`` characters."""
+    return [text[start:end] for start, end in chunk_spans(text, max_chars, overlap)]
+
+
+def _read_sources(source: Path) -> Iterator[Tuple[PurePosixPath, str]]:
+    """``(path, text)`` for every ``.txt`` file under a folder or inside a zip, sorted by path."""
+    if source.is_file() and zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            names = sorted(name for name in archive.namelist() if name.endswith(".txt"))
+            for name in names:
+                yield PurePosixPath(name), archive.read(name).decode("utf-8", errors="ignore")
+        return
+    if not source.is_dir():
+        raise FileNotFoundError(f"No corpus folder or zip at {source}.")
+    for path in sorted(source.rglob("*.txt")):
+        yield PurePosixPath(path.relative_to(source.parent).as_posix()), path.read_text("utf-8", errors="ignore")
+
+
+def load_documents(source: Path, preview_chars: int = 280) -> List[Document]:
+    """Read a corpus; ``Title:`` and ``Category:`` lines win over the first line and the parent folder."""
+    documents = []
+    for doc_id, (path, text) in enumerate(_read_sources(source)):
+        title = _TITLE.search(text)
+        category = _CATEGORY.search(text)
+        documents.append(Document(
+            doc_id=doc_id,
+            path=str(path),
+            title=title.group(1).strip() if title else (text.strip().splitlines() or [path.stem])[0].strip(),
+            category=category.group(1).strip() if category else (path.parent.name or "unknown"),
+            text=text,
+            n_chars=len(text),
+            n_words=len(_WORD.findall(text)),
+            preview=preview(text, preview_chars),
+            content_hash=hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        ))
+    return documents
+
+
+def write_documents(documents: Iterable[Document], path: Path) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    with path.open("w", encoding="utf-8") as file:
+        for document in documents:
+            file.write(json.dumps(asdict(document), ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def read_documents(path: Path) -> List[Document]:
+    with path.open(encoding="utf-8") as file:
+        return [Document(**json.loads(line)) for line in file if line.strip()]
@@ -0,0 +1,249 @@
+"""Text embedders: OpenAI's embeddings API, and a hashing embedding that needs no API key.
+
+``openai`` is imported only when an :class:`OpenAIEmbedder` is built, and
+``tiktoken`` only to count its batches' tokens.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Protocol, Sequence, Tuple
+
+import numpy as np
+
+from semantic_search.config import Settings
+from semantic_search.ratelimit import RateBudget, backoff_delay, parse_duration
+
+logger = logging.getLogger(__name__)
+
+OPENAI = "openai"
+HASHING = "hashing"
+
+_TOKEN = re.compile(r"[a-zA-Z0-9_]+")
+
+
+class Embedder(Protocol):
+    name: str
+    model: str
+    dim: Optional[int]
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """A float32 ``[len(texts), dim]`` matrix, not normalized."""
+        ...
+
+
+@dataclass(frozen=True)
+class EmbedderSpec:
+    """What an index was embedded with; a query must be embedded the same way."""
+
+    name: str
+    model: str
+    dim: int
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "model": self.model, "dim": self.dim}
+
+
+def l2_normalize(matrix: np.ndarray, eps: float = 1e-12) -> np.ndarray:
+    """Row-wise L2 normalization, so inner product equals cosine similarity."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + eps)
+
+
+class HashingEmbedder:
+    """Deterministic feature-hashing embedding for demos without an API key.
+
+    Far less accurate than a learned embedding, but it keeps the whole flow
+    runnable offline.
+    """
+
+    name = HASHING
+
+    def __init__(self, dim: int = 1024, salt: int = 13) -> None:
+        self.dim = dim
+        self.model = f"hashing-{dim}"
+        self._salt = str(salt)
+        self._buckets: Dict[str, int] = {}
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in _TOKEN.findall(text.lower()):
+                matrix[row, self._bucket(token)] += 1.0
+        return np.log1p(matrix)
+
+    def _bucket(self, token: str) -> int:
+        bucket = self._buckets.get(token)
+        if bucket is None:
+            digest = hashlib.md5((token + self._salt).encode("utf-8"), usedforsecurity=False).hexdigest()
+            bucket = self._buckets[token] = int(digest, 16) % self.dim
+        return bucket
+
+
+def _estimate_tokens(text: str) -> int:
+    # English averages about four characters per token; three errs high, which keeps batches under the cap.
+    return len(text) // 3 + 1
+
+
+def token_counter(model: str) -> Callable[[str], int]:
+    """Token counts with the model's tiktoken encoding, or an estimate when tiktoken or the encoding is unavailable."""
+    try:
+        import tiktoken
+
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+    # tiktoken downloads encodings on first use, so a missing network fails here too.
+    except Exception as exc:
+        logger.warning("Estimating token counts, since tiktoken is unavailable: %s", exc)
+        return _estimate_tokens
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def pack_batches(token_counts: Sequence[int], max_tokens: int, max_items: int) -> List[Tuple[int, int]]:
+    """Consecutive ``[start, end)`` ranges of at most ``max_items`` items and ``max_tokens`` tokens.
+
+    An item over ``max_tokens`` on its own gets a batch to itself.
+    """
+    batches = []
+    start, tokens = 0, 0
+    for position, count in enumerate(token_counts):
+        if position > start and (tokens + count > max_tokens or position - start >= max_items):
+            batches.append((start, position))
+            start, tokens = position, 0
+        tokens += count
+    if start < len(token_counts):
+        batches.append((start, len(token_counts)))
+    return batches
+
+
+class OpenAIEmbedder:
+    """Concurrent, rate-limited calls to the OpenAI embeddings API.
+
+    Texts are packed into batches by token count and sent by up to
+    ``concurrency`` threads. Each request first takes its tokens from a
+    :class:`~semantic_search.ratelimit.RateBudget` that follows the API's
+    rate-limit headers. A failed batch is retried on its own, up to
+    ``max_retries`` times, with jittered backoff; a 429 pauses every thread
+    for its ``Retry-After``. Results keep the input order. Errors that a
+    retry cannot fix, and batches still failing after the last retry, raise
+    ``RuntimeError``.
+    """
+
+    name = OPENAI
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "text-embedding-3-small",
+        batch_size: int = 2048,
+        batch_tokens: int = 100_000,
+        concurrency: int = 4,
+        max_retries: int = 5,
+        timeout: float = 60.0,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        http_client: Any = None,
+    ) -> None:
+        from openai import OpenAI
+
+        self.model = model
+        self.dim: Optional[int] = None
+        self._batch_size = batch_size
+        self._batch_tokens = batch_tokens
+        self._concurrency = concurrency
+        self._max_retries = max_retries
+        # Retries are done per batch here, where they can follow the shared budget.
+        self._client = OpenAI(api_key=api_key, max_retries=0, timeout=timeout, http_client=http_client)
+        self._budget = RateBudget(requests_per_minute, tokens_per_minute)
+        self._count_tokens = token_counter(model)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        counts = [self._count_tokens(text) for text in texts]
+        batches = pack_batches(counts, self._batch_tokens, self._batch_size)
+        if len(batches) == 1:
+            # A query: skip the thread pool.
+            matrix = self._embed_batch(list(texts), sum(counts))
+            self.dim = matrix.shape[1]
+            return matrix
+        with ThreadPoolExecutor(max_workers=max(1, min(self._concurrency, len(batches)))) as pool:
+            futures = [pool.submit(self._embed_batch, list(texts[start:end]), sum(counts[start:end]))
+                       for start, end in batches]
+            try:
+                matrices = [future.result() for future in futures]
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        if not matrices:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        matrix = np.vstack(matrices)
+        self.dim = matrix.shape[1]
+        return matrix
+
+    def _embed_batch(self, batch: List[str], tokens: int) -> np.ndarray:
+        from openai import APIConnectionError, APIStatusError, OpenAIError, RateLimitError
+
+        for attempt in range(self._max_retries + 1):
+            self._budget.acquire(tokens)
+            try:
+                raw = self._client.embeddings.with_raw_response.create(model=self.model, input=batch)
+            except RateLimitError as exc:
+                self._budget.observe(exc.response.headers)
+                retry_after = parse_duration(exc.response.headers.get("retry-after"))
+                delay = backoff_delay(attempt, 1.0, 60.0) if retry_after is None else retry_after
+                # The pause holds every thread; the jitter spreads out the moment they resume.
+                self._budget.pause(delay + random.uniform(0, 1.0))
+                error: Exception = exc
+            except APIConnectionError as exc:
+                error = exc
+                self._backoff(attempt)
+            except APIStatusError as exc:
+                if exc.status_code not in (408, 409) and exc.status_code < 500:
+                    raise RuntimeError(f"OpenAI embedding request failed: {exc}") from exc
+                error = exc
+                self._backoff(attempt)
+            except OpenAIError as exc:
+                raise RuntimeError(f"OpenAI embedding request failed: {exc}") from exc
+            else:
+                self._budget.observe(raw.headers)
+                data = sorted(raw.parse().data, key=lambda item: item.index)
+                return np.asarray([item.embedding for item in data], dtype=np.float32)
+            logger.warning("Embedding batch of %d texts failed (attempt %d/%d): %s",
+                           len(batch), attempt + 1, self._max_retries + 1, error)
+        raise RuntimeError(f"OpenAI embedding failed after {self._max_retries + 1} attempts: {error}") from error
+
+    def _backoff(self, attempt: int) -> None:
+        if attempt < self._max_retries:
+            time.sleep(backoff_delay(attempt, 0.5, 30.0))
+
+
+def build_embedder(settings: Settings, spec: Optional[EmbedderSpec] = None) -> Embedder:
+    """The embedder chosen by ``settings``, or the one ``spec`` records when loading an index."""
+    name = spec.name if spec is not None else settings.embedding_backend
+    if name == "auto":
+        name = OPENAI if settings.openai_api_key else HASHING
+    if name == HASHING:
+        return HashingEmbedder(spec.dim if spec is not None else settings.hashing_dim)
+    if name != OPENAI:
+        raise ValueError(f"Unknown embedding backend {name!r}.")
+    if not settings.openai_api_key:
+        raise RuntimeError("OPENAI_API_KEY must be set to embed with OpenAI.")
+    return OpenAIEmbedder(
+        settings.openai_api_key,
+        model=spec.model if spec is not None else settings.embedding_model,
+        batch_size=settings.embedding_batch_size,
+        batch_tokens=settings.embedding_batch_tokens,
+        concurrency=settings.embedding_concurrency,
+        max_retries=settings.embedding_max_retries,
+        timeout=settings.embedding_timeout_seconds,
+        requests_per_minute=settings.embedding_requests_per_minute,
+        tokens_per_minute=settings.embedding_tokens_per_minute,
+    )
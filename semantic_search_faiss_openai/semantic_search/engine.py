@@ -0,0 +1,162 @@
+"""Query-time search over the artifacts written by ``build-index``."""
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+import numpy as np
+
+from semantic_search.ann import set_search_params
+from semantic_search.config import Settings
+from semantic_search.corpus import DOCUMENTS_FILE, Document, preview, read_documents
+from semantic_search.embeddings import Embedder, build_embedder, l2_normalize
+from semantic_search.index import ChunkMap, Manifest, VectorIndex, load_chunk_map, load_index, read_manifest
+
+Pooling = Literal["max", "top_m"]
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    rank: int
+    score: float
+    doc_id: int
+    title: str
+    category: str
+    path: str
+    # The start of the document, or of the best-matching passage in a chunk-level index.
+    preview: str
+    # The best-matching chunk; only a chunk-level index has one.
+    passage: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class SearchEngine:
+    """Embeds queries the way the index was built and looks them up.
+
+    Everything is loaded once in :meth:`load`; :meth:`search` only embeds the
+    query and searches the index, and is safe to call from several threads.
+
+    In a chunk-level index, a search retrieves ``k * oversample`` chunks,
+    groups them by document, and ranks documents by ``pooling``: the score
+    of their best chunk (``max``), or the mean of their best ``pooling_m``
+    scores, with missing chunks counted as zero (``top_m``). A document with
+    several matching passages therefore outranks one with a single match.
+    When the retrieved chunks cover fewer than ``k`` documents, more are
+    fetched.
+    """
+
+    def __init__(
+        self,
+        documents: List[Document],
+        index: VectorIndex,
+        embedder: Embedder,
+        manifest: Manifest,
+        chunk_map: Optional[ChunkMap] = None,
+        pooling: Pooling = "max",
+        pooling_m: int = 3,
+        oversample: int = 4,
+        preview_chars: int = 280,
+    ) -> None:
+        expected = len(documents) if chunk_map is None else chunk_map.live
+        if index.ntotal != expected:
+            raise ValueError(f"Index holds {index.ntotal} vectors where {expected} were expected; rebuild it.")
+        self.documents = documents
+        self._by_id = {document.doc_id: document for document in documents}
+        self.index = index
+        self.embedder = embedder
+        self.manifest = manifest
+        self._chunk_docs = None if chunk_map is None else np.asarray(chunk_map.rows[:, 0])
+        self._chunk_spans = None if chunk_map is None else np.asarray(chunk_map.rows[:, 1:])
+        self._pooling = pooling
+        self._pooling_m = pooling_m
+        self._oversample = oversample
+        self._preview_chars = preview_chars
+
+    @classmethod
+    def load(cls, settings: Settings, index_dir: Optional[Path] = None) -> "SearchEngine":
+        index_dir = index_dir or settings.index_dir
+        manifest = read_manifest(index_dir)
+        index = load_index(index_dir, manifest)
+        set_search_params(index, manifest.index_factory, settings.index_nprobe, settings.index_ef_search)
+        return cls(
+            read_documents(index_dir / DOCUMENTS_FILE),
+            index,
+            build_embedder(settings, manifest.embedder),
+            manifest,
+            chunk_map=load_chunk_map(index_dir) if manifest.granularity == "chunk" else None,
+            pooling=settings.chunk_pooling,
+            pooling_m=settings.chunk_pooling_m,
+            oversample=settings.chunk_oversample,
+            preview_chars=settings.preview_chars,
+        )
+
+    def search(self, query: str, k: int = 5) -> List[SearchHit]:
+        if not self.index.ntotal:
+            return []
+        vector = l2_normalize(self.embedder.embed([query]))
+        if self._chunk_docs is not None:
+            return self._search_chunks(vector, k)
+        scores, ids = self.index.search(vector, min(k, self.index.ntotal))
+        hits = []
+        for score, doc_id in zip(scores[0].tolist(), ids[0].tolist()):
+            # FAISS pads with -1 when it finds fewer than k neighbours.
+            if doc_id < 0:
+                continue
+            document = self._by_id[doc_id]
+            hits.append(self._hit(len(hits) + 1, score, document, document.preview))
+        return hits
+
+    def _search_chunks(self, vector: np.ndarray, k: int) -> List[SearchHit]:
+        fetch = min(self.index.ntotal, k * self._oversample)
+        while True:
+            scores, chunk_ids = self.index.search(vector, fetch)
+            # Chunk scores per document, best first, as the index returned them.
+            matches: Dict[int, List[Tuple[float, int]]] = {}
+            for score, chunk_id in zip(scores[0].tolist(), chunk_ids[0].tolist()):
+                if chunk_id >= 0:
+                    matches.setdefault(int(self._chunk_docs[chunk_id]), []).append((score, chunk_id))
+            if len(matches) >= k or fetch >= self.index.ntotal:
+                break
+            fetch = min(self.index.ntotal, fetch * 2)
+
+        ranked = sorted(matches.items(), key=lambda item: self._pool(item[1]), reverse=True)[:k]
+        hits = []
+        for doc_id, chunk_scores in ranked:
+            document = self._by_id[doc_id]
+            start, end = self._chunk_spans[chunk_scores[0][1]].tolist()
+            passage = document.text[start:end]
+            hits.append(self._hit(len(hits) + 1, self._pool(chunk_scores), document,
+                                  preview(passage, self._preview_chars), passage))
+        return hits
+
+    def _pool(self, chunk_scores: List[Tuple[float, int]]) -> float:
+        if self._pooling == "max":
+            return chunk_scores[0][0]
+        return sum(score for score, _ in chunk_scores[:self._pooling_m]) / self._pooling_m
+
+    @staticmethod
+    def _hit(rank: int, score: float, document: Document, snippet: str, passage: Optional[str] = None) -> SearchHit:
+        return SearchHit(
+            rank=rank,
+            score=float(score),
+            doc_id=document.doc_id,
+            title=document.title,
+            category=document.category,
+            path=document.path,
+            preview=snippet,
+            passage=passage,
+        )
+
+    def search_frame(self, query: str, k: int = 5) -> Any:
+        """:meth:`search` as a pandas ``DataFrame``, as the notebook displayed it."""
+        import pandas as pd
+
+        return pd.DataFrame([hit.as_dict() for hit in self.search(query, k)])
+
+    def warm_up(self) -> None:
+        """Search with a zero vector, so the index is paged in before the first request rather than during it."""
+        self.index.search(np.zeros((1, self.manifest.embedder.dim), dtype=np.float32), 1)
@@ -0,0 +1,251 @@
+"""Nearest-neighbour indexes over L2-normalized vectors, and their on-disk artifacts.
+
+Vectors are normalized, so inner product equals cosine similarity, and are
+stored under their document ids so an index can be updated in place with
+``add_with_ids``/``remove_ids``. ``faiss`` is imported only when a FAISS index
+is built or loaded; :class:`NumpyFlatIndex` serves the same exact searches
+without it. The approximate FAISS structures are described in
+:mod:`semantic_search.ann`.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Literal, Optional, Protocol, Sequence, Tuple
+
+import numpy as np
+
+from semantic_search.embeddings import EmbedderSpec
+
+EMBEDDINGS_FILE = "embeddings.npy"
+IDS_FILE = "ids.npy"
+FAISS_INDEX_FILE = "faiss.index"
+CHUNK_MAP_FILE = "chunk_map.npy"
+MANIFEST_FILE = "manifest.json"
+
+IndexBackend = Literal["faiss", "numpy"]
+Granularity = Literal["document", "chunk"]
+
+
+class VectorIndex(Protocol):
+    """Vectors under caller-chosen int64 ids, which :meth:`search` returns."""
+
+    ntotal: int
+    # False until an approximate index's centroids and codebooks are trained.
+    is_trained: bool
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """``(scores, ids)``, each ``[len(queries), k]``, best match first."""
+        ...
+
+    def add_with_ids(self, vectors: np.ndarray, ids: np.ndarray) -> None:
+        ...
+
+    def remove_ids(self, ids: np.ndarray) -> int:
+        ...
+
+
+class NumpyFlatIndex:
+    """Exact inner-product search with NumPy, for hosts without FAISS."""
+
+    is_trained = True
+
+    def __init__(self, vectors: np.ndarray, ids: Optional[np.ndarray] = None) -> None:
+        self._vectors = vectors
+        self._ids = np.arange(len(vectors), dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+        self.ntotal = len(vectors)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = queries @ self._vectors.T
+        k = min(k, self.ntotal)
+        if k < self.ntotal:
+            # Partition first so only the top k are sorted.
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(self.ntotal), scores.shape)
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+        positions = np.take_along_axis(top, order, axis=1)
+        return np.take_along_axis(scores, positions, axis=1), self._ids[positions]
+
+    def add_with_ids(self, vectors: np.ndarray, ids: np.ndarray) -> None:
+        self._vectors = np.concatenate([self._vectors, np.asarray(vectors, dtype=np.float32)])
+        self._ids = np.concatenate([self._ids, np.asarray(ids, dtype=np.int64)])
+        self.ntotal = len(self._vectors)
+
+    def remove_ids(self, ids: np.ndarray) -> int:
+        keep = ~np.isin(self._ids, ids)
+        removed = self.ntotal - int(keep.sum())
+        if removed:
+            self._vectors, self._ids = self._vectors[keep], self._ids[keep]
+            self.ntotal = len(self._vectors)
+        return removed
+
+
+def faiss_available() -> bool:
+    try:
+        import faiss  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_backend(backend: str) -> IndexBackend:
+    if backend == "auto":
+        return "faiss" if faiss_available() else "numpy"
+    if backend not in ("faiss", "numpy"):
+        raise ValueError(f"Unknown index backend {backend!r}.")
+    return backend  # type: ignore[return-value]
+
+
+def create_index(dim: int, backend: IndexBackend, factory: str = "Flat") -> VectorIndex:
+    """An empty index that keeps the ids its vectors are added with.
+
+    ``factory`` is a FAISS factory string from
+    :func:`semantic_search.ann.index_factory`; the NumPy backend is always flat.
+    """
+    if backend == "numpy":
+        if factory != "Flat":
+            raise ValueError(f"The numpy index backend only builds flat indexes, not {factory!r}.")
+        return NumpyFlatIndex(np.empty((0, dim), dtype=np.float32))
+    import faiss
+
+    from semantic_search.ann import HNSW_EF_CONSTRUCTION
+
+    index = faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    # IVF indexes, behind an OPQ rotation or not, keep ids in their lists; the others need the map.
+    return index if faiss.try_extract_index_ivf(index) is not None else faiss.IndexIDMap2(index)
+
+
+class ChunkMap:
+    """Document and character span of every chunk in a chunk-level index, by chunk id.
+
+    One flat ``int32`` array of ``[doc_id, start, end]`` rows, so memory
+    grows with the number of chunks and nothing else. A released chunk's row
+    is set to ``-1`` and its id is handed out again before the array grows.
+    """
+
+    def __init__(self, rows: Optional[np.ndarray] = None) -> None:
+        self.rows = np.empty((0, 3), dtype=np.int32) if rows is None else rows
+
+    @property
+    def live(self) -> int:
+        return int((self.rows[:, 0] >= 0).sum())
+
+    def release(self, doc_ids: Sequence[int]) -> np.ndarray:
+        """Free the chunks of ``doc_ids``; returns their chunk ids."""
+        chunk_ids = np.flatnonzero(np.isin(self.rows[:, 0], np.asarray(doc_ids, dtype=np.int32)))
+        if len(chunk_ids):
+            self.rows = np.array(self.rows)
+            self.rows[chunk_ids] = -1
+        return chunk_ids.astype(np.int64)
+
+    def allocate(self, rows: np.ndarray) -> np.ndarray:
+        """Store ``[doc_id, start, end]`` rows under free or new chunk ids; returns the ids."""
+        free = np.flatnonzero(self.rows[:, 0] < 0)[:len(rows)]
+        extra = len(rows) - len(free)
+        chunk_ids = np.concatenate([free, np.arange(len(self.rows), len(self.rows) + extra)]).astype(np.int64)
+        self.rows = np.concatenate([self.rows, np.full((extra, 3), -1, dtype=np.int32)])
+        self.rows[chunk_ids] = rows
+        return chunk_ids
+
+
+@dataclass(frozen=True)
+class Manifest:
+    """What ``build-index`` produced; the server trusts it instead of probing the artifacts."""
+
+    embedder: EmbedderSpec
+    index_backend: IndexBackend
+    documents: int
+    chunk_max_chars: int
+    chunk_overlap_chars: int
+    # ``document`` indexes one averaged vector per document, ``chunk`` every chunk's vector.
+    granularity: Granularity
+    vectors: int
+    # The structure ``build-index`` chose (see :mod:`semantic_search.ann`), and its FAISS factory string.
+    index_type: str = "flat"
+    index_factory: str = "Flat"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "embedder": self.embedder.as_dict(),
+            "index_backend": self.index_backend,
+            "documents": self.documents,
+            "chunk_max_chars": self.chunk_max_chars,
+            "chunk_overlap_chars": self.chunk_overlap_chars,
+            "granularity": self.granularity,
+            "vectors": self.vectors,
+            "index_type": self.index_type,
+            "index_factory": self.index_factory,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Manifest":
+        return cls(
+            EmbedderSpec(**data["embedder"]), data["index_backend"], data["documents"],
+            data["chunk_max_chars"], data["chunk_overlap_chars"], data["granularity"], data["vectors"],
+            # Indexes written before the approximate types existed are flat.
+            data.get("index_type", "flat"), data.get("index_factory", "Flat"),
+        )
+
+
+def _replace(path: Path, write: Callable[[Path], None]) -> None:
+    # Write beside the target and rename over it, so a server loading the index never sees half a file.
+    partial = path.with_name(path.name + ".partial")
+    write(partial)
+    os.replace(partial, path)
+
+
+def _save_array(path: Path, array: np.ndarray) -> None:
+    # Through a file object, since ``np.save`` appends ``.npy`` to a path without it.
+    with path.open("wb") as file:
+        np.save(file, array)
+
+
+def save_index(index_dir: Path, index: VectorIndex, manifest: Manifest, chunk_map: Optional[ChunkMap] = None) -> None:
+    """Write the chunk map of a chunk-level index, the index, and then the manifest."""
+    index_dir.mkdir(parents=True, exist_ok=True)
+    if chunk_map is not None:
+        _replace(index_dir / CHUNK_MAP_FILE, lambda path: _save_array(path, chunk_map.rows))
+    if manifest.index_backend == "faiss":
+        import faiss
+
+        _replace(index_dir / FAISS_INDEX_FILE, lambda path: faiss.write_index(index, str(path)))
+    else:
+        _replace(index_dir / EMBEDDINGS_FILE, lambda path: _save_array(path, index.vectors))
+        _replace(index_dir / IDS_FILE, lambda path: _save_array(path, index.ids))
+    _replace(index_dir / MANIFEST_FILE,
+             lambda path: path.write_text(json.dumps(manifest.as_dict(), indent=2) + "\n", encoding="utf-8"))
+
+
+def read_manifest(index_dir: Path) -> Manifest:
+    path = index_dir / MANIFEST_FILE
+    if not path.exists():
+        raise FileNotFoundError(f"No index at {index_dir}; run `semantic-search build-index` first.")
+    return Manifest.from_dict(json.loads(path.read_text(encoding="utf-8")))
+
+
+def load_index(index_dir: Path, manifest: Manifest) -> VectorIndex:
+    if manifest.index_backend == "faiss":
+        import faiss
+
+        return faiss.read_index(str(index_dir / FAISS_INDEX_FILE))
+    # Memory-mapped, so startup does not wait for the whole matrix to be read.
+    return NumpyFlatIndex(np.load(index_dir / EMBEDDINGS_FILE, mmap_mode="r"), np.load(index_dir / IDS_FILE))
+
+
+def load_chunk_map(index_dir: Path) -> ChunkMap:
+    # Memory-mapped like the NumPy index; ``release`` copies it before the first write.
+    return ChunkMap(np.load(index_dir / CHUNK_MAP_FILE, mmap_mode="r"))
@@ -0,0 +1,305 @@
+"""The offline steps: ``ingest`` reads a corpus, ``build_index`` embeds it and updates the index.
+
+Both are incremental. ``ingest`` keeps each path's ``doc_id`` across runs,
+and ``build_index`` only touches documents whose content hash differs from
+what the index holds: their chunks are looked up in the
+:class:`~semantic_search.store.EmbeddingStore`, only chunks it has never seen
+are embedded, and the index is updated with ``remove_ids``/``add_with_ids``.
+An HNSW index cannot remove vectors, so any change other than an addition
+rebuilds it.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from semantic_search.ann import (
+    IndexType,
+    choose_index_type,
+    index_factory,
+    supports_removal,
+    training_points,
+)
+from semantic_search.config import Settings
+from semantic_search.corpus import DOCUMENTS_FILE, Document, chunk_spans, load_documents, read_documents, write_documents
+from semantic_search.embeddings import Embedder, EmbedderSpec, build_embedder, l2_normalize
+from semantic_search.index import (
+    MANIFEST_FILE,
+    ChunkMap,
+    IndexBackend,
+    Manifest,
+    VectorIndex,
+    create_index,
+    load_chunk_map,
+    load_index,
+    read_manifest,
+    resolve_backend,
+    save_index,
+)
+from semantic_search.store import EmbeddingStore, IndexState, connect, digest
+
+logger = logging.getLogger(__name__)
+
+# Chunks embedded per store write, so an interrupted run keeps what it already paid for. Large
+# enough to give the embedder many batches to run concurrently.
+_EMBED_GROUP = 8192
+# Documents pooled and added to the index at a time, which bounds memory on full rebuilds.
+_ADD_GROUP = 4096
+
+
+@dataclass(frozen=True)
+class BuildReport:
+    manifest: Manifest
+    rebuilt: bool
+    added: int
+    updated: int
+    removed: int
+    embedded_chunks: int
+    reused_chunks: int
+
+
+def ingest(settings: Settings, source: Optional[Path] = None, index_dir: Optional[Path] = None) -> int:
+    """Read the corpus at ``source`` into ``<index_dir>/docs.jsonl``; returns the document count.
+
+    A path that was ingested before keeps its ``doc_id``; new paths get ids
+    above every id in use, so the index can be updated by id.
+    """
+    source = source or settings.data_dir
+    index_dir = index_dir or settings.index_dir
+    documents = load_documents(source, settings.preview_chars)
+    if not documents:
+        raise ValueError(f"No .txt documents found in {source}.")
+    path = index_dir / DOCUMENTS_FILE
+    previous = {document.path: document.doc_id for document in read_documents(path)} if path.exists() else {}
+    next_id = max(previous.values(), default=-1) + 1
+    stable = []
+    for document in documents:
+        doc_id = previous.get(document.path)
+        if doc_id is None:
+            doc_id, next_id = next_id, next_id + 1
+        stable.append(replace(document, doc_id=doc_id))
+    count = write_documents(stable, path)
+    logger.info("Ingested %d documents from %s", count, source)
+    return count
+
+
+def _model_key(embedder: Embedder) -> str:
+    return f"{embedder.name}/{embedder.model}"
+
+
+def _reusable(manifest: Optional[Manifest], embedder: Embedder, backend: IndexBackend, settings: Settings) -> bool:
+    """Whether the existing index was built the way this run would build it."""
+    return (
+        manifest is not None
+        and (manifest.embedder.name, manifest.embedder.model) == (embedder.name, embedder.model)
+        and manifest.index_backend == backend
+        and (manifest.chunk_max_chars, manifest.chunk_overlap_chars)
+        == (settings.chunk_max_chars, settings.chunk_overlap_chars)
+        and manifest.granularity == settings.index_granularity
+        and settings.index_type in ("auto", manifest.index_type)
+    )
+
+
+def _index_type(settings: Settings, backend: IndexBackend, vectors: int, dim: int) -> IndexType:
+    if backend == "numpy":
+        return "flat"
+    if settings.index_type == "auto":
+        return choose_index_type(vectors, dim, settings.index_memory_budget_mb)
+    return settings.index_type
+
+
+def _embed_missing(embedder: Embedder, store: EmbeddingStore, model: str, chunks: Dict[str, str]) -> int:
+    """Embed and store the chunks ``store`` lacks; ``chunks`` maps digest to text."""
+    missing = store.missing(model, chunks)
+    for start in range(0, len(missing), _EMBED_GROUP):
+        group = missing[start:start + _EMBED_GROUP]
+        store.put(model, group, embedder.embed([chunks[value] for value in group]))
+        logger.info("Embedded %d/%d new chunks", min(start + _EMBED_GROUP, len(missing)), len(missing))
+    return len(missing)
+
+
+def _document_vectors(store: EmbeddingStore, model: str, digests: Sequence[Sequence[str]]) -> np.ndarray:
+    """One L2-normalized vector per document: the mean of its chunks' embeddings."""
+    flat: List[str] = [value for document in digests for value in document]
+    chunk_matrix = store.get(model, flat)
+    bounds = np.cumsum([0] + [len(document) for document in digests])
+    return l2_normalize(np.vstack([chunk_matrix[start:end].mean(axis=0) for start, end in zip(bounds, bounds[1:])]))
+
+
+class _Chunks:
+    """Digests and spans of the chunks of the documents being (re-)indexed."""
+
+    def __init__(self, documents: Sequence[Document], max_chars: int, overlap: int) -> None:
+        self.digests: Dict[int, List[str]] = {}
+        self.spans: Dict[int, List[Tuple[int, int]]] = {}
+        self.texts: Dict[str, str] = {}
+        for document in documents:
+            spans = chunk_spans(document.text, max_chars, overlap)
+            pieces = [document.text[start:end] for start, end in spans]
+            self.spans[document.doc_id] = spans
+            self.digests[document.doc_id] = [digest(piece) for piece in pieces]
+            self.texts.update(zip(self.digests[document.doc_id], pieces))
+
+
+def _train(
+    index: VectorIndex, store: EmbeddingStore, model: str, factory: str, documents: Sequence[Document],
+    chunks: _Chunks, granularity: str, limit: int,
+) -> None:
+    """Train IVF centroids and PQ codebooks on a random sample of the vectors about to be added."""
+    rng = np.random.default_rng(0)
+    if granularity == "chunk":
+        digests = [value for document in documents for value in chunks.digests[document.doc_id]]
+        picked = rng.choice(len(digests), training_points(factory, len(digests), limit), replace=False)
+        sample = l2_normalize(store.get(model, [digests[position] for position in np.sort(picked)]))
+    else:
+        picked = rng.choice(len(documents), training_points(factory, len(documents), limit), replace=False)
+        sample = _document_vectors(store, model, [chunks.digests[documents[position].doc_id]
+                                                  for position in np.sort(picked)])
+    logger.info("Training the %s index on %d vectors", factory, len(sample))
+    index.train(sample)
+
+
+def _update_documents(
+    index: VectorIndex, store: EmbeddingStore, model: str, stale: Sequence[Document], removed: Sequence[int],
+    chunks: _Chunks, removable: bool,
+) -> None:
+    # Ids being added are removed first too, so re-running after an interrupted build never duplicates them.
+    if removable:
+        index.remove_ids(np.asarray(list(removed) + [document.doc_id for document in stale], dtype=np.int64))
+    for start in range(0, len(stale), _ADD_GROUP):
+        group = stale[start:start + _ADD_GROUP]
+        index.add_with_ids(
+            _document_vectors(store, model, [chunks.digests[document.doc_id] for document in group]),
+            np.asarray([document.doc_id for document in group], dtype=np.int64),
+        )
+
+
+def _update_chunks(
+    index: VectorIndex, chunk_map: ChunkMap, store: EmbeddingStore, model: str, stale: Sequence[Document],
+    removed: Sequence[int], chunks: _Chunks, removable: bool,
+) -> None:
+    released = chunk_map.release(list(removed) + [document.doc_id for document in stale])
+    if removable:
+        index.remove_ids(released)
+    for start in range(0, len(stale), _ADD_GROUP):
+        group = stale[start:start + _ADD_GROUP]
+        digests = [value for document in group for value in chunks.digests[document.doc_id]]
+        rows = np.asarray([(document.doc_id, span_start, span_end)
+                           for document in group for span_start, span_end in chunks.spans[document.doc_id]],
+                          dtype=np.int32)
+        index.add_with_ids(l2_normalize(store.get(model, digests)), chunk_map.allocate(rows))
+
+
+def build_index(settings: Settings, index_dir: Optional[Path] = None, full: bool = False) -> BuildReport:
+    """Bring the index in ``index_dir`` up to date with the ingested documents.
+
+    The index is rebuilt from scratch when ``full`` is set, when there is
+    none yet, or when the embedder, index backend, index type, granularity or
+    chunking settings changed; unchanged chunks still come from the store.
+    With ``INDEX_TYPE=auto`` it is also rebuilt when the corpus has grown or
+    shrunk into another type's range.
+    """
+    index_dir = index_dir or settings.index_dir
+    documents_path = index_dir / DOCUMENTS_FILE
+    if not documents_path.exists():
+        raise FileNotFoundError(f"No documents at {documents_path}; run `semantic-search ingest` first.")
+    documents = read_documents(documents_path)
+    embedder = build_embedder(settings)
+    backend = resolve_backend(settings.index_backend)
+    if backend == "numpy" and settings.index_type not in ("auto", "flat"):
+        raise ValueError(f"INDEX_TYPE={settings.index_type} needs the faiss index backend.")
+    model = _model_key(embedder)
+    previous = read_manifest(index_dir) if (index_dir / MANIFEST_FILE).exists() else None
+    granularity = settings.index_granularity
+    rebuild = full or not _reusable(previous, embedder, backend, settings)
+    if not rebuild and granularity == "chunk" and load_chunk_map(index_dir).live != previous.vectors:
+        # The chunk map is written before the index, so a build interrupted in between leaves them disagreeing.
+        logger.warning("Chunk map does not match the index; rebuilding")
+        rebuild = True
+    if not rebuild and settings.index_type == "auto":
+        # Chunk counts are only known after chunking, so scale the indexed ones by the document count.
+        expected = (len(documents) if granularity == "document"
+                    else previous.vectors * len(documents) // max(previous.documents, 1))
+        planned = _index_type(settings, backend, expected, previous.embedder.dim)
+        if planned != previous.index_type:
+            logger.info("The corpus now calls for a %s index instead of %s; rebuilding", planned,
+                        previous.index_type)
+            rebuild = True
+
+    connection = connect(index_dir)
+    try:
+        store, state = EmbeddingStore(index_dir, connection), IndexState(connection)
+        indexed = state.content_hashes()
+        current = {document.doc_id for document in documents}
+        removed = [doc_id for doc_id in indexed if doc_id not in current]
+        stale: List[Document] = [
+            document for document in documents if rebuild or indexed.get(document.doc_id) != document.content_hash
+        ]
+        # Every build leaves all its documents in the state, so a count that differs means the last build
+        # stopped after writing the index: its documents are in the index but would be added again.
+        if (not rebuild and not supports_removal(previous.index_factory)
+                and (removed or len(indexed) != previous.documents
+                     or any(document.doc_id in indexed for document in stale))):
+            logger.info("A %s index cannot remove vectors; rebuilding", previous.index_factory)
+            rebuild, stale = True, list(documents)
+        superseded = state.chunk_digests(removed + [document.doc_id for document in stale])
+
+        chunks = _Chunks(stale, settings.chunk_max_chars, settings.chunk_overlap_chars)
+        if not (rebuild or stale or removed):
+            logger.info("Index is up to date")
+            return BuildReport(previous, rebuilt=False, added=0, updated=0, removed=0, embedded_chunks=0,
+                               reused_chunks=0)
+        logger.info("%d documents to embed, %d to remove (%s)", len(stale), len(removed),
+                    "full rebuild" if rebuild else "incremental")
+        embedded = _embed_missing(embedder, store, model, chunks.texts)
+
+        dim = store.dim(model) or (previous.embedder.dim if previous is not None and not rebuild else None)
+        if dim is None:
+            raise ValueError("Nothing to index.")
+        if rebuild:
+            vectors = len(stale) if granularity == "document" else sum(map(len, chunks.spans.values()))
+            index_type = _index_type(settings, backend, vectors, dim)
+            factory = index_factory(index_type, vectors, dim, settings.index_memory_budget_mb,
+                                    settings.index_pq_m, settings.index_hnsw_m)
+            index = create_index(dim, backend, factory)
+            if not index.is_trained:
+                _train(index, store, model, factory, stale, chunks, granularity, settings.index_train_size)
+        else:
+            index_type, factory = previous.index_type, previous.index_factory
+            index = load_index(index_dir, previous)
+        chunk_map: Optional[ChunkMap] = None
+        if granularity == "chunk":
+            chunk_map = ChunkMap() if rebuild else load_chunk_map(index_dir)
+            _update_chunks(index, chunk_map, store, model, stale, removed, chunks, supports_removal(factory))
+        else:
+            _update_documents(index, store, model, stale, removed, chunks, supports_removal(factory))
+
+        manifest = Manifest(
+            EmbedderSpec(embedder.name, embedder.model, dim), backend, len(documents),
+            settings.chunk_max_chars, settings.chunk_overlap_chars, granularity, index.ntotal, index_type, factory,
+        )
+        save_index(index_dir, index, manifest, chunk_map)
+        # The state is only advanced once the index it describes is on disk.
+        state.replace(removed, {document.doc_id: (document.content_hash, chunks.digests[document.doc_id])
+                                for document in stale})
+        store.discard(model, state.unreferenced(superseded))
+    finally:
+        connection.close()
+
+    added = sum(1 for document in stale if document.doc_id not in indexed)
+    report = BuildReport(
+        manifest=manifest,
+        rebuilt=rebuild,
+        added=added,
+        updated=len(stale) - added,
+        removed=len(removed),
+        embedded_chunks=embedded,
+        reused_chunks=len(chunks.texts) - embedded,
+    )
+    logger.info("Wrote a %s %s index of %d vectors to %s", backend, factory, index.ntotal, index_dir)
+    return report
@@ -0,0 +1,122 @@
+"""Client-side request and token budgets for the OpenAI embeddings API.
+
+:class:`RateBudget` holds two token buckets, one for requests per minute and
+one for tokens per minute. Each refills continuously at its per-minute limit.
+Limits that are not configured are learned from the ``x-ratelimit-*``
+headers of the first response. Every response then pulls the buckets down
+to the remaining quota the API reports, so the budget also accounts for
+other clients spending from the same organisation's quota.
+"""
+
+from __future__ import annotations
+
+import random
+import re
+import threading
+import time
+from typing import Callable, Mapping, Optional
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds in an OpenAI reset header (``"1s"``, ``"6m0s"``, ``"20ms"``) or a ``Retry-After``."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _UNIT_SECONDS[unit] for amount, unit in parts)
+
+
+def backoff_delay(attempt: int, base_seconds: float, max_seconds: float) -> float:
+    """Full-jitter exponential backoff for retry number ``attempt`` (0-based)."""
+    return random.uniform(0, min(max_seconds, base_seconds * (2 ** attempt)))
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> Optional[int]:
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class _Bucket:
+    def __init__(self, per_minute: float, now: float) -> None:
+        self.capacity = per_minute
+        self.level = per_minute
+        self._rate = per_minute / 60.0
+        self._updated = now
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def wait(self, cost: float) -> float:
+        """Seconds until ``cost`` is available; a cost above capacity waits for a full bucket."""
+        cost = min(cost, self.capacity)
+        return 0.0 if self.level >= cost else (cost - self.level) / self._rate
+
+
+class RateBudget:
+    """Thread-safe requests-per-minute and tokens-per-minute budget; unset limits start unlimited."""
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self._clock = clock
+        self._sleep = sleep
+        now = clock()
+        self._requests = _Bucket(requests_per_minute, now) if requests_per_minute else None
+        self._tokens = _Bucket(tokens_per_minute, now) if tokens_per_minute else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> float:
+        """Block until one request of ``tokens`` fits the budget, then spend it; returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                wait = self._paused_until - now
+                for bucket, cost in ((self._requests, 1), (self._tokens, tokens)):
+                    if bucket is not None:
+                        bucket.refill(now)
+                        wait = max(wait, bucket.wait(cost))
+                if wait <= 0:
+                    for bucket, cost in ((self._requests, 1), (self._tokens, tokens)):
+                        if bucket is not None:
+                            bucket.level -= min(cost, bucket.capacity)
+                    return waited
+            self._sleep(wait)
+            waited += wait
+
+    def observe(self, headers: Mapping[str, str]) -> None:
+        """Learn limits from a response's headers and lower the buckets to the quota it reports as left."""
+        with self._lock:
+            now = self._clock()
+            for kind in ("requests", "tokens"):
+                limit = _header_int(headers, f"x-ratelimit-limit-{kind}")
+                remaining = _header_int(headers, f"x-ratelimit-remaining-{kind}")
+                bucket = getattr(self, f"_{kind}")
+                if bucket is None and limit:
+                    bucket = _Bucket(limit, now)
+                    setattr(self, f"_{kind}", bucket)
+                if bucket is not None and remaining is not None:
+                    bucket.refill(now)
+                    bucket.level = min(bucket.level, remaining)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every request for ``seconds``, e.g. after a 429 with ``Retry-After``."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
@@ -0,0 +1,246 @@
+"""Content-addressed chunk embeddings, and the record of what an index holds.
+
+:class:`EmbeddingStore` keeps one vector per ``(model, chunk digest)``, so a
+chunk is embedded once however often the corpus is re-ingested. Vectors are
+appended to a float32 file per model; SQLite maps each digest to its row.
+Superseded rows are dropped with :meth:`EmbeddingStore.discard` and the file
+is rewritten once most of it is dead.
+
+:class:`IndexState` records the content hash and chunk digests of every
+document in the index, which is what ``build-index`` diffs against to update
+the index in place.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+STORE_FILE = "embeddings.sqlite"
+
+# SQLite's default limit on host parameters in one statement is 999 on older builds.
+_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    model TEXT PRIMARY KEY,
+    dim INTEGER NOT NULL,
+    file TEXT NOT NULL,
+    rows INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunk_vectors (
+    model TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    PRIMARY KEY (model, digest)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS indexed_documents (
+    doc_id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS indexed_chunks (
+    doc_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (doc_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS indexed_chunks_digest ON indexed_chunks (digest);
+"""
+
+
+def digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _batches(values: Sequence[str]) -> Iterator[Sequence[str]]:
+    for start in range(0, len(values), _BATCH):
+        yield values[start:start + _BATCH]
+
+
+def connect(directory: Path) -> sqlite3.Connection:
+    directory.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(directory / STORE_FILE)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+class EmbeddingStore:
+    """Chunk vectors keyed by model and chunk digest.
+
+    A vector file is only ever appended to, and is fsynced before the rows
+    pointing into it are committed; compaction writes a new file and switches
+    to it in one transaction. A crash therefore leaves, at worst, unreferenced
+    vectors at the end of a file.
+    """
+
+    def __init__(self, directory: Path, connection: sqlite3.Connection) -> None:
+        self._directory = directory
+        self._db = connection
+
+    def dim(self, model: str) -> Optional[int]:
+        row = self._db.execute("SELECT dim FROM models WHERE model = ?", (model,)).fetchone()
+        return row[0] if row else None
+
+    def missing(self, model: str, digests: Iterable[str]) -> List[str]:
+        """The distinct ``digests`` that have no stored vector, in first-seen order."""
+        wanted = list(dict.fromkeys(digests))
+        stored = self._rows(model, wanted)
+        return [value for value in wanted if value not in stored]
+
+    def get(self, model: str, digests: Sequence[str]) -> np.ndarray:
+        """The vectors of ``digests``, in order; every digest must be stored."""
+        rows = self._rows(model, list(dict.fromkeys(digests)))
+        absent = [value for value in digests if value not in rows]
+        if absent:
+            raise KeyError(f"{len(absent)} chunks have no stored {model} embedding.")
+        if not digests:
+            return np.empty((0, self.dim(model) or 0), dtype=np.float32)
+        dim, path, _ = self._model(model)
+        vectors = np.memmap(path, dtype=np.float32, mode="r").reshape(-1, dim)
+        return np.asarray(vectors[[rows[value] for value in digests]])
+
+    def put(self, model: str, digests: Sequence[str], vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if len(digests) != len(vectors):
+            raise ValueError(f"Got {len(vectors)} vectors for {len(digests)} digests.")
+        if not digests:
+            return
+        if self.dim(model) is None:
+            dim, path = vectors.shape[1], self._new_path(model)
+            self._db.execute("INSERT INTO models VALUES (?, ?, ?, 0)", (model, dim, path.name))
+        else:
+            dim, path, _ = self._model(model)
+            if vectors.shape[1] != dim:
+                raise ValueError(f"{model} vectors have {dim} dimensions, got {vectors.shape[1]}.")
+        # Rows are counted from the file, so vectors left by an interrupted write are skipped, not reused.
+        first = path.stat().st_size // (dim * 4) if path.exists() else 0
+        with path.open("ab") as file:
+            file.truncate(first * dim * 4)
+            file.write(vectors.tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunk_vectors VALUES (?, ?, ?)",
+                [(model, value, first + offset) for offset, value in enumerate(digests)],
+            )
+            self._db.execute("UPDATE models SET rows = ? WHERE model = ?", (first + len(vectors), model))
+
+    def discard(self, model: str, digests: Iterable[str]) -> int:
+        """Drop the vectors of ``digests``; compacts the file once over half of it is unreferenced."""
+        values = list(dict.fromkeys(digests))
+        with self._db:
+            for batch in _batches(values):
+                self._db.execute(
+                    f"DELETE FROM chunk_vectors WHERE model = ? AND digest IN ({','.join('?' * len(batch))})",
+                    (model, *batch),
+                )
+        if self.dim(model) is not None:
+            _, _, rows = self._model(model)
+            live = self._db.execute("SELECT COUNT(*) FROM chunk_vectors WHERE model = ?", (model,)).fetchone()[0]
+            if rows > 2 * live:
+                self.compact(model)
+        return len(values)
+
+    def compact(self, model: str) -> None:
+        """Rewrite ``model``'s file with only its referenced vectors."""
+        dim, old_path, _ = self._model(model)
+        live = self._db.execute(
+            "SELECT digest, row FROM chunk_vectors WHERE model = ? ORDER BY row", (model,)).fetchall()
+        new_path = self._new_path(model)
+        old = np.memmap(old_path, dtype=np.float32, mode="r").reshape(-1, dim) if live else None
+        with new_path.open("wb") as file:
+            for start in range(0, len(live), 65536):
+                rows = [row for _, row in live[start:start + 65536]]
+                file.write(np.ascontiguousarray(old[rows]).tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+        del old
+        with self._db:
+            self._db.executemany(
+                "UPDATE chunk_vectors SET row = ? WHERE model = ? AND digest = ?",
+                [(position, model, value) for position, (value, _) in enumerate(live)],
+            )
+            self._db.execute("UPDATE models SET file = ?, rows = ? WHERE model = ?", (new_path.name, len(live), model))
+        old_path.unlink(missing_ok=True)
+
+    def _model(self, model: str) -> Tuple[int, Path, int]:
+        dim, file, rows = self._db.execute("SELECT dim, file, rows FROM models WHERE model = ?", (model,)).fetchone()
+        return dim, self._directory / file, rows
+
+    def _new_path(self, model: str) -> Path:
+        # A fresh name per generation, so compaction never overwrites the file the committed rows point into.
+        stem = re.sub(r"[^A-Za-z0-9_.-]+", "_", model)
+        generation = 0
+        while (self._directory / f"{stem}.{generation}.f32").exists():
+            generation += 1
+        return self._directory / f"{stem}.{generation}.f32"
+
+    def _rows(self, model: str, digests: Sequence[str]) -> Dict[str, int]:
+        rows: Dict[str, int] = {}
+        for batch in _batches(digests):
+            rows.update(self._db.execute(
+                f"SELECT digest, row FROM chunk_vectors WHERE model = ? AND digest IN ({','.join('?' * len(batch))})",
+                (model, *batch),
+            ).fetchall())
+        return rows
+
+
+class IndexState:
+    """Content hash and chunk digests of every document the index holds."""
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self._db = connection
+
+    def content_hashes(self) -> Dict[int, str]:
+        return dict(self._db.execute("SELECT doc_id, content_hash FROM indexed_documents").fetchall())
+
+    def chunk_digests(self, doc_ids: Iterable[int]) -> Set[str]:
+        ids = list(doc_ids)
+        digests: Set[str] = set()
+        for start in range(0, len(ids), _BATCH):
+            batch = ids[start:start + _BATCH]
+            digests.update(value for (value,) in self._db.execute(
+                f"SELECT digest FROM indexed_chunks WHERE doc_id IN ({','.join('?' * len(batch))})", batch))
+        return digests
+
+    def replace(self, removed: Iterable[int], documents: Dict[int, Tuple[str, Sequence[str]]]) -> None:
+        """Forget ``removed`` and record ``documents``: ``doc_id -> (content hash, chunk digests)``."""
+        stale = list(removed) + list(documents)
+        with self._db:
+            for start in range(0, len(stale), _BATCH):
+                batch = stale[start:start + _BATCH]
+                placeholders = ",".join("?" * len(batch))
+                self._db.execute(f"DELETE FROM indexed_documents WHERE doc_id IN ({placeholders})", batch)
+                self._db.execute(f"DELETE FROM indexed_chunks WHERE doc_id IN ({placeholders})", batch)
+            self._db.executemany(
+                "INSERT INTO indexed_documents VALUES (?, ?)",
+                [(doc_id, content_hash) for doc_id, (content_hash, _) in documents.items()],
+            )
+            self._db.executemany(
+                "INSERT INTO indexed_chunks VALUES (?, ?, ?)",
+                [(doc_id, position, value)
+                 for doc_id, (_, digests) in documents.items() for position, value in enumerate(digests)],
+            )
+
+    def clear(self) -> None:
+        with self._db:
+            self._db.execute("DELETE FROM indexed_documents")
+            self._db.execute("DELETE FROM indexed_chunks")
+
+    def unreferenced(self, digests: Iterable[str]) -> List[str]:
+        """The ``digests`` no indexed document uses any more."""
+        values = list(dict.fromkeys(digests))
+        referenced: Set[str] = set()
+        for batch in _batches(values):
+            referenced.update(value for (value,) in self._db.execute(
+                f"SELECT DISTINCT digest FROM indexed_chunks WHERE digest IN ({','.join('?' * len(batch))})", batch))
+        return [value for value in values if value not in referenced]
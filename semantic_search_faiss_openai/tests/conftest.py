@@ -0,0 +1,35 @@
+from pathlib import Path
+
+import pytest
+
+from semantic_search.config import Settings
+
+DOCUMENTS = {
+    "cooking/bread.txt": "Title: Baking sourdough bread\nCategory: cooking\nFlour, water, salt and a starter make sourdough bread.",
+    "cooking/pasta.txt": "Fresh pasta\nKnead flour and eggs, rest the dough, then roll the pasta thin.",
+    "travel/kyoto.txt": "Title: Kyoto in spring\nCherry blossoms, temples and gardens make Kyoto busy in spring.",
+    "finance/etf.txt": "Title: ETF vs mutual fund\nAn ETF trades on an exchange all day; a mutual fund prices once a day.",
+}
+
+
+@pytest.fixture
+def corpus_dir(tmp_path: Path) -> Path:
+    root = tmp_path / "corpus"
+    for name, text in DOCUMENTS.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+    return root
+
+
+@pytest.fixture
+def settings(tmp_path: Path, corpus_dir: Path) -> Settings:
+    return Settings(
+        _env_file=None,
+        data_dir=corpus_dir,
+        index_dir=tmp_path / "index",
+        openai_api_key=None,
+        embedding_backend="hashing",
+        index_backend="numpy",
+        hashing_dim=256,
+    )
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from semantic_search.ann import (
+    choose_index_type,
+    estimate_memory,
+    index_factory,
+    recall_at_k,
+    set_search_params,
+    training_points,
+)
+from semantic_search.embeddings import l2_normalize
+from semantic_search.engine import SearchEngine
+from semantic_search.index import create_index
+from semantic_search.pipeline import build_index, ingest
+
+
+def clustered(count: int, dim: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(32, dim))
+    return l2_normalize(centers[rng.integers(0, 32, count)] + 0.5 * rng.normal(size=(count, dim)))
+
+
+def test_auto_stays_exact_for_small_corpora_and_compresses_to_fit_the_budget():
+    assert choose_index_type(10_000, 1536) == "flat"
+    assert choose_index_type(1_000_000, 1536) == "ivf_flat"
+    assert choose_index_type(1_000_000, 1536, memory_budget_mb=1024) == "opq"
+
+    factory = index_factory("opq", 1_000_000, 1536, memory_budget_mb=1024)
+    pq_m = int(factory.rsplit("PQ", 1)[1])
+
+    assert factory == f"OPQ{pq_m},IVF4000,PQ{pq_m}" and 1536 % pq_m == 0
+    assert estimate_memory("opq", 1_000_000, 1536, pq_m) <= 1024 * 2 ** 20
+    with pytest.raises(ValueError):
+        index_factory("ivf_pq", 1_000_000, 1536, memory_budget_mb=1)
+    with pytest.raises(ValueError):
+        index_factory("ivf_pq", 100, 64)
+
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "ivf_pq", "opq", "hnsw"])
+def test_approximate_indexes_keep_ids_and_recall_the_exact_neighbours(index_type):
+    pytest.importorskip("faiss")
+    # PQ codebooks train slowly, so those indexes get fewer, shorter vectors.
+    count, dim = (4000, 32) if index_type in ("ivf_flat", "hnsw") else (1000, 16)
+    vectors, queries = clustered(count, dim, seed=0), clustered(50, dim, seed=1)
+    ids = np.arange(count, dtype=np.int64) + 1000
+    truth = ids[np.argsort(-(queries @ vectors.T), axis=1)[:, :10]]
+    factory = index_factory(index_type, count, dim, pq_m=4)
+    index = create_index(dim, "faiss", factory)
+    if not index.is_trained:
+        index.train(vectors[:training_points(factory, count, 1000)])
+
+    index.add_with_ids(vectors, ids)
+    set_search_params(index, factory, nprobe=64, ef_search=128)
+    _, found = index.search(queries, 10)
+
+    assert recall_at_k(found, truth) >= (0.95 if index_type in ("ivf_flat", "hnsw") else 0.6)
+    if index_type != "hnsw":
+        assert index.remove_ids(ids[:10]) == 10 and index.ntotal == count - 10
+
+
+def test_hnsw_index_adds_in_place_and_rebuilds_for_changes(settings, corpus_dir):
+    pytest.importorskip("faiss")
+    settings = settings.model_copy(update={"index_backend": "faiss", "index_type": "hnsw"})
+    ingest(settings)
+    first = build_index(settings)
+
+    (corpus_dir / "travel/lisbon.txt").write_text("Title: Lisbon trams\nTram 28 climbs through Alfama.")
+    ingest(settings)
+    added = build_index(settings)
+    (corpus_dir / "finance/etf.txt").unlink()
+    ingest(settings)
+    removed = build_index(settings)
+    engine = SearchEngine.load(settings)
+
+    assert (first.manifest.index_type, first.manifest.index_factory) == ("hnsw", "HNSW32")
+    assert (first.rebuilt, added.rebuilt, removed.rebuilt) == (True, False, True)
+    assert (added.added, removed.embedded_chunks) == (1, 0)
+    assert engine.index.ntotal == 4
+    assert engine.search("tram Alfama", k=1)[0].title == "Lisbon trams"
+
+
+def test_changing_the_index_type_rebuilds(settings):
+    pytest.importorskip("faiss")
+    settings = settings.model_copy(update={"index_backend": "faiss"})
+    ingest(settings)
+    assert build_index(settings).manifest.index_factory == "Flat"
+
+    report = build_index(settings.model_copy(update={"index_type": "ivf_flat"}))
+    engine = SearchEngine.load(settings)
+
+    assert report.rebuilt and report.embedded_chunks == 0
+    assert (engine.manifest.index_type, engine.manifest.index_factory) == ("ivf_flat", "IVF1,Flat")
+    assert engine.search("sourdough bread starter", k=1)[0].title == "Baking sourdough bread"
+    # Back on ``auto``, four documents call for a flat index again.
+    assert build_index(settings).rebuilt
+
+
+def test_numpy_backend_only_builds_flat_indexes(settings):
+    ingest(settings)
+
+    with pytest.raises(ValueError, match="faiss"):
+        build_index(settings.model_copy(update={"index_type": "hnsw"}))
@@ -0,0 +1,22 @@
+from fastapi.testclient import TestClient
+
+from semantic_search.api import create_app
+from semantic_search.pipeline import build_index, ingest
+
+
+def test_search_endpoint_serves_the_loaded_index(settings):
+    ingest(settings)
+    build_index(settings)
+
+    with TestClient(create_app(settings)) as client:
+        response = client.get("/search", params={"q": "ETF exchange mutual fund", "k": 2})
+        health = client.get("/healthz").json()
+        too_many = client.get("/search", params={"q": "ETF", "k": settings.search_max_k + 1})
+        empty = client.get("/search", params={"q": ""})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["query"], body["k"], len(body["hits"])) == ("ETF exchange mutual fund", 2, 2)
+    assert body["hits"][0]["title"] == "ETF vs mutual fund"
+    assert health["status"] == "ok" and health["documents"] == 4
+    assert (too_many.status_code, empty.status_code) == (422, 422)
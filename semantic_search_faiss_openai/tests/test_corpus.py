@@ -0,0 +1,53 @@
+import zipfile
+
+from semantic_search.corpus import chunk_spans, chunk_text, load_documents, preview, read_documents, write_documents
+
+
+def test_documents_load_the_same_from_a_folder_or_a_zip(corpus_dir, tmp_path):
+    archive = tmp_path / "corpus.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        for path in corpus_dir.rglob("*.txt"):
+            zf.write(path, path.relative_to(corpus_dir.parent).as_posix())
+
+    from_folder, from_zip = load_documents(corpus_dir), load_documents(archive)
+
+    assert from_folder == from_zip
+    assert [(d.doc_id, d.title, d.category) for d in from_folder] == [
+        (0, "Baking sourdough bread", "cooking"),
+        (1, "Fresh pasta", "cooking"),
+        (2, "ETF vs mutual fund", "finance"),
+        (3, "Kyoto in spring", "travel"),
+    ]
+    assert from_folder[1].path == "corpus/cooking/pasta.txt"
+
+
+def test_documents_round_trip_through_jsonl(corpus_dir, tmp_path):
+    documents = load_documents(corpus_dir)
+    write_documents(documents, tmp_path / "docs.jsonl")
+
+    assert read_documents(tmp_path / "docs.jsonl") == documents
+
+
+def test_chunks_overlap_and_cover_the_text():
+    text = "".join(chr(ord("a") + i % 26) for i in range(50))
+
+    chunks = chunk_text(text, max_chars=20, overlap=5)
+
+    assert [len(chunk) for chunk in chunks] == [20, 20, 20]
+    assert all(a[-5:] == b[:5] for a, b in zip(chunks, chunks[1:]))
+    assert chunks[-1].endswith(text[-5:])
+    assert chunk_text("  short  ", max_chars=20) == ["short"]
+
+
+def test_preview_collapses_whitespace_and_truncates():
+    assert preview("a\n\n b   c") == "a b c"
+    assert preview("x" * 10, max_chars=4) == "xxxx…"
+
+
+def test_chunk_spans_point_into_the_unstripped_text():
+    text = "  " + "".join(chr(ord("a") + i % 26) for i in range(50)) + "\n"
+
+    spans = chunk_spans(text, max_chars=20, overlap=5)
+
+    assert spans[0][0] == 2 and spans[-1][1] == 52
+    assert [text[start:end] for start, end in spans] == chunk_text(text, max_chars=20, overlap=5)
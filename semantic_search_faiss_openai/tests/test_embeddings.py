@@ -0,0 +1,116 @@
+import json
+import threading
+import time
+
+import httpx
+import numpy as np
+import pytest
+
+from semantic_search import embeddings
+from semantic_search.embeddings import OpenAIEmbedder, pack_batches
+from semantic_search.ratelimit import RateBudget, parse_duration
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+def test_batches_are_packed_by_tokens_and_items():
+    assert pack_batches([3, 3, 3, 9, 1, 1, 1], max_tokens=6, max_items=2) == [(0, 2), (2, 3), (3, 4), (4, 6), (6, 7)]
+    assert pack_batches([], max_tokens=6, max_items=2) == []
+
+
+def test_reset_headers_are_parsed():
+    assert parse_duration("6m0s") == 360
+    assert parse_duration("20ms") == pytest.approx(0.02)
+    assert parse_duration("1.5") == 1.5
+    assert parse_duration(None) is None
+
+
+def test_budget_waits_for_tokens_and_learns_limits_from_headers():
+    clock = FakeClock()
+    budget = RateBudget(tokens_per_minute=600, clock=clock, sleep=clock.sleep)
+
+    assert budget.acquire(600) == 0
+    assert budget.acquire(60) == pytest.approx(6.0)
+
+    budget.observe({"x-ratelimit-limit-requests": "60", "x-ratelimit-remaining-requests": "0"})
+    assert budget.acquire(0) == pytest.approx(1.0)
+
+    budget.pause(30)
+    assert budget.acquire(0) == pytest.approx(30.0)
+
+
+class FakeEmbeddingsAPI:
+    """Embeds each input as ``[len(text), 1]``.
+
+    ``failures`` maps a batch's first text to the statuses its first attempts fail with.
+    """
+
+    def __init__(self, failures=None) -> None:
+        self.failures = {text: list(statuses) for text, statuses in (failures or {}).items()}
+        self.inputs = []
+        self.in_flight = self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        texts = json.loads(request.content)["input"]
+        with self._lock:
+            self.inputs.append(texts)
+            statuses = self.failures.get(texts[0])
+            failure = statuses.pop(0) if statuses else None
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.02)
+        with self._lock:
+            self.in_flight -= 1
+        if failure is not None:
+            return httpx.Response(failure, headers={"retry-after": "0"}, json={"error": {"message": "nope"}})
+        data = [{"object": "embedding", "index": i, "embedding": [float(len(text)), 1.0]} for i, text in enumerate(texts)]
+        # Out of order, as the API is allowed to return them.
+        return httpx.Response(200, headers={"x-ratelimit-limit-requests": "10000"}, json={
+            "object": "list", "data": data[::-1], "model": "m", "usage": {"prompt_tokens": 1, "total_tokens": 1}})
+
+
+def _embedder(api: FakeEmbeddingsAPI, monkeypatch, **kwargs) -> OpenAIEmbedder:
+    monkeypatch.setattr(embeddings, "token_counter", lambda model: len)
+    monkeypatch.setattr(embeddings, "backoff_delay", lambda *args: 0.0)
+    monkeypatch.setattr(embeddings.random, "uniform", lambda low, high: 0.0)
+    return OpenAIEmbedder("sk-test", http_client=httpx.Client(transport=httpx.MockTransport(api)), **kwargs)
+
+
+def test_batches_run_concurrently_retry_alone_and_keep_input_order(monkeypatch):
+    texts = [f"text {'x' * i}" for i in range(12)]
+    api = FakeEmbeddingsAPI(failures={texts[3]: [429], texts[6]: [500]})
+    embedder = _embedder(api, monkeypatch, batch_size=3, concurrency=4, max_retries=2)
+
+    matrix = embedder.embed(texts)
+
+    np.testing.assert_array_equal(matrix[:, 0], [len(text) for text in texts])
+    assert embedder.dim == 2
+    assert len(api.inputs) == 6
+    assert sorted(batch[0] for batch in api.inputs) == sorted([texts[0], texts[3], texts[3], texts[6], texts[6], texts[9]])
+    assert api.max_in_flight > 1
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    api = FakeEmbeddingsAPI(failures={"bad": [400]})
+
+    with pytest.raises(RuntimeError):
+        _embedder(api, monkeypatch).embed(["bad"])
+    assert len(api.inputs) == 1
+
+
+def test_a_batch_failing_every_attempt_raises(monkeypatch):
+    api = FakeEmbeddingsAPI(failures={"flaky": [503] * 3})
+
+    with pytest.raises(RuntimeError, match="after 3 attempts"):
+        _embedder(api, monkeypatch, max_retries=2).embed(["flaky"])
+    assert len(api.inputs) == 3
@@ -0,0 +1,96 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from semantic_search import cli
+from semantic_search.embeddings import HashingEmbedder, l2_normalize
+from semantic_search.engine import SearchEngine
+from semantic_search.index import ChunkMap, NumpyFlatIndex
+from semantic_search.pipeline import build_index, ingest
+
+
+@pytest.mark.parametrize("index_backend", ["numpy", "faiss"])
+def test_built_index_finds_the_matching_document(settings, index_backend):
+    if index_backend == "faiss":
+        pytest.importorskip("faiss")
+    settings = settings.model_copy(update={"index_backend": index_backend})
+
+    assert ingest(settings) == 4
+    manifest = build_index(settings).manifest
+    engine = SearchEngine.load(settings)
+    hits = engine.search("sourdough bread starter", k=10)
+
+    assert (manifest.index_backend, manifest.embedder.dim, manifest.documents) == (index_backend, 256, 4)
+    assert hits[0].title == "Baking sourdough bread"
+    assert [hit.rank for hit in hits] == [1, 2, 3, 4]
+    assert hits[0].score >= hits[1].score >= hits[-1].score
+
+
+def test_numpy_index_matches_brute_force():
+    vectors = l2_normalize(np.random.default_rng(0).normal(size=(50, 8)))
+    queries = l2_normalize(np.random.default_rng(1).normal(size=(3, 8)))
+
+    scores, ids = NumpyFlatIndex(vectors).search(queries, 5)
+
+    expected = np.argsort(-(queries @ vectors.T), axis=1)[:, :5]
+    np.testing.assert_array_equal(ids, expected)
+    np.testing.assert_allclose(scores, np.take_along_axis(queries @ vectors.T, expected, axis=1), rtol=1e-6)
+
+
+def test_hashing_embedding_is_deterministic():
+    first, second = HashingEmbedder(64).embed(["Same text"]), HashingEmbedder(64).embed(["same TEXT"])
+
+    np.testing.assert_array_equal(first, second)
+    assert first.shape == (1, 64)
+
+
+def test_cli_runs_the_pipeline(settings, capsys, monkeypatch):
+    monkeypatch.setattr(cli, "get_settings", lambda: settings)
+
+    assert cli.main(["ingest"]) == 0
+    assert cli.main(["build-index"]) == 0
+    assert cli.main(["query", "Kyoto cherry blossoms", "-k", "1", "--json"]) == 0
+
+    assert '"title": "Kyoto in spring"' in capsys.readouterr().out
+
+
+def test_cli_reports_a_missing_index(settings, capsys, monkeypatch):
+    monkeypatch.setattr(cli, "get_settings", lambda: settings)
+
+    assert cli.main(["query", "anything"]) == 1
+    assert "build-index" in capsys.readouterr().err
+
+
+def test_loading_and_querying_with_hashing_imports_no_optional_dependency(settings):
+    ingest(settings)
+    build_index(settings)
+    script = (
+        "import sys\n"
+        "from semantic_search.config import Settings\n"
+        "from semantic_search.engine import SearchEngine\n"
+        "import semantic_search.cli\n"
+        f"engine = SearchEngine.load(Settings(_env_file=None, index_dir={str(settings.index_dir)!r}))\n"
+        "engine.search('bread')\n"
+        "print(sorted({'faiss', 'openai', 'pandas', 'fastapi'} & set(sys.modules)))\n"
+    )
+
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                            cwd=Path(__file__).parents[1])
+
+    assert result.stdout.strip() == "[]"
+
+
+def test_chunk_map_reuses_released_ids():
+    chunk_map = ChunkMap()
+    first = chunk_map.allocate(np.array([[7, 0, 10], [7, 8, 20], [9, 0, 5]], dtype=np.int32))
+
+    released = chunk_map.release([7])
+    again = chunk_map.allocate(np.array([[11, 0, 4], [11, 2, 6], [11, 4, 8]], dtype=np.int32))
+
+    assert first.tolist() == [0, 1, 2] and released.tolist() == [0, 1]
+    assert again.tolist() == [0, 1, 3]
+    assert chunk_map.rows.dtype == np.int32 and chunk_map.rows[:, 0].tolist() == [11, 11, 9, 11]
+    assert chunk_map.live == 4
@@ -0,0 +1,113 @@
+import pytest
+
+from semantic_search import pipeline
+from semantic_search.embeddings import HashingEmbedder
+from semantic_search.engine import SearchEngine
+from semantic_search.pipeline import build_index, ingest
+
+
+class CountingEmbedder(HashingEmbedder):
+    def __init__(self, dim: int) -> None:
+        super().__init__(dim)
+        self.texts: list = []
+
+    def embed(self, texts):
+        self.texts.extend(texts)
+        return super().embed(texts)
+
+
+@pytest.fixture
+def embedder(monkeypatch, settings):
+    embedder = CountingEmbedder(settings.hashing_dim)
+    monkeypatch.setattr(pipeline, "build_embedder", lambda _: embedder)
+    return embedder
+
+
+@pytest.mark.parametrize("index_backend", ["numpy", "faiss"])
+def test_reindexing_embeds_only_new_and_changed_documents(settings, corpus_dir, embedder, index_backend):
+    if index_backend == "faiss":
+        pytest.importorskip("faiss")
+    settings = settings.model_copy(update={"index_backend": index_backend})
+    ingest(settings)
+    first = build_index(settings)
+    ids = {document.path: document.doc_id for document in SearchEngine.load(settings).documents}
+
+    (corpus_dir / "cooking/bread.txt").write_text("Title: Rye bread\nDense rye loaves need a long proof.")
+    (corpus_dir / "finance/etf.txt").unlink()
+    (corpus_dir / "travel/lisbon.txt").write_text("Title: Lisbon trams\nTram 28 climbs through Alfama.")
+    embedder.texts.clear()
+    ingest(settings)
+    report = build_index(settings)
+    engine = SearchEngine.load(settings)
+
+    assert (first.rebuilt, report.rebuilt) == (True, False)
+    assert (report.added, report.updated, report.removed, report.embedded_chunks) == (1, 1, 1, 2)
+    assert embedder.texts == ["Title: Rye bread\nDense rye loaves need a long proof.",
+                              "Title: Lisbon trams\nTram 28 climbs through Alfama."]
+    assert report.manifest.documents == engine.index.ntotal == 4
+    assert {d.path: d.doc_id for d in engine.documents if d.path in ids} == {
+        path: doc_id for path, doc_id in ids.items() if not path.endswith("etf.txt")}
+    assert engine.search("rye loaves", k=1)[0].title == "Rye bread"
+    assert engine.search("tram Alfama", k=1)[0].title == "Lisbon trams"
+    assert "ETF vs mutual fund" not in {hit.title for hit in engine.search("ETF mutual fund", k=4)}
+
+    embedder.texts.clear()
+    assert build_index(settings).embedded_chunks == 0
+    assert embedder.texts == []
+
+
+def test_changed_chunking_rebuilds_and_reuses_stored_chunks(settings, embedder):
+    ingest(settings)
+    build_index(settings)
+    embedder.texts.clear()
+
+    report = build_index(settings.model_copy(update={"chunk_max_chars": 80, "chunk_overlap_chars": 10}))
+
+    assert report.rebuilt and report.manifest.chunk_max_chars == 80
+    assert 0 < report.embedded_chunks == len(embedder.texts)
+    assert report.reused_chunks > 0
+
+
+@pytest.mark.parametrize("index_backend", ["numpy", "faiss"])
+def test_chunk_index_returns_the_matching_passage_and_updates_in_place(settings, corpus_dir, embedder, index_backend):
+    if index_backend == "faiss":
+        pytest.importorskip("faiss")
+    long_text = ("Title: Field guide\n" + "Moss and lichen cover the north side of old oak trees. " * 4
+                 + "Sourdough needs a starter fed with flour and water every day. " * 4)
+    (corpus_dir / "guide.txt").write_text(long_text)
+    settings = settings.model_copy(update={"index_backend": index_backend, "index_granularity": "chunk",
+                                           "chunk_max_chars": 120, "chunk_overlap_chars": 20})
+    ingest(settings)
+    build_index(settings)
+    engine = SearchEngine.load(settings)
+
+    hits = engine.search("sourdough starter flour water", k=2)
+
+    assert engine.manifest.granularity == "chunk" and engine.manifest.vectors > engine.manifest.documents
+    assert len({hit.doc_id for hit in hits}) == 2
+    guide = next(hit for hit in hits if hit.title == "Field guide")
+    assert "Sourdough" in guide.passage and guide.passage in long_text
+    assert guide.preview.startswith(" ".join(guide.passage.split())[:40])
+
+    (corpus_dir / "guide.txt").unlink()
+    ingest(settings)
+    report = build_index(settings)
+    engine = SearchEngine.load(settings)
+
+    assert not report.rebuilt and report.removed == 1
+    assert engine.index.ntotal == engine.manifest.vectors == 4
+    assert all(hit.title != "Field guide" for hit in engine.search("moss lichen oak", k=4))
+
+
+def test_top_m_pooling_favours_documents_with_several_matching_passages(settings, corpus_dir, embedder):
+    (corpus_dir / "many.txt").write_text("Title: Many\n" + "kyoto temples. " * 3 + "\n" + "kyoto gardens. " * 3)
+    settings = settings.model_copy(update={"index_granularity": "chunk", "chunk_max_chars": 40,
+                                           "chunk_overlap_chars": 0, "chunk_pooling": "top_m"})
+    ingest(settings)
+    build_index(settings)
+
+    pooled = SearchEngine.load(settings).search("kyoto temples gardens", k=1)[0]
+    best = SearchEngine.load(settings.model_copy(update={"chunk_pooling": "max"})).search("kyoto temples gardens", k=5)
+
+    assert pooled.title == "Many"
+    assert pooled.score <= next(hit.score for hit in best if hit.title == "Many")
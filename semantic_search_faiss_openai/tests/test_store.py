@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from semantic_search.store import EmbeddingStore, IndexState, connect, digest
+
+MODEL = "hashing/hashing-4"
+
+
+@pytest.fixture
+def db(tmp_path):
+    connection = connect(tmp_path)
+    yield connection
+    connection.close()
+
+
+def test_vectors_are_stored_once_per_model_and_digest(tmp_path, db):
+    store = EmbeddingStore(tmp_path, db)
+    vectors = np.arange(8, dtype=np.float32).reshape(2, 4)
+    store.put(MODEL, [digest("a"), digest("b")], vectors)
+
+    assert store.missing(MODEL, [digest("b"), digest("c"), digest("c")]) == [digest("c")]
+    assert store.missing("openai/other", [digest("a")]) == [digest("a")]
+    np.testing.assert_array_equal(store.get(MODEL, [digest("b"), digest("a"), digest("b")]), vectors[[1, 0, 1]])
+    with pytest.raises(KeyError):
+        store.get(MODEL, [digest("c")])
+    with pytest.raises(ValueError):
+        store.put(MODEL, [digest("c")], np.zeros((1, 3)))
+
+
+def test_discarding_most_vectors_compacts_the_file(tmp_path, db):
+    store = EmbeddingStore(tmp_path, db)
+    digests = [digest(str(i)) for i in range(10)]
+    vectors = np.random.default_rng(0).normal(size=(10, 4)).astype(np.float32)
+    store.put(MODEL, digests, vectors)
+
+    store.discard(MODEL, digests[:3])
+    assert sorted(path.name for path in tmp_path.glob("*.f32")) == ["hashing_hashing-4.0.f32"]
+
+    store.discard(MODEL, digests[3:8])
+    assert sorted(path.name for path in tmp_path.glob("*.f32")) == ["hashing_hashing-4.1.f32"]
+    assert (tmp_path / "hashing_hashing-4.1.f32").stat().st_size == 2 * 4 * 4
+    np.testing.assert_array_equal(store.get(MODEL, digests[8:]), vectors[8:])
+
+
+def test_a_torn_append_is_trimmed_and_never_read(tmp_path, db):
+    store = EmbeddingStore(tmp_path, db)
+    store.put(MODEL, [digest("a")], np.ones((1, 4), dtype=np.float32))
+    with (tmp_path / "hashing_hashing-4.0.f32").open("ab") as file:
+        file.write(b"\x00" * 6)
+
+    store.put(MODEL, [digest("b")], np.full((1, 4), 2, dtype=np.float32))
+
+    np.testing.assert_array_equal(store.get(MODEL, [digest("a"), digest("b")]), [[1] * 4, [2] * 4])
+
+
+def test_index_state_tracks_unreferenced_chunks(db):
+    state = IndexState(db)
+    state.replace([], {1: ("h1", ["x", "y"]), 2: ("h2", ["y", "z"])})
+
+    state.replace([2], {1: ("h1b", ["x"])})
+
+    assert state.content_hashes() == {1: "h1b"}
+    assert state.unreferenced(["x", "y", "z"]) == ["y", "z"]